@@ -0,0 +1,86 @@
+# Memory used by the outputs of a herd kept in memory
+# Compares ModelOutput with CompactModelOutput (float64 and float32). Run from the
+# root of the repository:
+#
+#   python dev_scripts/benchmark_model_output_memory.py
+#
+# The 'ModelOutput without compaction' row is the current ModelOutput without the
+# conversion of NumPy scalars to Python numbers and the copy of dataframes, so it
+# shows what that step saves. It isn't the ModelOutput of earlier versions. To
+# measure an earlier version, check it out in a worktree and run this script with
+# its source first on the path (rows it can't run are skipped):
+#
+#   git worktree add ../nasem-before <commit>
+#   PYTHONPATH=../nasem-before/src python dev_scripts/benchmark_model_output_memory.py
+#
+# Per animal on the sample input, ModelOutput before CompactModelOutput was added
+# (c79da78) used 303 KiB. Now ModelOutput uses 180 KiB, and CompactModelOutput
+# uses 51 KiB (float64) or 48 KiB (float32).
+#
+# The memory of each output is measured with tracemalloc as the increase in
+# traced memory while the outputs are kept in a list, so memory shared between
+# outputs (the layout of CompactModelOutput) is only counted once.
+import gc
+import tracemalloc
+
+import pandas as pd
+
+import nasem_dairy as nd
+import nasem_dairy.ration_balancer.execute_model as execute_model_module
+
+n_animals = 50
+
+user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+if hasattr(nd, 'CompiledFeedLibrary'):
+    feed_library = nd.CompiledFeedLibrary(feed_library)
+
+
+class UncompactedModelOutput(nd.ModelOutput):
+    """
+    ModelOutput without the conversion of NumPy scalars to Python numbers and the copy of dataframes.
+    """
+    def _ModelOutput__compact_values(self):
+        pass
+
+
+def run_model(animal):
+    return nd.execute_model(user_diet, {**animal_input, 'An_BW': 550 + animal}, equation_selection,
+                            feed_library, nd.coeff_dict.copy())
+
+
+def run_model_uncompacted(animal):
+    # execute_model creates the ModelOutput by its name in its module
+    execute_model_module.ModelOutput = UncompactedModelOutput
+    try:
+        return run_model(animal)
+    finally:
+        execute_model_module.ModelOutput = nd.ModelOutput
+
+
+def memory_per_animal(make_output):
+    # Run once so caches (compiled feed library, layouts) aren't counted
+    make_output(0)
+    gc.collect()
+    tracemalloc.start()
+    herd = []
+    for animal in range(n_animals):
+        herd.append(make_output(animal))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used / n_animals
+
+
+results = {}
+if hasattr(nd.ModelOutput, '_ModelOutput__compact_values'):
+    results['ModelOutput without compaction'] = memory_per_animal(run_model_uncompacted)
+results['ModelOutput'] = memory_per_animal(run_model)
+if hasattr(nd, 'CompactModelOutput'):
+    results['CompactModelOutput float64'] = memory_per_animal(
+        lambda animal: nd.CompactModelOutput.from_model_output(run_model(animal)))
+    results['CompactModelOutput float32'] = memory_per_animal(
+        lambda animal: nd.CompactModelOutput.from_model_output(run_model(animal), dtype='float32'))
+print(f"Memory per animal, {n_animals} animals")
+for name, used in results.items():
+    print(f"{name:33} {used / 1024:8.1f} KiB")
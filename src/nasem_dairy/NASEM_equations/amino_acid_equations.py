@@ -6,12 +6,20 @@ import math
 import pandas as pd
 
 
+def _get_AA_coeffs(coeff_dict, names):
+    """
+    Coefficients for each amino acid with the amino acids on the last axis, so
+    coefficients given as arrays (one value per animal) give one row per animal.
+    """
+    return np.stack(np.broadcast_arrays(*[coeff_dict[name] for name in names]), axis=-1)
+
+
 def calculate_Du_AAMic(Du_MiTP_g, AA_list, coeff_dict):
     req_coeffs = ['MiTPArgProf', 'MiTPHisProf', 'MiTPIleProf', 'MiTPLeuProf',
                   'MiTPLysProf', 'MiTPMetProf', 'MiTPPheProf', 'MiTPThrProf',
                   'MiTPTrpProf', 'MiTPValProf']
     check_coeffs_in_coeff_dict(coeff_dict, req_coeffs)
-    AA_coeffs = np.array([coeff_dict[f"MiTP{AA}Prof"] for AA in AA_list])
+    AA_coeffs = _get_AA_coeffs(coeff_dict, [f"MiTP{AA}Prof" for AA in AA_list])
     Du_AAMic = Du_MiTP_g * AA_coeffs / 100   # Line 1573-1582
     return Du_AAMic
 
@@ -19,7 +27,7 @@ def calculate_Du_AAMic(Du_MiTP_g, AA_list, coeff_dict):
 def calculate_Du_IdAAMic(Du_AAMic, coeff_dict):
     req_coeffs = ['SI_dcMiCP']
     check_coeffs_in_coeff_dict(coeff_dict, req_coeffs)
-    Du_IdAAMic = Du_AAMic * coeff_dict['SI_dcMiCP'] / 100
+    Du_IdAAMic = Du_AAMic * np.expand_dims(coeff_dict['SI_dcMiCP'], -1) / 100
     return Du_IdAAMic
 
 
@@ -38,8 +46,8 @@ def calculate_mPrtmx_AA(AA_list, coeff_dict):
                   'mPrt_k_Lys_src', 'mPrt_k_Met_src', 'mPrt_k_Phe_src', 'mPrt_k_Thr_src',
                   'mPrt_k_Trp_src', 'mPrt_k_Val_src', 'mPrt_k_EAA2_src']
     check_coeffs_in_coeff_dict(coeff_dict, req_coeffs)
-    AA_coeffs = np.array([coeff_dict[f'mPrt_k_{AA}_src'] for AA in AA_list])
-    mPrtmx_AA = -(AA_coeffs**2) / (4 * coeff_dict['mPrt_k_EAA2_src'])
+    AA_coeffs = _get_AA_coeffs(coeff_dict, [f"mPrt_k_{AA}_src" for AA in AA_list])
+    mPrtmx_AA = -(AA_coeffs**2) / (4 * np.expand_dims(coeff_dict['mPrt_k_EAA2_src'], -1))
     return mPrtmx_AA
 
 
@@ -53,8 +61,8 @@ def calculate_AA_mPrtmx(AA_list, coeff_dict):
                   'mPrt_k_Lys_src', 'mPrt_k_Met_src', 'mPrt_k_Phe_src', 'mPrt_k_Thr_src',
                   'mPrt_k_Trp_src', 'mPrt_k_Val_src', 'mPrt_k_EAA2_src']
     check_coeffs_in_coeff_dict(coeff_dict, req_coeffs)
-    AA_coeffs = np.array([coeff_dict[f"mPrt_k_{AA}_src"] for AA in AA_list])
-    AA_mPrtmx = -AA_coeffs / (2 * coeff_dict['mPrt_k_EAA2_src'])
+    AA_coeffs = _get_AA_coeffs(coeff_dict, [f"mPrt_k_{AA}_src" for AA in AA_list])
+    AA_mPrtmx = -AA_coeffs / (2 * np.expand_dims(coeff_dict['mPrt_k_EAA2_src'], -1))
     return AA_mPrtmx
 
 
@@ -63,9 +71,9 @@ def calculate_mPrt_AA_01(AA_mPrtmx, AA_list, coeff_dict):
                   'mPrt_k_Lys_src', 'mPrt_k_Met_src', 'mPrt_k_Phe_src', 'mPrt_k_Thr_src',
                   'mPrt_k_Trp_src', 'mPrt_k_Val_src', 'mPrt_k_EAA2_src']
     check_coeffs_in_coeff_dict(coeff_dict, req_coeffs)
-    AA_coeffs = np.array([coeff_dict[f"mPrt_k_{AA}_src"] for AA in AA_list])
+    AA_coeffs = _get_AA_coeffs(coeff_dict, [f"mPrt_k_{AA}_src" for AA in AA_list])
     mPrt_AA_01 = AA_mPrtmx * 0.1 * AA_coeffs + \
-        (AA_mPrtmx * 0.1)**2 * coeff_dict['mPrt_k_EAA2_src']
+        (AA_mPrtmx * 0.1)**2 * np.expand_dims(coeff_dict['mPrt_k_EAA2_src'], -1)
     return mPrt_AA_01
 
 
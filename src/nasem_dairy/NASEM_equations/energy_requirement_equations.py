@@ -1,5 +1,5 @@
 import numpy as np
-from nasem_dairy.ration_balancer.ration_balancer_functions import check_coeffs_in_coeff_dict
+from nasem_dairy.ration_balancer.ration_balancer_functions import _where, check_coeffs_in_coeff_dict
 
 def calculate_An_NEmUse_NS(
         An_StatePhys: str, 
@@ -67,22 +67,26 @@ def calculate_An_NEmUse_NS(
     # R code note: 'Back calculated from MEm of 0.15 and Km_NE_ME = 0.66'
     An_NEmUse_NS = 0.10 * An_BW ** 0.75  
     
-    # Calves drinking milk or eating mixed diet
-    # R code line 2779
-    if An_StatePhys == "Calf" and Dt_DMIn_ClfLiq > 0:
-        An_NEmUse_NS = 0.0769 * An_BW_empty**0.75
+    # Adjustments are applied in reverse order of the R code so that the
+    # first matching condition takes priority
+
+    # Adjust NEm for cows based on parity (assuming parity > 0 implies cow)
+    # R code line 2782
+    # This recalculates what is already set as default for Heifers
+    # Equation 20-272 says An_BW is An_BW NPr_3 i.e. Equation 20-246
+    An_NEmUse_NS = _where(An_parity_rl > 0, 0.10 * An_BW**0.75, An_NEmUse_NS)
 
     # Adjust NEm for weaned calves (Calf state with zero DMI from calf liquid diet)
     # R code line 2780
-    elif An_StatePhys == "Calf" and Dt_DMIn_ClfLiq == 0:
-        An_NEmUse_NS = 0.097 * An_BW_empty**0.75
+    An_NEmUse_NS = _where((An_StatePhys == "Calf") & (Dt_DMIn_ClfLiq == 0),
+                            0.097 * An_BW_empty**0.75,
+                            An_NEmUse_NS)
 
-    # Adjust NEm for cows based on parity (assuming parity > 0 implies cow)
-    # R code line 2782
-    elif An_parity_rl > 0:
-        # This recalculates what is already set as default for Heifers
-        # Equation 20-272 says An_BW is An_BW NPr_3 i.e. Equation 20-246
-        An_NEmUse_NS = 0.10 * An_BW**0.75
+    # Calves drinking milk or eating mixed diet
+    # R code line 2779
+    An_NEmUse_NS = _where((An_StatePhys == "Calf") & (Dt_DMIn_ClfLiq > 0),
+                            0.0769 * An_BW_empty**0.75,
+                            An_NEmUse_NS)
 
     return An_NEmUse_NS
 
@@ -139,10 +143,9 @@ def calculate_An_NEm_Act_Graze(
     )
     ```
     """
-    if Dt_PastIn / Dt_DMIn < 0.005:     # Line 2793
-        An_NEm_Act_Graze = 0
-    else:
-        An_NEm_Act_Graze = 0.0075 * An_MBW * (600 - 12 * Dt_PastSupplIn) / 600 # Lines 2794-5
+    An_NEm_Act_Graze = _where(Dt_PastIn / Dt_DMIn < 0.005,     # Line 2793
+                                0,
+                                0.0075 * An_MBW * (600 - 12 * Dt_PastSupplIn) / 600) # Lines 2794-5
     return An_NEm_Act_Graze
 
 
@@ -507,13 +510,9 @@ def calculate_Kr_ME_RE(Trg_MilkProd: float, Trg_RsrvGain: float) -> float:
     ```
 
     """
-    if Trg_MilkProd > 0 and Trg_RsrvGain > 0:   # Efficiency of ME to Rsrv RE for lactating cows gaining Rsrv, Line 2836
-        Kr_ME_RE = 0.75
-    elif Trg_RsrvGain <= 0:     # Line 2837, Efficiency of ME generated for cows losing Rsrv
-        Kr_ME_RE = 0.89
-    else:
-        # Efficiency of ME to RE for reserves gain, Heifers and dry cows, Line 2835
-        Kr_ME_RE = 0.60
+    # Efficiency of ME to RE for reserves gain, Heifers and dry cows, Line 2835
+    Kr_ME_RE = _where(Trg_RsrvGain <= 0, 0.89, 0.60)  # Line 2837, Efficiency of ME generated for cows losing Rsrv
+    Kr_ME_RE = _where((Trg_MilkProd > 0) & (Trg_RsrvGain > 0), 0.75, Kr_ME_RE)   # Efficiency of ME to Rsrv RE for lactating cows gaining Rsrv, Line 2836
     return Kr_ME_RE
 
 
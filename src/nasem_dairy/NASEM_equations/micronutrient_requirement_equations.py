@@ -1,18 +1,16 @@
 # Micronutrient Requirement Equations
-import math
+import numpy as np
+from nasem_dairy.ration_balancer.ration_balancer_functions import _where
 
 ### CALCIUM ###
 def calculate_Ca_Mlk(An_Breed: str) -> float:
     """
     Ca_Mlk: Calcium content of milk, g/L
     """
-    if( An_Breed == "Jersey") | (An_Breed != ""):   
     # NOTE This makes no sense as if An_Breed is any string it gets assigned 1.17
     # So why check if it's a Jersey? No cow could be assigened 1.03 unless there is no An_Breed, 
     # but that would break the rest of the model
-        Ca_Mlk = 1.17   # Calcium content of milk, g/L, Line 2963
-    else:
-        Ca_Mlk = 1.03
+    Ca_Mlk = _where((An_Breed == "Jersey") | (An_Breed != ""), 1.17, 1.03)   # Calcium content of milk, g/L, Line 2963
     return Ca_Mlk
 
 
@@ -36,8 +34,8 @@ def calculate_An_Ca_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Ca_y: Ca requirement for gestation, g/d
     """
-    An_Ca_y = (0.0245 * math.exp((0.05581 - 0.00007 * An_GestDay) * An_GestDay) \
-              - 0.0245 * math.exp((0.05581 - 0.00007 * (An_GestDay - 1)) * (An_GestDay - 1))) * An_BW / 715    # Gestation, Line 2966-2967 
+    An_Ca_y = (0.0245 * np.exp((0.05581 - 0.00007 * An_GestDay) * An_GestDay) \
+              - 0.0245 * np.exp((0.05581 - 0.00007 * (An_GestDay - 1)) * (An_GestDay - 1))) * An_BW / 715    # Gestation, Line 2966-2967 
     return An_Ca_y
 
 
@@ -45,12 +43,12 @@ def calculate_An_Ca_l(Mlk_NP_g: float, Ca_Mlk: float, Trg_MilkProd: float, Trg_M
     """
     An_Ca_l: Ca requirement for lactation, g/d
     """
-    if Mlk_NP_g is None or math.isnan(Mlk_NP_g):    # Lactation, Line 2968
-        An_Ca_l = Ca_Mlk * Trg_MilkProd 
-    else:
-        An_Ca_l = (0.295 + 0.239 * Trg_MilkTPp) * Trg_MilkProd
+    Mlk_NP_g = np.asarray(Mlk_NP_g, dtype=float)
+    An_Ca_l = _where(np.isnan(Mlk_NP_g),     # Lactation, Line 2968
+                       Ca_Mlk * Trg_MilkProd,
+                       (0.295 + 0.239 * Trg_MilkTPp) * Trg_MilkProd)
     # Line 2969 - this is not possible for An_Ca_l to be NA, but keeping commented out for record of R code line number:
-    # if math.isnan(An_Ca_l):
+    # if np.isnan(An_Ca_l):
     #     An_Ca_l = 0
     return An_Ca_l
 
@@ -67,10 +65,9 @@ def calculate_An_Ca_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Ca_Clf: flo
     """
     An_Ca_req: Calcium requirement, g/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:
-        An_Ca_req = An_Ca_Clf
-    else:
-        An_Ca_req = Fe_Ca_m + An_Ca_g + An_Ca_y + An_Ca_l
+    An_Ca_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),
+                         An_Ca_Clf,
+                         Fe_Ca_m + An_Ca_g + An_Ca_y + An_Ca_l)
     return An_Ca_req
 
 
@@ -103,10 +100,7 @@ def calculate_Fe_P_m(An_Parity_rl: int, An_DMIn: float) -> float:
     """
     Fe_P_m: Fecal P loss?, g/d, part of maintenance requirement
     """
-    if An_Parity_rl == 0:   # Line 2978
-        Fe_P_m = 0.8 * An_DMIn
-    else:
-        Fe_P_m = 1.0 * An_DMIn
+    Fe_P_m = _where(An_Parity_rl == 0, 0.8 * An_DMIn, 1.0 * An_DMIn)   # Line 2978
     return Fe_P_m
 
 
@@ -130,8 +124,8 @@ def calculate_An_P_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_P_y: P gestation requirement, g/d
     """
-    An_P_y = (0.02743 * math.exp((0.05527 - 0.000075 * An_GestDay) * An_GestDay)    # Line 2981
-             - 0.02743 * math.exp((0.05527 - 0.000075 * (An_GestDay - 1)) * (An_GestDay - 1))) * An_BW / 715
+    An_P_y = (0.02743 * np.exp((0.05527 - 0.000075 * An_GestDay) * An_GestDay)    # Line 2981
+             - 0.02743 * np.exp((0.05527 - 0.000075 * (An_GestDay - 1)) * (An_GestDay - 1))) * An_BW / 715
     return An_P_y
 
 
@@ -139,10 +133,10 @@ def calculate_An_P_l(Trg_MilkProd: float, MlkNP_Milk: float) -> float:
     """
     An_P_l: P requirement for lactation, g/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 2983
-        An_P_l = 0      # If MTP not known then 0.9*Milk
-    else:
-        An_P_l = (0.48 + 0.13 * MlkNP_Milk * 100) * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_P_l = _where(np.isnan(Trg_MilkProd),   # Line 2983
+                      0,    # If MTP not known then 0.9*Milk
+                      (0.48 + 0.13 * MlkNP_Milk * 100) * Trg_MilkProd)
     return An_P_l
 
 
@@ -158,10 +152,9 @@ def calculate_An_P_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_P_Clf: float
     """
     An_P_req: P requirement, g/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:    # LIne 2986-2987
-        An_P_req = An_P_Clf
-    else:
-        An_P_req = An_P_m + An_P_g + An_P_y + An_P_l
+    An_P_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),    # LIne 2986-2987
+                        An_P_Clf,
+                        An_P_m + An_P_g + An_P_y + An_P_l)
     return An_P_req
 
 
@@ -235,10 +228,7 @@ def calculate_An_Mg_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Mg_y: Mg requirement for gestation, g/d
     """
-    if An_GestDay > 190:    # Line 3000
-        An_Mg_y = 0.3 * (An_BW / 715)
-    else:
-        An_Mg_y = 0
+    An_Mg_y = _where(An_GestDay > 190, 0.3 * (An_BW / 715), 0)    # Line 3000
     return An_Mg_y
 
 
@@ -246,10 +236,8 @@ def calculate_An_Mg_l(Trg_MilkProd: float) -> float:
     """
     An_Mg_l: Mg requirement for lactation
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3001
-        An_Mg_l = 0
-    else:
-        An_Mg_l = 0.11 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_Mg_l = _where(np.isnan(Trg_MilkProd), 0, 0.11 * Trg_MilkProd)    # Line 3001
     return An_Mg_l
 
 
@@ -257,10 +245,9 @@ def calculate_An_Mg_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Mg_Clf: flo
     """
     An_Mg_req: Mg requirement, g/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3002
-        An_Mg_req = An_Mg_Clf
-    else:
-        An_Mg_req = An_Mg_m + An_Mg_g + An_Mg_y + An_Mg_l
+    An_Mg_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3002
+                         An_Mg_Clf,
+                         An_Mg_m + An_Mg_g + An_Mg_y + An_Mg_l)
     return An_Mg_req
 
 
@@ -309,10 +296,7 @@ def calculate_An_Na_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Na_y: Na required for gestation
     """
-    if An_GestDay > 190:    # Line 3011
-        An_Na_y = 1.4 * An_BW / 715
-    else:
-        An_Na_y = 0
+    An_Na_y = _where(An_GestDay > 190, 1.4 * An_BW / 715, 0)    # Line 3011
     return An_Na_y
 
 
@@ -320,10 +304,8 @@ def calculate_An_Na_l(Trg_MilkProd: float) -> float:
     """
     An_Na_l: Na requirement for lactation, g/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3012
-        An_Na_l = 0
-    else:
-        An_Na_l = 0.4 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_Na_l = _where(np.isnan(Trg_MilkProd), 0, 0.4 * Trg_MilkProd)    # Line 3012
     return An_Na_l
 
 
@@ -331,10 +313,9 @@ def calculate_An_Na_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Na_Clf: flo
     """
     An_Na_req: Na requirement, g/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3013-3014
-        An_Na_req = An_Na_Clf
-    else:
-        An_Na_req = Fe_Na_m + An_Na_g + An_Na_y + An_Na_l
+    An_Na_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3013-3014
+                         An_Na_Clf,
+                         Fe_Na_m + An_Na_g + An_Na_y + An_Na_l)
     return An_Na_req
 
 
@@ -383,10 +364,7 @@ def calculate_An_Cl_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Cl_y: Cl requirement for gestation, g/d
     """
-    if An_GestDay > 190:    # Line 3021
-        An_Cl_y = 1.0 * An_BW / 715       
-    else:
-       An_Cl_y = 0
+    An_Cl_y = _where(An_GestDay > 190, 1.0 * An_BW / 715, 0)    # Line 3021
     return An_Cl_y
 
 
@@ -394,10 +372,8 @@ def calculate_An_Cl_l(Trg_MilkProd: float) -> float:
     """
     An_Cl_l: Cl required for lactation, g/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3022
-        An_Cl_l = 0
-    else:
-        An_Cl_l = 1.0 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_Cl_l = _where(np.isnan(Trg_MilkProd), 0, 1.0 * Trg_MilkProd)    # Line 3022
     return An_Cl_l
 
 
@@ -405,10 +381,9 @@ def calculate_An_Cl_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Cl_Clf: flo
     """
     An_Cl_req: Cl requirement, g/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3023-3024
-        An_Cl_req = An_Cl_Clf
-    else:
-        An_Cl_req = Fe_Cl_m + An_Cl_g + An_Cl_y + An_Cl_l
+    An_Cl_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3023-3024
+                         An_Cl_Clf,
+                         Fe_Cl_m + An_Cl_g + An_Cl_y + An_Cl_l)
     return An_Cl_req
 
 
@@ -441,10 +416,7 @@ def calculate_Ur_K_m(Trg_MilkProd: float, An_BW: float) -> float:
     """
     Ur_K_m: Urinary K loss, g/d
     """
-    if Trg_MilkProd > 0:    # Line 3029
-        Ur_K_m = 0.2 * An_BW
-    else:
-        Ur_K_m = 0.07 * An_BW
+    Ur_K_m = _where(Trg_MilkProd > 0, 0.2 * An_BW, 0.07 * An_BW)    # Line 3029
     return Ur_K_m
 
 
@@ -476,10 +448,7 @@ def calculate_An_K_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_K_y: K required for gestation, g/d
     """
-    if An_GestDay > 190:    # Line 3033
-        An_K_y = 1.03 * An_BW / 715
-    else:
-        An_K_y = 0
+    An_K_y = _where(An_GestDay > 190, 1.03 * An_BW / 715, 0)    # Line 3033
     return An_K_y
 
 
@@ -487,10 +456,8 @@ def calculate_An_K_l(Trg_MilkProd: float) -> float:
     """
     An_K_l: K required for lactation, g/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3034
-        An_K_l = 0
-    else:
-        An_K_l = 1.5 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_K_l = _where(np.isnan(Trg_MilkProd), 0, 1.5 * Trg_MilkProd)    # Line 3034
     return An_K_l
 
 
@@ -498,10 +465,9 @@ def calculate_An_K_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_K_Clf: float
     """
     An_K_req: K requirement, g/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3035-3036
-        An_K_req = An_K_Clf
-    else: 
-        An_K_req = An_K_m + An_K_g + An_K_y + An_K_l
+    An_K_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3035-3036
+                        An_K_Clf,
+                        An_K_m + An_K_g + An_K_y + An_K_l)
     return An_K_req
 
 
@@ -584,12 +550,9 @@ def calculate_An_Cu_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Cu_y: Cu required for gestation, mg/d
     """
-    if An_GestDay < 90: # Line 3053
-        An_Cu_y = 0
-    elif An_GestDay > 190:
-        An_Cu_y = 0.0023 * An_BW
-    else:
-        An_Cu_y = 0.0003 * An_BW
+    An_Cu_y = _where(An_GestDay < 90, # Line 3053
+                       0,
+                       _where(An_GestDay > 190, 0.0023 * An_BW, 0.0003 * An_BW))
     return An_Cu_y
 
 
@@ -597,10 +560,8 @@ def calculate_An_Cu_l(Trg_MilkProd: float) -> float:
     """
     An_Cu_l: Cu required for lactation, mg/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3054
-        An_Cu_l = 0
-    else:
-        An_Cu_l = 0.04 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_Cu_l = _where(np.isnan(Trg_MilkProd), 0, 0.04 * Trg_MilkProd)    # Line 3054
     return An_Cu_l
 
 
@@ -608,10 +569,9 @@ def calculate_An_Cu_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Cu_Clf: flo
     """
     An_Cu_req: Cu requirement, mg/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3055-3056
-        An_Cu_req = An_Cu_Clf
-    else:
-        An_Cu_req = An_Cu_m + An_Cu_g + An_Cu_y + An_Cu_l
+    An_Cu_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3055-3056
+                         An_Cu_Clf,
+                         An_Cu_m + An_Cu_g + An_Cu_y + An_Cu_l)
     return An_Cu_req
 
 
@@ -636,10 +596,9 @@ def calculate_An_I_req(An_StatePhys: str, An_DMIn: float, An_BW: float, Trg_Milk
     """
     An_I_req: I requirement, mg/d
     """
-    if An_StatePhys == 'Calf':  # Line 3060
-        An_I_req = 0.8 * An_DMIn
-    else:
-        An_I_req = 0.216 * An_BW**0.528 + 0.1 * Trg_MilkProd
+    An_I_req = _where(An_StatePhys == 'Calf',  # Line 3060
+                        0.8 * An_DMIn,
+                        0.216 * An_BW**0.528 + 0.1 * Trg_MilkProd)
     return An_I_req
 
 
@@ -672,10 +631,7 @@ def calculate_An_Fe_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Fe_y: Fe required for gestation, mg/d
     """
-    if An_GestDay > 190:    # Line 3066
-        An_Fe_y = 0.025 * An_BW
-    else:
-        An_Fe_y = 0
+    An_Fe_y = _where(An_GestDay > 190, 0.025 * An_BW, 0)    # Line 3066
     return An_Fe_y
 
 
@@ -683,10 +639,8 @@ def calculate_An_Fe_l(Trg_MilkProd: float) -> float:
     """
     An_Fe_l: Fe required for lactation, mg/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3067
-       An_Fe_l = 0
-    else:
-        An_Fe_l = 1.0 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_Fe_l = _where(np.isnan(Trg_MilkProd), 0, 1.0 * Trg_MilkProd)    # Line 3067
     return An_Fe_l
 
 
@@ -696,10 +650,9 @@ def calculate_An_Fe_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Fe_Clf: flo
     There's a comment in the R code saying: #add An_Fe_m when I move the eqn up here.
     Also includes Line 3290; An_Fe_m <- 0  #no Fe maintenance requirement
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3068-3069
-        An_Fe_req = An_Fe_Clf
-    else: 
-        An_Fe_req = An_Fe_g + An_Fe_y + An_Fe_l
+    An_Fe_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3068-3069
+                         An_Fe_Clf,
+                         An_Fe_g + An_Fe_y + An_Fe_l)
     return An_Fe_req
 
 
@@ -748,10 +701,7 @@ def calculate_An_Mn_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Mn_y: Mn required for gestation, mg/d
     """
-    if An_GestDay > 190:    # Line 3076
-        An_Mn_y = 0.00042 * An_BW
-    else:
-        An_Mn_y = 0
+    An_Mn_y = _where(An_GestDay > 190, 0.00042 * An_BW, 0)    # Line 3076
     return An_Mn_y
 
 
@@ -759,10 +709,8 @@ def calculate_An_Mn_l(Trg_MilkProd: float) -> float:
     """
     An_Mn_l: Mn required for lactation, mg/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3077
-       An_Mn_l = 0
-    else:
-        An_Mn_l = 0.03 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_Mn_l = _where(np.isnan(Trg_MilkProd), 0, 0.03 * Trg_MilkProd)    # Line 3077
     return An_Mn_l
 
 
@@ -770,10 +718,9 @@ def calculate_An_Mn_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Mn_Clf: flo
     """
     An_Mn_req: Mn requirement, mg/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3078 
-        An_Mn_req = An_Mn_Clf
-    else: 
-        An_Mn_req = An_Mn_m + An_Mn_g + An_Mn_y + An_Mn_l
+    An_Mn_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3078 
+                         An_Mn_Clf,
+                         An_Mn_m + An_Mn_g + An_Mn_y + An_Mn_l)
     return An_Mn_req
 
 
@@ -839,10 +786,7 @@ def calculate_An_Zn_y(An_GestDay: int, An_BW: float) -> float:
     """
     An_Zn_y: Zn required for gestation, mg/d
     """
-    if An_GestDay > 190:    # Line 3090
-        An_Zn_y = 0.017 * An_BW
-    else:
-        An_Zn_y = 0
+    An_Zn_y = _where(An_GestDay > 190, 0.017 * An_BW, 0)    # Line 3090
     return An_Zn_y
 
 
@@ -850,10 +794,8 @@ def calculate_An_Zn_l(Trg_MilkProd: float) -> float:
     """
     An_Zn_l: Zn requirement for lactation, mg/d
     """
-    if Trg_MilkProd is None or math.isnan(Trg_MilkProd):    # Line 3091
-       An_Zn_l = 0
-    else:
-        An_Zn_l = 4.0 * Trg_MilkProd
+    Trg_MilkProd = np.asarray(Trg_MilkProd, dtype=float)
+    An_Zn_l = _where(np.isnan(Trg_MilkProd), 0, 4.0 * Trg_MilkProd)    # Line 3091
     return An_Zn_l
 
 
@@ -861,10 +803,9 @@ def calculate_An_Zn_req(An_StatePhys: str, Dt_DMIn_ClfLiq: float, An_Zn_Clf: flo
     """
     An_Zn_req: Zn requirement, mg/d
     """
-    if An_StatePhys == 'Calf' and Dt_DMIn_ClfLiq > 0:   # Line 3092-3093
-        An_Zn_req = An_Zn_Clf
-    else: 
-        An_Zn_req = An_Zn_m + An_Zn_g + An_Zn_y + An_Zn_l
+    An_Zn_req = _where((An_StatePhys == 'Calf') & (Dt_DMIn_ClfLiq > 0),   # Line 3092-3093
+                         An_Zn_Clf,
+                         An_Zn_m + An_Zn_g + An_Zn_y + An_Zn_l)
     return An_Zn_req
 
 
@@ -1,6 +1,7 @@
 # dev_milk_equations
 # All calculations related to milk production, milk components, and milk energy
-from nasem_dairy.ration_balancer.ration_balancer_functions import check_coeffs_in_coeff_dict
+import numpy as np
+from nasem_dairy.ration_balancer.ration_balancer_functions import _where, check_coeffs_in_coeff_dict
 
 
 def calculate_Trg_NEmilk_Milk(
@@ -65,10 +66,7 @@ def calculate_Mlk_NP_g(An_StatePhys, An_BW, Abs_AA_g, mPrt_k_AA, Abs_neAA_g, Abs
     req_coeff = ['mPrt_Int', 'mPrt_k_NEAA', 'mPrt_k_OthAA', 'mPrt_k_DEInp',
                  'mPrt_k_DigNDF', 'mPrt_k_DEIn_StFA', 'mPrt_k_DEIn_NDF', 'mPrt_k_BW']
     check_coeffs_in_coeff_dict(coeff_dict, req_coeff)
-    if An_StatePhys != "Lactating Cow":                 # Line 2204
-        Mlk_NP_g = 0
-    else:
-        Mlk_NP_g = coeff_dict['mPrt_Int'] + Abs_AA_g['Arg'] * mPrt_k_AA['Arg'] + Abs_AA_g['His'] * mPrt_k_AA['His'] \
+    Mlk_NP_g = coeff_dict['mPrt_Int'] + Abs_AA_g['Arg'] * mPrt_k_AA['Arg'] + Abs_AA_g['His'] * mPrt_k_AA['His'] \
             + Abs_AA_g['Ile'] * mPrt_k_AA['Ile'] + Abs_AA_g['Leu'] * mPrt_k_AA['Leu'] \
             + Abs_AA_g['Lys'] * mPrt_k_AA['Lys'] + Abs_AA_g['Met'] * mPrt_k_AA['Met'] \
             + Abs_AA_g['Phe'] * mPrt_k_AA['Phe'] + Abs_AA_g['Thr'] * mPrt_k_AA['Thr'] \
@@ -76,6 +74,7 @@ def calculate_Mlk_NP_g(An_StatePhys, An_BW, Abs_AA_g, mPrt_k_AA, Abs_neAA_g, Abs
             + Abs_neAA_g * coeff_dict['mPrt_k_NEAA'] + Abs_OthAA_g * coeff_dict['mPrt_k_OthAA'] + Abs_EAA2b_g * mPrt_k_EAA2 \
             + An_DEInp * coeff_dict['mPrt_k_DEInp'] + (An_DigNDF - 17.06) * coeff_dict['mPrt_k_DigNDF'] + (An_DEStIn + An_DEFAIn + An_DErOMIn) \
             * coeff_dict['mPrt_k_DEIn_StFA'] + An_DENDFIn * coeff_dict['mPrt_k_DEIn_NDF'] + (An_BW - 612) * coeff_dict['mPrt_k_BW']
+    Mlk_NP_g = _where(An_StatePhys != "Lactating Cow", 0, Mlk_NP_g)  # Line 2204
     return Mlk_NP_g
 
 
@@ -89,10 +88,7 @@ def calculate_An_LactDay_MlkPred(An_LactDay: int) -> int:
     An_LactDay_MlkPred: An_LactDay but capped at day 375
     """
     # Cap DIM at 375 d to prevent the polynomial from getting out of range, Line 2259
-    if An_LactDay <= 375:
-        An_LactDay_MlkPred = An_LactDay
-    elif An_LactDay > 375:
-        An_LactDay_MlkPred = 375
+    An_LactDay_MlkPred = _where(An_LactDay <= 375, An_LactDay, 375)
 
     return An_LactDay_MlkPred
 
@@ -128,16 +124,14 @@ def calculate_Mlk_Fatemp_g(An_StatePhys: str, An_LactDay_MlkPred: int, Dt_DMIn:
         Abs_Ile_g: Net absorbed hydrated Isoleucine (g/d) from diet, microbes and infusions 
         Abs_Met_g: Net absorbed hydrated Methionine (g/d) from diet, microbes and infusions
     """
-    if An_StatePhys == "Lactating Cow":
-        # Line 2259, (Equation 20-215, p. 440)
-        Mlk_Fatemp_g = 453 - 1.42 * An_LactDay_MlkPred \
+    # Line 2259, (Equation 20-215, p. 440)
+    Mlk_Fatemp_g = 453 - 1.42 * An_LactDay_MlkPred \
             + 24.52 * (Dt_DMIn - Dt_FAIn) \
             + 0.41 * Dt_DigC160In * 1000 \
             + 1.80 * Dt_DigC183In * 1000 \
             + 1.45 * Abs_Ile_g \
             + 1.34 * Abs_Met_g
-    else:
-        Mlk_Fatemp_g = 0    # Line 2261
+    Mlk_Fatemp_g = _where(An_StatePhys == "Lactating Cow", Mlk_Fatemp_g, 0)    # Line 2261
     return Mlk_Fatemp_g
 
 
@@ -187,10 +181,9 @@ def calculate_Mlk_Prod_comp(An_Breed: str, Mlk_NP: float, Mlk_Fat: float, An_DEI
         - 7.397e-9 * (An_LactDay_MlkPred - 137.1)**4 \
         + 1.567 * (An_Parity_rl - 1)
 
-    if An_Breed == "Jersey":
-        Mlk_Prod_comp = Mlk_Prod_comp - 3.400   # Line 2278
-    elif (An_Breed != "Jersey") & (An_Breed != "Holstein"):
-        Mlk_Prod_comp = Mlk_Prod_comp - 1.526
+    Mlk_Prod_comp = _where(An_Breed == "Jersey",
+                             Mlk_Prod_comp - 3.400,   # Line 2278
+                             _where(An_Breed != "Holstein", Mlk_Prod_comp - 1.526, Mlk_Prod_comp))
     return Mlk_Prod_comp
 
 
@@ -250,10 +243,11 @@ def calculate_MlkNP_Milk(An_StatePhys: str, Mlk_NP_g: float, Mlk_Prod: float):
     """
     MlkNP_Milk: Net protein content of milk, g/g
     """
-    if An_StatePhys == "Lactating Cow": 
-        MlkNP_Milk = Mlk_NP_g / 1000 / Mlk_Prod # Milk true protein, g/g, Line 2907-2908
-    else:
-        MlkNP_Milk = 0
+    # Mlk_Prod can be 0 when not a lactating cow
+    with np.errstate(divide='ignore', invalid='ignore'):
+        MlkNP_Milk = _where(An_StatePhys == "Lactating Cow",
+                              np.divide(Mlk_NP_g, 1000) / Mlk_Prod,   # Milk true protein, g/g, Line 2907-2908
+                              0)
     return MlkNP_Milk
 
 
@@ -261,16 +255,17 @@ def calculate_Mlk_Prod(An_StatePhys: str, mProd_eqn: int, Mlk_Prod_comp: float,
     """
     Mlk_Prod: Milk production, kg/d, can be user entered target or a prediction 
     """
-    if An_StatePhys == "Lactating Cow" and mProd_eqn==1:    # Milk production from component predictions, Line 2282
+    if mProd_eqn==1:    # Milk production from component predictions, Line 2282
         Mlk_Prod = Mlk_Prod_comp
-    elif An_StatePhys == "Lactating Cow" and mProd_eqn==2:  # use NE Allowable Milk prediction, Line 2899
+    elif mProd_eqn==2:  # use NE Allowable Milk prediction, Line 2899
         Mlk_Prod = Mlk_Prod_NEalow
-    elif An_StatePhys == "Lactating Cow" and mProd_eqn==3:  # Use MP Allowable based predictions, Line 2709
+    elif mProd_eqn==3:  # Use MP Allowable based predictions, Line 2709
         Mlk_Prod = Mlk_Prod_MPalow
-    elif An_StatePhys == "Lactating Cow" and mProd_eqn==4:  # Use min of NE and MP Allowable, Line 2900
-        Mlk_Prod = min(Mlk_Prod_NEalow, Mlk_Prod_MPalow)
+    elif mProd_eqn==4:  # Use min of NE and MP Allowable, Line 2900
+        Mlk_Prod = np.minimum(Mlk_Prod_NEalow, Mlk_Prod_MPalow)
     else:
         Mlk_Prod = Trg_MilkProd     # Use user entered production if no prediction selected or if not a lactating cow
+    Mlk_Prod = _where(An_StatePhys == "Lactating Cow", Mlk_Prod, Trg_MilkProd)
     return Mlk_Prod
 
 
@@ -278,10 +273,11 @@ def calculate_MlkFat_Milk(An_StatePhys: str, Mlk_Fat: float, Mlk_Prod: float) ->
     """
     MlkFat_Milk: Milk fat g/g 
     """
-    if An_StatePhys == "Lactating Cow":
-        MlkFat_Milk = Mlk_Fat / Mlk_Prod  # Milk Fat, g/g, Line 2909
-    else:
-        MlkFat_Milk = 0
+    # Mlk_Prod can be 0 when not a lactating cow
+    with np.errstate(divide='ignore', invalid='ignore'):
+        MlkFat_Milk = _where(An_StatePhys == "Lactating Cow",
+                               np.divide(Mlk_Fat, Mlk_Prod),  # Milk Fat, g/g, Line 2909
+                               0)
     return MlkFat_Milk
 
 
@@ -953,59 +953,165 @@ def calculate_TT_dcSt(TT_dcSt_Base, An_DMIn_BW):
 ####################
 
 
-def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
+def calculate_feed_properties(An_StatePhys, Use_DNDF_IV, feed_data, coeff_dict):
+    """
+    Feed properties used by calculate_diet_info that do not depend on intake.
+
+    These only depend on the feed library values, An_StatePhys, Use_DNDF_IV and
+    coeff_dict, so they can be calculated once for a feed library and reused
+    for every diet (see `CompiledFeedLibrary`). Returns a DataFrame with the
+    same index as feed_data.
+    """
+    feed_properties = pd.DataFrame(index=feed_data.index)
+    feed_properties['Fd_GE'] = calculate_Fd_GE(An_StatePhys,
+                                               feed_data['Fd_Category'],
+                                               feed_data['Fd_CP'],
+                                               feed_data['Fd_FA'],
+                                               feed_data['Fd_Ash'],
+                                               feed_data['Fd_St'],
+                                               feed_data['Fd_NDF'],
+                                               coeff_dict)
+    feed_properties['Fd_For'] = calculate_Fd_For(feed_data['Fd_Conc'])
+    feed_properties['Fd_ForWet'] = calculate_Fd_ForWet(
+        feed_data['Fd_DM'], feed_properties['Fd_For'])
+    feed_properties['Fd_ForDry'] = calculate_Fd_ForDry(
+        feed_data['Fd_DM'], feed_properties['Fd_For'])
+    feed_properties['Fd_Past'] = calculate_Fd_Past(feed_data['Fd_Category'])
+    feed_properties['Fd_LiqClf'] = calculate_Fd_LiqClf(feed_data['Fd_Category'])
+    feed_properties['Fd_ForNDF'] = calculate_Fd_ForNDF(
+        feed_data['Fd_NDF'], feed_data['Fd_Conc'])
+    feed_properties['Fd_NDFnf'] = calculate_Fd_NDFnf(
+        feed_data['Fd_NDF'], feed_data['Fd_NDFIP'])
+    feed_properties['Fd_NPNCP'] = calculate_Fd_NPNCP(
+        feed_data['Fd_CP'], feed_data['Fd_NPN_CP'])
+    feed_properties['Fd_NPN'] = calculate_Fd_NPN(feed_properties['Fd_NPNCP'])
+    feed_properties['Fd_NPNDM'] = calculate_Fd_NPNDM(feed_properties['Fd_NPNCP'])
+    feed_properties['Fd_TP'] = calculate_Fd_TP(
+        feed_data['Fd_CP'], feed_properties['Fd_NPNCP'])
+    feed_properties['Fd_fHydr_FA'] = calculate_Fd_fHydr_FA(feed_data['Fd_Category'])
+    feed_properties['Fd_FAhydr'] = calculate_Fd_FAhydr(
+        feed_data['Fd_FA'], feed_properties['Fd_fHydr_FA'])
+    feed_properties['Fd_NFC'] = calculate_Fd_NFC(feed_data['Fd_NDF'],
+                                                 feed_properties['Fd_TP'],
+                                                 feed_data['Fd_Ash'],
+                                                 feed_properties['Fd_FAhydr'],
+                                                 feed_properties['Fd_NPNDM'])
+    feed_properties['Fd_rOM'] = calculate_Fd_rOM(feed_data['Fd_NDF'],
+                                                 feed_data['Fd_St'],
+                                                 feed_properties['Fd_TP'],
+                                                 feed_data['Fd_FA'],
+                                                 feed_properties['Fd_fHydr_FA'],
+                                                 feed_data['Fd_Ash'],
+                                                 feed_properties['Fd_NPNDM'])
+    feed_properties['TT_dcFdNDF_Lg'] = calculate_TT_dcFdNDF_Lg(feed_data['Fd_NDF'],
+                                                               feed_data['Fd_Lg'])
+    feed_properties['Fd_DNDF48'] = calculate_Fd_DNDF48(feed_data['Fd_Conc'],
+                                                       feed_data['Fd_DNDF48'])
+    feed_properties['TT_dcFdNDF_48h'] = calculate_TT_dcFdNDF_48h(
+        feed_properties['Fd_DNDF48'])
+    feed_properties['TT_dcFdNDF_Base'] = calculate_TT_dcFdNDF_Base(Use_DNDF_IV,
+                                                                   feed_data['Fd_Conc'],
+                                                                   feed_properties['TT_dcFdNDF_Lg'],
+                                                                   feed_properties['TT_dcFdNDF_48h'])
+    feed_properties['Fd_rdcRUPB'] = calculate_Fd_rdcRUPB(feed_properties['Fd_For'],
+                                                         feed_data['Fd_Conc'],
+                                                         feed_data['Fd_KdRUP'],
+                                                         coeff_dict)
+    # Fd_RUP and Fd_RDP are a proportion of DM, calculated from the intakes of 1 kg DM
+    Fd_CPIn = feed_data['Fd_CP'] / 100
+    Fd_NPNCPIn = calculate_Fd_NPNCPIn(Fd_CPIn, feed_data['Fd_NPN_CP'])
+    Fd_RUPIn = calculate_Fd_RUPIn(Fd_CPIn,
+                                  calculate_Fd_CPAIn(Fd_CPIn, feed_data['Fd_CPARU']),
+                                  calculate_Fd_CPCIn(Fd_CPIn, feed_data['Fd_CPCRU']),
+                                  Fd_NPNCPIn,
+                                  calculate_Fd_RUPBIn(feed_properties['Fd_For'],
+                                                      feed_data['Fd_Conc'],
+                                                      feed_data['Fd_KdRUP'],
+                                                      calculate_Fd_CPBIn(Fd_CPIn, feed_data['Fd_CPBRU']),
+                                                      coeff_dict),
+                                  coeff_dict)
+    Fd_RUP = calculate_Fd_RUP(Fd_CPIn, Fd_RUPIn, 1)
+    Fd_RDP = calculate_Fd_RDP(Fd_CPIn, feed_data['Fd_CP'], Fd_RUP)
+    feed_properties['Fd_DE_base_1'] = calculate_Fd_DE_base_1(feed_data['Fd_NDF'],
+                                                             feed_data['Fd_Lg'],
+                                                             feed_data['Fd_St'],
+                                                             feed_data['Fd_dcSt'],
+                                                             feed_data['Fd_FA'],
+                                                             feed_data['Fd_dcFA'],
+                                                             feed_data['Fd_Ash'],
+                                                             feed_data['Fd_CP'],
+                                                             feed_properties['Fd_NPNCP'],
+                                                             Fd_RUP,
+                                                             feed_data['Fd_dcRUP'])
+    feed_properties['Fd_DE_base_2'] = calculate_Fd_DE_base_2(feed_data['Fd_NDF'],
+                                                             feed_data['Fd_St'],
+                                                             feed_data['Fd_dcSt'],
+                                                             feed_data['Fd_FA'],
+                                                             feed_data['Fd_dcFA'],
+                                                             feed_data['Fd_Ash'],
+                                                             feed_data['Fd_CP'],
+                                                             feed_properties['Fd_NPNCP'],
+                                                             Fd_RUP,
+                                                             feed_data['Fd_dcRUP'],
+                                                             feed_data['Fd_DNDF48_NDF'])
+    feed_properties['Fd_DE_base'] = calculate_Fd_DE_base(Use_DNDF_IV,
+                                                         feed_properties['Fd_DE_base_1'],
+                                                         feed_properties['Fd_DE_base_2'],
+                                                         feed_properties['Fd_For'],
+                                                         feed_data['Fd_FA'],
+                                                         Fd_RDP,
+                                                         Fd_RUP,
+                                                         feed_data['Fd_dcRUP'],
+                                                         feed_data['Fd_CP'],
+                                                         feed_data['Fd_Ash'],
+                                                         feed_data['Fd_dcFA'],
+                                                         feed_properties['Fd_NPN'],
+                                                         feed_data['Fd_Category'])
+    feed_properties['Fd_DE_ClfLiq'] = calculate_Fd_DE_ClfLiq(An_StatePhys,
+                                                             feed_data['Fd_Category'],
+                                                             feed_properties['Fd_GE'])
+    feed_properties['Fd_ME_ClfLiq'] = calculate_Fd_ME_ClfLiq(An_StatePhys,
+                                                             feed_data['Fd_Category'],
+                                                             feed_properties['Fd_DE_ClfLiq'])
+    feed_properties['Fd_MgIn_min'] = calculate_Fd_MgIn_min(feed_data['Fd_Category'],
+                                                           feed_data['Fd_Mg'])
+    feed_properties['Fd_DigSt'] = calculate_Fd_DigSt(feed_data['Fd_St'],
+                                                     feed_data['Fd_dcSt'])
+    feed_properties['Fd_DigrOMt'] = calculate_Fd_DigrOMt(feed_properties['Fd_rOM'],
+                                                         coeff_dict)
+    return feed_properties
+
+
+def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict, feed_properties=None):
+    # feed_properties can be given when they have already been calculated for
+    # the rows of diet_info, e.g. by CompiledFeedLibrary
+    if feed_properties is None:
+        feed_properties = calculate_feed_properties(An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict)
+
     # Start with copy of diet_info
     complete_diet_info = diet_info.copy()
 
     # Calculate all aditional feed data columns
     complete_diet_info['Fd_DMIn'] = calculate_Fd_DMIn(
         DMI, diet_info['Fd_DMInp'])
-    complete_diet_info['Fd_GE'] = calculate_Fd_GE(An_StatePhys,
-                                                  diet_info['Fd_Category'],
-                                                  diet_info['Fd_CP'],
-                                                  diet_info['Fd_FA'],
-                                                  diet_info['Fd_Ash'],
-                                                  diet_info['Fd_St'],
-                                                  diet_info['Fd_NDF'],
-                                                  coeff_dict)
+    complete_diet_info['Fd_GE'] = feed_properties['Fd_GE']
     complete_diet_info['Fd_AFIn'] = calculate_Fd_AFIn(
         diet_info['Fd_DM'], diet_info['Fd_DMIn'])
-    complete_diet_info['Fd_For'] = calculate_Fd_For(diet_info['Fd_Conc'])
-    complete_diet_info['Fd_ForWet'] = calculate_Fd_ForWet(
-        diet_info['Fd_DM'], complete_diet_info['Fd_For'])
-    complete_diet_info['Fd_ForDry'] = calculate_Fd_ForDry(
-        diet_info['Fd_DM'], complete_diet_info['Fd_For'])
-    complete_diet_info['Fd_Past'] = calculate_Fd_Past(diet_info['Fd_Category'])
-    complete_diet_info['Fd_LiqClf'] = calculate_Fd_LiqClf(
-        diet_info['Fd_Category'])
-    complete_diet_info['Fd_ForNDF'] = calculate_Fd_ForNDF(
-        diet_info['Fd_NDF'], diet_info['Fd_Conc'])
-    complete_diet_info['Fd_NDFnf'] = calculate_Fd_NDFnf(
-        diet_info['Fd_NDF'], diet_info['Fd_NDFIP'])
-    complete_diet_info['Fd_NPNCP'] = calculate_Fd_NPNCP(
-        diet_info['Fd_CP'], diet_info['Fd_NPN_CP'])
-    complete_diet_info['Fd_NPN'] = calculate_Fd_NPN(
-        complete_diet_info['Fd_NPNCP'])
-    complete_diet_info['Fd_NPNDM'] = calculate_Fd_NPNDM(
-        complete_diet_info['Fd_NPNCP'])
-    complete_diet_info['Fd_TP'] = calculate_Fd_TP(
-        diet_info['Fd_CP'], complete_diet_info['Fd_NPNCP'])
-    complete_diet_info['Fd_fHydr_FA'] = calculate_Fd_fHydr_FA(
-        diet_info['Fd_Category'])
-    complete_diet_info['Fd_FAhydr'] = calculate_Fd_FAhydr(
-        diet_info['Fd_FA'], complete_diet_info['Fd_fHydr_FA'])
-    complete_diet_info['Fd_NFC'] = calculate_Fd_NFC(diet_info['Fd_NDF'],
-                                                    complete_diet_info['Fd_TP'],
-                                                    diet_info['Fd_Ash'],
-                                                    complete_diet_info['Fd_FAhydr'],
-                                                    complete_diet_info['Fd_NPNDM'])
-    complete_diet_info['Fd_rOM'] = calculate_Fd_rOM(diet_info['Fd_NDF'],
-                                                    diet_info['Fd_St'],
-                                                    complete_diet_info['Fd_TP'],
-                                                    diet_info['Fd_FA'],
-                                                    complete_diet_info['Fd_fHydr_FA'],
-                                                    diet_info['Fd_Ash'],
-                                                    complete_diet_info['Fd_NPNDM'])
+    complete_diet_info['Fd_For'] = feed_properties['Fd_For']
+    complete_diet_info['Fd_ForWet'] = feed_properties['Fd_ForWet']
+    complete_diet_info['Fd_ForDry'] = feed_properties['Fd_ForDry']
+    complete_diet_info['Fd_Past'] = feed_properties['Fd_Past']
+    complete_diet_info['Fd_LiqClf'] = feed_properties['Fd_LiqClf']
+    complete_diet_info['Fd_ForNDF'] = feed_properties['Fd_ForNDF']
+    complete_diet_info['Fd_NDFnf'] = feed_properties['Fd_NDFnf']
+    complete_diet_info['Fd_NPNCP'] = feed_properties['Fd_NPNCP']
+    complete_diet_info['Fd_NPN'] = feed_properties['Fd_NPN']
+    complete_diet_info['Fd_NPNDM'] = feed_properties['Fd_NPNDM']
+    complete_diet_info['Fd_TP'] = feed_properties['Fd_TP']
+    complete_diet_info['Fd_fHydr_FA'] = feed_properties['Fd_fHydr_FA']
+    complete_diet_info['Fd_FAhydr'] = feed_properties['Fd_FAhydr']
+    complete_diet_info['Fd_NFC'] = feed_properties['Fd_NFC']
+    complete_diet_info['Fd_rOM'] = feed_properties['Fd_rOM']
     complete_diet_info['Fd_GEIn'] = calculate_Fd_GEIn(complete_diet_info['Fd_GE'], 
                                                       complete_diet_info['Fd_DMIn'])
     # Loop through identical calculations
@@ -1034,16 +1140,10 @@ def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
     )
 
     # Calculate nutrient intakes for each feed
-    complete_diet_info['TT_dcFdNDF_Lg'] = calculate_TT_dcFdNDF_Lg(diet_info['Fd_NDF'],
-                                                                  diet_info['Fd_Lg'])
-    complete_diet_info['Fd_DNDF48'] = calculate_Fd_DNDF48(diet_info['Fd_Conc'],
-                                                          diet_info['Fd_DNDF48'])
-    complete_diet_info['TT_dcFdNDF_48h'] = calculate_TT_dcFdNDF_48h(
-        complete_diet_info['Fd_DNDF48'])
-    complete_diet_info['TT_dcFdNDF_Base'] = calculate_TT_dcFdNDF_Base(Use_DNDF_IV,
-                                                                      diet_info['Fd_Conc'],
-                                                                      complete_diet_info['TT_dcFdNDF_Lg'],
-                                                                      complete_diet_info['TT_dcFdNDF_48h'])
+    complete_diet_info['TT_dcFdNDF_Lg'] = feed_properties['TT_dcFdNDF_Lg']
+    complete_diet_info['Fd_DNDF48'] = feed_properties['Fd_DNDF48']
+    complete_diet_info['TT_dcFdNDF_48h'] = feed_properties['TT_dcFdNDF_48h']
+    complete_diet_info['TT_dcFdNDF_Base'] = feed_properties['TT_dcFdNDF_Base']
     complete_diet_info['Fd_DigNDFIn_Base'] = calculate_Fd_DigNDFIn_Base(complete_diet_info['Fd_NDFIn'],
                                                                         complete_diet_info['TT_dcFdNDF_Base'])
     complete_diet_info['Fd_NPNCPIn'] = calculate_Fd_NPNCPIn(
@@ -1074,10 +1174,7 @@ def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
         complete_diet_info['Fd_DMIn'], complete_diet_info['Fd_AshIn'])
 
     # Rumen Degraded and Undegraded Protein
-    complete_diet_info['Fd_rdcRUPB'] = calculate_Fd_rdcRUPB(complete_diet_info['Fd_For'],
-                                                            complete_diet_info['Fd_Conc'],
-                                                            complete_diet_info['Fd_KdRUP'],
-                                                            coeff_dict)
+    complete_diet_info['Fd_rdcRUPB'] = feed_properties['Fd_rdcRUPB']
     complete_diet_info['Fd_RUPBIn'] = calculate_Fd_RUPBIn(complete_diet_info['Fd_For'],
                                                           complete_diet_info['Fd_Conc'],
                                                           complete_diet_info['Fd_KdRUP'],
@@ -1115,41 +1212,9 @@ def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
         **{f"{col}In": lambda df, col=col: df[f"{col}_FA"] / 100 * df['Fd_FA'] / 100 * df['Fd_DMIn'] for col in column_names_FAIn}
     )
 
-    complete_diet_info['Fd_DE_base_1'] = calculate_Fd_DE_base_1(diet_info['Fd_NDF'],
-                                                                diet_info['Fd_Lg'],
-                                                                diet_info['Fd_St'],
-                                                                diet_info['Fd_dcSt'],
-                                                                diet_info['Fd_FA'],
-                                                                diet_info['Fd_dcFA'],
-                                                                diet_info['Fd_Ash'],
-                                                                diet_info['Fd_CP'],
-                                                                complete_diet_info['Fd_NPNCP'],
-                                                                complete_diet_info['Fd_RUP'],
-                                                                diet_info['Fd_dcRUP'])
-    complete_diet_info['Fd_DE_base_2'] = calculate_Fd_DE_base_2(diet_info['Fd_NDF'],
-                                                                diet_info['Fd_St'],
-                                                                diet_info['Fd_dcSt'],
-                                                                diet_info['Fd_FA'],
-                                                                diet_info['Fd_dcFA'],
-                                                                diet_info['Fd_Ash'],
-                                                                diet_info['Fd_CP'],
-                                                                complete_diet_info['Fd_NPNCP'],
-                                                                complete_diet_info['Fd_RUP'],
-                                                                diet_info['Fd_dcRUP'],
-                                                                diet_info['Fd_DNDF48_NDF'])
-    complete_diet_info['Fd_DE_base'] = calculate_Fd_DE_base(Use_DNDF_IV,
-                                                            complete_diet_info['Fd_DE_base_1'],
-                                                            complete_diet_info['Fd_DE_base_2'],
-                                                            complete_diet_info['Fd_For'],
-                                                            diet_info['Fd_FA'],
-                                                            complete_diet_info['Fd_RDP'],
-                                                            complete_diet_info['Fd_RUP'],
-                                                            diet_info['Fd_dcRUP'],
-                                                            diet_info['Fd_CP'],
-                                                            diet_info['Fd_Ash'],
-                                                            diet_info['Fd_dcFA'],
-                                                            complete_diet_info['Fd_NPN'],
-                                                            diet_info['Fd_Category'])
+    complete_diet_info['Fd_DE_base_1'] = feed_properties['Fd_DE_base_1']
+    complete_diet_info['Fd_DE_base_2'] = feed_properties['Fd_DE_base_2']
+    complete_diet_info['Fd_DE_base'] = feed_properties['Fd_DE_base']
     complete_diet_info['Fd_DEIn_base'] = calculate_Fd_DEIn_base(complete_diet_info['Fd_DE_base'],
                                                                 complete_diet_info['Fd_DMIn'])
     complete_diet_info['Fd_DEIn_base_ClfLiq'] = calculate_Fd_DEIn_base_ClfLiq(diet_info['Fd_Category'],
@@ -1159,12 +1224,8 @@ def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
     complete_diet_info['Fd_DMIn_ClfLiq'] = calculate_Fd_DMIn_ClfLiq(An_StatePhys,
                                                                     diet_info['Fd_DMIn'],
                                                                     diet_info['Fd_Category'])
-    complete_diet_info['Fd_DE_ClfLiq'] = calculate_Fd_DE_ClfLiq(An_StatePhys,
-                                                                diet_info['Fd_Category'],
-                                                                complete_diet_info['Fd_GE'])
-    complete_diet_info['Fd_ME_ClfLiq'] = calculate_Fd_ME_ClfLiq(An_StatePhys,
-                                                                diet_info['Fd_Category'],
-                                                                complete_diet_info['Fd_DE_ClfLiq'])
+    complete_diet_info['Fd_DE_ClfLiq'] = feed_properties['Fd_DE_ClfLiq']
+    complete_diet_info['Fd_ME_ClfLiq'] = feed_properties['Fd_ME_ClfLiq']
     complete_diet_info['Fd_DMIn_ClfFor'] = calculate_Fd_DMIn_ClfFor(DMI,
                                                                     diet_info['Fd_Conc'],
                                                                     complete_diet_info['Fd_DMInp'])
@@ -1185,8 +1246,7 @@ def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
                                                               complete_diet_info['Fd_Pinorg_P'])
     complete_diet_info['Fd_PorgIn'] = calculate_Fd_PorgIn(complete_diet_info['Fd_PIn'],
                                                           complete_diet_info['Fd_Porg_P'])
-    complete_diet_info['Fd_MgIn_min'] = calculate_Fd_MgIn_min(diet_info['Fd_Category'],
-                                                              diet_info['Fd_Mg'])
+    complete_diet_info['Fd_MgIn_min'] = feed_properties['Fd_MgIn_min']
 
     micro_mineral_intakes = ['Fd_Co',
                              'Fd_Cr',
@@ -1321,12 +1381,10 @@ def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
         **{f"Fd_Id{AA}RUPIn": lambda df, AA=AA: df['Fd_dcRUP'] / 100 * df[f"Fd_{AA}RUPIn"] * SIDig_values[AA] for AA in AA_list}
     )
 
-    complete_diet_info['Fd_DigSt'] = calculate_Fd_DigSt(diet_info['Fd_St'],
-                                                        diet_info['Fd_dcSt'])
+    complete_diet_info['Fd_DigSt'] = feed_properties['Fd_DigSt']
     complete_diet_info['Fd_DigStIn_Base'] = calculate_Fd_DigStIn_Base(complete_diet_info['Fd_DigSt'],
                                                                       diet_info['Fd_DMIn'])
-    complete_diet_info['Fd_DigrOMt'] = calculate_Fd_DigrOMt(complete_diet_info['Fd_rOM'],
-                                                            coeff_dict)
+    complete_diet_info['Fd_DigrOMt'] = feed_properties['Fd_DigrOMt']
     complete_diet_info['Fd_DigrOMtIn'] = calculate_Fd_DigrOMtIn(complete_diet_info['Fd_DigrOMt'],
                                                                 diet_info['Fd_DMIn'])
     complete_diet_info['Fd_idRUPIn'] = calculate_Fd_idRUPIn(diet_info['Fd_dcRUP'],
@@ -1360,6 +1418,16 @@ def calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict):
 
 
 def calculate_diet_data_initial(df, DMI, An_BW, An_StatePhys, An_DMIn_BW, An_AgeDryFdStart, Env_TempCurr, DMIn_eqn, Fe_rOMend, coeff_dict):
+    diet_data = calculate_diet_data_sums(df, coeff_dict)
+    return calculate_diet_data_from_sums(diet_data, DMI, An_BW, An_StatePhys, An_DMIn_BW, An_AgeDryFdStart,
+                                         Env_TempCurr, DMIn_eqn, Fe_rOMend, coeff_dict)
+
+
+def calculate_diet_data_sums(df, coeff_dict):
+    """
+    Diet level sums of the feed level intakes in diet_info (df).
+    These are the only values of diet_data_initial that need diet_info, see calculate_diet_data_from_sums
+    """
     diet_data = {}
 
     # Diet Intakes
@@ -1437,25 +1505,102 @@ def calculate_diet_data_initial(df, DMI, An_BW, An_StatePhys, An_DMIn_BW, An_Age
                                                        df['Fd_Conc'],
                                                        df['Fd_NDF'],
                                                        df['Fd_DNDF48'])
-    diet_data['Dt_ForDNDF48_ForNDF'] = calculate_Dt_ForDNDF48_ForNDF(diet_data['Dt_ForDNDF48'],
-                                                                     diet_data['Dt_ForNDF'])
-    diet_data['Dt_ADF_NDF'] = calculate_Dt_ADF_NDF(diet_data['Dt_ADF'],
-                                                   diet_data['Dt_NDF'])
     diet_data['Dt_NDFnfIn'] = calculate_Dt_NDFnfIn(df['Fd_DMIn'],
                                                    df['Fd_NDFnf'])
-    diet_data['Dt_Lg_NDF'] = calculate_Dt_Lg_NDF(diet_data['Dt_LgIn'],
-                                                 diet_data['Dt_NDFIn'])
     diet_data['Dt_ForNDFIn'] = calculate_Dt_ForNDFIn(df['Fd_DMIn'],
                                                      df['Fd_ForNDF'])
-    diet_data['Dt_PastSupplIn'] = calculate_Dt_PastSupplIn(diet_data['Dt_DMInSum'],
-                                                           diet_data['Dt_PastIn'])
-    diet_data['Dt_NIn'] = calculate_Dt_NIn(diet_data['Dt_CPIn'])
     diet_data['Dt_RUPIn'] = calculate_Dt_RUPIn(diet_data['Dt_CPAIn'],
                                                diet_data['Dt_NPNIn'],
                                                diet_data['Dt_RUPBIn'],
                                                diet_data['Dt_CPCIn'],
                                                coeff_dict,
                                                Fd_RUPIn=df['Fd_RUPIn'])
+
+    column_names_micronutrients = ['CaIn',
+                                   'PIn',
+                                   'PinorgIn',
+                                   'PorgIn',
+                                   'NaIn',
+                                   'MgIn',
+                                   'MgIn_min',
+                                   'KIn',
+                                   'ClIn',
+                                   'SIn',
+                                   'CoIn',
+                                   'CrIn',
+                                   'CuIn',
+                                   'FeIn',
+                                   'IIn',
+                                   'MnIn',
+                                   'MoIn',
+                                   'SeIn',
+                                   'ZnIn',
+                                   'VitAIn',
+                                   'VitDIn',
+                                   'VitEIn',
+                                   'CholineIn',
+                                   'BiotinIn',
+                                   'NiacinIn',
+                                   'B_CaroteneIn'
+                                   ]
+    for column_name in column_names_micronutrients:
+        # Lines 762-791
+        diet_data[f'Dt_{column_name}'] = df[f'Fd_{column_name}'].sum()
+
+    AA_list = ['Arg', 'His', 'Ile', 'Leu',
+               'Lys', 'Met', 'Phe', 'Thr', 'Trp', 'Val']
+    for AA in AA_list:
+        # Dt_IdAARUPIn
+        diet_data[f'Dt_Id{AA}RUPIn'] = df[f'Fd_Id{AA}RUPIn'].sum()
+
+    Dig_FA_list = [
+        'C120',
+        'C140',
+        'C160',
+        'C161',
+        'C180',
+        'C181t',
+        'C181c',
+        'C182',
+        'C183',
+        'OtherFA'
+    ]
+    for FA in Dig_FA_list:
+        # Dt_DigFAIn
+        diet_data[f'Dt_Dig{FA}In'] = df[f'Fd_Dig{FA}In'].sum()
+
+    Abs_micro_list = [
+        'CaIn',
+        'PIn',
+        'NaIn',
+        'KIn',
+        'ClIn',
+        'CoIn',
+        'CuIn',
+        'FeIn',
+        'MnIn',
+        'ZnIn'
+    ]
+    for micro in Abs_micro_list:
+        diet_data[f"Abs_{micro}"] = df[f"Fd_abs{micro}"].sum()
+    return diet_data
+
+
+def calculate_diet_data_from_sums(diet_sums, DMI, An_BW, An_StatePhys, An_DMIn_BW, An_AgeDryFdStart, Env_TempCurr, DMIn_eqn, Fe_rOMend, coeff_dict):
+    """
+    The rest of diet_data_initial, from the diet level sums returned by calculate_diet_data_sums
+    """
+    diet_data = diet_sums.copy()
+
+    diet_data['Dt_ForDNDF48_ForNDF'] = calculate_Dt_ForDNDF48_ForNDF(diet_data['Dt_ForDNDF48'],
+                                                                     diet_data['Dt_ForNDF'])
+    diet_data['Dt_ADF_NDF'] = calculate_Dt_ADF_NDF(diet_data['Dt_ADF'],
+                                                   diet_data['Dt_NDF'])
+    diet_data['Dt_Lg_NDF'] = calculate_Dt_Lg_NDF(diet_data['Dt_LgIn'],
+                                                 diet_data['Dt_NDFIn'])
+    diet_data['Dt_PastSupplIn'] = calculate_Dt_PastSupplIn(diet_data['Dt_DMInSum'],
+                                                           diet_data['Dt_PastIn'])
+    diet_data['Dt_NIn'] = calculate_Dt_NIn(diet_data['Dt_CPIn'])
     diet_data['Dt_RUP_CP'] = calculate_Dt_RUP_CP(diet_data['Dt_CPIn'],
                                                  diet_data['Dt_RUPIn'])
     diet_data['Dt_fCPBdu'] = calculate_Dt_fCPBdu(diet_data['Dt_RUPBIn'],
@@ -1567,37 +1712,6 @@ def calculate_diet_data_initial(df, DMI, An_BW, An_StatePhys, An_DMIn_BW, An_Age
     diet_data['Dt_CPC_CP'] = calculate_Dt_CPC_CP(diet_data['Dt_CPCIn'],
                                                  diet_data['Dt_CPIn'])
 
-    column_names_micronutrients = ['CaIn',
-                                   'PIn',
-                                   'PinorgIn',
-                                   'PorgIn',
-                                   'NaIn',
-                                   'MgIn',
-                                   'MgIn_min',
-                                   'KIn',
-                                   'ClIn',
-                                   'SIn',
-                                   'CoIn',
-                                   'CrIn',
-                                   'CuIn',
-                                   'FeIn',
-                                   'IIn',
-                                   'MnIn',
-                                   'MoIn',
-                                   'SeIn',
-                                   'ZnIn',
-                                   'VitAIn',
-                                   'VitDIn',
-                                   'VitEIn',
-                                   'CholineIn',
-                                   'BiotinIn',
-                                   'NiacinIn',
-                                   'B_CaroteneIn'
-                                   ]
-    for column_name in column_names_micronutrients:
-        # Lines 762-791
-        diet_data[f'Dt_{column_name}'] = df[f'Fd_{column_name}'].sum()
-
     column_names_macro = ['Dt_Ca',
                           'Dt_P',
                           'Dt_Pinorg',
@@ -1632,11 +1746,6 @@ def calculate_diet_data_initial(df, DMI, An_BW, An_StatePhys, An_DMIn_BW, An_Age
         # Line 807 - 825
         diet_data[f'{column_name}'] = diet_data[f'{column_name}In'] / DMI
 
-    AA_list = ['Arg', 'His', 'Ile', 'Leu',
-               'Lys', 'Met', 'Phe', 'Thr', 'Trp', 'Val']
-    for AA in AA_list:
-        # Dt_IdAARUPIn
-        diet_data[f'Dt_Id{AA}RUPIn'] = df[f'Fd_Id{AA}RUPIn'].sum()
     diet_data['Dt_RDPIn'] = calculate_Dt_RDPIn(diet_data['Dt_CPIn'],
                                                diet_data['Dt_RUPIn'])
 
@@ -1681,37 +1790,6 @@ def calculate_diet_data_initial(df, DMI, An_BW, An_StatePhys, An_DMIn_BW, An_Age
                                                              DMI,
                                                              coeff_dict)
     
-    Dig_FA_list = [
-        'C120',
-        'C140',
-        'C160',
-        'C161',
-        'C180',
-        'C181t',
-        'C181c',
-        'C182',
-        'C183',
-        'OtherFA'
-    ]
-    for FA in Dig_FA_list:
-        # Dt_DigFAIn
-        diet_data[f'Dt_Dig{FA}In'] = df[f'Fd_Dig{FA}In'].sum()
-
-    Abs_micro_list = [
-        'CaIn',
-        'PIn',
-        'NaIn',
-        'KIn',
-        'ClIn',
-        'CoIn',
-        'CuIn',
-        'FeIn',
-        'MnIn',
-        'ZnIn'
-    ]
-    for micro in Abs_micro_list:
-        diet_data[f"Abs_{micro}"] = df[f"Fd_abs{micro}"].sum()
-
     diet_data['Dt_acMg'] = calculate_Dt_acMg(An_StatePhys,
                                              diet_data['Dt_K'],
                                              diet_data['Dt_MgIn_min'],
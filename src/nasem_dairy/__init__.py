@@ -3,8 +3,27 @@ from importlib.metadata import version
 __version__ = version("nasem_dairy")
 
 from nasem_dairy.ration_balancer.ration_balancer_functions import get_feed_rows_feedlibrary, check_coeffs_in_coeff_dict, read_csv_input, read_infusion_input
-from nasem_dairy.ration_balancer.ModelOutput import ModelOutput
-from nasem_dairy.ration_balancer.execute_model import execute_model
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput, ModelSnapshot
+from nasem_dairy.ration_balancer.batch_model_output import BatchModelOutput, BatchTable
+from nasem_dairy.ration_balancer.compact_model_output import CompactModelOutput
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary
+from nasem_dairy.ration_balancer.diet_context import DietContext
+from nasem_dairy.ration_balancer.coeff_overlay import CoeffOverlay
+from nasem_dairy.ration_balancer.execute_model import execute_model, model_graph
+from nasem_dairy.ration_balancer.model_graph import ModelGraph, EvaluationPlan
+from nasem_dairy.ration_balancer.model_profiler import ModelProfiler
+from nasem_dairy.ration_balancer.model_session import ModelSession
+from nasem_dairy.ration_balancer.execute_model_batch import execute_model_batch
+from nasem_dairy.ration_balancer.diet_matrix import DietMatrix
+from nasem_dairy.ration_balancer.least_cost_ration import formulate_least_cost_ration, ration_constraints
+from nasem_dairy.ration_balancer.sensitivity import jacobian
+from nasem_dairy.ration_balancer.monte_carlo import run_monte_carlo
+from nasem_dairy.ration_balancer.scenario_runner import run_scenarios, ScenarioResults
+from nasem_dairy.ration_balancer.result_sink import ResultSink, read_results
+from nasem_dairy.ration_balancer.result_cache import ResultCache
+from nasem_dairy.ration_balancer.memory_cache import MemoryCache
+from nasem_dairy.ration_balancer.output_schema import get_output_schema
+from nasem_dairy.ration_balancer.compare_outputs import compare_outputs, ComparisonReport
 from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
 from nasem_dairy.NASEM_equations.DMI_equations import (
     calculate_Kb_LateGest_DMIn,
@@ -179,8 +198,11 @@ from nasem_dairy.NASEM_equations.nutrient_intakes import (
     calculate_TT_dcSt,
     calculate_Dt_acMg,
     calculate_Abs_MgIn,
+    calculate_feed_properties,
     calculate_diet_info,
     calculate_diet_data_initial,
+    calculate_diet_data_sums,
+    calculate_diet_data_from_sums,
     calculate_diet_data_complete
 )
 
@@ -1,27 +1,199 @@
+from typing import NamedTuple
+
 import pandas as pd
-import re
 import numpy as np
 
+from nasem_dairy.ration_balancer.coeff_overlay import CoeffOverlay
+from nasem_dairy.ration_balancer.output_file import read_output_file, write_output_file
+from nasem_dairy.ration_balancer.search_index import SearchIndex
+
+def compact_value(value):
+    """
+    Python number for a NumPy scalar or 0-dimensional array (e.g. from np.where()), other values are returned as is.
+    """
+    if isinstance(value, np.generic) or (isinstance(value, np.ndarray) and value.ndim == 0):
+        return value.item()
+    return value
+
+
+# Variables shown in the ModelOutput snapshot, with their descriptions
+snapshot_variables = {
+    'Milk production kg (Mlk_Prod_comp)': 'Mlk_Prod_comp',
+    'Milk fat g/g (MlkFat_Milk)': 'MlkFat_Milk',
+    'Milk protein g/g (MlkNP_Milk)': 'MlkNP_Milk',
+    'Milk Production - MP allowable kg (Mlk_Prod_MPalow)': 'Mlk_Prod_MPalow',
+    'Milk Production - NE allowable kg (Mlk_Prod_NEalow)': 'Mlk_Prod_NEalow', 
+    'Animal ME intake Mcal/d (An_MEIn)': 'An_MEIn',
+    'Target ME use Mcal/d (Trg_MEuse)': 'Trg_MEuse',
+    'Animal MP intake g/d (An_MPIn_g)': 'An_MPIn_g',
+    'Animal MP use g/d (An_MPuse_g_Trg)': 'An_MPuse_g_Trg',
+    'Animal RDP intake g/d (An_RDPIn_g)': 'An_RDPIn_g',
+    'Diet DCAD meq (An_DCADmeq)': 'An_DCADmeq'
+}
+
+# Variables stored in the Inputs category of ModelOutput
+input_variables = ['user_diet', 'animal_input', 'equation_selection', 'coeff_dict', 'infusion_input',
+                   'MP_NP_efficiency_input']
+
+# Dictionaries and dataframes stored directly in the Intakes category
+intake_tables = ['diet_info', 'infusion_data', 'diet_data', 'An_data']
+
+# Variables stored in each group of the other categories
+output_groups = {
+    'Intakes': {
+        'energy': ['An_MEIn', 'An_NEIn', 'An_NE', 'An_MEIn_approx'],
+        'protein': ['An_MPIn', 'An_MPIn_g'],
+        'AA': ['AA_values', 'Abs_EAA_g', 'Abs_neAA_g', 'Abs_OthAA_g', 'Abs_EAA2b_g'],
+        'FA': [],
+        'rumen_digestable': ['Rum_DigNDFIn', 'Rum_DigStIn']
+    },
+    'Requirements': {
+        'energy': ['An_NEmUse_NS', 'An_NEm_Act_Graze', 'An_NEm_Act_Parlor', 'An_NEm_Act_Topo',
+                   'An_NEmUse_Act', 'An_NEmUse', 'An_MEmUse', 'Gest_MEuse', 'Trg_Mlk_NEout', 'Trg_Mlk_MEout',
+                   'Trg_MEuse'],
+        'protein': ['Gest_NCPgain_g', 'Gest_NPgain_g', 'Gest_NPuse_g', 'Gest_CPuse_g', 'An_MPm_g_Trg',
+                    'Body_NPgain_g', 'Body_MPUse_g_Trg', 'Gest_MPUse_g_Trg', 'Trg_Mlk_NP_g',
+                    'Mlk_MPUse_g_Trg', 'An_MPuse_g_Trg', 'Min_MPuse_g', 'Diff_MPuse_g', 'Frm_NPgain_g',
+                    'Frm_MPUse_g_Trg', 'Rsrv_NPgain_g', 'Rsrv_MPUse_g_Trg']
+    },
+    'Production': {
+        'milk': ['Trg_NEmilk_Milk', 'Mlk_NP_g', 'Mlk_CP_g', 'Trg_Mlk_Fat', 'Trg_Mlk_Fat_g', 'Mlk_Fatemp_g',
+                 'Mlk_Fat_g', 'Mlk_Fat', 'Mlk_NP', 'Mlk_Prod_comp', 'An_MPavail_Milk_Trg',
+                 'Mlk_NP_MPalow_Trg_g', 'Mlk_Prod_MPalow', 'An_MEavail_Milk', 'Mlk_Prod_NEalow', 'Mlk_Prod',
+                 'MlkNP_Milk', 'MlkFat_Milk', 'MlkNE_Milk', 'Mlk_NEout', 'Mlk_MEout'],
+        'body_composition': ['CPGain_FrmGain', 'NPGain_FrmGain', 'Frm_Gain', 'Rsrv_Gain', 'Rsrv_Gain_empty',
+                             'NPGain_RsrvGain', 'Rsrv_NPgain', 'Frm_Gain_empty', 'Body_Gain_empty',
+                             'Frm_NPgain', 'Body_NPgain', 'Body_CPgain', 'Body_CPgain_g', 'Rsrv_Fatgain',
+                             'Rsrv_CPgain', 'Rsrv_NEgain', 'An_BWmature_empty', 'Body_Gain'],
+        'gestation': ['Uter_Wtpart', 'Uter_Wt', 'GrUter_Wtpart', 'GrUter_Wt', 'Uter_BWgain', 'GrUter_BWgain',
+                      'Rsrv_MEgain', 'FatGain_FrmGain', 'Frm_Fatgain', 'Frm_CPgain', 'Frm_NEgain',
+                      'Frm_MEgain', 'An_MEgain', 'Gest_REgain'],
+        'MiCP': ['RDPIn_MiNmax', 'MiN_Vm', 'Du_MiN_g', 'Du_MiCP_g', 'Du_MiTP_g', 'Du_MiCP', 'Du_idMiCP_g',
+                 'Du_idMiCP', 'Du_idMiTP_g', 'Du_idMiTP']
+    },
+    'Excretion': {
+        'fecal': ['Fe_rOMend', 'Fe_RUP', 'Fe_RumMiCP', 'Fe_CPend_g', 'Fe_CPend', 'Fe_CP', 'Fe_NPend',
+                  'Fe_NPend_g', 'Fe_MPendUse_g_Trg'],
+        'urinary': ['Ur_Nout_g', 'Ur_DEout', 'Ur_Nend_g', 'Ur_NPend_g', 'Ur_MPendUse_g'],
+        'gaseous': [],
+        'scurf': ['Scrf_CP_g', 'Scrf_NP_g', 'Scrf_MPUse_g_Trg']
+    },
+    'Digestibility': {
+        'rumen': ['Rum_dcNDF', 'Rum_dcSt'],
+        'TT': []
+    },
+    'Efficiencies': {
+        'energy': ['Kr_ME_RE'],
+        'protein': ['Kg_MP_NP_Trg']
+    },
+    'Miscellaneous': {
+        'misc': ['Kb_LateGest_DMIn', 'An_PrePartWklim', 'An_PrePartWkDurat', 'An_DMIn_BW', 'f_mPrt_max',
+                 'mPrt_k_EAA2', 'An_REgain_Calf', 'An_LactDay_MlkPred', 'An_DCADmeq', 'Dt_DMIn_BW',
+                 'Dt_DMIn_MBW']
+    }
+}
+
+# Variables stored in Requirements['mineral_requirements'], one group per mineral
+mineral_requirement_groups = {
+    'Ca': ['Ca_Mlk', 'Fe_Ca_m', 'An_Ca_g', 'An_Ca_y', 'An_Ca_l', 'An_Ca_Clf', 'An_Ca_req', 'An_Ca_bal',
+           'An_Ca_prod'],
+    'P': ['Ur_P_m', 'Fe_P_m', 'An_P_m', 'An_P_g', 'An_P_y', 'An_P_l', 'An_P_Clf', 'An_P_req', 'An_P_bal',
+          'Fe_P_g', 'An_P_prod'],
+    'Mg': ['An_Mg_Clf', 'Ur_Mg_m', 'Fe_Mg_m', 'An_Mg_m', 'An_Mg_g', 'An_Mg_y', 'An_Mg_l', 'An_Mg_req',
+           'An_Mg_bal', 'An_Mg_prod'],
+    'Na': ['An_Na_Clf', 'Fe_Na_m', 'An_Na_g', 'An_Na_y', 'An_Na_l', 'An_Na_req', 'An_Na_bal', 'An_Na_prod'],
+    'Cl': ['An_Cl_Clf', 'Fe_Cl_m', 'An_Cl_g', 'An_Cl_y', 'An_Cl_l', 'An_Cl_req', 'An_Cl_bal', 'An_Cl_prod'],
+    'K': ['An_K_Clf', 'Ur_K_m', 'Fe_K_m', 'An_K_m', 'An_K_g', 'An_K_y', 'An_K_l', 'An_K_req', 'An_K_bal',
+          'An_K_prod'],
+    'S': ['An_S_req', 'An_S_bal'],
+    'Co': ['An_Co_req', 'An_Co_bal'],
+    'Cu': ['An_Cu_Clf', 'An_Cu_m', 'An_Cu_g', 'An_Cu_y', 'An_Cu_l', 'An_Cu_req', 'An_Cu_bal', 'An_Cu_prod'],
+    'I': ['An_I_req', 'An_I_bal'],
+    'Fe': ['An_Fe_Clf', 'An_Fe_g', 'An_Fe_y', 'An_Fe_l', 'An_Fe_req', 'An_Fe_bal', 'An_Fe_prod'],
+    'Mn': ['An_Mn_Clf', 'An_Mn_m', 'An_Mn_g', 'An_Mn_y', 'An_Mn_l', 'An_Mn_req', 'An_Mn_bal', 'An_Mn_prod'],
+    'Se': ['An_Se_req', 'An_Se_bal'],
+    'Zn': ['An_Zn_Clf', 'An_Zn_m', 'An_Zn_g', 'An_Zn_y', 'An_Zn_l', 'An_Zn_req', 'An_Zn_bal', 'An_Zn_prod']
+}
+
+# Categories and groups kept with capture='requirements', None keeps every group
+requirements_capture = {
+    'Intakes': ['An_data', 'energy', 'protein'],
+    'Requirements': None,
+    'Production': ['milk'],
+    'Efficiencies': None,
+    'Miscellaneous': None
+}
+
+
+class ModelSnapshot(NamedTuple):
+    """
+    The snapshot variables of one model run, returned by execute_model with capture='snapshot'.
+    """
+    Mlk_Prod_comp: float
+    MlkFat_Milk: float
+    MlkNP_Milk: float
+    Mlk_Prod_MPalow: float
+    Mlk_Prod_NEalow: float
+    An_MEIn: float
+    Trg_MEuse: float
+    An_MPIn_g: float
+    An_MPuse_g_Trg: float
+    An_RDPIn_g: float
+    An_DCADmeq: float
+
+
 class ModelOutput:
     """
     A class for storing the output from run_NASEM
 
     Attributes:
         locals_input (dict): Dictionary with all variables calculated in the run_NASEM function
+        capture (str): 'full' to keep every output, 'requirements' to keep only the categories and groups in
+            requirements_capture (requirements, supply and milk production).
+        categories (tuple): Names of the categories the outputs are stored in, used by every class that
+            stores, saves or searches outputs.
 
     Methods:
-        __init__(locals_input):
+        __init__(locals_input, capture='full'):
             Initalizes the ModelOutput instance. Runs sorting methods when initalized to sort locals_input.
 
+        __filter_capture(capture):
+            Removes the variables that are not kept for the capture level from locals_input before sorting.
+
+        __apply_capture(capture):
+            Removes the categories and groups that are not kept for the capture level, which are empty.
+
         __populate_category(category_name, group_names, *variable_lists):
             Creates and populates a nested dictionary using lists of variable names
         
         __populate_uncategorized():
             Stores all remaining values in locals_input in the Uncategorized category and pops them from locals_input.
 
+        __compact_values():
+            Converts NumPy scalars to Python numbers and copies dataframes to drop their cached columns.
+
+        __build_index():
+            Builds a flat index of every category, group and variable name for get_value and get_values.
+
+        __setstate__(state):
+            Restores an unpickled ModelOutput, building the index if it was pickled without one.
+
         get_value(name):
             Retrieves a value, dictionary or dataframe with a given name from the ModelOutput instance.
 
+        get_values(names):
+            Retrieves the values of a list of scalar variables as an array.
+
+        save(path):
+            Saves the outputs to a binary file.
+
+        load(path, mmap_mode=None):
+            Creates a ModelOutput from a file written by save.
+
+    Notes:
+        Outputs are stored as Python numbers rather than NumPy scalars to reduce memory use. Use
+        CompactModelOutput to store many outputs in memory.
+
     Example:
         # Create an instance of ModelOutput
         model_output = ModelOutput(locals_input=my_locals_input_dict)
@@ -29,11 +201,17 @@ class ModelOutput:
         # Retrieve a specific group of variables
         requirements_group = model_output.get_value('Requirements')
     """
-    def __init__(self, locals_input):
+    # Names of the categories the outputs are stored in. Every module that saves, loads, searches or
+    # copies outputs reads the categories from here
+    categories = ('Inputs', 'Intakes', 'Requirements', 'Production', 'Excretion',
+                  'Digestibility', 'Efficiencies', 'Miscellaneous', 'Uncategorized')
+
+    def __init__(self, locals_input, capture='full'):
         # Dictionary with all variables from execute_model
         self.locals_input = locals_input
         # Take locals_input and store variables in different Categories
         self.__filter_locals_input()
+        self.__filter_capture(capture)
         self.__sort_Input()
         self.__sort_Intakes()
         self.__sort_Requirements()
@@ -43,6 +221,21 @@ class ModelOutput:
         self.__sort_Efficiencies()
         self.__sort_Miscellaneous()
         self.__populate_uncategorized()
+        self.__apply_capture(capture)
+        self.__compact_values()
+        self.__build_index()
+        # Built the first time search() is called
+        self.__search_index = None
+
+    def __setstate__(self, state):
+        """
+        Restore an unpickled ModelOutput, rebuilding the index of outputs pickled before it was added.
+        """
+        self.__dict__.update(state)
+        if '_ModelOutput__index' not in state:
+            self.__build_index()
+        if '_ModelOutput__search_index' not in state:
+            self.__search_index = None
 
     def _repr_html_(self):
         # This is the HTML display when the ModelOutput object is called directly in a IPython setting (e.g. juptyer notebook, VSCode interactive)
@@ -128,28 +321,11 @@ class ModelOutput:
         """
         Return a list of dictionaries of snapshot variables for _refr_html_ and __str__
         """
-        snapshot_dict = {
-            'Milk production kg (Mlk_Prod_comp)': 'Mlk_Prod_comp',
-            'Milk fat g/g (MlkFat_Milk)': 'MlkFat_Milk',
-            'Milk protein g/g (MlkNP_Milk)': 'MlkNP_Milk',
-            'Milk Production - MP allowable kg (Mlk_Prod_MPalow)': 'Mlk_Prod_MPalow',
-            'Milk Production - NE allowable kg (Mlk_Prod_NEalow)': 'Mlk_Prod_NEalow', 
-            'Animal ME intake Mcal/d (An_MEIn)': 'An_MEIn',
-            'Target ME use Mcal/d (Trg_MEuse)': 'Trg_MEuse',
-            'Animal MP intake g/d (An_MPIn_g)': 'An_MPIn_g',
-            'Animal MP use g/d (An_MPuse_g_Trg)': 'An_MPuse_g_Trg',
-            'Animal RDP intake g/d (An_RDPIn_g)': 'An_RDPIn_g',
-            'Diet DCAD meq (An_DCADmeq)': 'An_DCADmeq'
-        }
-
         snapshot_data = []
-        for description, key in snapshot_dict.items():
+        for description, key in snapshot_variables.items():
             raw_value = self.get_value(key)
             if isinstance(raw_value, (float, int)):  # Check if the value is numeric
                 value = round(raw_value, 3)  
-            elif isinstance(raw_value, (np.ndarray)) and raw_value.size == 1:
-                # This is required for any numbers handled by np.where() that return arrays instead of floats - needs cleaning up
-                value = round(float(raw_value),3)
             else:
                 value = raw_value  
         
@@ -199,7 +375,7 @@ class ModelOutput:
         """
         variables_to_remove = ['key', 'value', 'num_value', 'feed_library_df', 
                                'feed_data', 'diet_info_initial', 'diet_data_initial',
-                                'AA_list', 'An_data_initial']
+                                'AA_list', 'An_data_initial', 'feed_properties', 'outputs', 'capture']
         for key in variables_to_remove:
             # Remove values that should be excluded from output
             self.locals_input.pop(key, None)
@@ -210,10 +386,16 @@ class ModelOutput:
         Sort and store specific variables related to model inputs in the Inputs category.
         """
         setattr(self, 'Inputs', {})
-        variables_to_add = ['user_diet', 'animal_input', 'equation_selection', 'coeff_dict', 'infusion_input', 'MP_NP_efficiency_input']
-        for key in variables_to_add:
+        for key in input_variables:
+            # Not kept with capture='requirements'
+            if key not in self.locals_input:
+                continue
             # Add to the Inputs Category
-            self.Inputs[key] = self.locals_input[key]
+            value = self.locals_input[key]
+            # The coefficients used, including those changed for this run (e.g. LCT)
+            if isinstance(value, CoeffOverlay):
+                value = value.to_dict()
+            self.Inputs[key] = value
             # Remove so that values are only stored in one place
             self.locals_input.pop(key, None)
 
@@ -223,59 +405,22 @@ class ModelOutput:
         Sort and store specific variables related to nutrient intakes in the Intakes category.
         """
         setattr(self, 'Intakes', {})
-        variables_to_add = ['diet_info', 'infusion_data', 'diet_data', 'An_data']
-        for key in variables_to_add:
-            self.Intakes[key] = self.locals_input[key]
-            self.locals_input.pop(key, None)
-
-        # Name intake groups
-        group_names = ['energy', 'protein', 'AA', 'FA', 'rumen_digestable'] 
-        # Lists of variables to store
-        energy_variables = ['An_MEIn', 'An_NEIn', 'An_NE', 'An_MEIn_approx']
-        protein_variables = ['An_MPIn', 'An_MPIn_g']
-        AA_variables = ['AA_values', 'Abs_EAA_g', 'Abs_neAA_g', 'Abs_OthAA_g', 'Abs_EAA2b_g']
-        FA_variables = []
-        rumen_digestable_variables = ['Rum_DigNDFIn', 'Rum_DigStIn']
-        # Store variables
-        self.__populate_category('Intakes', group_names, energy_variables, protein_variables, AA_variables, FA_variables, rumen_digestable_variables)
+        for key in intake_tables:
+            if key in self.locals_input:
+                self.Intakes[key] = self.locals_input.pop(key)
+        self.__sort_groups('Intakes')
 
 
     def __sort_Requirements(self):
         """
         Sort and store specific variables related to required intakes in the Requirements category.
         """
-        # Name digestability groups
-        group_names = ['energy', 'protein']
-        # Lists of variables to store
-        energy_variables = ['An_NEmUse_NS', 'An_NEm_Act_Graze', 'An_NEm_Act_Parlor', 'An_NEm_Act_Topo',
-                            'An_NEmUse_Act', 'An_NEmUse', 'An_MEmUse', 'Gest_MEuse', 'Trg_Mlk_NEout', 'Trg_Mlk_MEout', 'Trg_MEuse']
-        protein_variables = ['Gest_NCPgain_g', 'Gest_NPgain_g', 'Gest_NPuse_g', 'Gest_CPuse_g', 'An_MPm_g_Trg', 'Body_NPgain_g', 'Body_MPUse_g_Trg', 'Gest_MPUse_g_Trg', 'Trg_Mlk_NP_g', 'Mlk_MPUse_g_Trg', 'An_MPuse_g_Trg', 'Min_MPuse_g',
-                             'Diff_MPuse_g', 'Frm_NPgain_g', 'Frm_MPUse_g_Trg', 'Rsrv_NPgain_g', 'Rsrv_MPUse_g_Trg']
-        # Store variables
-        self.__populate_category('Requirements', group_names, energy_variables, protein_variables)
-
+        self.__sort_groups('Requirements')
 
         ### Store mineral requirements in nested dictionaries ###
-        mineral_abbreviations = ['Ca', 'P', 'Mg', 'Na', 'Cl', 'K', 'S', 'Co', 'Cu', 'I', 'Fe', 'Mn', 'Se', 'Zn']
-        mineral_variable_lists = [
-            ['Ca_Mlk', 'Fe_Ca_m', 'An_Ca_g', 'An_Ca_y', 'An_Ca_l', 'An_Ca_Clf', 'An_Ca_req', 'An_Ca_bal', 'An_Ca_prod'],
-            ['Ur_P_m', 'Fe_P_m', 'An_P_m', 'An_P_g', 'An_P_y', 'An_P_l', 'An_P_Clf', 'An_P_req', 'An_P_bal', 'Fe_P_g', 'An_P_prod'],
-            ['An_Mg_Clf', 'Ur_Mg_m', 'Fe_Mg_m', 'An_Mg_m', 'An_Mg_g', 'An_Mg_y', 'An_Mg_l', 'An_Mg_req', 'An_Mg_bal', 'An_Mg_prod'],
-            ['An_Na_Clf', 'Fe_Na_m', 'An_Na_g', 'An_Na_y', 'An_Na_l', 'An_Na_req', 'An_Na_bal', 'An_Na_prod'],
-            ['An_Cl_Clf', 'Fe_Cl_m', 'An_Cl_g', 'An_Cl_y', 'An_Cl_l', 'An_Cl_req', 'An_Cl_bal', 'An_Cl_prod'],
-            ['An_K_Clf', 'Ur_K_m', 'Fe_K_m', 'An_K_m', 'An_K_g', 'An_K_y', 'An_K_l', 'An_K_req', 'An_K_bal', 'An_K_prod'],
-            ['An_S_req', 'An_S_bal'],
-            ['An_Co_req', 'An_Co_bal'],
-            ['An_Cu_Clf', 'An_Cu_m', 'An_Cu_g', 'An_Cu_y', 'An_Cu_l', 'An_Cu_req', 'An_Cu_bal', 'An_Cu_prod'],
-            ['An_I_req', 'An_I_bal'],
-            ['An_Fe_Clf', 'An_Fe_g', 'An_Fe_y', 'An_Fe_l', 'An_Fe_req', 'An_Fe_bal', 'An_Fe_prod'],
-            ['An_Mn_Clf', 'An_Mn_m', 'An_Mn_g', 'An_Mn_y', 'An_Mn_l', 'An_Mn_req', 'An_Mn_bal', 'An_Mn_prod'],
-            ['An_Se_req', 'An_Se_bal'],
-            ['An_Zn_Clf', 'An_Zn_m', 'An_Zn_g', 'An_Zn_y', 'An_Zn_l', 'An_Zn_req', 'An_Zn_bal', 'An_Zn_prod']
-        ]
         mineral_requirements = {}
         # NOTE Since all the mineral requirements are nested within mineral_requirements can't use populate_category()
-        for abbreviation, variable_list in zip(mineral_abbreviations, mineral_variable_lists):
+        for abbreviation, variable_list in mineral_requirement_groups.items():
             mineral_requirements[abbreviation] = {}  # Initialize the dictionary for the current mineral
             for variable in variable_list:
                 if variable in self.locals_input:
@@ -287,72 +432,148 @@ class ModelOutput:
         """
         Sort and store specific variables related to production, including body composition changes and gestation, in the Production category.
         """
-        # Name production groups
-        group_names = ['milk', 'body_composition', 'gestation', 'MiCP']
-        # List variables to store
-        milk_variables = ['Trg_NEmilk_Milk', 'Mlk_NP_g', 'Mlk_CP_g', 'Trg_Mlk_Fat' ,'Trg_Mlk_Fat_g', 'Mlk_Fatemp_g', 'Mlk_Fat_g', 'Mlk_Fat', 'Mlk_NP', 'Mlk_Prod_comp',
-                          'An_MPavail_Milk_Trg', 'Mlk_NP_MPalow_Trg_g', 'Mlk_Prod_MPalow', 'An_MEavail_Milk', 'Mlk_Prod_NEalow', 'Mlk_Prod', 'MlkNP_Milk', 'MlkFat_Milk', 'MlkNE_Milk', 'Mlk_NEout', 'Mlk_MEout']
-        composition_variables = ['CPGain_FrmGain', 'NPGain_FrmGain', 'Frm_Gain', 'Rsrv_Gain', 'Rsrv_Gain_empty', 'NPGain_RsrvGain', 'Rsrv_NPgain',
-                                 'Frm_Gain_empty', 'Body_Gain_empty', 'Frm_NPgain', 'Body_NPgain', 'Body_CPgain', 'Body_CPgain_g', 'Rsrv_Fatgain', 'Rsrv_CPgain', 'Rsrv_NEgain', 'An_BWmature_empty', 'Body_Gain']
-        gestation_variables = ['Uter_Wtpart', 'Uter_Wt', 'GrUter_Wtpart', 'GrUter_Wt', 'Uter_BWgain', 'GrUter_BWgain', 'Rsrv_MEgain', 'FatGain_FrmGain', 'Frm_Fatgain',
-                               'Frm_CPgain', 'Frm_NEgain', 'Frm_MEgain', 'An_MEgain', 'Gest_REgain']
-        MiCP_variables = ['RDPIn_MiNmax', 'MiN_Vm', 'Du_MiN_g', 'Du_MiCP_g', 'Du_MiTP_g', 'Du_MiCP', 'Du_idMiCP_g', 'Du_idMiCP', 'Du_idMiTP_g', 'Du_idMiTP']
-        # Store variables
-        self.__populate_category('Production', group_names, milk_variables, composition_variables, gestation_variables, MiCP_variables)
+        self.__sort_groups('Production')
 
 
     def __sort_Excretion(self):
         """
         Sort and store specific variables related to excreted nutrients in the Excretion category.
         """
-        # Name excretion groups
-        group_names = ['fecal', 'urinary', 'gaseous', 'scurf'] 
-        # Lists of variables to store
-        fecal_variables = ['Fe_rOMend', 'Fe_RUP', 'Fe_RumMiCP', 'Fe_CPend_g', 'Fe_CPend', 'Fe_CP', 'Fe_NPend', 'Fe_NPend_g', 'Fe_MPendUse_g_Trg']
-        urinary_variables = ['Ur_Nout_g', 'Ur_DEout', 'Ur_Nend_g', 'Ur_NPend_g', 'Ur_MPendUse_g']
-        gaseous_variables = []
-        scurf_variables = ['Scrf_CP_g', 'Scrf_NP_g', 'Scrf_MPUse_g_Trg']
-        # Store variables
-        self.__populate_category('Excretion', group_names, fecal_variables, urinary_variables, gaseous_variables, scurf_variables)
+        self.__sort_groups('Excretion')
 
 
     def __sort_Digestibility(self):
         """
         Sort and store specific variables related to digestability in the Digestability category.
         """
-        # Name digestability groups
-        group_names = ['rumen', 'TT']
-        # Lists of variables to store
-        rumen_variables = ['Rum_dcNDF', 'Rum_dcSt']
-        TT_variables = []
-        # Store variables
-        self.__populate_category('Digestibility', group_names, rumen_variables, TT_variables)
+        self.__sort_groups('Digestibility')
 
 
     def __sort_Efficiencies(self):
         """
         Sort and store specific variables related to conversion efficiencies in the Efficiencies category.
         """
-        # Name digestability groups
-        group_names = ['energy', 'protein']
-        # Lists of variables to store
-        energy_variables = ['Kr_ME_RE']
-        protein_variables = ['Kg_MP_NP_Trg']
-        # Store variables
-        self.__populate_category('Efficiencies', group_names, energy_variables, protein_variables)
+        self.__sort_groups('Efficiencies')
 
 
     def __sort_Miscellaneous(self):
         """
         Sort and store specific miscellaneous variables that need a final location in the Miscellaneous category.
         """
-        # These variables need to be given a storage location
-        group_names = ['misc']
-        # Lists of variables to store
-        misc_variables = ['Kb_LateGest_DMIn', 'An_PrePartWklim', 'An_PrePartWkDurat', 'An_DMIn_BW', 'f_mPrt_max', 'mPrt_k_EAA2', 'An_REgain_Calf', 'An_LactDay_MlkPred', 'An_DCADmeq', 'Dt_DMIn_BW', 'Dt_DMIn_MBW']
-        # Store variables
-        self.__populate_category('Miscellaneous', group_names, misc_variables)
-   
+        self.__sort_groups('Miscellaneous')
+
+
+    def __sort_groups(self, category_name):
+        """
+        Store the variables of each group of a category listed in output_groups.
+        """
+        groups = output_groups[category_name]
+        self.__populate_category(category_name, list(groups), *groups.values())
+
+
+    def __filter_capture(self, capture):
+        """
+        Keep only the variables of the categories and groups kept for the capture level in locals_input.
+
+        Notes:
+            This is done before sorting, so the outputs that aren't kept are never stored and can be freed.
+        """
+        if capture == 'full':
+            return
+        if capture != 'requirements':
+            raise ValueError(f"capture must be 'full' or 'requirements' for a ModelOutput, got {capture!r}")
+        names = set()
+        for category_name, group_names in requirements_capture.items():
+            groups = dict(output_groups[category_name])
+            if category_name == 'Requirements':
+                groups['mineral_requirements'] = [name for variables in mineral_requirement_groups.values()
+                                                  for name in variables]
+            for group_name in (groups if group_names is None else group_names):
+                # Tables like An_data are stored directly in the category
+                names.update(groups.get(group_name, [group_name]))
+        self.locals_input = {name: value for name, value in self.locals_input.items() if name in names}
+
+
+    def __apply_capture(self, capture):
+        """
+        Remove the categories and groups that are not kept for the capture level, these are empty.
+        """
+        if capture == 'full':
+            return
+        for category_name in self.categories:
+            if category_name not in requirements_capture:
+                setattr(self, category_name, {})
+            elif requirements_capture[category_name] is not None:
+                category = getattr(self, category_name)
+                setattr(self, category_name, {group: category[group]
+                                              for group in requirements_capture[category_name]})
+
+
+    def __compact_values(self):
+        """
+        Replace NumPy scalars and 0-dimensional arrays (e.g. from np.where()) with Python numbers and copy dataframes.
+
+        Notes:
+            A float uses 24 bytes, a np.float64 32 bytes and a 0-dimensional array over 100 bytes. Dataframes
+            built column by column in execute_model keep a cached Series for every column, a copy doesn't.
+            Inputs are not changed as they are the dictionaries and dataframe passed to execute_model.
+        """
+        def compact(dictionary):
+            for key, value in dictionary.items():
+                if isinstance(value, dict):
+                    compact(value)
+                elif isinstance(value, pd.DataFrame):
+                    dictionary[key] = value.copy()
+                else:
+                    dictionary[key] = compact_value(value)
+
+        for category_name in self.categories:
+            if category_name != 'Inputs':
+                compact(getattr(self, category_name))
+
+
+    def __build_index(self):
+        """
+        Build a flat dictionary of name: path for every category, group and variable.
+
+        Notes:
+            The path is the category name followed by the keys of the groups and the variable,
+            e.g. ('Production', 'milk', 'Mlk_Prod_comp'). Values are read through the path when they
+            are requested, so changes made to the outputs after they are created are returned.
+            When a name is stored in more than one place the first one found by a recursive search of the
+            categories in alphabetical order is kept.
+        """
+        self.__index = {}
+        category_names = sorted(self.categories)
+        for category_name in category_names:
+            self.__index[category_name] = (category_name,)
+
+        def add_to_index(dictionary, path):
+            # All names in a dictionary are found before names in its nested dictionaries
+            for key, value in dictionary.items():
+                if value is not None and key not in self.__index:
+                    self.__index[key] = path + (key,)
+            for key, value in dictionary.items():
+                if isinstance(value, dict):
+                    add_to_index(value, path + (key,))
+
+        for category_name in category_names:
+            add_to_index(getattr(self, category_name), (category_name,))
+
+
+    def __lookup(self, name):
+        """
+        Read the object stored under an indexed name, raising KeyError if it isn't there (anymore).
+        """
+        path = self.__index[name]
+        value = getattr(self, path[0])
+        try:
+            for key in path[1:]:
+                value = value[key]
+        except (KeyError, TypeError, IndexError):
+            raise KeyError(name) from None
+        return value
+
 
     def get_value(self, name):
         """
@@ -364,89 +585,102 @@ class ModelOutput:
         Returns:
         str or int or float or dict or pd.DataFrame or None: The object with the given name, or None if not found.
         """
-        # Helper function to recursively search for a group in a nested dictionary
-        def recursive_search(dictionary, target_name):
-            if target_name in dictionary:
-                return dictionary[target_name]
-            for key, value in dictionary.items():
-                if isinstance(value, dict):
-                    result = recursive_search(value, target_name)
-                    if result is not None:
-                        return result
+        try:
+            return self.__lookup(name)
+        except KeyError:
             return None
 
-        # Search in all dictionaries contained in self
-        for category_name in dir(self):
-            category = getattr(self, category_name, None)
-            if category is not None:
-                if isinstance(category, dict) and category_name == name:
-                    return category
-                elif isinstance(category, pd.DataFrame) and category_name == name:
-                    return category
-                elif isinstance(category, dict):
-                    result = recursive_search(category, name)
-                    if result is not None:
-                        return result
-
-        # Return None if not found
-        return None
+
+    def get_values(self, names):
+        """
+        Retrieve the values of a list of scalar variables.
+
+        Parameters:
+        names (list): Names of the variables to retrieve.
+
+        Returns:
+        np.ndarray: The value of each variable, in the same order as names.
+
+        Raises:
+        KeyError: If any of the names are not found.
+        """
+        values = []
+        missing = []
+        for name in names:
+            try:
+                values.append(self.__lookup(name))
+            except KeyError:
+                missing.append(name)
+        if missing:
+            raise KeyError(f"Variables not found in ModelOutput: {missing}")
+        return np.array(values, dtype=float)
        
 
     def search(self, search_string, dictionaries_to_search=None):
+        """
+        Search the names of all outputs, and the columns of dataframe outputs, with a regular expression (case insensitive).
+
+        Notes:
+            Names are matched including the category and groups they are stored in, e.g. 'Production.milk.Mlk_Prod'.
+            The outputs are indexed the first time search is called and the results of each search are cached,
+            so changes made to the outputs after that aren't found.
+
+        Parameters:
+        search_string (str): The string or regular expression to search for.
+        dictionaries_to_search (list): Names of the categories to search, by default all of them.
+
+        Returns:
+        pd.DataFrame: The 'Name' and 'Value' of each match.
+        """
         # Define the dictionaries to search within, by default all dictionaries where outputs are stored
         if dictionaries_to_search is None:
-            dictionaries_to_search = ['Inputs', 'Intakes', 'Requirements', 'Production',
-                                      'Excretion', 'Digestibility', 'Efficiencies',
-                                      'Miscellaneous', 'Uncategorized']
-        result = {}
-        visited_keys = set()
-        table_rows = []
-
-        def recursive_search(d, path=''):
-            for key, value in d.items():
-                full_key = path + key
-                if re.search(search_string, str(full_key), flags=re.IGNORECASE) and full_key not in visited_keys:
-                    result[full_key] = value
-                    visited_keys.add(full_key)
-                if isinstance(value, dict):
-                    recursive_search(value, full_key + '.')
-                elif isinstance(value, pd.DataFrame):
-                    matching_columns = [col for col in value.columns if re.search(search_string, col, flags=re.IGNORECASE)]
-                    if matching_columns:
-                        columns_key = full_key + '_columns'
-                        if columns_key not in visited_keys:
-                            result[columns_key] = matching_columns
-                            visited_keys.add(columns_key)
-
-        def extract_dataframe_and_column(key, value):
-            parts = key.split('.')[-1].rsplit('_', 1)
-            # variable_name = parts[0]
-            dataframe_name, column_name = parts[-1], "column"
-            return {'Name': value, 'Value': f'{parts[0]}[{column_name}]'}
-
-        # Iterate over specified dictionaries
-        for dictionary_name in dictionaries_to_search:
-            dictionary = getattr(self, dictionary_name, None)
-            if dictionary is not None and isinstance(dictionary, dict):
-                recursive_search(dictionary, dictionary_name + '.')
-
-        # Create output dataframe
-        for key, value in result.items():
-            variable_name = key.split('.')[-1]
-            if isinstance(value, dict):
-                value_display = 'dict'
-            elif isinstance(value, pd.DataFrame):
-                value_display = 'Dataframe'
-            elif isinstance(value, list) and key.endswith('_columns'):
-                table_rows.extend([extract_dataframe_and_column(key, col) for col in value])
-            elif isinstance(value, list):
-                value_display = 'list'
-            else:
-                value_display = value  
-            # Add the current row to the list
-            if not (isinstance(value, list) and key.endswith('_columns')):
-                table_rows.append({'Name': variable_name, 'Value': value_display})
-
-        output_table = pd.DataFrame(table_rows)
-        return output_table
-    
\ No newline at end of file
+            dictionaries_to_search = self.categories
+        if self.__search_index is None:
+            self.__search_index = SearchIndex({name: getattr(self, name) for name in self.categories})
+        return self.__search_index.search(search_string, dictionaries_to_search)
+
+
+    def save(self, path):
+        """
+        Save the outputs to a binary file, read it with ModelOutput.load.
+
+        Notes:
+            Scalars are stored in a JSON manifest at the start of the file and the columns of dataframes
+            as arrays after it. Numbers stored as 0-dimensional arrays are loaded as floats.
+
+        Parameters:
+        path (str): The file to write.
+        """
+        categories = {category_name: getattr(self, category_name)
+                      for category_name in self.categories}
+        write_output_file(path, 'ModelOutput', categories)
+
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Create a ModelOutput from a file written by ModelOutput.save.
+
+        Parameters:
+        path (str): The file to read.
+        mmap_mode (str): If given (e.g. 'r'), the columns of dataframes are memory-mapped instead of read.
+
+        Returns:
+        ModelOutput: The saved outputs.
+        """
+        categories, _ = read_output_file(path, 'ModelOutput', mmap_mode)
+        return cls._from_categories(categories)
+
+
+    @classmethod
+    def _from_categories(cls, categories):
+        """
+        Create a ModelOutput from category dictionaries that are already sorted, e.g. read from a file.
+        """
+        output = cls.__new__(cls)
+        output.locals_input = {}
+        for category_name in cls.categories:
+            setattr(output, category_name, categories.get(category_name, {}))
+        output.__build_index()
+        output.__search_index = None
+        return output
@@ -0,0 +1,412 @@
+# Columnar storage for the ModelOutput of many animals
+# Every scalar output is one NumPy array with a value per animal, stored in the
+# same category and group dictionaries as ModelOutput. DataFrame outputs are
+# stored as a BatchTable, 2-D arrays when every animal has the same rows (e.g.
+# AA_values) and ragged arrays with offsets when they don't (e.g. diet_info).
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.batch_table import BatchTable, _import_pyarrow
+from nasem_dairy.ration_balancer.execute_model_batch import AA_list
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput
+from nasem_dairy.ration_balancer.output_file import read_output_file, write_output_file
+from nasem_dairy.ration_balancer.output_schema import _build_output_schema, _schema_entry
+from nasem_dairy.ration_balancer.search_index import SearchIndex
+
+
+def _leaves(dictionary, path):
+    """
+    (path, value) of every value in nested dictionaries, empty dictionaries included as values.
+    """
+    for key, value in dictionary.items():
+        if isinstance(value, dict) and value:
+            yield from _leaves(value, path + (key,))
+        else:
+            yield path + (key,), value
+
+
+def _insert(category_dicts, path, item):
+    """
+    Store item in nested dictionaries at path, e.g. ('Production', 'milk', 'Mlk_Prod').
+    """
+    group = category_dicts
+    for key in path[:-1]:
+        group = group.setdefault(key, {})
+    group[path[-1]] = item
+
+
+def _schema_path(category, group, name):
+    return (category, *(group.split('.') if isinstance(group, str) else ()), name)
+
+
+def _to_column(values):
+    """
+    Array with one value per animal, missing values (None) are NaN for numbers.
+    """
+    present = [value for value in values if value is not None]
+    if not present:
+        return np.full(len(values), None, dtype=object)
+    if all(isinstance(value, (int, float, np.number, np.ndarray, bool)) for value in present):
+        shapes = {np.shape(value) for value in present}
+        if len(shapes) == 1:
+            shape = shapes.pop()
+            if len(present) == len(values):
+                return np.stack([np.asarray(value) for value in values])
+            fill = np.full(shape, np.nan)
+            return np.stack([fill if value is None else np.asarray(value, dtype=float) for value in values])
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _to_table(tables):
+    """
+    BatchTable from a list of (index, {column: values}) tuples, None for animals without the table.
+    """
+    present = [table for table in tables if table is not None]
+    index_name = present[0][2]
+    column_names = list(dict.fromkeys(name for _, columns, _ in present for name in columns))
+    first_index = present[0][0]
+    same_rows = (len(present) == len(tables)
+                 and all(set(columns) == set(column_names) for _, columns, _ in present)
+                 and all(len(index) == len(first_index) and np.array_equal(index, first_index)
+                         for index, _, _ in present))
+    if same_rows:
+        columns = {name: np.stack([columns[name] for _, columns, _ in present]) for name in column_names}
+        return BatchTable(first_index, columns, index_name=index_name)
+
+    lengths = [0 if table is None else len(table[0]) for table in tables]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    index = np.concatenate([table[0] for table in present])
+    columns = {}
+    for name in column_names:
+        parts = []
+        for (rows, table_columns, _) in present:
+            if name in table_columns:
+                parts.append(table_columns[name])
+            else:
+                parts.append(np.full(len(rows), np.nan))
+        columns[name] = np.concatenate(parts)
+    return BatchTable(index, columns, offsets, index_name=index_name)
+
+
+class BatchModelOutput:
+    """
+    Columnar storage of the ModelOutput of many animals.
+
+    Each category of ModelOutput (Inputs, Intakes, Requirements, ...) is an
+    attribute with the same groups, e.g. `batch.Production['milk']['Mlk_Prod']`,
+    but each scalar output is an array with one value per animal and each
+    DataFrame output is a BatchTable.
+
+    Use `BatchModelOutput.from_model_outputs()` to create one. The ModelOutputs are
+    read one at a time, so they can come from a generator (e.g. over `nd.run_scenarios()` results)
+    without keeping them all in memory. The results of `execute_model_batch` are already one
+    column per output, `BatchModelOutput.from_batch_results()` stores them without a ModelOutput
+    for each animal.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = nd.CompiledFeedLibrary(pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv"))
+
+    outputs = (nd.execute_model(user_diet, {**animal_input, 'An_BW': An_BW}, equation_selection,
+                                feed_library, nd.coeff_dict.copy())
+               for An_BW in range(550, 750, 50))
+    batch = nd.BatchModelOutput.from_model_outputs(outputs)
+    batch.Production['milk']['Mlk_Prod_comp']
+    batch.get_value('AA_values').get(0)
+    batch.search('Mlk_Prod')
+
+    batch.save('batch_output.nasem')
+    nd.BatchModelOutput.load('batch_output.nasem').get_value('Mlk_Prod_comp')
+    batch.to_pandas()[['An_BW', 'Mlk_Prod_comp', 'An_MPIn_g']]
+
+    herd = pd.DataFrame([animal_input] * 4).assign(diet_id='TMR', An_BW=range(550, 750, 50))
+    results = nd.execute_model_batch(herd, {'TMR': user_diet}, equation_selection, feed_library)
+    nd.BatchModelOutput.from_batch_results(results).Production['milk']['Mlk_Prod_comp']
+    ```
+    """
+    def __init__(self, category_dicts, n_animals):
+        self.n_animals = n_animals
+        for category in ModelOutput.categories:
+            setattr(self, category, category_dicts.get(category, {}))
+        # Built the first time search() is called
+        self._search_index = None
+
+    def __repr__(self):
+        return f"BatchModelOutput({self.n_animals} animals)"
+
+    def __len__(self):
+        return self.n_animals
+
+    @classmethod
+    def from_model_outputs(cls, model_outputs):
+        """
+        Combine ModelOutputs into a BatchModelOutput.
+
+        Parameters
+        ----------
+        model_outputs : iterable of ModelOutput
+            Outputs of `execute_model`, one per animal. Outputs missing from some animals
+            are NaN (or None for outputs that aren't numbers) for those animals.
+
+        Returns
+        -------
+        BatchModelOutput
+        """
+        values = {}
+        tables = {}
+        n_animals = 0
+        for model_output in model_outputs:
+            if not isinstance(model_output, ModelOutput):
+                raise TypeError(f"Expected a ModelOutput, got {type(model_output).__name__}")
+            for category in ModelOutput.categories:
+                for path, value in _leaves(getattr(model_output, category, {}), (category,)):
+                    if isinstance(value, pd.DataFrame):
+                        store = tables.setdefault(path, [None] * n_animals)
+                        store.append((value.index.to_numpy(),
+                                      {name: value[name].to_numpy() for name in value.columns},
+                                      value.index.name))
+                    elif isinstance(value, dict):
+                        values.setdefault(path, [])
+                    else:
+                        values.setdefault(path, [None] * n_animals).append(value)
+            n_animals += 1
+            for store in (*values.values(), *tables.values()):
+                if store and len(store) < n_animals:
+                    store.append(None)
+
+        category_dicts = {}
+        for path, column in values.items():
+            _insert(category_dicts, path, _to_column(column) if column else {})
+        for path, table in tables.items():
+            _insert(category_dicts, path, _to_table(table))
+        return cls(category_dicts, n_animals)
+
+    @classmethod
+    def from_batch_results(cls, results):
+        """
+        Store the results of `execute_model_batch` as a BatchModelOutput.
+
+        Each column is stored where ModelOutput stores the variable (see `get_output_schema`),
+        so the outputs are found in the same categories and groups as with `from_model_outputs`.
+        The amino acid columns (e.g. 'Abs_AA_g_Met') are stored as the columns of the AA_values
+        table and the columns ModelOutput doesn't have (e.g. DMI_input) in Uncategorized. The
+        outputs that are not in the results, such as the tables of each feed (diet_info) and the
+        dictionaries that are the same for every animal (equation_selection, coeff_dict), are not stored.
+
+        Parameters
+        ----------
+        results : pd.DataFrame
+            Returned by `execute_model_batch`, one row per animal. Animals are numbered by row.
+
+        Returns
+        -------
+        BatchModelOutput
+        """
+        schema = _build_output_schema()
+        category_dicts = {}
+        stored = set()
+
+        AA_columns = {}
+        for name in schema.index[schema['kind'] == 'per_AA']:
+            columns = [f'{name}_{AA}' for AA in AA_list]
+            if name not in AA_columns and all(column in results.columns for column in columns):
+                AA_columns[name] = results[columns].to_numpy()
+                stored.update(columns)
+        if AA_columns:
+            table = schema[schema['kind'] == 'table'].loc[['AA_values']].iloc[0]
+            _insert(category_dicts, _schema_path(table['category'], table['group'], 'AA_values'),
+                    BatchTable(np.array(AA_list, dtype=object), AA_columns))
+
+        scalars = schema[schema['kind'] == 'scalar']
+        for name, category, group in zip(scalars.index, scalars['category'], scalars['group']):
+            if name in results.columns:
+                _insert(category_dicts, _schema_path(category, group, name), results[name].to_numpy())
+                stored.add(name)
+        for name in results.columns:
+            if name not in stored:
+                _insert(category_dicts, ('Uncategorized', name), results[name].to_numpy())
+        return cls(category_dicts, len(results))
+
+    def get_value(self, name):
+        """
+        Retrieve an array, BatchTable or dictionary with a given name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the output, group or category.
+
+        Returns
+        -------
+        np.ndarray or BatchTable or dict or None
+            The object with the given name, or None if not found.
+        """
+        def recursive_search(dictionary):
+            if name in dictionary:
+                return dictionary[name]
+            for value in dictionary.values():
+                if isinstance(value, dict):
+                    result = recursive_search(value)
+                    if result is not None:
+                        return result
+            return None
+
+        if name in ModelOutput.categories:
+            return getattr(self, name)
+        for category in ModelOutput.categories:
+            result = recursive_search(getattr(self, category))
+            if result is not None:
+                return result
+        return None
+
+    def search(self, search_string, dictionaries_to_search=None):
+        """
+        Search the names of all outputs, and the columns of table outputs, as in `ModelOutput.search`.
+
+        The names are indexed once for the whole batch, the Value of each scalar output is
+        its array of values for every animal.
+
+        Parameters
+        ----------
+        search_string : str
+            The string or regular expression to search for (case insensitive).
+        dictionaries_to_search : list, optional
+            Names of the categories to search, by default all of them.
+
+        Returns
+        -------
+        pd.DataFrame
+            The 'Name' and 'Value' of each match.
+        """
+        if self._search_index is None:
+            self._search_index = SearchIndex({category: getattr(self, category)
+                                              for category in ModelOutput.categories})
+        return self._search_index.search(search_string, ModelOutput.categories if dictionaries_to_search is None
+                                         else dictionaries_to_search)
+
+    def save(self, path):
+        """
+        Save the outputs to a binary file, read it with `BatchModelOutput.load`.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            The file to write.
+        """
+        write_output_file(path, 'BatchModelOutput',
+                          {category: getattr(self, category) for category in ModelOutput.categories},
+                          n_animals=self.n_animals)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Create a BatchModelOutput from a file written by `BatchModelOutput.save`.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            The file to read.
+        mmap_mode : str, optional
+            Mode used to memory-map the arrays (see `np.memmap`), by default 'r' so an output is only
+            read from the file when it is used. With None every array is read.
+
+        Returns
+        -------
+        BatchModelOutput
+        """
+        category_dicts, attributes = read_output_file(path, 'BatchModelOutput', mmap_mode)
+        return cls(category_dicts, attributes['n_animals'])
+
+    def __columns(self):
+        """
+        Name and array of every scalar output, each name only once (the first found, as in get_value).
+        """
+        return {name: values for name, (_, values) in self.__column_paths().items()}
+
+    def __column_paths(self):
+        """
+        Path and array of every scalar output by name, each name only once (the first found).
+        """
+        columns = {}
+        for category in ModelOutput.categories:
+            for path, value in _leaves(getattr(self, category), (category,)):
+                if isinstance(value, np.ndarray) and path[-1] not in columns:
+                    if value.ndim == 1:
+                        columns[path[-1]] = (path, value)
+                    else:
+                        flat = value.reshape(len(value), -1)
+                        for position in range(flat.shape[1]):
+                            columns[f"{path[-1]}[{position}]"] = (path, flat[:, position])
+        return columns
+
+    def __table(self, table):
+        value = self.get_value(table)
+        if not isinstance(value, BatchTable):
+            raise KeyError(f"{table} is not a table output")
+        return value
+
+    def to_pandas(self, table=None):
+        """
+        DataFrame with one row per animal and one column per scalar output.
+
+        Parameters
+        ----------
+        table : str, optional
+            Name of a table output (e.g. 'diet_info', 'AA_values') to return instead,
+            with the rows of every animal and an 'animal' column.
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        if table is not None:
+            return self.__table(table).to_pandas()
+        return pd.DataFrame(self.__columns())
+
+    def to_arrow(self, table=None):
+        """
+        pyarrow Table with one row per animal and one column per scalar output.
+
+        The field of each output has the description, unit, category, group and kind of
+        `get_output_schema` as metadata.
+
+        Parameters
+        ----------
+        table : str, optional
+            Name of a table output (e.g. 'diet_info', 'AA_values') to return instead,
+            with the rows of every animal and an 'animal' column.
+
+        Returns
+        -------
+        pyarrow.Table
+        """
+        if table is not None:
+            return self.__table(table).to_arrow()
+        pa = _import_pyarrow()
+        fields = []
+        arrays = []
+        for name, (path, values) in self.__column_paths().items():
+            entry = _schema_entry(path)
+            if values.dtype == object:
+                # Outputs that are None for every animal get the dtype of the output schema
+                arrow_type = None
+                if (entry is not None and entry['dtype'] not in ('object', 'str')
+                        and all(value is None for value in values)):
+                    arrow_type = pa.from_numpy_dtype(np.dtype(entry['dtype']))
+                array = pa.array(values.tolist(), type=arrow_type)
+            else:
+                array = pa.array(values)
+            metadata = None
+            if entry is not None:
+                metadata = {key: entry[key] for key in ['description', 'unit', 'category', 'group', 'kind']
+                            if entry[key] is not None}
+            fields.append(pa.field(name, array.type, metadata=metadata))
+            arrays.append(array)
+        return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
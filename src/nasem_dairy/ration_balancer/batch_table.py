@@ -0,0 +1,84 @@
+# A DataFrame output of ModelOutput stored for many animals, see BatchModelOutput
+import numpy as np
+import pandas as pd
+
+
+class BatchTable:
+    """
+    A DataFrame output (e.g. diet_info, AA_values) for many animals.
+
+    Attributes
+    ----------
+    index : np.ndarray
+        Row labels. When every animal has the same rows this is the labels of
+        one animal, otherwise the labels of every animal one after the other.
+    columns : dict
+        Array of each column. Shape (animals, rows) when every animal has the
+        same rows, otherwise all rows one after the other.
+    offsets : np.ndarray or None
+        For ragged tables the rows of animal i are offsets[i]:offsets[i + 1],
+        None when every animal has the same rows.
+    """
+    def __init__(self, index, columns, offsets=None, index_name=None):
+        self.index = index
+        self.columns = columns
+        self.offsets = offsets
+        self.index_name = index_name
+
+    def __repr__(self):
+        layout = "ragged" if self.is_ragged else f"{len(self.index)} rows per animal"
+        return f"BatchTable({len(self)} animals, {len(self.columns)} columns, {layout})"
+
+    def __len__(self):
+        if self.is_ragged:
+            return len(self.offsets) - 1
+        return len(next(iter(self.columns.values()), []))
+
+    @property
+    def is_ragged(self):
+        return self.offsets is not None
+
+    def get(self, animal):
+        """
+        The table for one animal as a DataFrame.
+        """
+        if self.is_ragged:
+            rows = slice(self.offsets[animal], self.offsets[animal + 1])
+            index = self.index[rows]
+            data = {name: values[rows] for name, values in self.columns.items()}
+        else:
+            index = self.index
+            data = {name: values[animal] for name, values in self.columns.items()}
+        return pd.DataFrame(data, index=pd.Index(index, name=self.index_name))
+
+    def __long_columns(self):
+        if self.is_ragged:
+            animal = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+            return animal, self.index, self.columns
+        n_rows = len(self.index)
+        animal = np.repeat(np.arange(len(self)), n_rows)
+        index = np.tile(self.index, len(self))
+        return animal, index, {name: values.reshape(-1) for name, values in self.columns.items()}
+
+    def to_pandas(self):
+        """
+        Rows of every animal in one DataFrame, with an 'animal' column.
+        """
+        animal, index, columns = self.__long_columns()
+        return pd.DataFrame({'animal': animal, self.index_name or 'index': index, **columns})
+
+    def to_arrow(self):
+        """
+        Rows of every animal in one pyarrow Table, with an 'animal' column.
+        """
+        pa = _import_pyarrow()
+        animal, index, columns = self.__long_columns()
+        return pa.table({'animal': animal, self.index_name or 'index': index, **columns})
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise ImportError("to_arrow() requires pyarrow, install it with `pip install pyarrow`") from error
+    return pyarrow
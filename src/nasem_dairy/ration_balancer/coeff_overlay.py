@@ -0,0 +1,37 @@
+# Coefficients changed for one run layered over a shared coeff_dict
+# A CoeffOverlay holds the coefficients one run changes (e.g. LCT) on top of a
+# shared coeff_dict, which is never changed, so runs in threads don't interfere.
+from collections import ChainMap
+
+
+class CoeffOverlay(ChainMap):
+    """
+    Coefficients changed for one run on top of a shared coeff_dict that is never changed.
+
+    Values are looked up in each layer in order, so the first layer holds the changed values
+    and the last one the shared coeff_dict, e.g. `CoeffOverlay({'LCT': 5}, nd.coeff_dict)`. Assigning
+    a value only changes the first layer. execute_model uses one to store the LCT for the animal's
+    age, so the coeff_dict it is given (by default `nd.coeff_dict`) can be shared by runs in
+    different threads without being copied for each run.
+
+    Examples
+    --------
+    ```{python}
+    import nasem_dairy as nd
+
+    coeffs = nd.CoeffOverlay({'LCT': 5}, nd.coeff_dict)
+    coeffs['LCT'], nd.coeff_dict['LCT'], coeffs['En_CP']
+    ```
+    """
+    def to_dict(self):
+        """
+        Dictionary with the value of every coefficient.
+
+        Returns
+        -------
+        dict
+        """
+        values = {}
+        for layer in reversed(self.maps):
+            values.update(layer.to_dict() if isinstance(layer, CoeffOverlay) else layer)
+        return values
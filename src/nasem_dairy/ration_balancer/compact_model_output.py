@@ -0,0 +1,260 @@
+# Memory-lean storage of one ModelOutput
+# Every number in the output is packed into one contiguous array (float64 or
+# float32) and the other values (strings, dataframes) are kept in a tuple. The
+# layout, which says where each name is stored, depends only on which outputs
+# were calculated, so it's shared by every output with the same variables,
+# e.g. all the animals of a herd. Category dictionaries are rebuilt when used.
+import numpy as np
+
+from nasem_dairy.ration_balancer.batch_model_output import _leaves
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput
+
+_number_kinds = {'b': bool, 'i': int, 'f': float}
+# Layouts shared by outputs with the same variables
+_layouts = {}
+
+
+def _kind(value):
+    """
+    'b', 'i' or 'f' for numbers stored in the packed array, 'n' for None and 'o' for other objects.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return 'b'
+    if isinstance(value, (int, np.integer)):
+        return 'i'
+    if isinstance(value, (float, np.floating)):
+        return 'f'
+    if isinstance(value, np.ndarray) and value.ndim == 0 and value.dtype.kind in 'biuf':
+        return {'u': 'i'}.get(value.dtype.kind, value.dtype.kind)
+    return 'n' if value is None else 'o'
+
+
+class _Layout:
+    """
+    Where every name of a ModelOutput is stored in a CompactModelOutput.
+
+    index maps each name to (kind, position) for values or ('group', path) for dictionaries,
+    found in the same order as ModelOutput.get_value.
+    """
+    __slots__ = ('paths', 'kinds', 'positions', 'index')
+
+    def __init__(self, paths, kinds):
+        self.paths = paths
+        self.kinds = kinds
+        # Position of each path in the packed array or the tuple of objects
+        self.positions = []
+        n_numbers = n_objects = 0
+        for kind in kinds:
+            if kind in _number_kinds:
+                self.positions.append(n_numbers)
+                n_numbers += 1
+            else:
+                self.positions.append(n_objects)
+                n_objects += 1
+
+        self.index = {}
+        for category_name in sorted(ModelOutput.categories):
+            self.index[category_name] = ('group', (category_name,))
+        entries = {}
+        for path, kind, position in zip(paths, kinds, self.positions):
+            for depth in range(2, len(path)):
+                entries.setdefault(path[:depth], ('group', path[:depth]))
+            if kind != 'n':
+                entries[path] = (kind, position)
+
+        # All names in a dictionary are found before names in its nested dictionaries
+        children = {}
+        for path in entries:
+            children.setdefault(path[:-1], []).append(path)
+
+        def add_to_index(group_path):
+            for path in children.get(group_path, []):
+                self.index.setdefault(path[-1], entries[path])
+            for path in children.get(group_path, []):
+                if entries[path][0] == 'group':
+                    add_to_index(path)
+
+        for category_name in sorted(ModelOutput.categories):
+            add_to_index((category_name,))
+
+    def __reduce__(self):
+        # Unpickled layouts are shared too
+        return _Layout.get, (self.paths, self.kinds)
+
+    @classmethod
+    def get(cls, paths, kinds):
+        key = (paths, kinds)
+        layout = _layouts.get(key)
+        if layout is None:
+            layout = _layouts[key] = cls(paths, kinds)
+        return layout
+
+
+class CompactModelOutput:
+    """
+    Memory-lean copy of a ModelOutput, for keeping the outputs of many animals in memory.
+
+    Every number is stored in one array, `values`, with the dtype given (float32 halves the
+    memory used but keeps about 7 significant digits). Strings and dataframes are kept as
+    they are. Outputs with the same variables share the layout that maps names to positions,
+    so each CompactModelOutput only stores its values.
+
+    The categories of ModelOutput (Inputs, Intakes, Requirements, ...) are available as
+    attributes, but are rebuilt as dictionaries each time they are used. Use `get_value` or
+    `get_values` to read individual outputs and `to_model_output` to get a ModelOutput back.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = nd.CompiledFeedLibrary(pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv"))
+
+    herd = [nd.CompactModelOutput.from_model_output(
+                nd.execute_model(user_diet, {**animal_input, 'An_BW': An_BW}, equation_selection,
+                                 feed_library, nd.coeff_dict.copy()),
+                dtype='float32')
+            for An_BW in range(550, 750, 50)]
+    [output.get_value('Mlk_Prod_comp') for output in herd]
+    herd[0].get_values(['An_MEIn', 'Trg_MEuse'])
+    herd[0].Production['milk']
+    ```
+    """
+    __slots__ = ('_layout', 'values', 'objects')
+
+    def __init__(self, layout, values, objects):
+        self._layout = layout
+        self.values = values
+        self.objects = objects
+
+    @classmethod
+    def from_model_output(cls, model_output, dtype='float64'):
+        """
+        Pack the outputs of a ModelOutput.
+
+        Parameters
+        ----------
+        model_output : ModelOutput
+            Output of `execute_model`.
+        dtype : str or np.dtype, optional
+            'float64' to store numbers exactly or 'float32' to use half the memory.
+
+        Returns
+        -------
+        CompactModelOutput
+        """
+        if not isinstance(model_output, ModelOutput):
+            raise TypeError(f"Expected a ModelOutput, got {type(model_output).__name__}")
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError(f"dtype must be float32 or float64, got {dtype}")
+        paths = []
+        kinds = []
+        numbers = []
+        objects = []
+        for category_name in ModelOutput.categories:
+            for path, value in _leaves(getattr(model_output, category_name), (category_name,)):
+                kind = _kind(value)
+                paths.append(path)
+                kinds.append(kind)
+                if kind in _number_kinds:
+                    numbers.append(value)
+                else:
+                    objects.append(value)
+        layout = _Layout.get(tuple(paths), tuple(kinds))
+        return cls(layout, np.array(numbers, dtype=dtype), tuple(objects))
+
+    def __repr__(self):
+        return f"CompactModelOutput({len(self.values)} {self.values.dtype} values, {len(self.objects)} objects)"
+
+    def __getattr__(self, name):
+        if name in ModelOutput.categories:
+            return self.__group((name,))
+        raise AttributeError(f"'CompactModelOutput' object has no attribute '{name}'")
+
+    def __value(self, kind, position):
+        if kind in _number_kinds:
+            return _number_kinds[kind](self.values[position])
+        return self.objects[position]
+
+    def __group(self, group_path):
+        group = {}
+        depth = len(group_path)
+        layout = self._layout
+        for path, kind, position in zip(layout.paths, layout.kinds, layout.positions):
+            if path[:depth] != group_path:
+                continue
+            dictionary = group
+            for key in path[depth:-1]:
+                dictionary = dictionary.setdefault(key, {})
+            dictionary[path[-1]] = self.__value(kind, position)
+        return group
+
+    def get_value(self, name):
+        """
+        Retrieve a value, dictionary or dataframe with a given name, as `ModelOutput.get_value`.
+
+        Parameters
+        ----------
+        name : str
+            Name of the output, group or category.
+
+        Returns
+        -------
+        float or int or str or dict or pd.DataFrame or None
+            The object with the given name, or None if not found.
+        """
+        entry = self._layout.index.get(name)
+        if entry is None:
+            return None
+        if entry[0] == 'group':
+            return self.__group(entry[1])
+        return self.__value(*entry)
+
+    def get_values(self, names):
+        """
+        Retrieve the values of a list of scalar outputs.
+
+        Parameters
+        ----------
+        names : list
+            Names of the outputs to retrieve.
+
+        Returns
+        -------
+        np.ndarray
+            The value of each output, in the same order as names.
+
+        Raises
+        ------
+        KeyError
+            If any of the names are not found.
+        """
+        index = self._layout.index
+        missing = [name for name in names if name not in index]
+        if missing:
+            raise KeyError(f"Variables not found in CompactModelOutput: {missing}")
+        entries = [index[name] for name in names]
+        if all(kind in _number_kinds for kind, _ in entries):
+            return self.values[[position for _, position in entries]].astype(float)
+        return np.array([self.get_value(name) for name in names], dtype=float)
+
+    def to_model_output(self):
+        """
+        Unpack the outputs into a ModelOutput.
+
+        Returns
+        -------
+        ModelOutput
+        """
+        return ModelOutput._from_categories({category_name: self.__group((category_name,))
+                                             for category_name in ModelOutput.categories})
+
+    @property
+    def nbytes(self):
+        """
+        Bytes used by the packed numbers.
+        """
+        return self.values.nbytes
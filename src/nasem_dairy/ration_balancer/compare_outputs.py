@@ -0,0 +1,337 @@
+# Compares two sets of model results variable by variable
+# Both sets are converted to a table with one row per result and one column per
+# scalar output or cell of a table output (e.g. 'diet_info[Corn silage].Fd_CP'),
+# aligned by row label and column name. Numeric columns are then
+# compared in blocks of columns as 2-D arrays, so the number of NumPy operations
+# doesn't depend on the number of results.
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.batch_model_output import BatchModelOutput
+from nasem_dairy.ration_balancer.batch_table import BatchTable
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput, ModelSnapshot
+from nasem_dairy.ration_balancer.result_sink import _result_row
+
+# Number of values compared at once, limits the memory used for many rows
+_block_values = 2 ** 22
+_summary_columns = ['n_diverged', 'max_abs_diff', 'max_rel_diff', 'row', 'reference', 'candidate']
+
+
+def _find_tables(category_dicts, table_type):
+    """
+    Name and value of every table output, each name only once (the first found, as in get_value).
+    """
+    tables = {}
+
+    def add_tables(dictionary):
+        for key, value in dictionary.items():
+            if isinstance(value, table_type):
+                tables.setdefault(key, value)
+        for value in dictionary.values():
+            if isinstance(value, dict):
+                add_tables(value)
+
+    for category_name in ModelOutput.categories:
+        add_tables(category_dicts.get(category_name, {}))
+    return tables
+
+
+def _table_cells(name, table):
+    """
+    Dictionary of the cells of a table output, e.g. {'diet_info[Corn silage].Fd_CP': 7.1}.
+
+    Rows are labelled by Feedstuff if the table has unique feeds, otherwise by the index.
+    """
+    if 'Feedstuff' in table.columns and table['Feedstuff'].is_unique:
+        labels = table['Feedstuff'].to_numpy()
+    else:
+        labels = table.index.to_numpy()
+    cells = {}
+    for column in table.columns:
+        values = table[column].to_numpy()
+        for label, value in zip(labels, values):
+            cells[f"{name}[{label}].{column}"] = value
+    return cells
+
+
+def _batch_table_cells(name, table):
+    """
+    Dictionary of the cells of a table output of a BatchModelOutput, with one value per animal.
+
+    The rows of every animal are put one after the other and pivoted to one column per cell, so the
+    Python loops depend on the number of cells and not on the number of animals. Missing cells
+    (e.g. a feed not in the diet of an animal) are NaN.
+    """
+    n_animals = len(table)
+    if table.is_ragged:
+        animal = np.repeat(np.arange(n_animals), np.diff(table.offsets))
+        index = np.asarray(table.index)
+        columns = table.columns
+    else:
+        animal = np.repeat(np.arange(n_animals), len(table.index))
+        index = np.tile(table.index, n_animals)
+        columns = {column: values.reshape(-1) for column, values in table.columns.items()}
+
+    labels = index
+    if 'Feedstuff' in columns:
+        feeds = np.asarray(columns['Feedstuff'])
+        repeated = pd.DataFrame({'animal': animal, 'feed': feeds}).duplicated().to_numpy()
+        unique_feeds = np.bincount(animal[repeated], minlength=n_animals) == 0
+        labels = np.where(unique_feeds[animal], feeds, index)
+    codes, unique_labels = pd.factorize(labels, use_na_sentinel=False)
+    present = np.zeros((n_animals, len(unique_labels)), dtype=bool)
+    present[animal, codes] = True
+    complete = present.all()
+
+    cells = {}
+    for column, values in columns.items():
+        values = np.asarray(values)
+        if complete:
+            pivot = np.empty(present.shape, dtype=values.dtype)
+        elif values.dtype.kind in 'biuf':
+            pivot = np.full(present.shape, np.nan)
+        else:
+            pivot = np.full(present.shape, np.nan, dtype=object)
+        pivot[animal, codes] = values
+        for position, label in enumerate(unique_labels):
+            cells[f"{name}[{label}].{column}"] = pivot[:, position]
+    return cells
+
+
+def _output_row(result):
+    """
+    Scalar outputs and the cells of the table outputs of one result.
+    """
+    row = _result_row(result)
+    if isinstance(result, ModelOutput):
+        tables = _find_tables({category_name: getattr(result, category_name)
+                               for category_name in ModelOutput.categories},
+                              pd.DataFrame)
+        for name, table in tables.items():
+            row.update(_table_cells(name, table))
+    return row
+
+
+def _to_frame(results):
+    """
+    DataFrame with one row per result and one column per scalar output or cell of a table output.
+    """
+    if isinstance(results, pd.DataFrame):
+        return results
+    if isinstance(results, BatchModelOutput):
+        frame = results.to_pandas()
+        tables = _find_tables({category_name: getattr(results, category_name)
+                               for category_name in ModelOutput.categories},
+                              BatchTable)
+        if not tables:
+            return frame
+        cells = pd.DataFrame({key: values for name, table in tables.items()
+                              for key, values in _batch_table_cells(name, table).items()}, index=frame.index)
+        return pd.concat([frame, cells.drop(columns=frame.columns.intersection(cells.columns))], axis=1)
+    if isinstance(results, (ModelOutput, ModelSnapshot, dict)):
+        return pd.DataFrame([_output_row(results)])
+    if isinstance(results, (list, tuple)):
+        return pd.DataFrame([_output_row(result) for result in results])
+    raise TypeError(f"Can't compare results of type {type(results).__name__}")
+
+
+def _is_numeric(column):
+    return pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column)
+
+
+class ComparisonReport:
+    """
+    Variables that differ between two sets of results, returned by `compare_outputs`.
+
+    Attributes
+    ----------
+    summary : pd.DataFrame
+        One row per diverged variable, indexed by name and sorted by max_rel_diff, with:
+
+        - n_diverged: number of rows outside the tolerance
+        - max_abs_diff, max_rel_diff: largest absolute and relative difference (relative to
+          the reference value), inf if only one of the values is NaN
+        - row: label of the row with the largest absolute difference
+        - reference, candidate: values in that row
+
+        For non-numeric variables (e.g. An_StatePhys) the differences are NaN.
+    diverged_rows : pd.Index
+        Labels of the rows with at least one diverged variable.
+    only_in_reference, only_in_candidate : list
+        Variables in one set of results but not the other.
+    rows_only_in_reference, rows_only_in_candidate : pd.Index
+        Rows in one set of results but not the other, these aren't compared.
+    n_rows, n_variables : int
+        Number of rows and variables compared.
+    """
+    def __init__(self, summary, diverged_rows, only_in_reference, only_in_candidate,
+                 rows_only_in_reference, rows_only_in_candidate, n_rows, n_variables):
+        self.summary = summary
+        self.diverged_rows = diverged_rows
+        self.only_in_reference = only_in_reference
+        self.only_in_candidate = only_in_candidate
+        self.rows_only_in_reference = rows_only_in_reference
+        self.rows_only_in_candidate = rows_only_in_candidate
+        self.n_rows = n_rows
+        self.n_variables = n_variables
+
+    @property
+    def equal(self):
+        """
+        True if no variable diverged and both sets have the same rows and variables.
+        """
+        return (self.summary.empty and not self.only_in_reference and not self.only_in_candidate
+                and self.rows_only_in_reference.empty and self.rows_only_in_candidate.empty)
+
+    def __bool__(self):
+        return self.equal
+
+    def __repr__(self):
+        lines = [f"ComparisonReport({self.n_rows} rows, {self.n_variables} variables compared, "
+                 f"{len(self.summary)} diverged in {len(self.diverged_rows)} rows)"]
+        if self.only_in_reference:
+            lines.append(f"Only in reference: {len(self.only_in_reference)} variables")
+        if self.only_in_candidate:
+            lines.append(f"Only in candidate: {len(self.only_in_candidate)} variables")
+        if len(self.rows_only_in_reference) or len(self.rows_only_in_candidate):
+            lines.append(f"Rows only in reference: {len(self.rows_only_in_reference)}, "
+                         f"only in candidate: {len(self.rows_only_in_candidate)}")
+        if not self.summary.empty:
+            lines.append(self.summary.head(10).to_string())
+        return '\n'.join(lines)
+
+
+def _compare_numeric(reference, candidate, atol, rtol):
+    """
+    Boolean array of the diverged values and the absolute differences, for 2-D arrays.
+    """
+    with np.errstate(invalid='ignore'):
+        abs_diff = np.abs(candidate - reference)
+        missing = np.isnan(abs_diff)
+        if missing.any():
+            # Two NaN or equal infinities are equal, NaN in only one array is the largest difference
+            same = (candidate[missing] == reference[missing]) | (np.isnan(candidate[missing])
+                                                                 & np.isnan(reference[missing]))
+            abs_diff[missing] = np.where(same, 0.0, np.inf)
+        diverged = abs_diff > atol + rtol * np.abs(reference)
+        if missing.any():
+            # The tolerance is NaN when only the reference is NaN
+            diverged[missing] = abs_diff[missing] > 0
+    return diverged, abs_diff
+
+
+def _max_rel_diff(abs_diff, reference):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(abs_diff == 0, 0.0,
+                        np.where(np.isinf(abs_diff), np.inf, abs_diff / np.abs(reference))).max()
+
+
+def compare_outputs(reference, candidate, atol=0.0, rtol=1e-9, on=None):
+    """
+    Compare the outputs in two sets of results, e.g. before and after upgrading nasem_dairy.
+
+    Results are aligned by variable name and by row: the index of DataFrames, the position of each
+    animal in a BatchModelOutput or a list. Table outputs of ModelOutputs and BatchModelOutputs (e.g.
+    diet_info, AA_values) are compared cell by cell, each cell being a variable named
+    'table[row].column', with the rows labelled by Feedstuff (e.g. 'diet_info[Corn silage].Fd_CP') or
+    by the index of the table (e.g. 'AA_values[Arg].Abs_AA_g'), so feeds added to or removed from a
+    diet are listed in only_in_reference and only_in_candidate.
+
+    Every output present in both is compared, a value diverges if
+    `abs(candidate - reference) > atol + rtol * abs(reference)` (as in `np.isclose`, with two NaN
+    being equal). Non-numeric outputs diverge if they aren't equal.
+
+    Parameters
+    ----------
+    reference, candidate : ModelOutput, ModelSnapshot, BatchModelOutput, pd.DataFrame, dict or list
+        The results to compare. A DataFrame has one row per result and one column per output
+        (e.g. from `read_results` or `BatchModelOutput.to_pandas`), a list has one ModelOutput,
+        ModelSnapshot or dict per result.
+    atol : float, optional
+        Absolute tolerance.
+    rtol : float, optional
+        Relative tolerance.
+    on : str or list, optional
+        Column(s) of both results to align the rows on, e.g. 'scenario', instead of the index.
+
+    Returns
+    -------
+    ComparisonReport
+        The diverged variables and how much they changed, see `ComparisonReport`.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    reference = nd.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    candidate = nd.execute_model(user_diet, {**animal_input, 'An_BW': 650}, equation_selection, feed_library)
+    report = nd.compare_outputs(reference, candidate, rtol=1e-6)
+    report.summary.head()
+    ```
+    """
+    reference = _to_frame(reference)
+    candidate = _to_frame(candidate)
+    if on is not None:
+        reference = reference.set_index(on)
+        candidate = candidate.set_index(on)
+    for name, results in (('reference', reference), ('candidate', candidate)):
+        if not results.index.is_unique:
+            raise ValueError(f"The rows of {name} are not unique, use on= to select the columns to align them on")
+
+    rows_only_in_reference = reference.index.difference(candidate.index)
+    rows_only_in_candidate = candidate.index.difference(reference.index)
+    if not reference.index.equals(candidate.index):
+        rows = reference.index.intersection(candidate.index, sort=False)
+        reference = reference.loc[rows]
+        candidate = candidate.loc[rows]
+
+    candidate_columns = set(candidate.columns)
+    reference_columns = set(reference.columns)
+    names = [name for name in reference.columns if name in candidate_columns]
+    only_in_reference = [name for name in reference.columns if name not in candidate_columns]
+    only_in_candidate = [name for name in candidate.columns if name not in reference_columns]
+    numeric = [name for name in names if _is_numeric(reference[name]) and _is_numeric(candidate[name])]
+    numeric_set = set(numeric)
+    other = [name for name in names if name not in numeric_set]
+
+    n_rows = len(reference)
+    any_diverged = np.zeros(n_rows, dtype=bool)
+    summary = {}
+    block_size = max(1, _block_values // max(n_rows, 1))
+    for start in range(0, len(numeric), block_size):
+        block = numeric[start:start + block_size]
+        reference_values = reference[block].to_numpy(dtype=float)
+        candidate_values = candidate[block].to_numpy(dtype=float)
+        diverged, abs_diff = _compare_numeric(reference_values, candidate_values, atol, rtol)
+        n_diverged = diverged.sum(axis=0)
+        if not n_diverged.any():
+            continue
+        any_diverged |= diverged.any(axis=1)
+        for position in np.flatnonzero(n_diverged):
+            worst = int(np.argmax(abs_diff[:, position]))
+            max_rel_diff = _max_rel_diff(abs_diff[:, position], reference_values[:, position])
+            summary[block[position]] = (int(n_diverged[position]), abs_diff[worst, position], max_rel_diff,
+                                        reference.index[worst], reference_values[worst, position],
+                                        candidate_values[worst, position])
+
+    for name in other:
+        reference_values = reference[name].to_numpy()
+        candidate_values = candidate[name].to_numpy()
+        diverged = ~((reference_values == candidate_values)
+                     | (pd.isna(reference_values) & pd.isna(candidate_values)))
+        if diverged.any():
+            any_diverged |= diverged
+            first = int(np.argmax(diverged))
+            summary[name] = (int(diverged.sum()), np.nan, np.nan, reference.index[first],
+                             reference_values[first], candidate_values[first])
+
+    summary = pd.DataFrame.from_dict(summary, orient='index', columns=_summary_columns)
+    summary = summary.sort_values(['max_rel_diff', 'n_diverged'], ascending=False, kind='stable')
+    summary.index.name = 'variable'
+    return ComparisonReport(summary, reference.index[any_diverged], only_in_reference, only_in_candidate,
+                            rows_only_in_reference, rows_only_in_candidate, n_rows, len(names))
@@ -0,0 +1,369 @@
+# Feed library prepared once so that the feed rows and the feed properties that
+# do not depend on intake are not recalculated for every diet
+import ast
+import collections
+import functools
+import importlib
+import inspect
+import pkgutil
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.ration_balancer_functions import check_coeffs_in_coeff_dict
+from nasem_dairy.NASEM_equations.nutrient_intakes import calculate_diet_info, calculate_feed_properties
+
+# Coefficients used by calculate_feed_properties, the compiled properties are
+# reused for any coeff_dict with the same values for these
+feed_property_coeffs = ['En_CP', 'En_FA', 'En_rOM', 'En_St', 'En_NDF',
+                        'KpFor', 'KpConc', 'refCPIn', 'fCPAdu', 'IntRUP',
+                        'Fd_dcrOM']
+
+AA_list = ['Arg', 'His', 'Ile', 'Leu', 'Lys', 'Met', 'Phe', 'Thr', 'Trp', 'Val']
+
+# Feed level columns that calculate_diet_data_initial weights by Fd_DMInp (Lines 255, 256)
+feed_columns_DMInp = ['ADF', 'NDF', 'For', 'ForNDF']
+
+# Feed level intakes (kg/d per kg DM of the feed) that calculate_diet_data_initial sums
+feed_columns_sum = [
+    'DMIn', 'DMIn_ClfLiq', 'DMIn_ClfFor', 'AFIn', 'NDFIn', 'ADFIn', 'LgIn',
+    'DigNDFIn_Base', 'ForWetIn', 'ForDryIn', 'PastIn', 'ForIn', 'ConcIn',
+    'NFCIn', 'StIn', 'WSCIn', 'CPIn', 'CPIn_ClfLiq', 'TPIn', 'NPNCPIn', 'NPNIn',
+    'NPNDMIn', 'CPAIn', 'CPBIn', 'CPCIn', 'RUPBIn', 'CFatIn', 'FAIn',
+    'FAhydrIn', 'C120In', 'C140In', 'C160In', 'C161In', 'C180In', 'C181tIn',
+    'C181cIn', 'C182In', 'C183In', 'OtherFAIn', 'AshIn', 'GEIn', 'DEIn_base',
+    'DEIn_base_ClfLiq', 'DEIn_base_ClfDry', 'DigStIn_Base', 'DigrOMtIn',
+    'idRUPIn', 'DigFAIn', 'RUPIn', 'CaIn', 'PIn', 'PinorgIn', 'PorgIn', 'NaIn',
+    'MgIn', 'MgIn_min', 'KIn', 'ClIn', 'SIn', 'CoIn', 'CrIn', 'CuIn', 'FeIn',
+    'IIn', 'MnIn', 'MoIn', 'SeIn', 'ZnIn', 'VitAIn', 'VitDIn', 'VitEIn',
+    'CholineIn', 'BiotinIn', 'NiacinIn', 'B_CaroteneIn',
+    *[f'Id{AA}RUPIn' for AA in AA_list],
+    *[f'Dig{FA}In' for FA in ['C120', 'C140', 'C160', 'C161', 'C180', 'C181t',
+                              'C181c', 'C182', 'C183', 'OtherFA']],
+    *[f'abs{micro}' for micro in ['CaIn', 'PIn', 'NaIn', 'KIn', 'ClIn', 'CoIn',
+                                  'CuIn', 'FeIn', 'MnIn', 'ZnIn']]
+]
+
+# calculate_diet_info calculates these from the Fd_DMIn in diet_info_initial,
+# which execute_model sets with the DMI given in animal_input, before the DMI
+# prediction in Step 2
+feed_columns_input_DMI = ['AFIn', 'DigStIn_Base', 'DigrOMtIn', 'DigFAIn']
+
+
+@functools.lru_cache(maxsize=None)
+def _required_coeffs():
+    """
+    Names of the coefficients used by each function in nasem_dairy.NASEM_equations.
+
+    Found from the source: the lists passed to check_coeffs_in_coeff_dict and the
+    constant keys read from coeff_dict, e.g. coeff_dict['En_CP'].
+    """
+    import nasem_dairy.NASEM_equations as equations
+
+    required = {}
+    for module_info in pkgutil.iter_modules(equations.__path__):
+        module = importlib.import_module(f"{equations.__name__}.{module_info.name}")
+        for function in ast.walk(ast.parse(inspect.getsource(module))):
+            if not isinstance(function, ast.FunctionDef):
+                continue
+            lists = {}
+            names = set()
+            for node in ast.walk(function):
+                if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                        and isinstance(node.targets[0], ast.Name) and isinstance(node.value, ast.List)):
+                    lists[node.targets[0].id] = [element.value for element in node.value.elts
+                                                 if isinstance(element, ast.Constant)]
+                elif (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+                        and node.value.id == 'coeff_dict' and isinstance(node.slice, ast.Constant)):
+                    names.add(node.slice.value)
+            for node in ast.walk(function):
+                if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                        and node.func.id == 'check_coeffs_in_coeff_dict' and len(node.args) == 2):
+                    argument = node.args[1]
+                    if isinstance(argument, ast.Name):
+                        names.update(lists.get(argument.id, []))
+                    elif isinstance(argument, ast.List):
+                        names.update(element.value for element in argument.elts
+                                     if isinstance(element, ast.Constant))
+            if names:
+                required[function.name] = tuple(sorted(names))
+    return required
+
+
+@functools.lru_cache(maxsize=None)
+def _diet_info_coeffs():
+    """
+    Names of the coefficients used by calculate_diet_info and the functions it calls.
+    """
+    required = _required_coeffs()
+    names = set()
+    visited = set()
+    to_visit = [calculate_diet_info]
+    while to_visit:
+        function = to_visit.pop()
+        if function in visited:
+            continue
+        visited.add(function)
+        names.update(required.get(function.__name__, ()))
+        for node in ast.walk(ast.parse(inspect.getsource(function))):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+                called = function.__globals__.get(node.func.id)
+                if inspect.isfunction(called):
+                    to_visit.append(called)
+    return tuple(sorted(names))
+
+
+def _intake_sums(per_kg, DMI, DMI_input):
+    """
+    Diet level sums of feed intakes from the intakes per kg DM of the diet.
+
+    per_kg is a dictionary of the columns of `CompiledFeedLibrary.get_feed_composition`
+    weighted by Fd_DMInp, a value or an array of one value per animal for each. Returns the
+    values calculate_diet_data_sums takes from the rows of diet_info.
+    """
+    diet_sums = {}
+    for col_name in feed_columns_DMInp:
+        diet_sums[f'Dt_{col_name}'] = per_kg[col_name]
+    diet_sums['Dt_ForDNDF48'] = per_kg['ForDNDF48']
+    for col_name in feed_columns_sum + ['DEIn_ClfLiq', 'MEIn_ClfLiq', 'NDFnfIn', 'ForNDFIn']:
+        intake = per_kg[col_name] * (DMI_input if col_name in feed_columns_input_DMI else DMI)
+        if col_name == 'DMIn':
+            diet_sums['Dt_DMInSum'] = intake
+        elif col_name.startswith('abs'):
+            diet_sums[f'Abs_{col_name[3:]}'] = intake
+        else:
+            diet_sums[f'Dt_{col_name}'] = intake
+    # Line 617, negative RUP intakes are set to 0 as in calculate_Dt_RUPIn
+    diet_sums['Dt_RUPIn'] = np.where(diet_sums['Dt_RUPIn'] < 0, 0, diet_sums['Dt_RUPIn'])
+    return diet_sums
+
+
+class CompiledFeedLibrary:
+    """
+    Feed library with cleaned feed names and cached feed properties.
+
+    The feed names are stripped of whitespace once and the feed properties that
+    do not depend on intake (e.g. Fd_GE, Fd_NFC, Fd_rOM, TT_dcFdNDF_Base,
+    Fd_DE_base, Fd_fHydr_FA; see `calculate_feed_properties`) are calculated
+    for every feed in the library the first time they are needed for an
+    An_StatePhys, Use_DNDF_IV and set of coefficients. They are stored as a
+    feeds x properties array, so a model run only has to select rows and scale
+    by Fd_DMIn.
+
+    The intakes per kg DM of each feed of a diet (see `get_feed_composition`) are
+    also kept for the most recently used feed lists, so the diet level sums of
+    diet_data can be calculated with one product of the proportion of each feed
+    (see `sum_diet_intakes`) instead of building diet_info.
+
+    A CompiledFeedLibrary can be used anywhere `feed_library_df` is passed to
+    `execute_model` or `execute_model_batch`.
+
+    Parameters
+    ----------
+    feed_library_df : pd.DataFrame
+        DataFrame containing the feed library data.
+
+    Attributes
+    ----------
+    feed_data : pd.DataFrame
+        The feed library with the 'Fd_Name' column renamed to 'Feedstuff', as returned by `get_feed_rows_feedlibrary`.
+    feedstuffs : list
+        Feedstuff name of each row of feed_data.
+    row_index : dict
+        Row number of each Feedstuff.
+    property_names : list
+        Names of the columns in the compiled property arrays.
+    max_compositions : int
+        Number of feed compositions kept, the least recently used is removed when there are more.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = nd.CompiledFeedLibrary(pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv"))
+
+    output = nd.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    feed_library.get_feed_properties(user_diet['Feedstuff'], 'Lactating Cow', 0, nd.coeff_dict)
+    ```
+    """
+    max_compositions = 256
+
+    def __init__(self, feed_library_df: pd.DataFrame):
+        self.feed_data = (
+            feed_library_df.assign(Fd_Name=lambda df: df['Fd_Name'].str.strip())
+            .rename(columns={'Fd_Name': 'Feedstuff'})
+            .pipe(lambda df: df[['Feedstuff'] + [col for col in df.columns if col != 'Feedstuff']])
+        )
+        self.feedstuffs = self.feed_data['Feedstuff'].tolist()
+        self.row_index = {}
+        for row, feed in enumerate(self.feedstuffs):
+            self.row_index.setdefault(feed, row)
+        self.property_names = []
+        self._feed_properties = {}
+        self._feed_compositions = collections.OrderedDict()
+
+    def __repr__(self):
+        return f"CompiledFeedLibrary({len(self.feedstuffs)} feeds, {len(self._feed_properties)} compiled property sets)"
+
+    def __len__(self):
+        return len(self.feedstuffs)
+
+    def get_feed_rows(self, feeds_to_get: list) -> pd.DataFrame:
+        """
+        Same as `get_feed_rows_feedlibrary`, without cleaning the names of every feed on each call.
+        """
+        rows = sorted({self.row_index[feed] for feed in feeds_to_get if feed in self.row_index})
+        return self.feed_data.iloc[rows]
+
+    def compile(self, An_StatePhys: str, Use_DNDF_IV: int, coeff_dict: dict) -> np.ndarray:
+        """
+        Feeds x properties array for every feed in the library, calculated on first use.
+        """
+        check_coeffs_in_coeff_dict(coeff_dict, feed_property_coeffs)
+        key = (An_StatePhys, int(Use_DNDF_IV), tuple(coeff_dict[name] for name in feed_property_coeffs))
+        if key not in self._feed_properties:
+            feed_properties = calculate_feed_properties(An_StatePhys, int(Use_DNDF_IV), self.feed_data, coeff_dict)
+            self.property_names = list(feed_properties.columns)
+            self._feed_properties[key] = feed_properties.to_numpy(dtype=float)
+        return self._feed_properties[key]
+
+    def get_feed_properties(self,
+                            feeds_to_get: list,
+                            An_StatePhys: str,
+                            Use_DNDF_IV: int,
+                            coeff_dict: dict
+                            ) -> pd.DataFrame:
+        """
+        Feed properties for a list of feeds.
+
+        Parameters
+        ----------
+        feeds_to_get : list
+            Feed names, can be repeated. Feeds not in the library get missing values.
+        An_StatePhys : str
+            Physiological state of the animal.
+        Use_DNDF_IV : int
+            Equation selection for NDF digestibility.
+        coeff_dict : dict
+            Dictionary containing coefficients for the model.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per feed in feeds_to_get (in the same order) and one column per property.
+        """
+        feed_properties = self.compile(An_StatePhys, Use_DNDF_IV, coeff_dict)
+        rows = np.array([self.row_index.get(feed, -1) for feed in feeds_to_get], dtype=int)
+        values = feed_properties[rows]
+        values[rows == -1] = np.nan
+        return pd.DataFrame(values, columns=self.property_names)
+
+    def get_feed_composition(self,
+                             feedstuffs: list,
+                             An_StatePhys: str,
+                             Use_DNDF_IV: int,
+                             coeff_dict: dict
+                             ) -> pd.DataFrame:
+        """
+        Feed level intakes for 1 kg DM of each feed.
+
+        Every Fd_ intake that is summed into diet_data is proportional to Fd_DMIn,
+        so running calculate_diet_info with Fd_DMIn = 1 gives a feeds x nutrients
+        table that can be scaled by the kg DM of each feed eaten. The table is kept
+        for the feed list, An_StatePhys, Use_DNDF_IV and the coefficients used by
+        calculate_diet_info.
+
+        TT_dcFdFA replaces the FA digestibility of every feed when any feed in the
+        list is missing Fd_dcFA (Lines 1252-1254), so the composition is only valid
+        for diets with the same feeds.
+
+        Parameters
+        ----------
+        feedstuffs : list
+            Feed names, without repeats.
+        An_StatePhys : str
+            Physiological state of the animal.
+        Use_DNDF_IV : int
+            Equation selection for NDF digestibility.
+        coeff_dict : dict
+            Dictionary containing coefficients for the model.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per feed, indexed by Feedstuff, and one column per intake. Missing values are 0.
+        """
+        key = (tuple(feedstuffs), An_StatePhys, int(Use_DNDF_IV),
+               tuple(coeff_dict[name] for name in _diet_info_coeffs()))
+        composition = self._feed_compositions.get(key)
+        if composition is not None:
+            self._feed_compositions.move_to_end(key)
+            return composition
+
+        feed_data = self.get_feed_rows(feedstuffs)
+        missing_feeds = set(feedstuffs) - set(feed_data['Feedstuff'])
+        if missing_feeds:
+            raise ValueError(f"Feeds not found in feed library: {sorted(missing_feeds)}")
+        diet_info_initial = (
+            pd.DataFrame({'Feedstuff': list(feedstuffs)})
+            .assign(Fd_DMInp=1.0, Fd_DMIn=1.0)
+            .merge(feed_data, how='left', on='Feedstuff')
+        )
+        feed_properties = self.get_feed_properties(diet_info_initial['Feedstuff'],
+                                                   An_StatePhys,
+                                                   Use_DNDF_IV,
+                                                   coeff_dict)
+        diet_info = calculate_diet_info(1.0,
+                                        An_StatePhys,
+                                        Use_DNDF_IV,
+                                        diet_info=diet_info_initial,
+                                        coeff_dict=coeff_dict,
+                                        feed_properties=feed_properties)
+        composition = {col_name: diet_info[f'Fd_{col_name}'].to_numpy()
+                       for col_name in feed_columns_DMInp + feed_columns_sum}
+        # Products of feed level columns that are summed in calculate_diet_data_initial
+        composition['DEIn_ClfLiq'] = (diet_info['Fd_DE_ClfLiq'] * diet_info['Fd_DMIn_ClfLiq']).to_numpy()
+        composition['MEIn_ClfLiq'] = (diet_info['Fd_ME_ClfLiq'] * diet_info['Fd_DMIn_ClfLiq']).to_numpy()
+        composition['ForDNDF48'] = ((1 - diet_info['Fd_Conc'] / 100) * diet_info['Fd_NDF'] *
+                                    diet_info['Fd_DNDF48'] / 100).to_numpy()
+        composition['NDFnfIn'] = (diet_info['Fd_NDFnf'] / 100 * diet_info['Fd_DMIn']).to_numpy()
+        composition['ForNDFIn'] = (diet_info['Fd_ForNDF'] / 100 * diet_info['Fd_DMIn']).to_numpy()
+        # pandas .sum() skips missing values, which is the same as adding 0
+        composition = pd.DataFrame(composition, index=diet_info['Feedstuff']).fillna(0)
+
+        self._feed_compositions[key] = composition
+        while len(self._feed_compositions) > self.max_compositions:
+            self._feed_compositions.popitem(last=False)
+        return composition
+
+    def sum_diet_intakes(self,
+                         diet_info: pd.DataFrame,
+                         DMI: float,
+                         An_StatePhys: str,
+                         Use_DNDF_IV: int,
+                         coeff_dict: dict
+                         ) -> dict:
+        """
+        Same as `calculate_diet_data_sums`, from the composition of each feed instead of diet_info.
+
+        diet_info is diet_info_initial in execute_model: the diet merged with the feed rows, with
+        Fd_DMInp and the Fd_DMIn calculated with the DMI given in animal_input. Feeds that are not
+        in the library add nothing, as their missing values are skipped by calculate_diet_data_sums.
+        Calves are not supported, the calf feed calculations use the liquid feed intake of the diet.
+
+        Returns
+        -------
+        dict
+            The values that `calculate_diet_data_from_sums` takes.
+        """
+        feedstuffs = diet_info['Feedstuff'].tolist()
+        known_feeds = [feed for feed in dict.fromkeys(feedstuffs) if feed in self.row_index]
+        composition = self.get_feed_composition(known_feeds, An_StatePhys, Use_DNDF_IV, coeff_dict)
+        nutrient_matrix = composition.reindex(feedstuffs, fill_value=0)
+        per_kg = diet_info['Fd_DMInp'].to_numpy(dtype=float) @ nutrient_matrix.to_numpy()
+        return _intake_sums(dict(zip(nutrient_matrix.columns, per_kg)),
+                            DMI,
+                            diet_info['Fd_DMIn'].sum())
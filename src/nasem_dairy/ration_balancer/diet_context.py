@@ -0,0 +1,216 @@
+# Composition of one diet (e.g. the TMR of a pen) calculated once per kg DM
+# Every column of diet_info is either the same for any intake or proportional to
+# it, so the model can be run for many animals eating the same diet by scaling
+# the composition by each animal's DMI instead of running calculate_diet_info.
+import collections
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary, _diet_info_coeffs
+from nasem_dairy.NASEM_equations.nutrient_intakes import calculate_diet_info, calculate_feed_properties
+
+
+def _diet_info_initial(user_diet, feed_data, DMI):
+    # The same as diet_info_initial in execute_model
+    return (
+        user_diet
+        .assign(
+            Fd_DMInp = lambda df: df['kg_user'] / df['kg_user'].sum(),
+            Fd_DMIn = lambda df: df['Fd_DMInp'] * DMI
+            )
+        .merge(feed_data, how='left', on='Feedstuff')
+    )
+
+
+class _Composition:
+    """
+    diet_info for 1 kg DM of each feed, split into the columns taken from diet_info_initial,
+    the columns that don't depend on intake and those proportional to the intake of their feed.
+    """
+    __slots__ = ('columns', 'inputs', 'constant', 'scaled_names', 'per_kg', 'scale_by_initial')
+
+    def __init__(self, initial, base, final_weighted, initial_weighted, weights):
+        """
+        base is diet_info for 1 kg DM of each feed (Fd_DMInp and the Fd_DMIn of diet_info_initial),
+        final_weighted and initial_weighted have one of these multiplied by weights, a different
+        number for each feed. initial is diet_info_initial, without the intakes.
+        """
+        inputs = []
+        constant = []
+        scaled = []
+        scale_by_initial = []
+        weights = weights[:, None]
+        for name in base.columns:
+            values = base[name]
+            if name == 'Fd_DMInp':
+                continue
+            if name in initial.columns and name != 'Fd_DMIn':
+                if all(frame[name].equals(initial[name]) for frame in (base, final_weighted, initial_weighted)):
+                    inputs.append(name)
+                    continue
+            if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                if not (values.equals(final_weighted[name]) and values.equals(initial_weighted[name])):
+                    raise ValueError(f"{name} changes with intake")
+                constant.append(name)
+                continue
+            values = values.to_numpy(dtype=float)[:, None]
+            final = final_weighted[name].to_numpy(dtype=float)[:, None]
+            initial_values = initial_weighted[name].to_numpy(dtype=float)[:, None]
+            if _same(final, values) and _same(initial_values, values):
+                constant.append(name)
+            elif _same(final, weights * values) and _same(initial_values, values):
+                scaled.append(name)
+                scale_by_initial.append(False)
+            elif _same(initial_values, weights * values) and _same(final, values):
+                scaled.append(name)
+                scale_by_initial.append(True)
+            else:
+                raise ValueError(f"{name} is not proportional to the intake of the feed")
+        self.columns = base.columns
+        self.inputs = inputs + ['Fd_DMInp']
+        self.constant = base[constant].reset_index(drop=True)
+        self.scaled_names = scaled
+        self.per_kg = base[scaled].to_numpy(dtype=float)
+        self.scale_by_initial = np.array(scale_by_initial, dtype=bool)
+
+    def diet_info(self, diet_info, DMI):
+        """
+        Same as `calculate_diet_info(DMI, ..., diet_info)` for diet_info_initial with the same feeds.
+        """
+        intake = diet_info['Fd_DMInp'].to_numpy(dtype=float)[:, None] * DMI
+        intake_initial = diet_info['Fd_DMIn'].to_numpy(dtype=float)[:, None]
+        scaled = pd.DataFrame(self.per_kg * np.where(self.scale_by_initial, intake_initial, intake),
+                              columns=self.scaled_names, index=diet_info.index)
+        return pd.concat([diet_info[self.inputs], self.constant.set_axis(diet_info.index), scaled],
+                         axis=1)[self.columns]
+
+
+def _feed_composition(diet_info_initial, An_StatePhys, Use_DNDF_IV, coeff_dict, feed_properties=None):
+    """
+    _Composition of the feeds in diet_info_initial (in execute_model), None if a column of diet_info
+    is not either the same for any intake or proportional to the intake of its feed.
+
+    This is checked by calculating diet_info with a different intake for every feed, as the calf feed
+    calculations use the liquid feed intake of the whole diet.
+    """
+    if feed_properties is None:
+        feed_properties = calculate_feed_properties(An_StatePhys, Use_DNDF_IV, diet_info_initial, coeff_dict)
+    ones = np.ones(len(diet_info_initial))
+    weights = np.arange(2.0, len(diet_info_initial) + 2)
+
+    def diet_info(Fd_DMInp, Fd_DMIn):
+        return calculate_diet_info(1.0, An_StatePhys, Use_DNDF_IV, diet_info_initial.assign(Fd_DMInp=Fd_DMInp,
+                                                                                             Fd_DMIn=Fd_DMIn),
+                                   coeff_dict, feed_properties)
+    try:
+        return _Composition(diet_info_initial, diet_info(ones, ones), diet_info(weights, ones),
+                            diet_info(ones, weights), weights)
+    except ValueError:
+        return None
+
+
+def _same(a, b):
+    return np.allclose(a, b, rtol=1e-12, atol=0.0, equal_nan=True)
+
+
+class DietContext(CompiledFeedLibrary):
+    """
+    Feed library that also keeps the composition per kg DM of one diet, e.g. the TMR fed to a pen.
+
+    Every column of `diet_info` (the per feed table calculated by `calculate_diet_info`) either
+    doesn't depend on intake (e.g. Fd_CP, Fd_DE_base) or is proportional to DMI (e.g. Fd_DMIn,
+    Fd_CPIn, Fd_DigNDFIn_Base). A DietContext calculates diet_info once for 1 kg DM and, when
+    `execute_model` is run with it as `feed_library_df` and the same diet, scales the intake
+    columns by the animal's DMI instead of calculating diet_info again. This is most of the
+    time of a model run, so many animals on the same diet are evaluated several times faster.
+    The rest of the model (diet_data, digestibility, requirements, ...) is calculated for each
+    animal as usual, as those are not proportional to intake.
+
+    Which columns are proportional to intake is checked when the composition is first
+    calculated for an An_StatePhys, Use_DNDF_IV and set of coefficients, by calculating
+    diet_info for 1 kg DM of each feed and for a different intake of each feed. Results are
+    the same as with a feed library, up to rounding (about 1e-15 relative). Diets with other feeds or proportions are calculated as usual, so
+    a DietContext can be used as a `CompiledFeedLibrary` for any diet.
+
+    Parameters
+    ----------
+    user_diet : pd.DataFrame
+        The diet, with 'Feedstuff' and 'kg_user' columns. Only the proportion of each feed is
+        used, so the same diet can be given for any amount fed.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary
+        DataFrame containing the feed library data.
+
+    Attributes
+    ----------
+    user_diet : pd.DataFrame
+        Copy of the diet.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    pen = nd.DietContext(user_diet, feed_library)
+    cows = [{**animal_input, 'An_BW': An_BW, 'DMI': DMI}
+            for An_BW, DMI in [(600, 22.5), (650, 24.0), (700, 25.5)]]
+    [nd.execute_model(user_diet, cow, equation_selection, pen).get_value('Mlk_Prod_comp') for cow in cows]
+    ```
+    """
+    def __init__(self, user_diet: pd.DataFrame, feed_library_df: pd.DataFrame):
+        if isinstance(feed_library_df, CompiledFeedLibrary):
+            # The feed library is already cleaned, only the caches are separate
+            self.feed_data = feed_library_df.feed_data
+            self.feedstuffs = feed_library_df.feedstuffs
+            self.row_index = feed_library_df.row_index
+            self.property_names = []
+            self._feed_properties = {}
+            self._feed_compositions = collections.OrderedDict()
+        else:
+            super().__init__(feed_library_df)
+        self.user_diet = user_diet.copy()
+        self._diet_feeds = user_diet['Feedstuff'].tolist()
+        self._feed_rows = self.get_feed_rows(self._diet_feeds)
+        self._proportions = (user_diet['kg_user'] / user_diet['kg_user'].sum()).to_numpy(dtype=float)
+        self._compositions = {}
+
+    def __repr__(self):
+        return (f"DietContext({len(self._diet_feeds)} feeds in the diet, {len(self.feedstuffs)} in the library, "
+                f"{len(self._compositions)} compositions)")
+
+    def is_same_diet(self, diet_info: pd.DataFrame) -> bool:
+        """
+        True if diet_info (diet_info_initial in execute_model) has the feeds and proportions of this diet.
+        """
+        return (diet_info['Feedstuff'].tolist() == self._diet_feeds and
+                _same(diet_info['Fd_DMInp'].to_numpy(dtype=float), self._proportions))
+
+    def __composition(self, An_StatePhys, Use_DNDF_IV, coeff_dict):
+        key = (An_StatePhys, int(Use_DNDF_IV), tuple(coeff_dict[name] for name in _diet_info_coeffs()))
+        if key not in self._compositions:
+            diet_info_initial = _diet_info_initial(self.user_diet, self._feed_rows, 1.0)
+            feed_properties = self.get_feed_properties(diet_info_initial['Feedstuff'], An_StatePhys,
+                                                       Use_DNDF_IV, coeff_dict)
+            feed_properties.index = diet_info_initial.index
+            # None when any column isn't proportional to intake, diet_info is then calculated for each animal
+            self._compositions[key] = _feed_composition(diet_info_initial, An_StatePhys, Use_DNDF_IV, coeff_dict,
+                                                        feed_properties)
+        return self._compositions[key]
+
+    def calculate_diet_info(self, DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict, feed_properties=None):
+        """
+        Same as `calculate_diet_info`, scaled from the composition per kg DM when diet_info is this diet.
+
+        diet_info is diet_info_initial in execute_model, its Fd_DMIn is calculated with the DMI given
+        in animal_input, which can be different from the DMI used by the model (see DMIn_eqn).
+        """
+        composition = None
+        if self.is_same_diet(diet_info):
+            composition = self.__composition(An_StatePhys, Use_DNDF_IV, coeff_dict)
+        if composition is None:
+            return calculate_diet_info(DMI, An_StatePhys, Use_DNDF_IV, diet_info, coeff_dict, feed_properties)
+        return composition.diet_info(diet_info, DMI)
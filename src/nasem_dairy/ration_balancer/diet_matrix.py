@@ -0,0 +1,193 @@
+# Sparse representation of many diets, used to calculate diet level sums for
+# many animals with one matrix product instead of a DataFrame per diet
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary
+
+
+class DietMatrix:
+    """
+    Compressed sparse row (CSR) matrix of the kg of each feed fed to each animal.
+
+    Each row is an animal (or a diet) and each column is a Feedstuff, normally
+    the rows of the feed library. Only the non-zero kg values are stored, so a
+    herd of animals fed a few feeds each from a large feed library stays small.
+
+    Attributes
+    ----------
+    indptr : np.ndarray
+        Row `i` is stored in `indices[indptr[i]:indptr[i + 1]]` and `data[indptr[i]:indptr[i + 1]]`.
+    indices : np.ndarray
+        Column (Feedstuff) number of each stored value.
+    data : np.ndarray
+        Stored kg values.
+    feedstuffs : list
+        Feedstuff name of each column.
+    index : pd.Index
+        Label of each row.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    diets = nd.DietMatrix.from_user_diets({'TMR': user_diet}, feed_library_df=feed_library)
+    diets.take([0, 0, 0]).shape
+    ```
+    """
+    def __init__(self, indptr, indices, data, feedstuffs, index=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.data = np.asarray(data, dtype=float)
+        self.feedstuffs = list(feedstuffs)
+        n_rows = len(self.indptr) - 1
+        self.index = pd.RangeIndex(n_rows) if index is None else pd.Index(index)
+        if len(self.index) != n_rows:
+            raise ValueError(f"index has {len(self.index)} labels but DietMatrix has {n_rows} rows")
+
+    def __repr__(self):
+        return f"DietMatrix({self.shape[0]} rows x {self.shape[1]} feeds, {self.nnz} stored values)"
+
+    @property
+    def shape(self):
+        return (len(self.indptr) - 1, len(self.feedstuffs))
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def row_ids(self):
+        """
+        Row number of each stored value.
+        """
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    @classmethod
+    def from_user_diets(cls, user_diets, feed_library_df=None):
+        """
+        Build a DietMatrix with one row per user_diet.
+
+        Parameters
+        ----------
+        user_diets : dict or list
+            user_diet DataFrames with 'Feedstuff' and 'kg_user' columns. Dictionary keys are used as the row index.
+        feed_library_df : pd.DataFrame or CompiledFeedLibrary, optional
+            If given, the columns are the feeds in the feed library (in the same order) and feeds
+            not in the library raise a ValueError. Otherwise the columns are the feeds found in user_diets.
+
+        Returns
+        -------
+        DietMatrix
+        """
+        if isinstance(user_diets, dict):
+            index, user_diets = list(user_diets.keys()), list(user_diets.values())
+        else:
+            index = None
+        if isinstance(feed_library_df, CompiledFeedLibrary):
+            feedstuffs = feed_library_df.feedstuffs
+        elif feed_library_df is not None:
+            feedstuffs = feed_library_df['Fd_Name'].str.strip().tolist()
+        else:
+            feedstuffs = list(dict.fromkeys(feed for user_diet in user_diets
+                                            for feed in user_diet['Feedstuff']))
+        column_numbers = {feed: column for column, feed in enumerate(feedstuffs)}
+
+        indptr = [0]
+        indices = []
+        data = []
+        for user_diet in user_diets:
+            kg_user = user_diet.groupby('Feedstuff', sort=False)['kg_user'].sum()
+            kg_user = kg_user[kg_user != 0]
+            missing_feeds = set(kg_user.index) - set(column_numbers)
+            if missing_feeds:
+                raise ValueError(f"Feeds not found in feed library: {sorted(missing_feeds)}")
+            indices.extend(column_numbers[feed] for feed in kg_user.index)
+            data.extend(kg_user.to_numpy())
+            indptr.append(len(indices))
+        return cls(indptr, indices, data, feedstuffs, index)
+
+    @classmethod
+    def from_dataframe(cls, kg_user: pd.DataFrame):
+        """
+        Build a DietMatrix from a DataFrame of kg with one column per Feedstuff.
+        Missing values are treated as 0.
+        """
+        values = kg_user.fillna(0).to_numpy(dtype=float)
+        rows, columns = np.nonzero(values)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=values.shape[0]))])
+        return cls(indptr, columns, values[rows, columns], kg_user.columns, kg_user.index)
+
+    def take(self, rows):
+        """
+        New DietMatrix with the given row numbers, which can be repeated.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        row_lengths = np.diff(self.indptr)[rows]
+        indptr = np.concatenate([[0], np.cumsum(row_lengths)])
+        # Position of each stored value of the new rows in the current arrays
+        positions = (np.repeat(self.indptr[rows] - indptr[:-1], row_lengths)
+                     + np.arange(indptr[-1]))
+        return DietMatrix(indptr, self.indices[positions], self.data[positions],
+                          self.feedstuffs, self.index[rows])
+
+    def row_sums(self):
+        return np.bincount(self.row_ids, weights=self.data, minlength=self.shape[0])
+
+    def proportions(self):
+        """
+        New DietMatrix where each row sums to 1, i.e. Fd_DMInp.
+        """
+        return DietMatrix(self.indptr, self.indices, self.data / np.repeat(self.row_sums(), np.diff(self.indptr)),
+                          self.feedstuffs, self.index)
+
+    def used_feeds(self):
+        """
+        Boolean array, True for columns with any non-zero value.
+        """
+        return np.bincount(self.indices, minlength=self.shape[1]) > 0
+
+    def any_nonzero(self, columns):
+        """
+        Boolean array, True for rows with a non-zero value in any of the columns.
+
+        Parameters
+        ----------
+        columns : np.ndarray
+            Boolean array with one value per column.
+        """
+        return np.bincount(self.row_ids, weights=np.asarray(columns)[self.indices],
+                           minlength=self.shape[0]) > 0
+
+    def dot(self, values):
+        """
+        Matrix product with a (feeds x nutrients) array, returns a (rows x nutrients) array.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            1 or 2 dimensional array with one row per column of the DietMatrix.
+        """
+        values = np.asarray(values, dtype=float)
+        row_ids = self.row_ids
+        if values.ndim == 1:
+            return np.bincount(row_ids, weights=self.data * values[self.indices], minlength=self.shape[0])
+        result = np.empty((self.shape[0], values.shape[1]))
+        # One nutrient at a time keeps memory to the number of stored values
+        for column in range(values.shape[1]):
+            result[:, column] = np.bincount(row_ids, weights=self.data * values[self.indices, column],
+                                            minlength=self.shape[0])
+        return result
+
+    def toarray(self):
+        result = np.zeros(self.shape)
+        result[self.row_ids, self.indices] = self.data
+        return result
+
+    def to_dataframe(self):
+        return pd.DataFrame(self.toarray(), index=self.index, columns=self.feedstuffs)
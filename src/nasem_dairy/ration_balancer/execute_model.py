@@ -1,6 +1,10 @@
 import pandas as pd
-from nasem_dairy.ration_balancer.ModelOutput import ModelOutput
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput, ModelSnapshot
 from nasem_dairy.ration_balancer.ration_balancer_functions import get_feed_rows_feedlibrary #, check_coeffs_in_coeff_dict, read_csv_input, read_infusion_input
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary
+from nasem_dairy.ration_balancer.coeff_overlay import CoeffOverlay
+from nasem_dairy.ration_balancer.diet_context import DietContext
+from nasem_dairy.ration_balancer.model_graph import ModelGraph
 from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
 from nasem_dairy.NASEM_equations.DMI_equations import (
     calculate_Kb_LateGest_DMIn,
@@ -51,6 +55,7 @@ from nasem_dairy.NASEM_equations.milk_equations import (
 from nasem_dairy.NASEM_equations.nutrient_intakes import (
     calculate_diet_info,
     calculate_diet_data_initial,
+    calculate_diet_data_from_sums,
     calculate_diet_data_complete
 )
 
@@ -332,7 +337,9 @@ def execute_model(user_diet: pd.DataFrame,
                   feed_library_df: pd.DataFrame, 
                   coeff_dict: dict = coeff_dict,
                   infusion_input: dict = infusion_dict,
-                  MP_NP_efficiency_input: dict = MP_NP_efficiency_dict
+                  MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+                  outputs: list = None,
+                  capture: str = 'full'
                   ):
     """
     Run the NASEM (National Academies of Sciences, Engineering, and Medicine) Nutrient Requirements of Dairy Cattle model.
@@ -345,25 +352,41 @@ def execute_model(user_diet: pd.DataFrame,
         Dictionary containing animal-specific input values.
     equation_selection : dict
         Dictionary containing equation selection criteria.
-    feed_library_df : pd.DataFrame
-        DataFrame containing the feed library data.
-    coeff_dict : dict, optional
-        Dictionary containing coefficients for the model, by default `nd.coeff_dict`.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary or DietContext
+        DataFrame containing the feed library data. A `CompiledFeedLibrary` reuses the feed properties
+        that do not depend on intake between runs, a `DietContext` also reuses the composition of its diet.
+    coeff_dict : dict or CoeffOverlay, optional
+        Dictionary containing coefficients for the model, by default `nd.coeff_dict`. It is not changed,
+        the 'LCT' for the animal's age is stored in a `CoeffOverlay` for the run, so one coeff_dict can be
+        used by runs in several threads.
     infusion_input : dict, optional
         Dictionary containing infusion input data, by default `nd.infusion_dict`.
     MP_NP_efficiency_input : dict, optional
         Dictionary containing amino acid conversion efficiencies, by default `nd.MP_NP_efficiency_dict`.
+    outputs : list, optional
+        Names of model variables to calculate. Only the calculations these depend on are run
+        and a dictionary of their values is returned instead of a ModelOutput.
+    capture : str, optional
+        How much of the output to keep, everything else is freed when the function returns:
+        'full' (default) returns a ModelOutput with every variable, 'requirements' a ModelOutput with
+        only the Requirements, Efficiencies and Miscellaneous categories, the An_data, energy and protein
+        Intakes and the milk Production group, and 'snapshot' a ModelSnapshot record of the snapshot variables.
 
     Returns
     -------
     Multiple
         Currently returns animal_input, diet_info, equation_selection, diet_data, AA_values, infusion_data, An_data, model_out_dict
         To be updated
+        If outputs is given, a dictionary with the value of each output.
+        If capture is 'snapshot', a ModelSnapshot.
 
     Notes
     -----
     - user_diet, animal_input an equation_selection can be generated from a CSV file using nd.read_csv_input
     - The default feed_library_df can be read from NASEM_feed_library.csv
+    - When outputs are given, `nd.model_graph.plan(outputs)` lists the statements that are run. If the outputs
+      don't need diet_info and feed_library_df is a CompiledFeedLibrary, the diet sums are calculated from the
+      composition of each feed instead of diet_info, which is most of the time of a model run
     
     Examples
     --------
@@ -379,6 +402,26 @@ def execute_model(user_diet: pd.DataFrame,
     )
     ```
     """
+    if capture not in ('snapshot', 'requirements', 'full'):
+        raise ValueError(f"capture must be 'snapshot', 'requirements' or 'full', got {capture!r}")
+    if outputs is not None and capture != 'full':
+        raise ValueError("outputs and capture can't be used together")
+    if capture == 'snapshot':
+        outputs = ModelSnapshot._fields
+    if outputs is not None:
+        # Only run the statements that the outputs depend on, see ModelGraph
+        values = model_graph.evaluate(outputs,
+                                      user_diet=user_diet,
+                                      animal_input=animal_input,
+                                      equation_selection=equation_selection,
+                                      feed_library_df=feed_library_df,
+                                      coeff_dict=coeff_dict,
+                                      infusion_input=infusion_input,
+                                      MP_NP_efficiency_input=MP_NP_efficiency_input)
+        if capture == 'snapshot':
+            return ModelSnapshot(*(float(values[name]) for name in ModelSnapshot._fields))
+        return values
+
     ########################################
     # Step 1: Read User Input
     ########################################
@@ -387,9 +430,12 @@ def execute_model(user_diet: pd.DataFrame,
     animal_input = animal_input.copy()
 
     # retrieve user's feeds from feed library
-    feed_data = get_feed_rows_feedlibrary(
-        feeds_to_get=user_diet['Feedstuff'].tolist(), 
-        feed_lib_df=feed_library_df)
+    if isinstance(feed_library_df, CompiledFeedLibrary):
+        feed_data = feed_library_df.get_feed_rows(user_diet['Feedstuff'].tolist())
+    else:
+        feed_data = get_feed_rows_feedlibrary(
+            feeds_to_get=user_diet['Feedstuff'].tolist(), 
+            feed_lib_df=feed_library_df)
 
     # Calculate Fd_DMInp (percentage inclusion as sum of kg_user column)
     # Then, use the percentages to calculate the DMIn for each ingredient, and merge feed data on
@@ -442,7 +488,8 @@ def execute_model(user_diet: pd.DataFrame,
     Rsrv_NPgain = calculate_Rsrv_NPgain(NPGain_RsrvGain,
                                            Rsrv_Gain_empty)
 
-    coeff_dict['LCT'] = adjust_LCT(animal_input['An_AgeDay'])
+    # LCT depends on age, it's kept in a layer for this run so coeff_dict isn't changed
+    coeff_dict = CoeffOverlay({'LCT': adjust_LCT(animal_input['An_AgeDay'])}, coeff_dict)
     animal_input['Trg_BWgain'] = calculate_Trg_BWgain(animal_input['Trg_FrmGain'],
                                       animal_input['Trg_RsrvGain'])
 
@@ -651,11 +698,31 @@ def execute_model(user_diet: pd.DataFrame,
     Fe_rOMend = calculate_Fe_rOMend(animal_input['DMI'],
                                        coeff_dict)
 
-    diet_info = calculate_diet_info(animal_input['DMI'],
-                                       animal_input['An_StatePhys'],
-                                       equation_selection['Use_DNDF_IV'],
-                                       diet_info=diet_info_initial,
-                                       coeff_dict=coeff_dict)
+    # Feed properties that do not depend on intake are cached by CompiledFeedLibrary
+    if isinstance(feed_library_df, CompiledFeedLibrary):
+        feed_properties = feed_library_df.get_feed_properties(diet_info_initial['Feedstuff'],
+                                                              animal_input['An_StatePhys'],
+                                                              equation_selection['Use_DNDF_IV'],
+                                                              coeff_dict)
+        feed_properties.index = diet_info_initial.index
+    else:
+        feed_properties = None
+
+    # A DietContext scales the composition of its diet by DMI instead of calculating it again
+    if isinstance(feed_library_df, DietContext):
+        diet_info = feed_library_df.calculate_diet_info(animal_input['DMI'],
+                                                        animal_input['An_StatePhys'],
+                                                        equation_selection['Use_DNDF_IV'],
+                                                        diet_info=diet_info_initial,
+                                                        coeff_dict=coeff_dict,
+                                                        feed_properties=feed_properties)
+    else:
+        diet_info = calculate_diet_info(animal_input['DMI'],
+                                           animal_input['An_StatePhys'],
+                                           equation_selection['Use_DNDF_IV'],
+                                           diet_info=diet_info_initial,
+                                           coeff_dict=coeff_dict,
+                                           feed_properties=feed_properties)
     # All equations in the f dataframe go into calculate_diet_info()
     # This includes micronutrient calculations which are no longer handled by seperate functions
 
@@ -1629,6 +1696,47 @@ def execute_model(user_diet: pd.DataFrame,
     # Capture Outputs
     ########################################
     locals_dict = locals()
-    output = ModelOutput(locals_input=locals_dict)
+    output = ModelOutput(locals_input=locals_dict, capture=capture)
     
     return output
+
+
+# Dependency graph of the calculations in execute_model, used when outputs are given
+model_graph = ModelGraph(execute_model)
+
+# Outputs that don't need diet_info get the sums of diet_data_initial from the composition
+# of each feed kept by a CompiledFeedLibrary. Calves use the full calculation, as their feed
+# calculations depend on the liquid feed intake of the whole diet
+model_graph.add_shortcut("""
+if isinstance(feed_library_df, CompiledFeedLibrary) and animal_input['An_StatePhys'] != 'Calf':
+    diet_data_initial = calculate_diet_data_from_sums(
+        feed_library_df.sum_diet_intakes(diet_info_initial,
+                                         animal_input['DMI'],
+                                         animal_input['An_StatePhys'],
+                                         equation_selection['Use_DNDF_IV'],
+                                         coeff_dict),
+        animal_input['DMI'],
+        animal_input['An_BW'],
+        animal_input['An_StatePhys'],
+        An_DMIn_BW,
+        animal_input['An_AgeDryFdStart'],
+        animal_input['Env_TempCurr'],
+        equation_selection['DMIn_eqn'],
+        Fe_rOMend,
+        coeff_dict)
+else:
+    diet_data_initial = calculate_diet_data_initial(calculate_diet_info(animal_input['DMI'],
+                                                                        animal_input['An_StatePhys'],
+                                                                        equation_selection['Use_DNDF_IV'],
+                                                                        diet_info=diet_info_initial,
+                                                                        coeff_dict=coeff_dict),
+                                                    animal_input['DMI'],
+                                                    animal_input['An_BW'],
+                                                    animal_input['An_StatePhys'],
+                                                    An_DMIn_BW,
+                                                    animal_input['An_AgeDryFdStart'],
+                                                    animal_input['Env_TempCurr'],
+                                                    equation_selection['DMIn_eqn'],
+                                                    Fe_rOMend,
+                                                    coeff_dict)
+""", replaces=['feed_properties', 'diet_info', 'diet_data_initial'])
@@ -0,0 +1,596 @@
+# Vectorized, herd-scale version of execute_model
+# Runs the statements of execute_model (see ModelGraph) with NumPy arrays of one
+# value per animal in animal_input. Equations that only accept scalars are called
+# once per animal, and the few statements that work on one diet or on the amino
+# acid table of one animal are replaced by the batch versions below.
+import collections.abc
+import functools
+import types
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.diet_matrix import DietMatrix
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary, AA_list, _intake_sums
+from nasem_dairy.ration_balancer.coeff_overlay import CoeffOverlay
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.execute_model import execute_model, model_graph
+from nasem_dairy.NASEM_equations.DMI_equations import (
+    calculate_Dt_DMIn_BW_LateGest_i,
+    calculate_Dt_DMIn_BW_LateGest_p,
+    calculate_Dt_DMIn_Heif_LateGestInd,
+    calculate_Dt_DMIn_Heif_LateGestPen,
+    calculate_Dt_NDFdev_DMI,
+    calculate_Dt_DMIn_Heif_NRCa,
+    calculate_Dt_DMIn_Heif_NRCad,
+    calculate_Dt_DMIn_Heif_H1,
+    calculate_Dt_DMIn_Heif_H2,
+    calculate_Dt_DMIn_Heif_HJ1,
+    calculate_Dt_DMIn_Heif_HJ2,
+    calculate_Dt_DMIn_Lact1,
+    calculate_Dt_DMIn_DryCow1_FarOff,
+    calculate_Dt_DMIn_DryCow1_Close,
+    calculate_Dt_DMIn_DryCow2
+)
+from nasem_dairy.NASEM_equations.nutrient_intakes import calculate_diet_data_from_sums
+from nasem_dairy.NASEM_equations.amino_acid_equations import (
+    calculate_Du_AAMic,
+    calculate_Du_IdAAMic,
+    calculate_mPrtmx_AA2,
+    calculate_mPrt_k_AA
+)
+
+
+# Equations that use if/else or the math module, called once per animal. They are
+# replaced in the namespace the statements of execute_model run in and in the
+# globals of the wrappers in _array_wrappers
+_scalar_equations = [
+    'adjust_LCT',
+    'calculate_An_PostPartDay',
+    'calculate_Kb_LateGest_DMIn',
+    'calculate_An_PrePartWklim',
+    'calculate_TT_dcNDF_Base',
+    'calculate_TT_dcSt_Base',
+    'calculate_Dt_acMg',
+    'calculate_Uter_Wt',
+    'calculate_GrUter_Wt',
+    'calculate_Uter_BWgain',
+    'calculate_GrUter_BWgain',
+    'calculate_An_GutFill_BW',
+    'calculate_Rum_dcNDF',
+    'calculate_Rum_dcSt',
+    'calculate_RDPIn_MiNmax',
+    'calculate_Du_MiN_NRC2021_g',
+    'calculate_Frm_Gain_empty',
+    'calculate_FatGain_FrmGain',
+    'calculate_Min_MPuse_g',
+    'calculate_Frm_MPUse_g_Trg',
+    'calculate_Rsrv_MPUse_g_Trg',
+    'calculate_Body_MPUse_g_Trg',
+    'calculate_Gest_MPUse_g_Trg',
+    'calculate_mPrt_k_EAA2'
+]
+
+# Wrappers called by execute_model that call equations in _scalar_equations
+_array_wrappers = ['calculate_An_data_initial']
+
+
+def _elementwise(func):
+    """
+    Wrap an equation that only accepts scalars (uses if/else or the math module)
+    so it can be called with one array element per animal.
+
+    Dictionaries such as coeff_dict with array values (one value per animal)
+    are split into one dictionary per animal.
+    """
+    vectorized = np.vectorize(func, otypes=[float])
+
+    @functools.wraps(func)
+    def call(*args):
+        return vectorized(*[_split_dict(arg) if isinstance(arg, collections.abc.Mapping) else arg
+                            for arg in args])
+    return call
+
+
+def _split_dict(values):
+    """
+    Array of dictionaries, one per animal, with the array values of values split
+    between them. A dictionary without array values is returned as a 0-d array so
+    np.vectorize passes it to every call unchanged.
+    """
+    array_values = {key: value for key, value in values.items()
+                    if isinstance(value, np.ndarray) and value.ndim == 1}
+    if not array_values:
+        split = np.empty((), dtype=object)
+        split[()] = values
+        return split
+    n_animals = len(next(iter(array_values.values())))
+    split = np.empty(n_animals, dtype=object)
+    for i in range(n_animals):
+        split[i] = CoeffOverlay({key: value[i] for key, value in array_values.items()}, values)
+    return split
+
+
+def _with_array_equations(func):
+    """
+    Copy of func that calls the _elementwise versions of the equations in _scalar_equations.
+    """
+    array_globals = dict(func.__globals__)
+    array_globals.update({name: _elementwise(func.__globals__[name])
+                          for name in _scalar_equations if name in func.__globals__})
+    return functools.update_wrapper(types.FunctionType(func.__code__, array_globals, func.__name__,
+                                                       func.__defaults__, func.__closure__), func)
+
+
+@functools.lru_cache(maxsize=None)
+def _array_namespace():
+    """
+    Module namespace of execute_model with the array versions of the scalar equations and wrappers.
+    """
+    namespace = dict(execute_model.__globals__)
+    namespace.update({name: _elementwise(namespace[name]) for name in _scalar_equations if name in namespace})
+    namespace.update({name: _with_array_equations(namespace[name]) for name in _array_wrappers})
+    return namespace
+
+
+def _sum_diet_intakes(Fd_DMInp, DMI, DMI_input, feed_library, An_StatePhys, Use_DNDF_IV, coeff_dict):
+    """
+    Diet level sums of feed intakes for each animal.
+
+    Fd_DMInp is a DietMatrix of the proportion of DM from each feed, one row per
+    animal. Returns a dictionary of arrays, one value per animal, with the same
+    values calculate_diet_data_sums takes from the rows of diet_info.
+    """
+    feeds_used = Fd_DMInp.used_feeds()
+    feedstuffs = [feed for feed, used in zip(Fd_DMInp.feedstuffs, feeds_used) if used]
+    # TT_dcFdFA replaces the FA digestibility of every feed when any feed in
+    # the diet is missing Fd_dcFA (Lines 1252-1254), so diets with and without
+    # these feeds need their own feed composition
+    feed_dcFA = (feed_library.get_feed_rows(feedstuffs)
+                 .set_index('Feedstuff')
+                 .reindex(feedstuffs)['Fd_dcFA'])
+    missing_dcFA = np.zeros(Fd_DMInp.shape[1], dtype=bool)
+    missing_dcFA[feeds_used] = feed_dcFA.isna().to_numpy()
+    diet_missing_dcFA = Fd_DMInp.any_nonzero(missing_dcFA)
+
+    Dt_per_kg = None
+    for missing, rows in ((False, ~diet_missing_dcFA), (True, diet_missing_dcFA)):
+        if not rows.any():
+            continue
+        composition_feeds = feedstuffs if missing else feed_dcFA.index[feed_dcFA.notna()].tolist()
+        composition = feed_library.get_feed_composition(composition_feeds, An_StatePhys, Use_DNDF_IV, coeff_dict)
+        # feeds x nutrients, with a row of zeros for every feed in the DietMatrix that is not used
+        nutrient_matrix = composition.reindex(Fd_DMInp.feedstuffs, fill_value=0)
+        if Dt_per_kg is None:
+            Dt_per_kg = np.zeros((Fd_DMInp.shape[0], nutrient_matrix.shape[1]))
+            composition_columns = nutrient_matrix.columns
+        if rows.all():
+            Dt_per_kg = Fd_DMInp.dot(nutrient_matrix.to_numpy())
+        else:
+            Dt_per_kg[rows] = Fd_DMInp.take(np.flatnonzero(rows)).dot(nutrient_matrix.to_numpy())
+
+    return _intake_sums(dict(zip(composition_columns, Dt_per_kg.T)), DMI, DMI_input)
+
+
+########################################
+# Batch versions of execute_model statements
+########################################
+# Each takes the namespace the statements run in, the DietMatrix of Fd_DMInp and
+# the CompiledFeedLibrary, and assigns the same names as the statement it replaces
+
+def _batch_Dt_NDF(namespace, Fd_DMInp, feed_library):
+    feedstuffs = [feed for feed, used in zip(Fd_DMInp.feedstuffs, Fd_DMInp.used_feeds()) if used]
+    feed_NDF = (feed_library.get_feed_rows(feedstuffs)
+                .set_index('Feedstuff')['Fd_NDF']
+                .reindex(Fd_DMInp.feedstuffs)
+                .fillna(0)
+                .to_numpy())
+    namespace['Dt_NDF'] = Fd_DMInp.dot(feed_NDF)
+
+
+def _batch_DMI(namespace, Fd_DMInp, feed_library):
+    """
+    DMI prediction of Step 2, with np.where in place of the if statements on An_PrePartWk.
+    """
+    animal_input = namespace['animal_input']
+    coeff_dict = namespace['coeff_dict']
+    Dt_NDF = namespace['Dt_NDF']
+    An_PrePartWklim = namespace['An_PrePartWklim']
+    An_PrePartWkDurat = namespace['An_PrePartWkDurat']
+    Kb_LateGest_DMIn = namespace['Kb_LateGest_DMIn']
+    late_gestation = animal_input['An_PrePartWk'] > An_PrePartWkDurat
+    # The DMI given in animal_input is used for the feed intakes in calculate_diet_info, see feed_columns_input_DMI
+    namespace['DMI_input'] = animal_input['DMI']
+
+    heifer_DMI_eqn = {
+        2: lambda: _elementwise(calculate_Dt_DMIn_Heif_NRCa)(animal_input['An_BW'], animal_input['An_BW_mature']),
+        3: lambda: _elementwise(calculate_Dt_DMIn_Heif_NRCad)(animal_input['An_BW'], animal_input['An_BW_mature'], Dt_NDF),
+        4: lambda: _elementwise(calculate_Dt_DMIn_Heif_H1)(animal_input['An_BW']),
+        5: lambda: _elementwise(calculate_Dt_DMIn_Heif_H2)(animal_input['An_BW'], calculate_Dt_NDFdev_DMI(animal_input['An_BW'], Dt_NDF)),
+        6: lambda: _elementwise(calculate_Dt_DMIn_Heif_HJ1)(animal_input['An_BW']),
+        7: lambda: _elementwise(calculate_Dt_DMIn_Heif_HJ2)(animal_input['An_BW'], calculate_Dt_NDFdev_DMI(animal_input['An_BW'], Dt_NDF))
+    }
+    DMIn_eqn = namespace['equation_selection']['DMIn_eqn']
+    if DMIn_eqn == 0:
+        pass
+    elif DMIn_eqn == 8:
+        animal_input['DMI'] = _elementwise(calculate_Dt_DMIn_Lact1)(animal_input['Trg_MilkProd'],
+                                                                    animal_input['An_BW'],
+                                                                    animal_input['An_BCS'],
+                                                                    animal_input['An_LactDay'],
+                                                                    animal_input['An_Parity_rl'],
+                                                                    namespace['Trg_NEmilk_Milk'])
+    elif DMIn_eqn in [2, 3, 4, 5, 6, 7]:
+        # Individual Heifer DMI Predictions
+        Dt_DMIn_BW_LateGest_i = calculate_Dt_DMIn_BW_LateGest_i(An_PrePartWklim, Kb_LateGest_DMIn, coeff_dict)
+        Dt_DMIn_Heif_LateGestInd = calculate_Dt_DMIn_Heif_LateGestInd(animal_input['An_BW'], Dt_DMIn_BW_LateGest_i)
+        Dt_DMIn_Heif = heifer_DMI_eqn[DMIn_eqn]()
+        animal_input['DMI'] = np.where(late_gestation, np.minimum(Dt_DMIn_Heif, Dt_DMIn_Heif_LateGestInd), Dt_DMIn_Heif)
+        namespace.update(Dt_DMIn_BW_LateGest_i=Dt_DMIn_BW_LateGest_i,
+                         Dt_DMIn_Heif_LateGestInd=Dt_DMIn_Heif_LateGestInd)
+    elif DMIn_eqn in [12, 13, 14, 15, 16, 17]:
+        # Group Heifer DMI Predictions
+        Dt_DMIn_BW_LateGest_p = calculate_Dt_DMIn_BW_LateGest_p(An_PrePartWkDurat, Kb_LateGest_DMIn, coeff_dict)
+        Dt_DMIn_Heif_LateGestPen = calculate_Dt_DMIn_Heif_LateGestPen(animal_input['An_BW'], Dt_DMIn_BW_LateGest_p)
+        Dt_DMIn_Heif = heifer_DMI_eqn[DMIn_eqn - 10]()
+        animal_input['DMI'] = np.where(late_gestation, np.minimum(Dt_DMIn_Heif, Dt_DMIn_Heif_LateGestPen), Dt_DMIn_Heif)
+        namespace.update(Dt_DMIn_BW_LateGest_p=Dt_DMIn_BW_LateGest_p,
+                         Dt_DMIn_Heif_LateGestPen=Dt_DMIn_Heif_LateGestPen)
+    elif DMIn_eqn == 10:
+        # Dry Cow DMI, NRC 2020
+        Dt_DMIn_BW_LateGest_i = calculate_Dt_DMIn_BW_LateGest_i(An_PrePartWklim, Kb_LateGest_DMIn, coeff_dict)
+        Dt_DMIn_BW_LateGest_p = calculate_Dt_DMIn_BW_LateGest_p(An_PrePartWkDurat, Kb_LateGest_DMIn, coeff_dict)
+        Dt_DMIn_DryCow1_FarOff = calculate_Dt_DMIn_DryCow1_FarOff(animal_input['An_BW'], Dt_DMIn_BW_LateGest_i)
+        Dt_DMIn_DryCow1_Close = calculate_Dt_DMIn_DryCow1_Close(animal_input['An_BW'], Dt_DMIn_BW_LateGest_p)
+        animal_input['DMI'] = np.where(late_gestation,
+                                       np.minimum(Dt_DMIn_DryCow1_FarOff, Dt_DMIn_DryCow1_Close),
+                                       Dt_DMIn_DryCow1_FarOff)
+        namespace.update(Dt_DMIn_BW_LateGest_i=Dt_DMIn_BW_LateGest_i,
+                         Dt_DMIn_BW_LateGest_p=Dt_DMIn_BW_LateGest_p)
+    elif DMIn_eqn == 11:
+        # Dry Cow DMI, Hayirli et al. 2003
+        animal_input['DMI'] = _elementwise(calculate_Dt_DMIn_DryCow2)(animal_input['An_BW'],
+                                                                      animal_input['An_GestDay'],
+                                                                      animal_input['An_GestLength'])
+    else:
+        # execute_model prints a message and keeps the DMI given, which would go unnoticed in a batch
+        raise ValueError(f"Invalid DMIn_eqn: {DMIn_eqn} was entered. Must choose 0, 2-8 or 10-17.")
+    animal_input['DMI'] = np.asarray(animal_input['DMI'], dtype=float)
+
+
+def _batch_diet_data_initial(namespace, Fd_DMInp, feed_library):
+    """
+    diet_data_initial from the DietMatrix, in place of diet_info for a single diet.
+    """
+    animal_input = namespace['animal_input']
+    equation_selection = namespace['equation_selection']
+    diet_sums = _sum_diet_intakes(Fd_DMInp,
+                                  animal_input['DMI'],
+                                  namespace['DMI_input'],
+                                  feed_library,
+                                  animal_input['An_StatePhys'],
+                                  equation_selection['Use_DNDF_IV'],
+                                  namespace['coeff_dict'])
+    namespace['diet_data_initial'] = _with_array_equations(calculate_diet_data_from_sums)(
+        diet_sums,
+        animal_input['DMI'],
+        animal_input['An_BW'],
+        animal_input['An_StatePhys'],
+        namespace['An_DMIn_BW'],
+        animal_input['An_AgeDryFdStart'],
+        animal_input['Env_TempCurr'],
+        equation_selection['DMIn_eqn'],
+        namespace['Fe_rOMend'],
+        namespace['coeff_dict'])
+
+
+class _AAValues(dict):
+    """
+    Batch version of the AA_values DataFrame: a dictionary of animals x AA values, either
+    DataFrames with one column per AA or arrays with AA as the last axis (e.g. mPrtmx_AA,
+    which is the same for every animal), with the same `.loc[AA, name]` lookup.
+    """
+    @property
+    def loc(self):
+        return _AALocator(self)
+
+
+class _AALocator:
+    def __init__(self, AA_values):
+        self.AA_values = AA_values
+
+    def __getitem__(self, key):
+        AA, name = key
+        values = self.AA_values[name]
+        if isinstance(values, pd.DataFrame):
+            return values[AA].to_numpy()
+        return np.asarray(values)[..., AA_list.index(AA)]
+
+
+def _batch_AA_values(namespace, Fd_DMInp, feed_library):
+    namespace['AA_values'] = _AAValues()
+
+
+def _batch_Du_AAMic(namespace, Fd_DMInp, feed_library):
+    Du_MiTP_g = np.asarray(namespace['Du_MiTP_g'])
+    namespace['AA_values']['Du_AAMic'] = pd.DataFrame(calculate_Du_AAMic(Du_MiTP_g[:, None],
+                                                                         AA_list,
+                                                                         namespace['coeff_dict']),
+                                                      columns=AA_list)
+
+
+def _batch_Du_IdAAMic(namespace, Fd_DMInp, feed_library):
+    AA_values = namespace['AA_values']
+    AA_values['Du_IdAAMic'] = pd.DataFrame(calculate_Du_IdAAMic(AA_values['Du_AAMic'].to_numpy(),
+                                                                namespace['coeff_dict']),
+                                           columns=AA_list)
+
+
+def _batch_Abs_AA_g(namespace, Fd_DMInp, feed_library):
+    # Same as calculate_Abs_AA_g, with one row per animal
+    An_data = namespace['An_data']
+    infusion_data = namespace['infusion_data']
+    namespace['AA_values']['Abs_AA_g'] = pd.DataFrame({
+        AA: An_data[f'An_Id{AA}In'] + infusion_data[f'Inf_{AA}_g'] * infusion_data['Inf_Art']
+        for AA in AA_list
+    })
+
+
+def _batch_mPrtmx_AA2(namespace, Fd_DMInp, feed_library):
+    AA_values = namespace['AA_values']
+    AA_values['mPrtmx_AA2'] = calculate_mPrtmx_AA2(AA_values['mPrtmx_AA'],
+                                                   np.asarray(namespace['f_mPrt_max'])[..., None])
+
+
+def _batch_mPrt_k_AA(namespace, Fd_DMInp, feed_library):
+    AA_values = namespace['AA_values']
+    AA_values['mPrt_k_AA'] = pd.DataFrame(calculate_mPrt_k_AA(AA_values['mPrtmx_AA2'],
+                                                              AA_values['mPrt_AA_01'],
+                                                              AA_values['AA_mPrtmx']),
+                                          columns=AA_list)
+
+
+def _batch_Abs_EAA_g(namespace, Fd_DMInp, feed_library):
+    namespace['Abs_EAA_g'] = namespace['AA_values']['Abs_AA_g'].sum(axis=1).to_numpy()
+
+
+# Statements of execute_model that only work for one animal, found by a name (or
+# (dictionary, key) pair) they assign, and the batch version that replaces them.
+# None skips the statement.
+_replaced_statements = {
+    'user_diet': None,
+    'feed_data': None,
+    'diet_info_initial': None,
+    'Dt_NDF': _batch_Dt_NDF,
+    ('animal_input', 'DMI'): _batch_DMI,
+    'feed_properties': None,
+    'diet_info': None,
+    'diet_data_initial': _batch_diet_data_initial,
+    'AA_values': _batch_AA_values,
+    ('AA_values', 'Du_AAMic'): _batch_Du_AAMic,
+    ('AA_values', 'Du_IdAAMic'): _batch_Du_IdAAMic,
+    ('AA_values', 'Abs_AA_g'): _batch_Abs_AA_g,
+    ('AA_values', 'mPrtmx_AA2'): _batch_mPrtmx_AA2,
+    ('AA_values', 'mPrt_k_AA'): _batch_mPrt_k_AA,
+    'Abs_EAA_g': _batch_Abs_EAA_g
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _batch_statements():
+    """
+    The statements of execute_model, in order, with the ones in _replaced_statements
+    replaced. Each is either compiled code to run in the namespace or a batch function.
+    """
+    replaced_at = {}
+    statements = []
+    for node in model_graph.build():
+        targets = [target for target in _replaced_statements
+                   if target in node.binds or target in node.keyed]
+        if not targets:
+            statements.append(node.code)
+            continue
+        if len(targets) > 1 or targets[0] in replaced_at:
+            raise RuntimeError(f"execute_model_batch can't tell which statement of execute_model assigns {targets}")
+        replaced_at[targets[0]] = node.index
+        if _replaced_statements[targets[0]] is not None:
+            statements.append(_replaced_statements[targets[0]])
+    missing = [target for target in _replaced_statements if target not in replaced_at]
+    if missing:
+        raise RuntimeError(f"execute_model has no statement that assigns {missing}, "
+                           "update _replaced_statements in execute_model_batch")
+    return statements
+
+
+def _collect_outputs(n_animals, *namespaces):
+    """
+    Gather every numeric value from the namespaces that has one value per
+    animal (or a single value for the whole group) into a dictionary of arrays.
+    """
+    columns = {}
+    for namespace in namespaces:
+        for name, value in namespace.items():
+            if isinstance(value, (bool, str, collections.abc.Mapping, list, pd.DataFrame)) or callable(value):
+                continue
+            value = np.asarray(value)
+            if value.dtype.kind not in 'biuf' or value.ndim > 1:
+                continue
+            if value.ndim == 1 and value.shape[0] != n_animals:
+                continue
+            columns[name] = np.broadcast_to(value.astype(float), (n_animals,))
+    return columns
+
+
+def _execute_group(animal_input, Fd_DMInp, equation_selection, feed_library, coeff_dict, infusion_input, MP_NP_efficiency_input):
+    """
+    Run the statements of execute_model for a group of animals that share An_StatePhys.
+
+    animal_input is a dictionary of arrays, Fd_DMInp is a DietMatrix of the
+    proportion of dietary DM supplied by each feed, one row per animal.
+    """
+    n_animals = Fd_DMInp.shape[0]
+    namespace = dict(_array_namespace())
+    namespace.update(user_diet=None,
+                     animal_input=animal_input,
+                     equation_selection=equation_selection,
+                     feed_library_df=feed_library,
+                     coeff_dict=coeff_dict,
+                     infusion_input=infusion_input,
+                     MP_NP_efficiency_input=MP_NP_efficiency_input)
+    for statement in _batch_statements():
+        if isinstance(statement, types.CodeType):
+            exec(statement, namespace)
+        else:
+            statement(namespace, Fd_DMInp, feed_library)
+
+    AA_outputs = {f'{name}_{AA}': values[AA].to_numpy()
+                  for name, values in namespace['AA_values'].items() if isinstance(values, pd.DataFrame)
+                  for AA in AA_list}
+    # Variables assigned by the statements, not the equations and constants of the module
+    assigned = {name for node in model_graph.build() for name in node.binds} | {'DMI_input'}
+    model_locals = {name: namespace[name] for name in sorted(assigned)
+                    if name in namespace and name not in ['key', 'value', 'num_value']}
+    # LCT differs between animals, it's kept in the CoeffOverlay of the run
+    model_locals['LCT'] = namespace['coeff_dict']['LCT']
+    return _collect_outputs(n_animals,
+                            namespace['animal_input'],
+                            namespace['diet_data'],
+                            namespace['infusion_data'],
+                            namespace['An_data'],
+                            AA_outputs,
+                            model_locals)
+
+
+def _get_diet_proportions(animal_inputs, diets, feed_library):
+    """
+    Convert diets into a DietMatrix of the proportion of DM supplied by each
+    feed (Fd_DMInp), with one row per animal in animal_inputs.
+    """
+    if isinstance(diets, DietMatrix) and 'diet_id' not in animal_inputs.columns:
+        if diets.shape[0] != len(animal_inputs):
+            raise ValueError("Every animal in animal_inputs needs a row in the diet matrix")
+        kg_user = diets
+    elif isinstance(diets, pd.DataFrame):
+        if not animal_inputs.index.is_unique or not diets.index.is_unique:
+            raise ValueError("animal_inputs and the diet matrix need a unique index to match animals to diets")
+        kg_user = diets.reindex(animal_inputs.index)
+        if kg_user.isna().all(axis=1).any():
+            raise ValueError("Every animal in animal_inputs needs a row in the diet matrix")
+        kg_user = DietMatrix.from_dataframe(kg_user)
+    else:
+        if 'diet_id' not in animal_inputs.columns:
+            raise KeyError("animal_inputs needs a 'diet_id' column when diets is a dictionary of user_diet DataFrames")
+        if not isinstance(diets, DietMatrix):
+            diets = DietMatrix.from_user_diets(diets, feed_library)
+        missing_diets = set(animal_inputs['diet_id']) - set(diets.index)
+        if missing_diets:
+            raise KeyError(f"diet_id not found in diets: {sorted(missing_diets)}")
+        kg_user = diets.take(diets.index.get_indexer(animal_inputs['diet_id']))
+    if (kg_user.row_sums() <= 0).any():
+        raise ValueError("Every diet needs at least one feed with kg_user greater than 0")
+    Fd_DMInp = kg_user.proportions()
+    Fd_DMInp.index = animal_inputs.index
+    return Fd_DMInp
+
+
+
+def execute_model_batch(animal_inputs: pd.DataFrame,
+                        diets,
+                        equation_selection: dict,
+                        feed_library_df: pd.DataFrame,
+                        coeff_dict: dict = coeff_dict,
+                        infusion_input: dict = infusion_dict,
+                        MP_NP_efficiency_input: dict = MP_NP_efficiency_dict
+                        ) -> pd.DataFrame:
+    """
+    Run the NASEM model for many animals at once.
+
+    The statements of `execute_model` are run on NumPy arrays with one value per
+    animal, so a herd or a parameter sweep can be run without building a
+    ModelOutput for every animal.
+
+    Parameters
+    ----------
+    animal_inputs : pd.DataFrame
+        One row per animal with the same variables as `animal_input` in `execute_model` as columns.
+    diets : dict, pd.DataFrame or DietMatrix
+        Either a dictionary of user_diet DataFrames ('Feedstuff' and 'kg_user' columns) keyed by diet id,
+        in which case animal_inputs must have a 'diet_id' column, or a DataFrame of kg_user with one row
+        per animal (same index as animal_inputs) and one column per Feedstuff. A DietMatrix is used like
+        the dictionary when animal_inputs has a 'diet_id' column (matched to the DietMatrix index) and
+        otherwise must have one row per animal.
+    equation_selection : dict
+        Dictionary containing equation selection criteria, applied to every animal.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary
+        DataFrame containing the feed library data. A DataFrame is compiled once for the whole batch.
+    coeff_dict : dict, optional
+        Dictionary containing coefficients for the model, by default `nd.coeff_dict`.
+    infusion_input : dict, optional
+        Dictionary containing infusion input data, by default `nd.infusion_dict`.
+    MP_NP_efficiency_input : dict, optional
+        Dictionary containing amino acid conversion efficiencies, by default `nd.MP_NP_efficiency_dict`.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per animal (same index as animal_inputs) and one column per model variable.
+        Amino acid values are returned as one column per amino acid, e.g. 'Abs_AA_g_Met'.
+
+    Notes
+    -----
+    - Animals are evaluated in groups that share An_StatePhys
+    - Calves are not supported, as the calf feed calculations can only be run one diet at a time
+    - The LCT adjustment for each animal's age is returned as a column
+    - Results are matched to animals by position, so the index of animal_inputs can have duplicates
+      unless diets is a DataFrame, which is matched to animal_inputs by index
+    - An invalid DMIn_eqn raises a ValueError, execute_model keeps the DMI given in animal_input
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    herd = pd.DataFrame([animal_input] * 3).assign(diet_id='TMR', An_BW=[580, 625, 670])
+    results = nd.execute_model_batch(herd, {'TMR': user_diet}, equation_selection, feed_library)
+    results[['An_BW', 'An_MPIn_g', 'Mlk_Prod_comp']]
+    ```
+    """
+    equation_selection = {key: int(value) for key, value in equation_selection.items()}
+    if (animal_inputs['An_StatePhys'] == 'Calf').any():
+        raise ValueError("execute_model_batch does not support An_StatePhys 'Calf'")
+
+    if isinstance(feed_library_df, CompiledFeedLibrary):
+        feed_library = feed_library_df
+    else:
+        feed_library = CompiledFeedLibrary(feed_library_df)
+    Fd_DMInp = _get_diet_proportions(animal_inputs, diets, feed_library)
+
+    # Groups are taken by position, so animal_inputs can have duplicate index labels
+    states = animal_inputs['An_StatePhys'].to_numpy()
+    group_results = []
+    for An_StatePhys in pd.unique(states):
+        rows = np.flatnonzero(states == An_StatePhys)
+        group = animal_inputs.iloc[rows]
+        animal_input = {
+            name: (An_StatePhys if name == 'An_StatePhys'
+                   else group[name].to_numpy() if group[name].dtype == object
+                   else group[name].to_numpy(dtype=float))
+            for name in group.columns if name != 'diet_id'
+        }
+        columns = _execute_group(animal_input,
+                                 Fd_DMInp.take(rows),
+                                 equation_selection,
+                                 feed_library,
+                                 coeff_dict,
+                                 infusion_input,
+                                 MP_NP_efficiency_input)
+        group_results.append(pd.DataFrame(columns, index=rows))
+
+    results = pd.concat(group_results).sort_index()
+    results.index = animal_inputs.index
+    results.insert(0, 'An_StatePhys', states)
+    return results
@@ -0,0 +1,222 @@
+# Least-cost ration formulation
+# Searches for the cheapest proportions of a set of feeds that meet constraints on
+# model outputs. Many candidate diets are evaluated per iteration with
+# execute_model_batch (cross-entropy method), so no external solver is needed.
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.execute_model_batch import execute_model_batch
+
+# Default constraints, as {output: (lower, upper)}. Bounds are a number, the name
+# of another output or None. The NDF (% DM) and DCAD (meq/kg DM) limits are for
+# lactating cows, dry cows fed an anionic diet need a negative DCAD instead.
+ration_constraints = {
+    'An_MPIn_g': ('An_MPuse_g_Trg', None),
+    'An_MEIn': ('Trg_MEuse', None),
+    'Dt_NDF': (25, 40),
+    'An_DCADmeq': (100, 500),
+    **{f'An_{mineral}_bal': (0, None)
+       for mineral in ['Ca', 'P', 'Mg', 'Na', 'Cl', 'K', 'S', 'Co', 'Cu', 'I', 'Fe', 'Mn', 'Se', 'Zn']}
+}
+
+
+def _project_to_bounds(values, lower, upper):
+    """
+    Closest proportions to each row of values that sum to 1 and are within the bounds.
+    """
+    # Find the shift for each row that makes the clipped values sum to 1 by bisection
+    low = (values - upper).min(axis=1, keepdims=True)
+    high = (values - lower).max(axis=1, keepdims=True)
+    for _ in range(60):
+        shift = (low + high) / 2
+        total = np.clip(values - shift, lower, upper).sum(axis=1, keepdims=True)
+        low = np.where(total > 1, shift, low)
+        high = np.where(total > 1, high, shift)
+    return np.clip(values - (low + high) / 2, lower, upper)
+
+
+def _get_bound(results, bound):
+    if bound is None:
+        return None
+    if isinstance(bound, str):
+        return results[bound].to_numpy()
+    return np.full(len(results), float(bound))
+
+
+def _constraint_violation(results, constraints):
+    """
+    Sum of the relative amounts by which each candidate misses the constraints.
+    """
+    violation = np.zeros(len(results))
+    for name, (lower, upper) in constraints.items():
+        value = results[name].to_numpy()
+        for bound, sign in [(_get_bound(results, lower), 1), (_get_bound(results, upper), -1)]:
+            if bound is None:
+                continue
+            miss = np.maximum(sign * (bound - value), 0)
+            violation += np.where(np.isnan(value), np.inf, miss / np.maximum(np.abs(bound), 1))
+    return violation
+
+
+def formulate_least_cost_ration(animal_input: dict,
+                                feeds: pd.DataFrame,
+                                equation_selection: dict,
+                                feed_library_df: pd.DataFrame,
+                                coeff_dict: dict = coeff_dict,
+                                infusion_input: dict = infusion_dict,
+                                MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+                                constraints: dict = None,
+                                n_candidates: int = 200,
+                                max_iterations: int = 50,
+                                elite_fraction: float = 0.1,
+                                tolerance: float = 1e-4,
+                                seed: int = None
+                                ) -> dict:
+    """
+    Find the cheapest diet from a set of feeds that meets constraints on model outputs.
+
+    The proportion of each feed in the diet is searched with the cross-entropy
+    method: each iteration evaluates `n_candidates` diets with `execute_model_batch`
+    and the best diets (feasible diets by cost, then the others by how much they
+    miss the constraints) are used to draw the next candidates. The intake of each
+    feed is its proportion of the DMI used by the model (`animal_input['DMI']` or
+    the predicted DMI, depending on DMIn_eqn).
+
+    Parameters
+    ----------
+    animal_input : dict
+        Dictionary containing animal-specific input values.
+    feeds : pd.DataFrame
+        One row per allowed feed, with columns 'Feedstuff' (name in the feed library),
+        'price' (cost per kg DM) and, optionally, 'min' and 'max' (proportion of diet DM, 0 to 1).
+    equation_selection : dict
+        Dictionary containing equation selection criteria.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary
+        DataFrame containing the feed library data.
+    coeff_dict : dict, optional
+        Dictionary containing coefficients for the model, by default `nd.coeff_dict`.
+    infusion_input : dict, optional
+        Dictionary containing infusion input data, by default `nd.infusion_dict`.
+    MP_NP_efficiency_input : dict, optional
+        Dictionary containing amino acid conversion efficiencies, by default `nd.MP_NP_efficiency_dict`.
+    constraints : dict, optional
+        Limits on model outputs as {output: (lower, upper)}, where each bound is a number,
+        the name of another output or None. By default `nd.ration_constraints`:
+        An_MPIn_g >= An_MPuse_g_Trg, An_MEIn >= Trg_MEuse, 25 <= Dt_NDF <= 40, 100 <= An_DCADmeq <= 500
+        and every An_<mineral>_bal >= 0. Replace the NDF and DCAD limits for animals other than
+        lactating cows, e.g. `{**nd.ration_constraints, 'An_DCADmeq': (-150, -50)}` for a close-up dry cow.
+    n_candidates : int, optional
+        Number of diets evaluated per iteration.
+    max_iterations : int, optional
+        Maximum number of iterations.
+    elite_fraction : float, optional
+        Fraction of the candidates used to draw the next iteration.
+    tolerance : float, optional
+        The search stops when the spread of the proportions drawn is below this value.
+    seed : int, optional
+        Seed for the random number generator.
+
+    Returns
+    -------
+    dict
+        - 'user_diet': pd.DataFrame with 'Feedstuff' and 'kg_user' columns for the best diet
+        - 'cost': cost of the best diet per day
+        - 'feasible': True if the best diet meets every constraint
+        - 'constraints': pd.DataFrame with the value and bounds of each constrained output
+        - 'results': model outputs for the best diet (a row of execute_model_batch)
+        - 'iterations': number of iterations run
+        - 'n_evaluated': number of diets evaluated
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    # Salt and cobalt carbonate supply the Na and Co the other feeds lack
+    feeds = pd.DataFrame({
+        'Feedstuff': ['Corn silage, typical', 'Alfalfa meal', 'Canola meal',
+                      'Corn grain HM, coarse grind', 'VitTM Premix, generic',
+                      'Sodium chloride (salt)', 'Cobalt carbonate'],
+        'price': [0.08, 0.25, 0.40, 0.22, 2.0, 0.3, 5.0],
+        'max': [0.6, 0.4, 0.3, 0.4, 0.02, 0.01, 0.001]
+    })
+    constraints = {**nd.ration_constraints, 'Dt_NDF': (28, 36)}
+    ration = nd.formulate_least_cost_ration(animal_input, feeds, equation_selection, feed_library,
+                                            constraints=constraints, seed=1)
+    ration['feasible'], ration['cost']
+    ration['user_diet']
+    ```
+    """
+    constraints = ration_constraints if constraints is None else constraints
+    if not isinstance(feed_library_df, CompiledFeedLibrary):
+        feed_library_df = CompiledFeedLibrary(feed_library_df)
+    feedstuffs = feeds['Feedstuff'].str.strip().tolist()
+    missing_feeds = set(feedstuffs) - set(feed_library_df.row_index)
+    if missing_feeds:
+        raise ValueError(f"Feeds not found in feed library: {sorted(missing_feeds)}")
+    price = feeds['price'].to_numpy(dtype=float)
+    lower = feeds['min'].fillna(0).to_numpy(dtype=float) if 'min' in feeds.columns else np.zeros(len(feeds))
+    upper = feeds['max'].fillna(1).to_numpy(dtype=float) if 'max' in feeds.columns else np.ones(len(feeds))
+    if lower.sum() > 1 or upper.sum() < 1 or (lower > upper).any():
+        raise ValueError("The 'min' and 'max' proportions of the feeds can't add up to 1")
+
+    rng = np.random.default_rng(seed)
+    animal_inputs = pd.DataFrame([animal_input] * n_candidates)
+    n_elite = max(2, int(n_candidates * elite_fraction))
+    mean = _project_to_bounds(np.full((1, len(feeds)), 1 / len(feeds)), lower, upper)[0]
+    spread = np.maximum(upper - lower, 1e-3) / 4
+    best = None
+    n_evaluated = 0
+
+    for iteration in range(1, max_iterations + 1):
+        candidates = rng.normal(mean, spread, size=(n_candidates, len(feeds)))
+        candidates[0] = mean
+        if best is not None:
+            candidates[1] = best['proportions']
+        candidates = _project_to_bounds(candidates, lower, upper)
+        with np.errstate(all='ignore'):
+            results = execute_model_batch(animal_inputs,
+                                          pd.DataFrame(candidates, columns=feedstuffs),
+                                          equation_selection,
+                                          feed_library_df,
+                                          coeff_dict,
+                                          infusion_input,
+                                          MP_NP_efficiency_input)
+        n_evaluated += n_candidates
+        cost = candidates @ price * results['DMI'].to_numpy()
+        violation = _constraint_violation(results, constraints)
+        order = np.lexsort((cost, violation))
+        if best is None or (violation[order[0]], cost[order[0]]) < (best['violation'], best['cost']):
+            best = {'proportions': candidates[order[0]], 'violation': violation[order[0]],
+                    'cost': cost[order[0]], 'results': results.iloc[order[0]]}
+
+        elite = candidates[order[:n_elite]]
+        mean = 0.7 * elite.mean(axis=0) + 0.3 * mean
+        spread = 0.7 * elite.std(axis=0) + 0.3 * spread
+        if spread.max() < tolerance:
+            break
+
+    results = best['results']
+    DMI = results['DMI']
+    constraint_table = pd.DataFrame(
+        [(name, results[name],
+          results[lower_bound] if isinstance(lower_bound, str) else lower_bound,
+          results[upper_bound] if isinstance(upper_bound, str) else upper_bound)
+         for name, (lower_bound, upper_bound) in constraints.items()],
+        columns=['Output', 'Value', 'Lower', 'Upper']
+    )
+    return {
+        'user_diet': pd.DataFrame({'Feedstuff': feedstuffs, 'kg_user': best['proportions'] * DMI}),
+        'cost': best['cost'],
+        'feasible': bool(best['violation'] == 0),
+        'constraints': constraint_table,
+        'results': results,
+        'iterations': iteration,
+        'n_evaluated': n_evaluated
+    }
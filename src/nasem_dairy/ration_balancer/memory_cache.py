@@ -0,0 +1,263 @@
+# In-memory cache of the latest execute_model results, e.g. for a web app where
+# users switch between the same few diets and animals
+# Results are kept under a hash of the inputs (see result_cache), with the feeds
+# of the diet sorted, and the least recently used are dropped when there are more
+# than max_entries or they use more than about max_bytes. The cached results are
+# never returned, each call gets a copy so callers can't change them.
+import collections
+import hashlib
+import json
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput, ModelSnapshot
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.execute_model import execute_model
+from nasem_dairy.ration_balancer.result_cache import _canonical, _feed_rows
+
+
+def _copy_value(value):
+    if isinstance(value, dict):
+        return {key: _copy_value(item) for key, item in value.items()}
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return value.copy()
+    return value
+
+
+def _copy_result(result):
+    """
+    Copy of a result of execute_model that shares nothing that can be changed with it.
+    """
+    if isinstance(result, ModelOutput):
+        return ModelOutput._from_categories({category_name: _copy_value(getattr(result, category_name))
+                                             for category_name in ModelOutput.categories})
+    # A ModelSnapshot is a tuple of floats
+    return _copy_value(result)
+
+
+def _approximate_size(value):
+    """
+    Bytes used by a result, counting the containers and the values but not shared strings.
+    """
+    if isinstance(value, ModelOutput):
+        return sys.getsizeof(value) + sum(_approximate_size(getattr(value, category_name))
+                                          for category_name in ModelOutput.categories)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_approximate_size(item) for item in value.values())
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.flags.owndata else value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_approximate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class MemoryCache:
+    """
+    Least recently used cache of `execute_model` results in memory.
+
+    Meant for interactive use, e.g. a web app where each change of an input runs the model and
+    users often go back to a diet or animal they have already evaluated. `execute_model` returns
+    the result of an earlier run with the same inputs instead of running the model again, which
+    takes a few milliseconds instead of about 50.
+
+    Results are kept under a hash of the diet (with its feeds sorted), the feed library rows of the
+    feeds in the diet, the values of animal_input, equation_selection, coeff_dict, infusion_input and
+    MP_NP_efficiency_input and the outputs requested (see `ResultCache`, which keeps results on disk).
+    As the feeds are sorted, a diet with the same feeds and amounts in another order gets the result
+    of the first run, with the rows of diet_info in that order.
+
+    The cached results are never returned: each call gets its own copy, so changing a result (e.g.
+    adding a column to a dataframe) doesn't change the cache or the results of other calls. Results
+    that raise an error are not cached.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Number of results kept, by default 128.
+    max_bytes : int, optional
+        Approximate memory used by the results kept, by default 256 MiB. A full ModelOutput uses
+        about 60 KiB, an output dictionary or ModelSnapshot less than 1 KiB. A result larger than
+        max_bytes is not kept.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of results found and not found in the cache.
+    n_evicted : int
+        Number of results removed to keep the cache under max_entries and max_bytes.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = nd.CompiledFeedLibrary(pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv"))
+
+    cache = nd.MemoryCache(max_entries=32)
+    for An_BW in [600, 650, 600, 650]:
+        output = cache.execute_model(user_diet, {**animal_input, 'An_BW': An_BW}, equation_selection, feed_library)
+    cache.stats()
+    ```
+    """
+    def __init__(self, max_entries=128, max_bytes=2**28):
+        if max_entries <= 0 or max_bytes <= 0:
+            raise ValueError("max_entries and max_bytes must be positive")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.n_evicted = 0
+        self._lock = threading.Lock()
+        # key: (result, size), least recently used first
+        self._entries = collections.OrderedDict()
+        self._size = 0
+
+    def __repr__(self):
+        return (f"MemoryCache({len(self._entries)} of {self.max_entries} results, {self._size / 2**20:.1f} of "
+                f"{self.max_bytes / 2**20:.1f} MiB, {self.hits} hits, {self.misses} misses)")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def size(self):
+        """
+        Approximate bytes used by the cached results.
+        """
+        return self._size
+
+    @property
+    def hit_rate(self):
+        """
+        Fraction of lookups that found a result, NaN before the first lookup.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else float('nan')
+
+    def stats(self):
+        """
+        Hits, misses and size of the cache.
+
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, n_evicted, n_results and size (approximate bytes).
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate,
+                'n_evicted': self.n_evicted, 'n_results': len(self._entries), 'size': self._size}
+
+    def key(self,
+            user_diet: pd.DataFrame,
+            animal_input: dict,
+            equation_selection: dict,
+            feed_library_df: pd.DataFrame,
+            coeff_dict: dict = coeff_dict,
+            infusion_input: dict = infusion_dict,
+            MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+            outputs: list = None,
+            capture: str = 'full') -> str:
+        """
+        Fingerprint of the inputs of an `execute_model` run, the same for a diet with its feeds in another order.
+
+        Parameters are the same as `execute_model`.
+
+        Returns
+        -------
+        str
+            Hexadecimal SHA-256 digest.
+        """
+        user_diet = user_diet.sort_values(['Feedstuff', 'kg_user'], kind='stable')
+        inputs = {
+            'user_diet': user_diet,
+            'feed_rows': _feed_rows(user_diet, feed_library_df),
+            'animal_input': animal_input,
+            'equation_selection': equation_selection,
+            'coeff_dict': coeff_dict,
+            'infusion_input': infusion_input,
+            'MP_NP_efficiency_input': MP_NP_efficiency_input,
+            'outputs': None if outputs is None else list(outputs),
+            'capture': capture
+        }
+        text = json.dumps(_canonical(inputs), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        A copy of the result stored under key, or None if it isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # The stored results are never changed, so they can be copied without the lock
+        return _copy_result(entry[0])
+
+    def put(self, key, result):
+        """
+        Store a copy of a result of execute_model (ModelOutput, ModelSnapshot or dictionary of outputs) under key.
+        """
+        if not isinstance(result, (ModelOutput, ModelSnapshot, dict)):
+            raise TypeError(f"Can't cache a result of type {type(result).__name__}")
+        result = _copy_result(result)
+        size = _approximate_size(result)
+        with self._lock:
+            self.__forget(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (result, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.n_evicted += 1
+
+    def __forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def clear(self):
+        """
+        Remove every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def execute_model(self,
+                      user_diet: pd.DataFrame,
+                      animal_input: dict,
+                      equation_selection: dict,
+                      feed_library_df: pd.DataFrame,
+                      coeff_dict: dict = coeff_dict,
+                      infusion_input: dict = infusion_dict,
+                      MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+                      outputs: list = None,
+                      capture: str = 'full'):
+        """
+        `execute_model`, returning a copy of the result of an earlier run with the same inputs if it's cached.
+        """
+        inputs = dict(user_diet=user_diet, animal_input=animal_input, equation_selection=equation_selection,
+                      feed_library_df=feed_library_df, coeff_dict=coeff_dict, infusion_input=infusion_input,
+                      MP_NP_efficiency_input=MP_NP_efficiency_input, outputs=outputs, capture=capture)
+        key = self.key(**inputs)
+        result = self.get(key)
+        if result is None:
+            result = execute_model(**inputs)
+            self.put(key, result)
+        return result
@@ -0,0 +1,482 @@
+# Dependency graph of the statements in execute_model, used to only calculate
+# the statements that are needed for a list of outputs
+import ast
+import collections
+import inspect
+import re
+import textwrap
+import threading
+
+import pandas as pd
+
+from nasem_dairy.ration_balancer.ModelOutput import compact_value
+
+# Section headings of execute_model, a comment between two lines of '#'
+_heading_line = re.compile(r'^\s*#\s*#{10,}\s*$')
+_heading_title = re.compile(r'^\s*#\s*([^#\s].*?)\s*$')
+# The statements after this heading store the outputs and aren't part of the graph
+_capture_heading = 'Capture Outputs'
+
+
+def _headings(source_lines, first_line):
+    """
+    List of (line number, title) of the section headings in the source of a function.
+
+    A heading is a comment between two lines of '#' that isn't directly after another heading,
+    e.g. '# pre calculations for DMI:' under '# Step 2: DMI Equations' is part of that step.
+    """
+    headings = []
+    previous_heading = None
+    for position in range(1, len(source_lines) - 1):
+        match = _heading_title.match(source_lines[position])
+        if (match and _heading_line.match(source_lines[position - 1])
+                and _heading_line.match(source_lines[position + 1]) and previous_heading != position - 2):
+            headings.append((first_line + position, match.group(1)))
+            previous_heading = position
+    return headings
+
+
+class ModelNode:
+    """
+    One top level statement of execute_model.
+
+    Attributes
+    ----------
+    index : int
+        Position of the statement in execute_model.
+    lineno : int
+        Line number of the statement in the source file.
+    code : code
+        Compiled statement.
+    binds : set
+        Names assigned by the statement, e.g. `Du_MiN_g = ...`.
+    keyed : set
+        (name, key) pairs assigned by the statement, e.g. `animal_input['DMI'] = ...`.
+    modifies : set
+        Names of dictionaries or DataFrames changed by the statement without a constant key.
+    deletes : set
+        Names removed with `del`.
+    uses : set
+        Names read by the statement.
+    uses_keyed : set
+        (name, key) pairs read by the statement, e.g. `diet_data['Dt_NDFIn']`.
+    """
+    def __init__(self, index, statement, code):
+        self.index = index
+        self.lineno = statement.lineno
+        self.code = code
+        self.binds = set()
+        self.keyed = set()
+        self.modifies = set()
+        self.deletes = set()
+        self.uses = set()
+        self.uses_keyed = set()
+        self.__find_names(statement)
+
+    def __repr__(self):
+        defines = sorted(self.binds | {f"{name}['{key}']" for name, key in self.keyed} | self.modifies)
+        return f"ModelNode({self.index}, line {self.lineno}: {', '.join(defines)})"
+
+    @property
+    def defines(self):
+        """
+        Every name this statement assigns or changes.
+        """
+        return self.binds | self.modifies | {name for name, _ in self.keyed}
+
+    def __find_names(self, statement):
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Name):
+                if isinstance(node.ctx, ast.Store):
+                    self.binds.add(node.id)
+                elif isinstance(node.ctx, ast.Del):
+                    self.deletes.add(node.id)
+                elif not getattr(node, '_keyed', False):
+                    self.uses.add(node.id)
+            elif isinstance(node, ast.Subscript):
+                name = self.__base_name(node.value)
+                if name is None:
+                    continue
+                key = node.slice.value if (isinstance(node.value, ast.Name) and
+                                           isinstance(node.slice, ast.Constant) and
+                                           isinstance(node.slice.value, str)) else None
+                # A subscript assignment also reads the object it changes, so
+                # the name is left in uses
+                if isinstance(node.ctx, ast.Store):
+                    if key is None:
+                        self.modifies.add(name)
+                    else:
+                        self.keyed.add((name, key))
+                elif key is not None:
+                    self.uses_keyed.add((name, key))
+                    node.value._keyed = True
+            elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store):
+                name = self.__base_name(node.value)
+                if name is not None:
+                    self.modifies.add(name)
+
+    @staticmethod
+    def __base_name(node):
+        while isinstance(node, (ast.Attribute, ast.Subscript)):
+            node = node.value
+        return node.id if isinstance(node, ast.Name) else None
+
+
+class EvaluationPlan:
+    """
+    The statements of execute_model that are needed to calculate a list of outputs.
+
+    Attributes
+    ----------
+    outputs : dict
+        Where each output is found after the statements are run: ('name', None) for
+        a variable or ('container', 'key') for a dictionary or DataFrame entry.
+    nodes : list
+        ModelNode objects to run, in order.
+    n_nodes : int
+        Number of statements in execute_model.
+    n_skipped : int
+        Number of statements of execute_model that are not run. This is a count of statements, not
+        of time: the statements take very different times and a shortcut is run in place of some.
+    shortcuts : list
+        ModelNode objects in nodes that are shortcuts, see `ModelGraph.add_shortcut`.
+    """
+    def __init__(self, outputs, nodes, n_nodes, shortcuts=()):
+        self.outputs = outputs
+        self.nodes = nodes
+        self.n_nodes = n_nodes
+        self.n_skipped = n_nodes - len(nodes)
+        self.shortcuts = list(shortcuts)
+
+    def __repr__(self):
+        shortcuts = f", {len(self.shortcuts)} shortcuts" if self.shortcuts else ""
+        return (f"EvaluationPlan({len(self.outputs)} outputs: {len(self.nodes)} of {self.n_nodes} "
+                f"statements evaluated, {self.n_skipped} skipped{shortcuts})")
+
+
+class ModelGraph:
+    """
+    Dependency graph between the statements of a model function such as `execute_model`.
+
+    The source of the function is parsed once and every top level statement is a
+    node that depends on the earlier statements that assign the variables (or
+    dictionary entries, such as `animal_input['DMI']`) it reads. Running only the
+    statements an output depends on gives the same value as running the whole
+    function.
+
+    Only the statements from the first section heading (e.g. '# Step 1: Read User Input')
+    to the '# Capture Outputs' heading are nodes, so the checks of the arguments before
+    the model and the statements that store its outputs are not part of the graph.
+
+    Entries in dictionaries built by other functions (e.g. 'Dt_NDFIn' in diet_data)
+    can't be found from the source, so the first time one of these is requested
+    the whole function is run and the dictionaries it returns are indexed.
+
+    A shortcut (see `add_shortcut`) is a statement that calculates a variable without
+    the intermediate values of the statements it replaces, e.g. the diet level sums of
+    diet_data_initial without diet_info. Plans use it when the outputs don't need those
+    intermediate values.
+
+    Parameters
+    ----------
+    func : function
+        Function to build the graph for, normally `execute_model`.
+    max_plans : int, optional
+        Number of plans kept, the least recently used plan is removed when there are more.
+
+    Examples
+    --------
+    The graph of execute_model is `nd.model_graph`, its plans list the statements
+    `execute_model(outputs=...)` runs:
+
+    ```{python}
+    import nasem_dairy as nd
+
+    plan = nd.model_graph.plan(['Mlk_Prod', 'An_MEIn', 'An_MPIn_g', 'Trg_MEuse', 'An_DCADmeq'])
+    plan.shortcuts
+    ```
+    """
+    def __init__(self, func, max_plans=128):
+        self.func = func
+        self.nodes = None
+        self.parameters = list(inspect.signature(func).parameters)
+        self.container_index = {}
+        self.max_plans = max_plans
+        # Plans by the sorted names of their outputs, least recently used first
+        self._plans = collections.OrderedDict()
+        self._plans_lock = threading.Lock()
+        # (source, names of the statements replaced) of each shortcut, built with the nodes
+        self._shortcut_sources = []
+        self.shortcuts = None
+
+    def __repr__(self):
+        n_nodes = "not built" if self.nodes is None else f"{len(self.nodes)} statements"
+        return f"ModelGraph({self.func.__name__}, {n_nodes})"
+
+    def build(self):
+        """
+        Parse the function source into ModelNode objects.
+        """
+        if self.nodes is not None:
+            return self.nodes
+        source_lines, first_line = inspect.getsourcelines(self.func)
+        function = ast.parse(textwrap.dedent(''.join(source_lines))).body[0]
+        ast.increment_lineno(function, first_line - 1)
+        filename = inspect.getsourcefile(self.func)
+        headings = _headings(source_lines, first_line)
+        start = headings[0][0] if headings else first_line
+        end = next((line for line, title in headings if title == _capture_heading), None)
+        self.nodes = []
+        for statement in function.body:
+            if statement.lineno < start:
+                continue
+            if end is not None and statement.lineno > end:
+                break
+            # Skip return statements
+            if isinstance(statement, ast.Return):
+                continue
+            code = compile(ast.Module(body=[statement], type_ignores=[]), filename, 'exec')
+            self.nodes.append(ModelNode(len(self.nodes), statement, code))
+        self.shortcuts = [self.__build_shortcut(source, replaces) for source, replaces in self._shortcut_sources]
+        return self.nodes
+
+    def add_shortcut(self, source, replaces):
+        """
+        Add a statement that is run in place of other statements when their other results aren't needed.
+
+        Parameters
+        ----------
+        source : str
+            One statement, run in the module namespace of the function like its own statements.
+        replaces : list
+            Names assigned by the statements it replaces. The shortcut is run in place of the last of
+            these statements and has to give the same values for the names it assigns. A plan only uses
+            it when no other statement it runs, and no output, needs a statement it replaces.
+        """
+        source = textwrap.dedent(source).strip()
+        replaces = tuple(replaces)
+        if self.nodes is not None:
+            self.shortcuts.append(self.__build_shortcut(source, replaces))
+        self._shortcut_sources.append((source, replaces))
+        with self._plans_lock:
+            self._plans.clear()
+
+    def __build_shortcut(self, source, replaces):
+        """
+        (ModelNode of the shortcut, indices of the statements it replaces).
+        """
+        replaced = {node.index for node in self.nodes if node.binds & set(replaces)}
+        if not replaced:
+            raise ValueError(f"{self.func.__name__} has no statement that assigns {list(replaces)}")
+        statements = ast.parse(source).body
+        if len(statements) != 1:
+            raise ValueError("A shortcut has to be one statement")
+        statement = statements[0]
+        position = max(replaced)
+        ast.increment_lineno(statement, self.nodes[position].lineno - 1)
+        code = compile(ast.Module(body=[statement], type_ignores=[]), '<shortcut>', 'exec')
+        node = ModelNode(position, statement, code)
+        replaced_names = set().union(*(self.nodes[index].binds for index in replaced))
+        if not node.binds <= replaced_names:
+            raise ValueError(f"A shortcut can only assign the names of the statements it replaces, "
+                             f"not {sorted(node.binds - replaced_names)}")
+        return node, frozenset(replaced)
+
+    def dependencies(self, node_index, names=(), keyed=()):
+        """
+        Indices of the nodes before node_index that assign the given names and (name, key) pairs.
+        """
+        nodes = self.build()
+        found = set()
+        for name in names:
+            for node in reversed(nodes[:node_index]):
+                if name in node.deletes:
+                    break
+                if name in node.defines:
+                    found.add(node.index)
+                    if name in node.binds:
+                        break
+        for name, key in keyed:
+            for node in reversed(nodes[:node_index]):
+                if (name, key) in node.keyed:
+                    found.add(node.index)
+                    break
+                if name in node.modifies:
+                    found.add(node.index)
+                elif name in node.binds:
+                    found.add(node.index)
+                    break
+        return found
+
+    def sources(self, node_index):
+        """
+        Where each value read by a node comes from.
+
+        Returns
+        -------
+        list
+            (source, name, key) tuples, where source is the index of the node that
+            assigned the value or None for an argument of the function, and key
+            is None when the node reads the whole of name.
+        """
+        nodes = self.build()
+        node = nodes[node_index]
+        sources = []
+        for name, key in [(name, None) for name in node.uses] + list(node.uses_keyed):
+            for previous in reversed(nodes[:node_index]):
+                if name in previous.deletes:
+                    break
+                if key is not None and (name, key) in previous.keyed:
+                    sources.append((previous.index, name, key))
+                    break
+                if name in previous.defines:
+                    sources.append((previous.index, name, key))
+                    if name in previous.binds:
+                        break
+            else:
+                if name in self.parameters:
+                    sources.append((None, name, key))
+        return sources
+
+    def upstream(self, node_indices, replaced=None):
+        """
+        The given nodes and every node they depend on, in order.
+
+        replaced is a dictionary of ModelNode objects (shortcuts) to use in place of the
+        node with the same index.
+        """
+        nodes = self.build()
+        replaced = replaced or {}
+        needed = set()
+        to_visit = list(node_indices)
+        while to_visit:
+            index = to_visit.pop()
+            if index in needed:
+                continue
+            needed.add(index)
+            node = replaced.get(index, nodes[index])
+            to_visit.extend(self.dependencies(index, node.uses, node.uses_keyed))
+        return sorted(needed)
+
+    def _locate(self, name):
+        """
+        Where the value of name is after the function has run.
+        """
+        nodes = self.build()
+        end = len(nodes)
+        if self.dependencies(end, names=[name]):
+            return (name, None)
+        keyed = [(container, key) for node in nodes for container, key in node.keyed if key == name]
+        if keyed:
+            return keyed[-1]
+        if name in self.parameters:
+            return (name, None)
+        if name in self.container_index:
+            return (self.container_index[name], name)
+        return None
+
+    def plan(self, outputs):
+        """
+        EvaluationPlan for a list of output names.
+
+        The plan doesn't depend on the order of the names or repeated names, so the outputs of
+        the plan are in alphabetical order.
+        """
+        outputs = tuple(sorted(set(outputs)))
+        with self._plans_lock:
+            if outputs in self._plans:
+                self._plans.move_to_end(outputs)
+                return self._plans[outputs]
+        nodes = self.build()
+        locations = {}
+        for name in outputs:
+            location = self._locate(name)
+            if location is None:
+                # Unknown names may be in a dictionary returned by another function
+                return EvaluationPlan(dict.fromkeys(outputs), list(nodes), len(nodes))
+            locations[name] = location
+        needed = set()
+        for container, key in locations.values():
+            if key is None:
+                needed |= self.dependencies(len(nodes), names=[container])
+            else:
+                needed |= self.dependencies(len(nodes), keyed=[(container, key)])
+        indices = self.upstream(needed)
+        # Each shortcut is used when nothing else needs the statements it replaces
+        replaced = {}
+        for shortcut, replaces in self.shortcuts:
+            if shortcut.index not in indices:
+                continue
+            with_shortcut = self.upstream(needed, {**replaced, shortcut.index: shortcut})
+            if not (replaces - {shortcut.index}) & set(with_shortcut):
+                replaced[shortcut.index] = shortcut
+                indices = with_shortcut
+        plan = EvaluationPlan(locations, [replaced.get(index, nodes[index]) for index in indices], len(nodes),
+                              [replaced[index] for index in sorted(replaced)])
+        with self._plans_lock:
+            self._plans[outputs] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def evaluate(self, outputs, **inputs):
+        """
+        Run the statements needed for outputs.
+
+        Parameters
+        ----------
+        outputs : list
+            Names of the values to return.
+        **inputs
+            Arguments of the function, by name.
+
+        Returns
+        -------
+        dict
+            The value of each output. NumPy scalars and 0-dimensional arrays are returned as
+            Python numbers, as in ModelOutput.
+        """
+        plan = self.plan(outputs)
+        namespace = self.run(plan.nodes, inputs)
+        if None in plan.outputs.values():
+            self.index_containers(namespace)
+        results = {}
+        for name in outputs:
+            location = plan.outputs[name] or self._locate(name)
+            if location is None:
+                raise KeyError(f"{name} is not calculated by {self.func.__name__}")
+            container, key = location
+            results[name] = compact_value(namespace[container] if key is None else namespace[container][key])
+        return results
+
+    def run(self, nodes, inputs, namespace=None):
+        """
+        Run nodes in a namespace made from the function's module and inputs.
+        """
+        if namespace is None:
+            namespace = dict(self.func.__globals__)
+            defaults = {name: parameter.default
+                        for name, parameter in inspect.signature(self.func).parameters.items()
+                        if parameter.default is not inspect.Parameter.empty}
+            namespace.update(defaults)
+        namespace.update(inputs)
+        for node in nodes:
+            exec(node.code, namespace)
+        return namespace
+
+    def index_containers(self, namespace):
+        """
+        Record which dictionary or DataFrame each entry is stored in.
+        """
+        names = self.parameters + [name for node in self.build() for name in sorted(node.binds)]
+        for name in names:
+            value = namespace.get(name)
+            if isinstance(value, dict):
+                keys = value.keys()
+            elif isinstance(value, pd.DataFrame):
+                keys = value.columns
+            else:
+                continue
+            for key in keys:
+                if isinstance(key, str):
+                    self.container_index.setdefault(key, name)
@@ -0,0 +1,268 @@
+# Timing of the steps and equations of execute_model
+# While a ModelProfiler is active the calculate_ functions used by execute_model
+# are replaced, in its module, by wrappers that record the time and memory used
+# by each call. They are restored when it's closed, so execute_model runs
+# unchanged when not profiling. Each call is assigned to the step of
+# execute_model (the '# Step 1: Read User Input' headings) it's made from.
+import bisect
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+import nasem_dairy.ration_balancer.execute_model as execute_model_module
+from nasem_dairy.ration_balancer.model_graph import _headings
+
+_call_columns = ['run', 'step', 'function', 'line', 'start', 'duration', 'allocated_blocks', 'allocated_bytes',
+                 'thread']
+# Other functions called by execute_model that are timed
+_profiled_names = {'adjust_LCT', 'get_feed_rows_feedlibrary', 'ModelOutput'}
+# Only one profiler can replace the functions at a time
+_active_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _step_headings():
+    """
+    (line numbers, titles) of the headings of execute_model, in order.
+    """
+    source_lines, first_line = inspect.getsourcelines(execute_model_module.execute_model)
+    headings = _headings(source_lines, first_line)
+    return [line for line, _ in headings], [title for _, title in headings]
+
+
+def _step(line):
+    lines, titles = _step_headings()
+    position = bisect.bisect_right(lines, line) - 1
+    return titles[position] if position >= 0 else None
+
+
+class ModelProfiler:
+    """
+    Record the time and memory used by each step and equation of `execute_model`.
+
+    Use it as a context manager around calls to `execute_model` (including those with
+    `outputs` or `capture='snapshot'`, `run_scenarios(workers=0)` and `ModelSession`). Every
+    `calculate_*` function called directly by execute_model is timed, and each call is
+    assigned to the step of execute_model it is made from. The time of a step is from the
+    first call in the step to the first call in the next step, so it includes the
+    calculations between the calls.
+
+    Nothing is recorded, and execute_model has no extra cost, outside of the `with` block.
+    While it's active, calls from every thread are recorded and only one ModelProfiler can
+    be active at a time.
+
+    Parameters
+    ----------
+    track_memory : bool, optional
+        Also record the bytes allocated by each call with tracemalloc, which makes the
+        model run several times slower. The number of memory blocks allocated is always
+        recorded. Both are the change over the call, so memory freed before the call
+        returns isn't counted.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    with nd.ModelProfiler() as profiler:
+        for _ in range(5):
+            nd.execute_model(user_diet, animal_input, equation_selection, feed_library)
+
+    profiler.summary('step')
+    profiler.summary('function').head(10)
+    profiler.to_chrome_trace('execute_model_trace.json')  # Open in chrome://tracing or Perfetto
+    ```
+    """
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.records = []
+        self._originals = {}
+        self._lock = threading.Lock()
+        self._run = -1
+        # Thread: (frame or namespace of its current run, run number)
+        self._run_contexts = {}
+        self._started_tracemalloc = False
+        self._start = None
+
+    def __repr__(self):
+        state = 'active' if self._originals else 'inactive'
+        return f"ModelProfiler({state}, {len(self.records)} calls in {self._run + 1} runs)"
+
+    def __enter__(self):
+        if not _active_lock.acquire(blocking=False):
+            raise RuntimeError("Another ModelProfiler is already active")
+        # Parse the headings now rather than during the first run
+        _step_headings()
+        if self._start is None:
+            self._start = time.perf_counter_ns()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        namespace = vars(execute_model_module)
+        for name, function in list(namespace.items()):
+            if callable(function) and (name.startswith('calculate_') or name in _profiled_names):
+                self._originals[name] = function
+                namespace[name] = self.__wrap(name, function)
+        return self
+
+    def __exit__(self, *exc_info):
+        namespace = vars(execute_model_module)
+        namespace.update(self._originals)
+        self._originals = {}
+        self._run_contexts = {}
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        _active_lock.release()
+
+    def __wrap(self, name, function):
+        record = self.__record
+        track_memory = self.track_memory
+
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            caller = sys._getframe(1)
+            blocks = sys.getallocatedblocks()
+            memory = tracemalloc.get_traced_memory()[0] if track_memory else 0
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = time.perf_counter_ns()
+                allocated_bytes = tracemalloc.get_traced_memory()[0] - memory if track_memory else None
+                record(name, caller, start, end, sys.getallocatedblocks() - blocks, allocated_bytes)
+        return profiled
+
+    def __record(self, name, caller, start, end, allocated_blocks, allocated_bytes):
+        in_model = caller.f_code.co_filename == execute_model_module.__file__
+        line = caller.f_lineno if in_model else None
+        # Statements run by ModelGraph share a namespace, execute_model has one frame per run
+        context = caller.f_globals if caller.f_code.co_name == '<module>' else caller
+        thread = threading.get_ident()
+        with self._lock:
+            # Runs in other threads are interleaved, so each thread has its own current run
+            run_context = self._run_contexts.get(thread)
+            if run_context is None or run_context[0] is not context:
+                self._run += 1
+                run_context = self._run_contexts[thread] = (context, self._run)
+            self.records.append((run_context[1], _step(line) if in_model else None, name, line,
+                                 (start - self._start) / 1e9, (end - start) / 1e9,
+                                 allocated_blocks, allocated_bytes, thread))
+
+    def to_pandas(self, level='call'):
+        """
+        The recorded calls or steps as a DataFrame.
+
+        Parameters
+        ----------
+        level : str, optional
+            'call' for one row per calculate_ call, 'step' for one row per step of each run.
+
+        Returns
+        -------
+        pd.DataFrame
+            For calls: run, step, function, line (in execute_model), start and duration (seconds),
+            allocated_blocks, allocated_bytes (None without track_memory) and thread.
+            For steps: run, step, start, duration, n_calls, allocated_blocks and allocated_bytes.
+        """
+        calls = pd.DataFrame(self.records, columns=_call_columns)
+        if level == 'call':
+            return calls
+        if level != 'step':
+            raise ValueError(f"level must be 'call' or 'step', got {level!r}")
+        steps = []
+        for (run, thread), run_calls in calls.groupby(['run', 'thread'], sort=False):
+            # A step starts at its first call and ends when the next step starts
+            segment = (run_calls['step'] != run_calls['step'].shift()).cumsum()
+            ends = run_calls['start'] + run_calls['duration']
+            segments = list(run_calls.groupby(segment, sort=False))
+            for position, (_, step_calls) in enumerate(segments):
+                start = step_calls['start'].iloc[0]
+                if position + 1 < len(segments):
+                    end = segments[position + 1][1]['start'].iloc[0]
+                else:
+                    end = ends.loc[step_calls.index].max()
+                steps.append({'run': run, 'step': step_calls['step'].iloc[0], 'start': start,
+                              'duration': end - start, 'n_calls': len(step_calls),
+                              'allocated_blocks': step_calls['allocated_blocks'].sum(),
+                              'allocated_bytes': step_calls['allocated_bytes'].sum(min_count=1),
+                              'thread': thread})
+        return pd.DataFrame(steps, columns=['run', 'step', 'start', 'duration', 'n_calls', 'allocated_blocks',
+                                            'allocated_bytes', 'thread'])
+
+    def summary(self, by='step'):
+        """
+        Time and memory of each step or function, over all runs.
+
+        Parameters
+        ----------
+        by : str, optional
+            'step' or 'function'.
+
+        Returns
+        -------
+        pd.DataFrame
+            Total and mean duration (seconds per run), percentage of the total time, number of calls
+            and allocations, sorted by total duration.
+        """
+        if by not in ('step', 'function'):
+            raise ValueError(f"by must be 'step' or 'function', got {by!r}")
+        table = self.to_pandas('step' if by == 'step' else 'call')
+        n_runs = max(table['run'].nunique(), 1)
+        if by == 'function':
+            table = table.assign(n_calls=1)
+        summary = table.groupby(by, sort=False, dropna=False).agg(
+            total_duration=('duration', 'sum'),
+            n_calls=('n_calls', 'sum'),
+            allocated_blocks=('allocated_blocks', 'sum'),
+            allocated_bytes=('allocated_bytes', lambda values: values.sum(min_count=1)))
+        summary.insert(1, 'mean_duration', summary['total_duration'] / n_runs)
+        summary.insert(2, 'percent', 100 * summary['total_duration'] / summary['total_duration'].sum())
+        return summary.sort_values('total_duration', ascending=False)
+
+    def to_chrome_trace(self, path=None):
+        """
+        The recorded steps and calls in the Chrome trace event format.
+
+        Open the file in chrome://tracing or https://ui.perfetto.dev, each step is shown with the
+        calls made in it.
+
+        Parameters
+        ----------
+        path : str or os.PathLike, optional
+            File to write the trace to as JSON.
+
+        Returns
+        -------
+        dict
+            The trace, with a 'traceEvents' list.
+        """
+        pid = os.getpid()
+        events = []
+        for step in self.to_pandas('step').itertuples(index=False):
+            events.append({'name': step.step or 'execute_model', 'cat': 'step', 'ph': 'X',
+                           'ts': step.start * 1e6, 'dur': step.duration * 1e6, 'pid': pid, 'tid': step.thread,
+                           'args': {'run': int(step.run), 'n_calls': int(step.n_calls)}})
+        for call in self.records:
+            run, step, name, line, start, duration, allocated_blocks, allocated_bytes, thread = call
+            args = {'run': run, 'step': step, 'line': line, 'allocated_blocks': allocated_blocks}
+            if allocated_bytes is not None:
+                args['allocated_bytes'] = allocated_bytes
+            events.append({'name': name, 'cat': 'calculate', 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6,
+                           'pid': pid, 'tid': thread, 'args': args})
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(trace, file)
+        return trace
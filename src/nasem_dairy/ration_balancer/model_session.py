@@ -0,0 +1,373 @@
+# Keeps the state of an execute_model run so that a change to one input only
+# recalculates the statements that depend on it, e.g. for the Shiny app
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput
+from nasem_dairy.ration_balancer.compiled_feed_library import _diet_info_coeffs
+from nasem_dairy.ration_balancer.diet_context import _feed_composition
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.execute_model import model_graph
+
+# Marks a variable that did not exist when a statement was last run
+_missing = object()
+
+
+def _same(a, b) -> bool:
+    """
+    True if a and b have the same value, missing values are equal to each other.
+    """
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, (pd.DataFrame, pd.Series, pd.Index)):
+        return a.equals(b)
+    if isinstance(a, np.ndarray):
+        if a.shape != b.shape or a.dtype != b.dtype:
+            return False
+        return bool(np.array_equal(a, b, equal_nan=a.dtype.kind in 'fc'))
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    try:
+        return bool(a == b) or bool(a != a and b != b)
+    except (TypeError, ValueError):
+        return False
+
+
+def _difference(old, new):
+    """
+    What changed between two values of a variable.
+
+    Returns
+    -------
+    bool or set
+        The keys that changed if both values are dictionaries, otherwise True if the value changed.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        return {key for key in old.keys() | new.keys()
+                if key not in old or key not in new or not _same(old[key], new[key])}
+    return not _same(old, new)
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    return value
+
+
+class ModelSession:
+    """
+    The state of an `execute_model` run that can be updated one input at a time.
+
+    Every statement of `execute_model` is run once and its results are kept.
+    When an input changes, only the statements that read a value that changed are
+    run again, in order. A statement whose results are the same as before (e.g.
+    `calculate_An_data_initial` when only `Env_DistParlor` changes) does not cause
+    the statements after it to be run. Changing `Env_DistParlor` only updates the
+    `An_NEm_Act_Parlor`, `An_NEmUse`, `An_MEmUse`, ..., `Trg_MEuse` chain, which
+    takes a few milliseconds instead of a full model run.
+
+    When user_diet changes but has the same feeds, diet_info is scaled from the composition
+    of each feed (see `DietContext`) instead of being calculated again, so changing the kg
+    of a feed only recalculates the intakes of each feed and the statements after diet_info.
+    The composition is calculated when the session is created and, for a diet with other
+    feeds, the first time the amounts of these feeds change.
+
+    Statements that change their own inputs (e.g. `animal_input['DMI'] = ...`) or
+    reuse a variable name (e.g. `coeff_dict = CoeffOverlay(...)`) are always run, so the
+    values each statement sees are the same as in a full run.
+
+    The inputs are copied, so the session does not change the dictionaries it is
+    given (including the default `coeff_dict`).
+
+    Parameters
+    ----------
+    user_diet : pd.DataFrame
+        DataFrame containing user-defined diet information.
+    animal_input : dict
+        Dictionary containing animal-specific input values.
+    equation_selection : dict
+        Dictionary containing equation selection criteria.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary
+        DataFrame containing the feed library data.
+    coeff_dict : dict, optional
+        Dictionary containing coefficients for the model, by default uses the coeff_dict.
+    infusion_input : dict, optional
+        Dictionary containing infusion input values, by default uses the infusion_dict.
+    MP_NP_efficiency_input : dict, optional
+        Dictionary containing MP to NP efficiency input values, by default uses the MP_NP_efficiency_dict.
+
+    Attributes
+    ----------
+    inputs : dict
+        The current value of each argument of `execute_model`.
+    namespace : dict
+        Every variable calculated by `execute_model`.
+    evaluated : list
+        ModelNode objects run by the last update.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    session = nd.ModelSession(user_diet, animal_input, equation_selection, feed_library)
+    session.update(animal_input={'Env_DistParlor': 1000})
+    session.get_value('Trg_MEuse')
+    ```
+    """
+    def __init__(self,
+                 user_diet: pd.DataFrame,
+                 animal_input: dict,
+                 equation_selection: dict,
+                 feed_library_df: pd.DataFrame,
+                 coeff_dict: dict = coeff_dict,
+                 infusion_input: dict = infusion_dict,
+                 MP_NP_efficiency_input: dict = MP_NP_efficiency_dict
+                 ):
+        self.graph = model_graph
+        self.nodes = self.graph.build()
+        self.inputs = {
+            'user_diet': _copy(user_diet),
+            'animal_input': _copy(animal_input),
+            'equation_selection': _copy(equation_selection),
+            'feed_library_df': feed_library_df,
+            'coeff_dict': _copy(coeff_dict),
+            'infusion_input': _copy(infusion_input),
+            'MP_NP_efficiency_input': _copy(MP_NP_efficiency_input)
+        }
+        self.__find_always_run()
+        self.sources = [self.graph.sources(node.index) for node in self.nodes]
+        self._values = {}
+        # The statement that calculates diet_info, and the composition of the feeds it was last run for
+        self._diet_info_node = next(node for node in self.nodes if 'diet_info' in node.binds)
+        self._diet_key = None
+        self._diet_composition = None
+        self.namespace = self.graph.run([], self.__namespace_inputs())
+        for node in self.nodes:
+            self.__run(node)
+            self.__record(node)
+        self.evaluated = list(self.nodes)
+
+    def __repr__(self):
+        return (f"ModelSession({len(self.evaluated)} of {len(self.nodes)} statements "
+                f"evaluated by the last update)")
+
+    def __find_always_run(self):
+        """
+        Find the statements that have to be run on every update and, for each
+        statement, the later statements that change a variable it assigns.
+        """
+        defined_by = {}
+        binders = {}
+        keyed_by = {}
+        for node in self.nodes:
+            for name in node.defines | node.deletes:
+                defined_by.setdefault(name, set()).add(node.index)
+            for name in node.binds:
+                binders.setdefault(name, set()).add(node.index)
+            for name, key in node.keyed:
+                keyed_by.setdefault((name, key), set()).add(node.index)
+
+        # Variables with more than one value during a run
+        versioned = {name for name in defined_by if name in self.graph.parameters}
+        versioned |= {name for name, indices in binders.items() if len(indices) > 1}
+        versioned |= {name for (name, _), indices in keyed_by.items() if len(indices) > 1}
+        versioned |= {name for node in self.nodes for name in node.deletes}
+        versioned |= {name for node in self.nodes for name in node.modifies - node.binds}
+        self.always_run = {index for name in versioned for index in defined_by[name]}
+
+        # Variables changed in place have to be copied to keep their previous value
+        self._mutable = {name for node in self.nodes
+                         for name in node.modifies | {name for name, _ in node.keyed}}
+
+        # Statements to run again when a statement assigns a new object to a
+        # name, as the object they changed is replaced
+        self._changed_after = {}
+        for node in self.nodes:
+            followers = set()
+            for name in node.binds:
+                for later in self.nodes[node.index + 1:]:
+                    if name in later.binds:
+                        break
+                    if name in later.modifies or name in later.deletes or any(
+                            keyed_name == name for keyed_name, _ in later.keyed):
+                        followers.add(later.index)
+            self._changed_after[node.index] = followers
+
+        # Names only assigned in one branch of a statement are removed before it
+        # is run again, otherwise a value from another branch would be kept
+        self._cleared = {}
+        defined = set(self.graph.parameters)
+        for node in self.nodes:
+            self._cleared[node.index] = node.binds - defined
+            defined |= node.defines
+
+    def __run(self, node):
+        if node is self._diet_info_node:
+            self.__calculate_diet_info(node)
+        else:
+            exec(node.code, self.namespace)
+
+    def __calculate_diet_info(self, node):
+        """
+        Run the diet_info statement, or scale the composition of each feed if the feeds are the
+        same as the last time it was run.
+        """
+        diet_info_initial = self.namespace['diet_info_initial']
+        animal_input = self.namespace['animal_input']
+        equation_selection = self.namespace['equation_selection']
+        coeff_dict = self.namespace['coeff_dict']
+        key = (tuple(diet_info_initial['Feedstuff']), animal_input['An_StatePhys'],
+               int(equation_selection['Use_DNDF_IV']), tuple(coeff_dict[name] for name in _diet_info_coeffs()))
+        if key != self._diet_key:
+            # The composition is calculated when the session is created, for other feeds only
+            # when their amounts change, as a diet may only be evaluated once
+            new_feeds = self._diet_key is not None
+            self._diet_key = key
+            self._diet_composition = None
+            if new_feeds:
+                exec(node.code, self.namespace)
+                return
+        if self._diet_composition is None:
+            # False when a column isn't proportional to intake, diet_info is then always calculated
+            self._diet_composition = _feed_composition(diet_info_initial,
+                                                       animal_input['An_StatePhys'],
+                                                       equation_selection['Use_DNDF_IV'],
+                                                       coeff_dict,
+                                                       self.namespace.get('feed_properties')) or False
+        if self._diet_composition is False:
+            exec(node.code, self.namespace)
+        else:
+            self.namespace['diet_info'] = self._diet_composition.diet_info(diet_info_initial, animal_input['DMI'])
+
+    def __namespace_inputs(self):
+        return {name: _copy(value) for name, value in self.inputs.items()}
+
+    def __snapshot(self, name, default=_missing):
+        value = self.namespace.get(name, default)
+        if name in self._mutable:
+            return _copy(value)
+        return value
+
+    def __record(self, node):
+        """
+        Store the values assigned by node and return what changed since it was last run.
+        """
+        previous = self._values.get(node.index)
+        values = {}
+        for name in node.binds | node.modifies:
+            values[name] = self.__snapshot(name)
+        for name, key in node.keyed:
+            try:
+                values[(name, key)] = self.namespace[name][key]
+            except (KeyError, TypeError):
+                values[(name, key)] = _missing
+        self._values[node.index] = values
+        if previous is None:
+            return {}
+
+        changes = {}
+        for name, value in values.items():
+            if isinstance(name, tuple):
+                name, key = name
+                if not _same(previous.get((name, key), _missing), value) and changes.get(name) is not True:
+                    changes.setdefault(name, set()).add(key)
+                continue
+            difference = _difference(previous.get(name, _missing), value)
+            if difference is True:
+                changes[name] = True
+            elif difference and changes.get(name) is not True:
+                changes.setdefault(name, set()).update(difference)
+        return changes
+
+    def __is_affected(self, node, changes):
+        for source, name, key in self.sources[node.index]:
+            changed = changes.get(source, {}).get(name)
+            if changed is True or (changed and (key is None or key in changed)):
+                return True
+        return False
+
+    def update(self, **changes):
+        """
+        Change inputs and recalculate the values that depend on them.
+
+        Parameters
+        ----------
+        **changes
+            New values for arguments of `execute_model`. For the dictionary arguments
+            (e.g. animal_input, equation_selection, coeff_dict) only the entries
+            that change need to be given.
+
+        Returns
+        -------
+        list
+            ModelNode objects that were run.
+        """
+        input_changes = {}
+        for name, value in changes.items():
+            if name not in self.inputs:
+                raise TypeError(f"{name} is not an input of execute_model")
+            old = self.inputs[name]
+            if isinstance(old, dict) and isinstance(value, dict):
+                new = {**old, **value}
+                changed = {key for key in value if key not in old or not _same(old[key], value[key])}
+            else:
+                new = _copy(value)
+                changed = not _same(old, value)
+            self.inputs[name] = new
+            if changed:
+                input_changes[name] = changed
+        if 'feed_library_df' in input_changes:
+            # The composition of the feeds has the feed rows of the old library
+            self._diet_key = None
+
+        self.namespace.update(self.__namespace_inputs())
+        changes = {None: input_changes}
+        to_run = set(self.always_run)
+        self.evaluated = []
+        for node in self.nodes:
+            if node.index not in to_run and not self.__is_affected(node, changes):
+                continue
+            for name in self._cleared[node.index]:
+                self.namespace.pop(name, None)
+            self.__run(node)
+            self.evaluated.append(node)
+            node_changes = self.__record(node)
+            if node_changes:
+                changes[node.index] = node_changes
+            to_run |= self._changed_after[node.index]
+        return self.evaluated
+
+    def get_value(self, name):
+        """
+        Current value of a variable calculated by execute_model.
+        """
+        location = self.graph._locate(name)
+        if location is None:
+            self.graph.index_containers(self.namespace)
+            location = self.graph._locate(name)
+        if location is None:
+            raise KeyError(f"{name} is not calculated by execute_model")
+        container, key = location
+        return self.namespace[container] if key is None else self.namespace[container][key]
+
+    def to_model_output(self) -> ModelOutput:
+        """
+        ModelOutput with the current values, the same as returned by execute_model.
+        """
+        names = self.graph.parameters + [name for node in self.nodes for name in sorted(node.binds)]
+        locals_input = {}
+        for name in names:
+            if name in self.namespace and name not in locals_input:
+                locals_input[name] = self.__snapshot(name)
+        return ModelOutput(locals_input=locals_input)
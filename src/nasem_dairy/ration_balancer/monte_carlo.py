@@ -0,0 +1,178 @@
+# Monte Carlo uncertainty analysis
+# Coefficients and feed composition are sampled for every replicate and all
+# replicates are run as one execute_model_batch call, with each replicate as an
+# animal and each sampled feed as its own row of the feed library.
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary, feed_property_coeffs
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.diet_matrix import DietMatrix
+from nasem_dairy.ration_balancer.execute_model_batch import execute_model_batch
+
+monte_carlo_outputs = ['Mlk_Prod_comp', 'Mlk_Prod_MPalow', 'Mlk_Prod_NEalow', 'An_MPIn_g', 'Mlk_NP_g', 'Du_MiCP_g']
+
+# Coefficients used in the feed level calculations, these are the same for every
+# row of the feed library so can't be sampled per replicate
+feed_coeffs = feed_property_coeffs + [f'Rec{AA}' for AA in ['Arg', 'His', 'Ile', 'Leu', 'Lys',
+                                                            'Met', 'Phe', 'Thr', 'Trp', 'Val']]
+
+
+def _sample(distribution, mean, size, rng):
+    """
+    Draw samples from a coefficient of variation (normal distribution) or a function.
+    """
+    if callable(distribution):
+        return np.asarray(distribution(rng, mean, size), dtype=float)
+    return rng.normal(mean, np.abs(mean) * distribution, size=size)
+
+
+def _sample_feed_library(user_diet, feed_library, feed_distributions, n_replicates, rng):
+    """
+    Feed library with a sampled copy of each feed in user_diet for every replicate,
+    and a DietMatrix with one row per replicate using that replicate's copies.
+    """
+    kg_user = user_diet.groupby('Feedstuff', sort=False)['kg_user'].sum()
+    kg_user = kg_user[kg_user != 0]
+    feedstuffs = kg_user.index.tolist()
+    feed_data = feed_library.get_feed_rows(feedstuffs).set_index('Feedstuff')
+    missing_feeds = set(feedstuffs) - set(feed_data.index)
+    if missing_feeds:
+        raise ValueError(f"Feeds not found in feed library: {sorted(missing_feeds)}")
+    feed_data = feed_data.loc[feedstuffs].reset_index()
+    n_feeds = len(feedstuffs)
+
+    samples = feed_data.iloc[np.tile(np.arange(n_feeds), n_replicates)].reset_index(drop=True)
+    samples['Feedstuff'] = [f'{feed} [{replicate}]' for replicate in range(n_replicates) for feed in feedstuffs]
+    for column, distribution in feed_distributions.items():
+        if column not in samples.columns:
+            raise KeyError(f"{column} is not a column of the feed library")
+        mean = samples[column].to_numpy(dtype=float)
+        samples[column] = np.maximum(_sample(distribution, mean, len(samples), rng), 0)
+
+    diets = DietMatrix(indptr=np.arange(n_replicates + 1) * n_feeds,
+                       indices=np.arange(n_replicates * n_feeds),
+                       data=np.tile(kg_user.to_numpy(dtype=float), n_replicates),
+                       feedstuffs=samples['Feedstuff'])
+    return CompiledFeedLibrary(samples.rename(columns={'Feedstuff': 'Fd_Name'})), diets
+
+
+def run_monte_carlo(user_diet: pd.DataFrame,
+                    animal_input: dict,
+                    equation_selection: dict,
+                    feed_library_df: pd.DataFrame,
+                    coeff_distributions: dict = None,
+                    feed_distributions: dict = None,
+                    n_replicates: int = 1000,
+                    outputs: list = None,
+                    quantiles: list = (0.025, 0.5, 0.975),
+                    coeff_dict: dict = coeff_dict,
+                    infusion_input: dict = infusion_dict,
+                    MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+                    seed: int = None,
+                    return_samples: bool = False
+                    ):
+    """
+    Uncertainty of model outputs from sampled coefficients and feed composition.
+
+    Every replicate gets its own draw of each coefficient in coeff_distributions
+    and of each feed library column in feed_distributions (drawn separately for
+    every feed in the diet). All replicates are evaluated together with
+    `execute_model_batch`.
+
+    Parameters
+    ----------
+    user_diet : pd.DataFrame
+        DataFrame with 'Feedstuff' and 'kg_user' columns.
+    animal_input : dict
+        Dictionary containing animal-specific input values.
+    equation_selection : dict
+        Dictionary containing equation selection criteria.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary
+        DataFrame containing the feed library data.
+    coeff_distributions : dict, optional
+        Coefficients to sample, e.g. {'VmMiNInt': 0.1, 'KmMiNRDNDF': 0.1}. A number is the coefficient of
+        variation of a normal distribution around the value in coeff_dict. A function is called as
+        `function(rng, mean, size)` and returns the samples. Coefficients used for the feed
+        level calculations (`feed_coeffs` in this module) can't be sampled.
+    feed_distributions : dict, optional
+        Feed library columns to sample, e.g. {'Fd_CP': 0.05, 'Fd_NDF': 0.08, 'Fd_St': 0.1}, given as for
+        coeff_distributions. Samples below 0 are set to 0.
+    n_replicates : int, optional
+        Number of replicates.
+    outputs : list, optional
+        Names of the outputs to summarise, by default Mlk_Prod_comp, Mlk_Prod_MPalow, Mlk_Prod_NEalow,
+        An_MPIn_g, Mlk_NP_g and Du_MiCP_g.
+    quantiles : list, optional
+        Quantiles to return, by default 0.025, 0.5 and 0.975.
+    coeff_dict : dict, optional
+        Dictionary containing coefficients for the model, by default `nd.coeff_dict`.
+    infusion_input : dict, optional
+        Dictionary containing infusion input data, by default `nd.infusion_dict`.
+    MP_NP_efficiency_input : dict, optional
+        Dictionary containing amino acid conversion efficiencies, by default `nd.MP_NP_efficiency_dict`.
+    seed : int, optional
+        Seed for the random number generator.
+    return_samples : bool, optional
+        If True, the outputs of every replicate are also returned.
+
+    Returns
+    -------
+    pd.DataFrame or tuple
+        One row per output and one column per quantile. If return_samples is True, a tuple of the
+        quantiles and a DataFrame with one row per replicate and one column per output.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    nd.run_monte_carlo(user_diet, animal_input, equation_selection, feed_library,
+                       coeff_distributions={'VmMiNInt': 0.1, 'KmMiNRDNDF': 0.1, 'mPrt_k_Met_src': 0.1},
+                       feed_distributions={'Fd_CP': 0.05, 'Fd_NDF': 0.05, 'Fd_St': 0.05},
+                       n_replicates=1000, seed=1)
+    ```
+    """
+    coeff_distributions = coeff_distributions or {}
+    feed_distributions = feed_distributions or {}
+    outputs = monte_carlo_outputs if outputs is None else list(outputs)
+    rng = np.random.default_rng(seed)
+
+    sampled_coeffs = dict(coeff_dict)
+    for name, distribution in coeff_distributions.items():
+        if name not in coeff_dict:
+            raise KeyError(f"{name} is not in coeff_dict")
+        if name in feed_coeffs:
+            raise ValueError(f"{name} is used in the feed level calculations and can't be sampled")
+        sampled_coeffs[name] = _sample(distribution, coeff_dict[name], n_replicates, rng)
+
+    if not isinstance(feed_library_df, CompiledFeedLibrary):
+        feed_library_df = CompiledFeedLibrary(feed_library_df)
+    if feed_distributions:
+        feed_library_df, diets = _sample_feed_library(user_diet, feed_library_df, feed_distributions,
+                                                      n_replicates, rng)
+    else:
+        diets = DietMatrix.from_user_diets([user_diet], feed_library_df).take(np.zeros(n_replicates, dtype=int))
+
+    animal_inputs = pd.DataFrame([animal_input] * n_replicates)
+    with np.errstate(all='ignore'):
+        results = execute_model_batch(animal_inputs,
+                                      diets,
+                                      equation_selection,
+                                      feed_library_df,
+                                      sampled_coeffs,
+                                      infusion_input,
+                                      MP_NP_efficiency_input)
+    missing_outputs = [name for name in outputs if name not in results.columns]
+    if missing_outputs:
+        raise KeyError(f"Outputs not calculated by execute_model_batch: {missing_outputs}")
+
+    samples = results[outputs]
+    summary = samples.quantile(list(quantiles)).T
+    if return_samples:
+        return summary, samples
+    return summary
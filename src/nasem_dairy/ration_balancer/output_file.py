@@ -0,0 +1,223 @@
+# Binary file format for ModelOutput and BatchModelOutput
+# A file is a JSON manifest followed by the raw data of every array:
+#
+#   b'NASEMOUT' | manifest length (uint64) | manifest | padding | array data
+#
+# The manifest has the category and group dictionaries of the output, with
+# scalars stored directly and arrays, DataFrames and BatchTables replaced by
+# {'__nasem__': ...} entries that give the dtype, shape and position of each
+# array. Arrays are aligned to 64 bytes so they can be memory-mapped, which
+# means one variable can be read from a large file without reading the rest.
+# Arrays of strings are stored as the unique strings and an array of codes.
+import json
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.batch_table import BatchTable
+
+magic = b'NASEMOUT'
+file_version = 1
+_alignment = 64
+
+
+def _align(position):
+    return -(-position // _alignment) * _alignment
+
+
+class _Writer:
+    """
+    Converts an output to a JSON compatible manifest, collecting the arrays to write.
+    """
+    def __init__(self):
+        self.arrays = []
+        self.size = 0
+
+    def array(self, values):
+        values = np.asarray(values)
+        if values.dtype == object or values.dtype.kind == 'U':
+            if all(isinstance(value, str) for value in values.flat):
+                strings, codes = np.unique(values.astype(str), return_inverse=True)
+                return {'__nasem__': 'strings', 'strings': strings.tolist(),
+                        'codes': self.array(codes.astype(np.int32).reshape(values.shape))}
+            return {'__nasem__': 'objects', 'shape': list(values.shape),
+                    'values': [self.value(value) for value in values.flat]}
+        values = np.ascontiguousarray(values)
+        offset = _align(self.size)
+        self.arrays.append((offset, values))
+        self.size = offset + values.nbytes
+        return {'__nasem__': 'array', 'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': offset}
+
+    def value(self, value):
+        if isinstance(value, dict):
+            return {str(key): self.value(item) for key, item in value.items()}
+        if isinstance(value, pd.DataFrame):
+            return {'__nasem__': 'dataframe',
+                    'index': self.array(value.index.to_numpy()),
+                    'index_name': value.index.name,
+                    'columns': [[name, self.array(value[name].to_numpy())] for name in value.columns]}
+        if isinstance(value, BatchTable):
+            return {'__nasem__': 'table',
+                    'index': self.array(value.index),
+                    'index_name': value.index_name,
+                    'offsets': None if value.offsets is None else self.array(value.offsets),
+                    'columns': [[name, self.array(values)] for name, values in value.columns.items()]}
+        if isinstance(value, np.ndarray) and value.ndim > 0:
+            return self.array(value)
+        if isinstance(value, (np.ndarray, np.generic)):
+            return value.item()
+        if isinstance(value, (list, tuple)):
+            return [self.value(item) for item in value]
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        raise TypeError(f"Can't save a value of type {type(value).__name__}")
+
+
+class _Reader:
+    """
+    Rebuilds the values in a manifest, reading arrays from the file.
+    """
+    def __init__(self, path, data_start, mmap_mode):
+        self.path = path
+        self.data_start = data_start
+        self.mmap_mode = mmap_mode
+        self.data = None
+        if mmap_mode is None:
+            with open(path, 'rb') as file:
+                file.seek(data_start)
+                self.data = bytearray(file.read())
+
+    def buffer(self):
+        # The data region is mapped once and every array is a view into it, since each
+        # np.memmap keeps its own file descriptor open and an output can have thousands of arrays
+        if self.data is None:
+            self.data = np.memmap(self.path, dtype=np.uint8, mode=self.mmap_mode, offset=self.data_start)
+        return self.data
+
+    def array(self, entry):
+        if entry['__nasem__'] == 'objects':
+            values = np.empty(len(entry['values']), dtype=object)
+            values[:] = [self.value(value) for value in entry['values']]
+            return values.reshape(entry['shape'])
+        if entry['__nasem__'] == 'strings':
+            strings = np.empty(len(entry['strings']), dtype=object)
+            strings[:] = entry['strings']
+            return strings[self.array(entry['codes'])]
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape))
+        if count == 0:
+            return np.empty(shape, dtype=dtype)
+        if self.mmap_mode is not None:
+            return np.ndarray(shape, dtype=dtype, buffer=self.buffer(), offset=entry['offset'])
+        return np.frombuffer(self.data, dtype=dtype, count=count, offset=entry['offset']).reshape(shape)
+
+    def value(self, value):
+        if isinstance(value, list):
+            return [self.value(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        kind = value.get('__nasem__')
+        if kind is None:
+            return {key: self.value(item) for key, item in value.items()}
+        if kind in ('array', 'strings', 'objects'):
+            return self.array(value)
+        columns = {name: self.array(values) for name, values in value['columns']}
+        if kind == 'dataframe':
+            index = pd.Index(self.array(value['index']), name=value['index_name'])
+            return pd.DataFrame(columns, index=index)
+        offsets = None if value['offsets'] is None else self.array(value['offsets'])
+        return BatchTable(self.array(value['index']), columns, offsets, index_name=value['index_name'])
+
+
+def write_output_file(path, kind, categories, **attributes):
+    """
+    Write the category dictionaries of an output to path.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        File to write.
+    kind : str
+        Name of the output class, checked by read_output_file.
+    categories : dict
+        Category name: category dictionary.
+    **attributes
+        Other values to store in the manifest.
+    """
+    writer = _Writer()
+    manifest = {
+        'kind': kind,
+        'file_version': file_version,
+        'nasem_dairy_version': version("nasem_dairy"),
+        'attributes': attributes,
+        'categories': writer.value(categories)
+    }
+    header = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+    data_start = _align(len(magic) + 8 + len(header))
+    with open(path, 'wb') as file:
+        file.write(magic)
+        file.write(np.array(len(header), dtype='<u8').tobytes())
+        file.write(header)
+        for offset, values in writer.arrays:
+            file.seek(data_start + offset)
+            file.write(values.tobytes())
+
+
+def open_output_file(path, kind, mmap_mode=None):
+    """
+    Read the manifest of a file written by write_output_file, without reading any arrays.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        File to read.
+    kind : str
+        Expected name of the output class.
+    mmap_mode : str, optional
+        If given (e.g. 'r'), arrays are memory-mapped with this mode (see `np.memmap`) instead of read,
+        so their data is only read from the file when it is used.
+
+    Returns
+    -------
+    tuple
+        The category dictionaries as stored in the manifest, the other attributes and a function that
+        returns the value of an entry of the manifest.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not a nasem_dairy output file")
+        header_length = int(np.frombuffer(file.read(8), dtype='<u8')[0])
+        manifest = json.loads(file.read(header_length).decode('utf-8'))
+    if manifest['kind'] != kind:
+        raise ValueError(f"{path} contains a {manifest['kind']}, not a {kind}")
+    if manifest['file_version'] > file_version:
+        raise ValueError(f"{path} was written by a newer version of nasem_dairy "
+                         f"({manifest['nasem_dairy_version']})")
+    data_start = _align(len(magic) + 8 + header_length)
+    reader = _Reader(path, data_start, mmap_mode)
+    return manifest['categories'], manifest['attributes'], reader.value
+
+
+def read_output_file(path, kind, mmap_mode=None):
+    """
+    Read a file written by write_output_file.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        File to read.
+    kind : str
+        Expected name of the output class.
+    mmap_mode : str, optional
+        If given (e.g. 'r'), arrays are memory-mapped with this mode (see `np.memmap`) instead of read,
+        so their data is only read from the file when it is used.
+
+    Returns
+    -------
+    tuple
+        The category dictionaries and the other attributes.
+    """
+    categories, attributes, read_value = open_output_file(path, kind, mmap_mode)
+    return read_value(categories), attributes
@@ -0,0 +1,154 @@
+# Registry of the variables in ModelOutput
+# Descriptions and units come from data/variable_descriptions.csv, categories
+# and groups from the layout of ModelOutput. The dtype and shape of each
+# variable are taken from one run of the example input in data/, so the schema
+# is known before any other run. The schema is built once and cached.
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.execute_model import execute_model
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput, mineral_requirement_groups, output_groups
+from nasem_dairy.ration_balancer.ration_balancer_functions import read_csv_input
+
+_data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+# Text after the last comma of a description is the unit if it starts with one of these
+_unit_pattern = re.compile(r'^(%|kg|g|Mcal|meq)(\b|/| )')
+
+
+def _unit(description):
+    if description.startswith('% '):
+        return '%'
+    if ',' in description:
+        unit = description.rsplit(',', 1)[-1].strip()
+        if _unit_pattern.match(unit):
+            return unit
+    return None
+
+
+def _read_descriptions():
+    descriptions = pd.read_csv(os.path.join(_data_path, 'variable_descriptions.csv'), encoding='utf-8-sig')
+    descriptions = descriptions.dropna().drop_duplicates('Model Variable')
+    return dict(zip(descriptions['Model Variable'], descriptions['Description'].str.strip()))
+
+
+def _dtype(value):
+    if isinstance(value, (dict, pd.DataFrame)) or value is None:
+        return 'object'
+    if isinstance(value, str):
+        return 'str'
+    return np.asarray(value).dtype.name
+
+
+def _reference_output():
+    user_diet, animal_input, equation_selection = read_csv_input(os.path.join(_data_path, 'input.csv'))
+    feed_library = pd.read_csv(os.path.join(_data_path, 'NASEM_feed_library.csv'))
+    with np.errstate(all='ignore'):
+        return execute_model(user_diet, animal_input, equation_selection, feed_library)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_output_schema():
+    rows = {}
+
+    def add(name, category, group, kind, dtype):
+        # A name can be stored in more than one place, e.g. Feedstuff in user_diet and diet_info
+        rows.setdefault((category, group, name), {'name': name, 'category': category, 'group': group,
+                                                  'kind': kind, 'dtype': dtype})
+
+    output = _reference_output()
+    tables = []
+
+    def add_dictionary(dictionary, category, group):
+        for key, value in dictionary.items():
+            if isinstance(value, dict):
+                add(key, category, group, 'dict', 'object')
+                add_dictionary(value, category, key if group is None else f"{group}.{key}")
+            elif isinstance(value, pd.DataFrame):
+                add(key, category, group, 'table', 'object')
+                tables.append((key, value, category))
+            else:
+                add(key, category, group, 'scalar', _dtype(value))
+
+    for category in ModelOutput.categories:
+        add_dictionary(getattr(output, category), category, None)
+
+    # Variables that are only calculated for other types of animals or equation selections
+    for category, groups in output_groups.items():
+        for group, variables in groups.items():
+            for name in variables:
+                add(name, category, group, 'scalar', 'float64')
+    for mineral, variables in mineral_requirement_groups.items():
+        for name in variables:
+            add(name, 'Requirements', f'mineral_requirements.{mineral}', 'scalar', 'float64')
+
+    for table_name, table, category in tables:
+        kind = 'per_AA' if table_name == 'AA_values' else 'per_feed'
+        for column in table.columns:
+            add(column, category, table_name, kind, table[column].dtype.name)
+
+    schema = pd.DataFrame(list(rows.values())).set_index('name')
+    descriptions = _read_descriptions()
+    schema.insert(0, 'description', [descriptions.get(name) for name in schema.index])
+    schema.insert(1, 'unit', [None if description is None else _unit(description)
+                              for description in schema['description']])
+    return schema[['description', 'unit', 'dtype', 'category', 'group', 'kind']]
+
+
+@functools.lru_cache(maxsize=None)
+def _schema_entries():
+    """
+    Dictionary of (category, group, name): schema row as a dictionary.
+    """
+    entries = {}
+    for entry in _build_output_schema().reset_index().to_dict('records'):
+        entry = {key: value if isinstance(value, str) else None for key, value in entry.items()}
+        entries[(entry['category'], entry['group'], entry['name'])] = entry
+    return entries
+
+
+def _schema_entry(path):
+    """
+    Schema row of the variable stored at path, e.g. ('Requirements', 'mineral_requirements', 'Ca', 'An_Ca_bal'),
+    or None if it isn't in the schema.
+    """
+    group = '.'.join(path[1:-1]) or None
+    return _schema_entries().get((path[0], group, path[-1]))
+
+
+def get_output_schema():
+    """
+    Name, description, unit, dtype, category, group and kind of every variable in ModelOutput.
+
+    The schema is built the first time this is called and cached.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per variable and place it is stored in, indexed by name, with the columns:
+
+        - description, unit: from variable_descriptions.csv, None if not described
+        - dtype: NumPy dtype name of the value ('str' for strings, 'object' for dictionaries and tables)
+        - category, group: where the variable is stored in ModelOutput, group is the path of nested
+          dictionaries separated by '.' (e.g. 'mineral_requirements.Ca') or the name of the table for
+          table columns, None for variables stored directly in the category
+        - kind: 'scalar', 'per_feed' (a column of a table with one row per feed, e.g. diet_info),
+          'per_AA' (a column of AA_values, one row per amino acid), 'table' or 'dict'
+
+        A name stored in more than one place (e.g. Feedstuff in user_diet and diet_info, or the infusions in
+        infusion_input and infusion_data) has a row for each, so rows are unique by category, group and name.
+
+    Examples
+    --------
+    ```{python}
+    import nasem_dairy as nd
+
+    schema = nd.get_output_schema()
+    schema.loc[['Mlk_Prod_comp', 'Fd_CP', 'Abs_AA_g']]
+    schema[schema['kind'] == 'scalar'].groupby('category').size()
+    ```
+    """
+    return _build_output_schema().copy()
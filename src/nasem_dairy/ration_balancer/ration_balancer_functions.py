@@ -1,7 +1,21 @@
 # This file contains all of the functions used to execute the NASEM model in python
+import numpy as np
 import pandas as pd
 
 
+def _where(condition, if_true, if_false):
+    """
+    np.where, but for a scalar condition and values the selected value is returned as it is.
+
+    Equations that branch with this accept arrays of animals and still return a plain int or float
+    (not a 0-dimensional array) when called with scalars.
+    """
+    if np.ndim(condition) == 0 and np.ndim(if_true) == 0 and np.ndim(if_false) == 0:
+        value = if_true if condition else if_false
+        return value.item() if isinstance(value, np.ndarray) else value
+    return np.where(condition, if_true, if_false)
+
+
 def check_coeffs_in_coeff_dict(
         input_coeff_dict: dict, 
         required_coeffs: list):
@@ -12,7 +26,7 @@ def check_coeffs_in_coeff_dict(
 
     Parameters
     ----------
-    input_coeff_dict : dict
+    input_coeff_dict : dict or CoeffOverlay
         Coefficient dictionary, normally called as `coeff_dict` by functions
     required_coeffs : list
         A list of strings that contain the names of the required coefficients to check for in the dictionary.
@@ -37,12 +51,8 @@ def check_coeffs_in_coeff_dict(
     ```
 
     '''
-    # Convert the list to a set for faster lookup
-    req_coef = set(required_coeffs)
-    dict_in = set(input_coeff_dict)
-
-    # Return coeffs that are not in dict_in
-    missing_coeffs = [value for value in req_coef if value not in dict_in]
+    # Return coeffs that are not in input_coeff_dict
+    missing_coeffs = [value for value in required_coeffs if value not in input_coeff_dict]
 
     # Check if all values are present in the dictionary
     result = not bool(missing_coeffs)
@@ -0,0 +1,330 @@
+# Persistent cache of execute_model results, keyed by a hash of the inputs
+# The key is the SHA-256 of a canonical JSON form of every input that can change
+# the result: the diet, the feed library rows of the feeds in the diet, the
+# animal, equation selection, coefficient, infusion and efficiency values, the
+# outputs requested and the nasem_dairy version. Results are stored in the
+# binary format of ModelOutput.save (see output_file), one file per key, and the
+# least recently used files are removed when the cache grows over its size.
+import collections
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput, ModelSnapshot
+from nasem_dairy.ration_balancer.coeff_overlay import CoeffOverlay
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.execute_model import execute_model
+from nasem_dairy.ration_balancer.output_file import file_version, read_output_file, write_output_file
+from nasem_dairy.ration_balancer.ration_balancer_functions import get_feed_rows_feedlibrary
+
+_extension = '.nasem'
+
+
+def _canonical(value):
+    """
+    JSON compatible form of an input, the same for equal inputs.
+    """
+    if isinstance(value, CoeffOverlay):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, pd.DataFrame):
+        return {str(name): _canonical(value[name].tolist()) for name in value.columns}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        # float.hex is exact, NaN and infinities aren't valid JSON numbers
+        return value.hex() if math.isfinite(value) else repr(value)
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    raise TypeError(f"Can't use a value of type {type(value).__name__} in a cache key")
+
+
+def _feed_rows(user_diet, feed_library_df):
+    """
+    The rows of the feed library for the feeds in the diet, the only ones a run uses.
+    """
+    feeds = user_diet['Feedstuff'].tolist()
+    if isinstance(feed_library_df, CompiledFeedLibrary):
+        return feed_library_df.get_feed_rows(feeds)
+    return get_feed_rows_feedlibrary(feeds_to_get=feeds, feed_lib_df=feed_library_df)
+
+
+class ResultCache:
+    """
+    Cache of `execute_model` results on disk, reused when a model is run again with the same inputs.
+
+    A result is stored under a hash of its normalized inputs: the diet, the rows of the feed library
+    for the feeds in the diet (so other changes to the library don't matter), the values of animal_input,
+    equation_selection, coeff_dict, infusion_input and MP_NP_efficiency_input, the outputs requested
+    and the nasem_dairy version. A run with the same inputs, e.g. in the next night's sweep, reads the
+    result instead of running execute_model. Results that raise an error are not cached.
+
+    Each result is a file in the binary format of `ModelOutput.save`, so a full ModelOutput uses about
+    65 KB and a few outputs much less. When the files use more than max_bytes the least recently used
+    are removed. Several processes can share a directory: files are written to a temporary name and
+    renamed, and files removed by another process are treated as not cached.
+
+    Pass a ResultCache to `run_scenarios` (`cache=`), or use `ResultCache.execute_model` directly.
+
+    Parameters
+    ----------
+    directory : str or os.PathLike
+        Directory the results are stored in, created if it doesn't exist.
+    max_bytes : int, optional
+        Size of the cache, by default 1 GiB.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of results found and not found in the cache by this object.
+    n_stored, n_evicted : int
+        Number of results written and removed to keep the cache under max_bytes.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = nd.CompiledFeedLibrary(pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv"))
+
+    cache = nd.ResultCache('model_cache', max_bytes=100 * 2**20)
+    output = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    output = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    cache.stats()
+    ```
+    """
+    def __init__(self, directory, max_bytes=2**30):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.n_stored = 0
+        self.n_evicted = 0
+        self._lock = threading.Lock()
+        # Size of each file, least recently used first
+        self._sizes = collections.OrderedDict()
+        entries = []
+        with os.scandir(self.directory) as files:
+            for entry in files:
+                if entry.name.endswith(_extension) and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-len(_extension)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+        self._size = sum(self._sizes.values())
+
+    def __repr__(self):
+        return (f"ResultCache({self.directory!r}, {len(self._sizes)} results, {self._size / 2**20:.1f} of "
+                f"{self.max_bytes / 2**20:.1f} MiB, {self.hits} hits, {self.misses} misses)")
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        """
+        Bytes used by the cached results.
+        """
+        return self._size
+
+    @property
+    def hit_rate(self):
+        """
+        Fraction of lookups that found a result, NaN before the first lookup.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else float('nan')
+
+    def stats(self):
+        """
+        Hits, misses and size of the cache.
+
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, n_stored, n_evicted, n_results and size (bytes).
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate,
+                'n_stored': self.n_stored, 'n_evicted': self.n_evicted,
+                'n_results': len(self._sizes), 'size': self._size}
+
+    def key(self,
+            user_diet: pd.DataFrame,
+            animal_input: dict,
+            equation_selection: dict,
+            feed_library_df: pd.DataFrame,
+            coeff_dict: dict = coeff_dict,
+            infusion_input: dict = infusion_dict,
+            MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+            outputs: list = None,
+            capture: str = 'full') -> str:
+        """
+        Hash of the inputs of an `execute_model` run, the name the result is stored under.
+
+        Parameters are the same as `execute_model`.
+
+        Returns
+        -------
+        str
+            Hexadecimal SHA-256 digest.
+        """
+        inputs = {
+            'nasem_dairy_version': version("nasem_dairy"),
+            'file_version': file_version,
+            'user_diet': user_diet,
+            'feed_rows': _feed_rows(user_diet, feed_library_df),
+            'animal_input': animal_input,
+            'equation_selection': equation_selection,
+            'coeff_dict': coeff_dict,
+            'infusion_input': infusion_input,
+            'MP_NP_efficiency_input': MP_NP_efficiency_input,
+            'outputs': None if outputs is None else list(outputs),
+            'capture': capture
+        }
+        text = json.dumps(_canonical(inputs), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + _extension)
+
+    def get(self, key):
+        """
+        The result stored under key, or None if it isn't cached.
+        """
+        path = self.__path(key)
+        try:
+            categories, attributes = read_output_file(path, 'ResultCache')
+            # The modification time orders the files for other processes
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # Removed by another process or not completely written
+            with self._lock:
+                self.misses += 1
+                self.__forget(key)
+            return None
+        with self._lock:
+            self.hits += 1
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+            else:
+                # Written by another process
+                self._sizes[key] = os.path.getsize(path)
+                self._size += self._sizes[key]
+        if attributes['result'] == 'ModelOutput':
+            return ModelOutput._from_categories(categories)
+        if attributes['result'] == 'ModelSnapshot':
+            return ModelSnapshot(**categories['values'])
+        return categories['values']
+
+    def put(self, key, result):
+        """
+        Store a result of execute_model (ModelOutput, ModelSnapshot or dictionary of outputs) under key.
+        """
+        if isinstance(result, ModelOutput):
+            kind = 'ModelOutput'
+            categories = {category_name: getattr(result, category_name)
+                          for category_name in ModelOutput.categories}
+        elif isinstance(result, ModelSnapshot):
+            kind = 'ModelSnapshot'
+            categories = {'values': result._asdict()}
+        elif isinstance(result, dict):
+            kind = 'dict'
+            categories = {'values': result}
+        else:
+            raise TypeError(f"Can't cache a result of type {type(result).__name__}")
+
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        os.close(descriptor)
+        try:
+            write_output_file(temporary_path, 'ResultCache', categories, result=kind)
+            size = os.path.getsize(temporary_path)
+            os.replace(temporary_path, self.__path(key))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        with self._lock:
+            self.__forget(key)
+            self._sizes[key] = size
+            self._size += size
+            self.n_stored += 1
+            self.__evict()
+
+    def __forget(self, key):
+        size = self._sizes.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    def __evict(self):
+        # Keep the result just stored, even if it's larger than max_bytes
+        while self._size > self.max_bytes and len(self._sizes) > 1:
+            key, size = self._sizes.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self.__path(key))
+            except FileNotFoundError:
+                continue
+            self.n_evicted += 1
+
+    def clear(self):
+        """
+        Remove every cached result.
+        """
+        with self._lock:
+            for key in list(self._sizes):
+                try:
+                    os.remove(self.__path(key))
+                except FileNotFoundError:
+                    pass
+            self._sizes.clear()
+            self._size = 0
+
+    def execute_model(self,
+                      user_diet: pd.DataFrame,
+                      animal_input: dict,
+                      equation_selection: dict,
+                      feed_library_df: pd.DataFrame,
+                      coeff_dict: dict = coeff_dict,
+                      infusion_input: dict = infusion_dict,
+                      MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+                      outputs: list = None,
+                      capture: str = 'full'):
+        """
+        `execute_model`, reading the result from the cache if it has been run with the same inputs.
+
+        Numbers stored as 0-dimensional arrays (e.g. Mlk_Prod_comp) are read back as floats.
+        """
+        inputs = dict(user_diet=user_diet, animal_input=animal_input, equation_selection=equation_selection,
+                      feed_library_df=feed_library_df, coeff_dict=coeff_dict, infusion_input=infusion_input,
+                      MP_NP_efficiency_input=MP_NP_efficiency_input, outputs=outputs, capture=capture)
+        key = self.key(**inputs)
+        result = self.get(key)
+        if result is None:
+            result = execute_model(**inputs)
+            self.put(key, result)
+        return result
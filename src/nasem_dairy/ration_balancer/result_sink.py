@@ -0,0 +1,226 @@
+# Writes the results of a long sweep to disk as they are produced
+# Results are buffered until flush_size rows are collected and then written as
+# one row group file in a directory, so memory use doesn't grow with the number
+# of scenarios. Each row group is written to a temporary file and renamed when
+# complete, so the results written so far can be read while the sweep runs.
+import os
+
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.ModelOutput import ModelOutput, ModelSnapshot
+from nasem_dairy.ration_balancer.output_file import open_output_file, write_output_file
+
+_row_group_name = 'part-{:06d}.nasem'
+
+
+def _is_scalar(value):
+    return (value is None or isinstance(value, (str, int, float, bool, np.generic))
+            or (isinstance(value, np.ndarray) and value.ndim == 0))
+
+
+def _scalar(value):
+    return value.item() if isinstance(value, (np.ndarray, np.generic)) else value
+
+
+def _result_row(result):
+    """
+    Dictionary of the scalar outputs in a result, each name only once (the first found, as in get_value).
+    """
+    if isinstance(result, ModelSnapshot):
+        return result._asdict()
+    if isinstance(result, ModelOutput):
+        row = {}
+
+        def add_scalars(dictionary):
+            for key, value in dictionary.items():
+                if _is_scalar(value):
+                    row.setdefault(key, _scalar(value))
+            for value in dictionary.values():
+                if isinstance(value, dict):
+                    add_scalars(value)
+
+        for category_name in ModelOutput.categories:
+            add_scalars(getattr(result, category_name))
+        return row
+    if isinstance(result, dict):
+        return {name: _scalar(value) for name, value in result.items() if _is_scalar(value)}
+    raise TypeError(f"Can't append a result of type {type(result).__name__}")
+
+
+def _row_group_paths(path):
+    names = sorted(name for name in os.listdir(path) if name.startswith('part-') and name.endswith('.nasem'))
+    return [os.path.join(path, name) for name in names]
+
+
+class ResultSink:
+    """
+    Write the results of a sweep to a directory of row group files with bounded memory.
+
+    Only scalar outputs are stored, one row per result and one column per output
+    (tables like diet_info are not). Rows are kept in memory until `flush_size`
+    rows have been appended and are then written as one row group. Read the
+    results, including those of a sweep that is still running, with `read_results`.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Directory to write to, created if it doesn't exist. Row groups already in the
+        directory are kept and new ones are added after them.
+    flush_size : int, optional
+        Number of rows in each row group.
+
+    Attributes
+    ----------
+    n_rows : int
+        Number of rows appended.
+    n_row_groups : int
+        Number of row groups in the directory.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    scenarios = ({'user_diet': user_diet,
+                  'animal_input': {**animal_input, 'An_BW': An_BW},
+                  'equation_selection': equation_selection,
+                  'capture': 'snapshot'}
+                 for An_BW in range(550, 750))
+    with nd.ResultSink('sweep_results', flush_size=50) as sink:
+        for index, result in nd.run_scenarios(scenarios, feed_library, workers=2, chunksize=10):
+            sink.append(result, scenario=index)
+
+    nd.read_results('sweep_results', columns=['scenario', 'Mlk_Prod_comp'])
+    ```
+    """
+    def __init__(self, path, flush_size=10000):
+        if flush_size < 1:
+            raise ValueError("flush_size must be at least 1")
+        self.path = os.fspath(path)
+        self.flush_size = flush_size
+        os.makedirs(self.path, exist_ok=True)
+        existing = _row_group_paths(self.path)
+        self.n_row_groups = len(existing)
+        self._next_row_group = int(os.path.basename(existing[-1])[5:11]) + 1 if existing else 0
+        self.n_rows = 0
+        self._rows = []
+        self._frames = []
+        self._n_buffered = 0
+
+    def __repr__(self):
+        return (f"ResultSink({self.path!r}, {self.n_rows} rows appended, {self._n_buffered} buffered, "
+                f"{self.n_row_groups} row groups)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, result, **columns):
+        """
+        Add the results of one scenario.
+
+        Parameters
+        ----------
+        result : ModelOutput, ModelSnapshot or dict
+            Output of `execute_model`, with any capture level or with outputs given.
+        **columns
+            Extra values to store in the row, e.g. the scenario number or the swept parameter.
+        """
+        row = _result_row(result)
+        row.update({name: _scalar(value) for name, value in columns.items()})
+        self._rows.append(row)
+        self.__add_buffered(1)
+
+    def append_chunk(self, results, **columns):
+        """
+        Add the results of many scenarios, e.g. from `execute_model_batch`.
+
+        Parameters
+        ----------
+        results : pd.DataFrame
+            One row per scenario and one column per output.
+        **columns
+            Extra values to store, a single value for every row or one value per row.
+        """
+        frame = results.reset_index(drop=True).assign(**columns)
+        self.__buffer_rows()
+        self._frames.append(frame)
+        self.__add_buffered(len(frame))
+
+    def __buffer_rows(self):
+        if self._rows:
+            self._frames.append(pd.DataFrame(self._rows))
+            self._rows = []
+
+    def __add_buffered(self, n_rows):
+        self.n_rows += n_rows
+        self._n_buffered += n_rows
+        if self._n_buffered >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows as a row group.
+        """
+        self.__buffer_rows()
+        if not self._frames:
+            return
+        frame = pd.concat(self._frames, ignore_index=True) if len(self._frames) > 1 else self._frames[0]
+        self._frames = []
+        self._n_buffered = 0
+
+        final_path = os.path.join(self.path, _row_group_name.format(self._next_row_group))
+        temporary_path = os.path.join(self.path, '.' + _row_group_name.format(self._next_row_group) + '.tmp')
+        columns = {str(name): frame[name].to_numpy() for name in frame.columns}
+        write_output_file(temporary_path, 'ResultRowGroup', {'columns': columns}, n_rows=len(frame))
+        os.replace(temporary_path, final_path)
+        self._next_row_group += 1
+        self.n_row_groups += 1
+
+    def close(self):
+        """
+        Write any buffered rows.
+        """
+        self.flush()
+
+
+def read_results(path, columns=None):
+    """
+    Read the rows written by a ResultSink.
+
+    Only complete row groups are read, so this can be used while a sweep is still writing
+    to path. Columns are memory-mapped and only the ones requested are read.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Directory given to the ResultSink.
+    columns : list, optional
+        Names of the columns to read, by default all of them. Columns missing from a
+        row group are NaN for its rows.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per result.
+    """
+    frames = []
+    for row_group_path in _row_group_paths(os.fspath(path)):
+        categories, attributes, read_value = open_output_file(row_group_path, 'ResultRowGroup', mmap_mode='r')
+        row_group = categories['columns']
+        names = row_group.keys() if columns is None else [name for name in columns if name in row_group]
+        frames.append(pd.DataFrame({name: np.array(read_value(row_group[name])) for name in names},
+                                   index=pd.RangeIndex(attributes['n_rows'])))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    results = pd.concat(frames, ignore_index=True)
+    if columns is not None:
+        results = results.reindex(columns=list(columns))
+    return results
@@ -0,0 +1,287 @@
+# Runs many execute_model scenarios in a pool of worker processes
+# The feed library and coefficients are sent to each worker once, when it
+# starts, instead of with every scenario. With a ResultCache, scenarios are
+# looked up in this process and only those not cached are sent to the workers.
+import collections
+import functools
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+
+from nasem_dairy.ration_balancer.coeff_overlay import CoeffOverlay
+from nasem_dairy.ration_balancer.compiled_feed_library import CompiledFeedLibrary
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.execute_model import execute_model
+from nasem_dairy.ration_balancer.result_cache import ResultCache
+
+# Inputs shared by every scenario run by a worker process, set by _init_worker
+_worker_inputs = {}
+
+
+def _shared_inputs(feed_library_df, coeff_dict, infusion_input, MP_NP_efficiency_input, outputs):
+    if not isinstance(feed_library_df, CompiledFeedLibrary):
+        feed_library_df = CompiledFeedLibrary(feed_library_df)
+    return {'feed_library_df': feed_library_df,
+            'coeff_dict': coeff_dict,
+            'infusion_input': infusion_input,
+            'MP_NP_efficiency_input': MP_NP_efficiency_input,
+            'outputs': outputs}
+
+
+def _init_worker(*args):
+    _worker_inputs.update(_shared_inputs(*args))
+
+
+def _scenario_inputs(scenario, shared_inputs):
+    """
+    Arguments of execute_model for a scenario, with the inputs shared by every scenario.
+    """
+    inputs = {
+        'feed_library_df': shared_inputs['feed_library_df'],
+        'coeff_dict': shared_inputs['coeff_dict'],
+        'infusion_input': shared_inputs['infusion_input'],
+        'MP_NP_efficiency_input': shared_inputs['MP_NP_efficiency_input'],
+        'outputs': shared_inputs['outputs']
+    }
+    inputs.update(scenario)
+    # Coefficients given for a scenario are layered over the shared coeff_dict
+    if 'coeff_dict' in scenario:
+        inputs['coeff_dict'] = CoeffOverlay(scenario['coeff_dict'], shared_inputs['coeff_dict'])
+    return inputs
+
+
+def _run_chunk(chunk, shared_inputs=None):
+    """
+    Run a list of (index, scenario) pairs, a scenario that raises an error returns the error.
+
+    shared_inputs is given when the scenarios are run in this process, worker processes
+    use the inputs set by _init_worker.
+    """
+    if shared_inputs is None:
+        shared_inputs = _worker_inputs
+    start = time.perf_counter()
+    results = []
+    for index, scenario in chunk:
+        try:
+            results.append((index, execute_model(**_scenario_inputs(scenario, shared_inputs))))
+        except Exception as error:
+            results.append((index, error))
+    return os.getpid(), time.perf_counter() - start, results
+
+
+def _uncached(scenarios, cache, shared_inputs, keys, cached):
+    """
+    (index, scenario) pairs of the scenarios not in cache, the results of the others are added to cached.
+    """
+    for index, scenario in enumerate(scenarios):
+        try:
+            key = cache.key(**_scenario_inputs(scenario, shared_inputs))
+        except Exception:
+            # Run without the cache, e.g. a scenario missing a required input returns its error
+            yield index, scenario
+            continue
+        result = cache.get(key)
+        if result is None:
+            keys[index] = key
+            yield index, scenario
+        else:
+            cached.append((index, result))
+
+
+def _chunks(indexed_scenarios, chunksize):
+    chunk = []
+    for index, scenario in indexed_scenarios:
+        chunk.append((index, scenario))
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ScenarioResults:
+    """
+    Iterator over the results of `run_scenarios`, in the order they finish.
+
+    Each item is a tuple of the position of the scenario in the input and its
+    result (a ModelOutput, a dictionary of outputs or the exception raised).
+    With a ResultCache, results are stored in the cache as they finish.
+
+    Attributes
+    ----------
+    n_completed : int
+        Number of scenarios finished.
+    n_failed : int
+        Number of scenarios that raised an error.
+    n_cached : int
+        Number of results read from the cache.
+    elapsed : float
+        Seconds since the first scenario was started.
+    worker_stats : dict
+        For each worker process id, the number of scenarios run ('n_scenarios') and
+        the seconds spent running them ('busy_time').
+    """
+    def __init__(self, chunk_results, pool=None, cache=None, keys=None, cached=None):
+        self._chunk_results = chunk_results
+        self._pool = pool
+        self._cache = cache
+        self._keys = keys
+        # Results read from the cache, added while the scenarios are read
+        self._cached = cached if cached is not None else collections.deque()
+        self._buffer = []
+        self._start = time.perf_counter()
+        self.n_completed = 0
+        self.n_failed = 0
+        self.n_cached = 0
+        self.worker_stats = {}
+
+    def __repr__(self):
+        return (f"ScenarioResults({self.n_completed} completed, {self.n_failed} failed, "
+                f"{self.throughput:.1f} scenarios/s)")
+
+    def __iter__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __next__(self):
+        while not self._buffer:
+            if self._cached:
+                self.n_completed += 1
+                self.n_cached += 1
+                return self._cached.popleft()
+            try:
+                pid, busy_time, results = next(self._chunk_results)
+            except StopIteration:
+                if self._cached:
+                    continue
+                self.close()
+                raise
+            stats = self.worker_stats.setdefault(pid, {'n_scenarios': 0, 'busy_time': 0.0})
+            stats['n_scenarios'] += len(results)
+            stats['busy_time'] += busy_time
+            self.n_completed += len(results)
+            self.n_failed += sum(isinstance(result, Exception) for _, result in results)
+            if self._cache is not None:
+                for index, result in results:
+                    key = self._keys.pop(index, None)
+                    if key is not None and not isinstance(result, Exception):
+                        self._cache.put(key, result)
+            self._buffer.extend(reversed(results))
+        return self._buffer.pop()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    @property
+    def throughput(self):
+        """
+        Scenarios completed per second.
+        """
+        return self.n_completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def worker_throughput(self):
+        """
+        Scenarios per second of busy time for each worker.
+        """
+        return pd.DataFrame(self.worker_stats).T.assign(
+            scenarios_per_second=lambda df: df['n_scenarios'] / df['busy_time']
+        )
+
+    def close(self):
+        """
+        Stop the worker processes, scenarios that have not finished are not run.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+
+def run_scenarios(scenarios,
+                  feed_library_df: pd.DataFrame,
+                  coeff_dict: dict = coeff_dict,
+                  infusion_input: dict = infusion_dict,
+                  MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+                  outputs: list = None,
+                  workers: int = None,
+                  chunksize: int = 1,
+                  cache: ResultCache = None
+                  ) -> ScenarioResults:
+    """
+    Run execute_model for many scenarios in parallel.
+
+    Each worker process gets the feed library and coefficients once when it
+    starts and compiles the feed library (see `CompiledFeedLibrary`). Scenarios
+    are sent to the workers in chunks as they are read from `scenarios`, and the
+    results are returned as they finish.
+
+    Parameters
+    ----------
+    scenarios : iterable
+        Dictionaries of arguments for `execute_model`, normally 'user_diet', 'animal_input' and
+        'equation_selection'. A 'coeff_dict' entry only needs the coefficients that differ from coeff_dict.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary
+        DataFrame containing the feed library data.
+    coeff_dict : dict, optional
+        Dictionary containing coefficients for the model, by default `nd.coeff_dict`.
+    infusion_input : dict, optional
+        Dictionary containing infusion input data, by default `nd.infusion_dict`.
+    MP_NP_efficiency_input : dict, optional
+        Dictionary containing amino acid conversion efficiencies, by default `nd.MP_NP_efficiency_dict`.
+    outputs : list, optional
+        If given, each result is a dictionary of these outputs (see `execute_model`) instead of a ModelOutput.
+    workers : int, optional
+        Number of worker processes, by default the number of CPUs. With 0 the scenarios are run in this process.
+    chunksize : int, optional
+        Number of scenarios sent to a worker at a time.
+    cache : ResultCache, optional
+        Cache of results on disk. Scenarios with a cached result are not run, the results of the
+        others are added to the cache.
+
+    Returns
+    -------
+    ScenarioResults
+        Iterator of (position in scenarios, result) tuples, with progress and throughput counters.
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    scenarios = ({'user_diet': user_diet,
+                  'animal_input': {**animal_input, 'An_BW': An_BW},
+                  'equation_selection': equation_selection}
+                 for An_BW in range(550, 750, 10))
+    results = nd.run_scenarios(scenarios, feed_library, outputs=['Mlk_Prod_comp'], workers=2, chunksize=5)
+    milk = dict(results)
+    results.worker_throughput()
+    ```
+    """
+    keys = {}
+    cached = collections.deque()
+    initargs = (feed_library_df, coeff_dict, infusion_input, MP_NP_efficiency_input, outputs)
+    # Compiled in this process if it's used here, for the cache keys or to run the scenarios
+    shared_inputs = _shared_inputs(*initargs) if cache is not None or workers == 0 else None
+    if cache is None:
+        indexed_scenarios = enumerate(scenarios)
+    else:
+        indexed_scenarios = _uncached(scenarios, cache, shared_inputs, keys, cached)
+        initargs = (shared_inputs['feed_library_df'],) + initargs[1:]
+    chunks = _chunks(indexed_scenarios, chunksize)
+    if workers == 0:
+        # The inputs are bound to this run, so runs iterated together or in threads don't share them
+        run_chunk = functools.partial(_run_chunk, shared_inputs=shared_inputs)
+        return ScenarioResults(map(run_chunk, chunks), None, cache, keys, cached)
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs)
+    return ScenarioResults(pool.imap_unordered(_run_chunk, chunks), pool, cache, keys, cached)
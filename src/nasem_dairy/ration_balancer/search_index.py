@@ -0,0 +1,93 @@
+# Name index used by ModelOutput.search and BatchModelOutput.search
+# The nested category dictionaries are walked once, the first time search is
+# called, and the results of each search are cached.
+import functools
+import re
+
+import pandas as pd
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(search_string):
+    return re.compile(search_string, flags=re.IGNORECASE)
+
+
+def _table_columns(value):
+    """
+    Column names of a table output, None for other values.
+    """
+    if isinstance(value, pd.DataFrame):
+        return [str(column) for column in value.columns]
+    columns = getattr(value, 'columns', None)
+    if isinstance(columns, dict):
+        return [str(column) for column in columns]
+    return None
+
+
+def _display_value(value):
+    if isinstance(value, dict):
+        return 'dict'
+    if isinstance(value, pd.DataFrame):
+        return 'Dataframe'
+    if isinstance(value, list):
+        return 'list'
+    if _table_columns(value) is not None:
+        return type(value).__name__
+    return value
+
+
+class SearchIndex:
+    """
+    Index of the names in a set of nested category dictionaries for searching.
+
+    For each category there is a list of (full name, name, value, table columns)
+    in the order a recursive search finds them, e.g.
+    ('Production.milk.Mlk_Prod', 'Mlk_Prod', 35.0, None).
+    """
+    max_cached_searches = 256
+
+    def __init__(self, categories):
+        self.categories = categories
+        self._entries = {}
+        self._searches = {}
+
+    def __category_entries(self, category_name):
+        if category_name not in self._entries:
+            entries = []
+
+            def add_entries(dictionary, path):
+                for key, value in dictionary.items():
+                    full_key = path + key
+                    entries.append((full_key, key, value, _table_columns(value)))
+                    if isinstance(value, dict):
+                        add_entries(value, full_key + '.')
+
+            dictionary = self.categories.get(category_name)
+            if isinstance(dictionary, dict):
+                add_entries(dictionary, category_name + '.')
+            self._entries[category_name] = entries
+        return self._entries[category_name]
+
+    def search(self, search_string, category_names):
+        """
+        DataFrame with the 'Name' and 'Value' of every name, or table column, matching search_string.
+
+        Names are matched including their category and groups, e.g. 'Production.milk.Mlk_Prod',
+        matching table columns are returned with a Value of '<table name>[column]'.
+        """
+        category_names = tuple(dict.fromkeys(category_names))
+        key = (search_string, category_names)
+        if key not in self._searches:
+            pattern = _compile(search_string)
+            table_rows = []
+            for category_name in category_names:
+                for full_key, name, value, columns in self.__category_entries(category_name):
+                    if pattern.search(full_key):
+                        table_rows.append({'Name': name, 'Value': _display_value(value)})
+                    if columns:
+                        table_rows.extend({'Name': column, 'Value': f'{name}[column]'}
+                                          for column in columns if pattern.search(column))
+            if len(self._searches) >= self.max_cached_searches:
+                self._searches.clear()
+            self._searches[key] = pd.DataFrame(table_rows)
+        return self._searches[key].copy()
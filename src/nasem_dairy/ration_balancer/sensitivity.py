@@ -0,0 +1,109 @@
+# Sensitivity of model outputs to the amount of each feed in the diet
+# Every perturbed diet is evaluated in one execute_model_batch call instead of
+# running execute_model twice per feed.
+import numpy as np
+import pandas as pd
+
+from nasem_dairy.ration_balancer.default_values_dictionaries import coeff_dict, infusion_dict, MP_NP_efficiency_dict
+from nasem_dairy.ration_balancer.execute_model_batch import execute_model_batch
+
+jacobian_outputs = ['Mlk_Prod_MPalow', 'Mlk_Prod_NEalow'] + [
+    f'An_{mineral}_bal' for mineral in ['Ca', 'P', 'Mg', 'Na', 'Cl', 'K', 'S', 'Co', 'Cu', 'I', 'Fe', 'Mn', 'Se', 'Zn']
+]
+
+
+def jacobian(user_diet: pd.DataFrame,
+             animal_input: dict,
+             equation_selection: dict,
+             feed_library_df: pd.DataFrame,
+             outputs: list = None,
+             coeff_dict: dict = coeff_dict,
+             infusion_input: dict = infusion_dict,
+             MP_NP_efficiency_input: dict = MP_NP_efficiency_dict,
+             step: float = 0.01
+             ) -> pd.DataFrame:
+    """
+    Change in model outputs per extra kg of each feed in the diet.
+
+    The derivatives are calculated by finite differences: the diet with `step` kg
+    more and less of each feed (only more for feeds fed at less than `step` kg) is
+    run together with the diet itself in a single `execute_model_batch` call.
+
+    Parameters
+    ----------
+    user_diet : pd.DataFrame
+        DataFrame with 'Feedstuff' and 'kg_user' columns.
+    animal_input : dict
+        Dictionary containing animal-specific input values.
+    equation_selection : dict
+        Dictionary containing equation selection criteria.
+    feed_library_df : pd.DataFrame or CompiledFeedLibrary
+        DataFrame containing the feed library data.
+    outputs : list, optional
+        Names of the outputs, by default Mlk_Prod_MPalow, Mlk_Prod_NEalow and every An_<mineral>_bal.
+    coeff_dict : dict, optional
+        Dictionary containing coefficients for the model, by default `nd.coeff_dict`.
+    infusion_input : dict, optional
+        Dictionary containing infusion input data, by default `nd.infusion_dict`.
+    MP_NP_efficiency_input : dict, optional
+        Dictionary containing amino acid conversion efficiencies, by default `nd.MP_NP_efficiency_dict`.
+    step : float, optional
+        Change in kg of each feed used for the finite differences.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per output and one column per Feedstuff in user_diet.
+
+    Notes
+    -----
+    - DMI is changed in proportion to the total kg_user, so when the kg_user column adds up
+      to DMI an extra kg of a feed is also an extra kg of DMI
+    - When DMI is predicted (DMIn_eqn is not 0) only the composition of the diet changes
+
+    Examples
+    --------
+    ```{python}
+    import pandas as pd
+    import nasem_dairy as nd
+
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+
+    nd.jacobian(user_diet, animal_input, equation_selection, feed_library,
+                outputs=['Mlk_Prod_MPalow', 'Mlk_Prod_NEalow', 'An_Ca_bal'])
+    ```
+    """
+    outputs = jacobian_outputs if outputs is None else list(outputs)
+    kg_user = user_diet.groupby('Feedstuff', sort=False)['kg_user'].sum()
+    n_feeds = len(kg_user)
+    base = kg_user.to_numpy(dtype=float)
+    central = base >= step
+
+    # Row 0 is the diet, then one row with more of each feed and one with less
+    # of each feed that can be reduced by step
+    changes = np.vstack([np.zeros(n_feeds),
+                         np.eye(n_feeds) * step,
+                         -np.eye(n_feeds)[central] * step])
+    diets = pd.DataFrame(base + changes, columns=kg_user.index)
+    animal_inputs = pd.DataFrame([animal_input] * len(diets))
+    animal_inputs['DMI'] = animal_input['DMI'] * diets.sum(axis=1) / base.sum()
+
+    with np.errstate(all='ignore'):
+        results = execute_model_batch(animal_inputs,
+                                      diets,
+                                      equation_selection,
+                                      feed_library_df,
+                                      coeff_dict,
+                                      infusion_input,
+                                      MP_NP_efficiency_input)
+    missing_outputs = [name for name in outputs if name not in results.columns]
+    if missing_outputs:
+        raise KeyError(f"Outputs not calculated by execute_model_batch: {missing_outputs}")
+    values = results[outputs].to_numpy()
+
+    upper = values[1:n_feeds + 1]
+    lower = np.repeat(values[[0]], n_feeds, axis=0)
+    lower[central] = values[n_feeds + 1:]
+    distance = np.where(central, 2 * step, step)[:, None]
+    return pd.DataFrame(((upper - lower) / distance).T, index=outputs, columns=kg_user.index)
@@ -0,0 +1,16 @@
+import pytest
+import nasem_dairy as nd
+import pandas as pd
+
+
+@pytest.fixture
+def model_input():
+    user_diet, animal_input, equation_selection = nd.read_csv_input("./src/nasem_dairy/data/input.csv")
+    feed_library = pd.read_csv("./src/nasem_dairy/data/NASEM_feed_library.csv")
+    return user_diet, animal_input, equation_selection, feed_library
+
+
+@pytest.fixture
+def compiled_model_input(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    return user_diet, animal_input, equation_selection, nd.CompiledFeedLibrary(feed_library)
@@ -0,0 +1,134 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+json_files = [
+    "./tests/micronutrient_requirement_equations_test.json",
+    "./tests/energy_requirement_equations_test.json",
+    "./tests/milk_equations_test.json"
+]
+
+# Values used in addition to those in the json files so that every branch is reached
+extra_values = {
+    'An_StatePhys': ['Lactating Cow', 'Dry Cow', 'Heifer', 'Calf'],
+    'An_Breed': ['Holstein', 'Jersey'],
+    'An_Parity_rl': [0, 1, 2],
+    'An_GestDay': [-10, 0, 50, 100, 200, 280, 290],
+    'An_LactDay': [0, 1, 60, 100, 400],
+    'An_AgeDay': [50, 300],
+    'Trg_MilkProd': [0, 35, np.nan],
+    'Trg_RsrvGain': [-0.5, 0, 0.5],
+    'Dt_DMIn_ClfLiq': [0, 0.5],
+    'Dt_PastIn': [0, 5],
+    'Dt_PastSupplIn': [0, 5]
+}
+
+
+@pytest.fixture
+def equation_inputs():
+    return pd.concat([pd.read_json(file) for file in json_files], ignore_index=True)
+
+
+def get_value_pool(equation_inputs):
+    """
+    All values used for each argument name across the json files.
+    """
+    value_pool = {name: list(values) for name, values in extra_values.items()}
+    for inputs in equation_inputs['Input']:
+        for name, value in inputs.items():
+            if isinstance(value, (int, float, str)) and value not in value_pool.setdefault(name, []):
+                value_pool[name].append(value)
+    return value_pool
+
+
+def get_scalar_inputs(rows, value_pool):
+    """
+    The json inputs for one function, plus copies with each argument changed
+    to every value in the pool for that argument.
+    """
+    scalar_inputs = []
+    for inputs in rows:
+        scalar_inputs.append(inputs)
+        for name, value in inputs.items():
+            if name.endswith('_eqn') or not isinstance(value, (int, float, str)):
+                continue
+            scalar_inputs.extend({**inputs, name: new_value}
+                                 for new_value in value_pool.get(name, []))
+    return scalar_inputs
+
+
+def test_arrays_match_scalars(equation_inputs):
+    value_pool = get_value_pool(equation_inputs)
+    for name, rows in equation_inputs.groupby('Name')['Input']:
+        func = getattr(nd, name)
+        rows = [{key: (nd.coeff_dict if key == 'coeff_dict' else value) for key, value in inputs.items()}
+                for inputs in rows]
+        # Equation selections are the same for every animal, so each is tested separately
+        eqn_names = sorted({key for inputs in rows for key in inputs if key.endswith('_eqn')})
+        groups = {}
+        for inputs in get_scalar_inputs(rows, value_pool):
+            groups.setdefault(tuple(inputs.get(key) for key in eqn_names), []).append(inputs)
+
+        for scalar_inputs in groups.values():
+            expected = []
+            valid_inputs = []
+            for inputs in scalar_inputs:
+                try:
+                    with np.errstate(all='ignore'):
+                        expected.append(float(func(**inputs)))
+                except (ZeroDivisionError, ValueError, OverflowError):
+                    continue
+                valid_inputs.append(inputs)
+
+            array_inputs = {}
+            for key, value in valid_inputs[0].items():
+                if key == 'coeff_dict' or key.endswith('_eqn'):
+                    array_inputs[key] = value
+                else:
+                    array_inputs[key] = np.array([inputs[key] for inputs in valid_inputs])
+            with np.errstate(all='ignore'):
+                result = np.broadcast_to(func(**array_inputs), (len(valid_inputs),))
+            np.testing.assert_allclose(result.astype(float), expected, rtol=1e-12, equal_nan=True,
+                                       err_msg=f"{name} array output does not match scalar output")
+
+
+def test_scalars_are_not_arrays(equation_inputs):
+    # Scalar calls return plain numbers, not 0-dimensional arrays
+    for name, inputs in zip(equation_inputs['Name'], equation_inputs['Input']):
+        inputs = {key: (nd.coeff_dict if key == 'coeff_dict' else value) for key, value in inputs.items()}
+        with np.errstate(all='ignore'):
+            result = getattr(nd, name)(**inputs)
+        assert not isinstance(result, np.ndarray), f"{name} returned a 0-dimensional array"
+    An_NEm_Act_Graze = nd.calculate_An_NEm_Act_Graze(Dt_PastIn=0, Dt_DMIn=20, Dt_PastSupplIn=0, An_MBW=130)
+    assert An_NEm_Act_Graze == 0 and type(An_NEm_Act_Graze) is int
+
+
+def test_Mlk_NP_g_arrays():
+    # Not in the json files as Abs_AA_g and mPrt_k_AA are indexed by amino acid
+    AA_list = ['Arg', 'His', 'Ile', 'Leu', 'Lys', 'Met', 'Phe', 'Thr', 'Trp', 'Val']
+    Abs_AA_g = pd.DataFrame([np.linspace(40, 220, 10), np.linspace(30, 200, 10), np.linspace(50, 250, 10)],
+                            columns=AA_list)
+    mPrt_k_AA = pd.DataFrame([np.linspace(-0.5, 1.5, 10)] * 3, columns=AA_list)
+    inputs = {
+        'An_StatePhys': np.array(['Lactating Cow', 'Heifer', 'Lactating Cow']),
+        'An_BW': np.array([625.0, 450.0, 700.0]),
+        'Abs_neAA_g': np.array([1200.0, 900.0, 1300.0]),
+        'Abs_OthAA_g': np.array([400.0, 300.0, 450.0]),
+        'Abs_EAA2b_g': np.array([5000.0, 4000.0, 5500.0]),
+        'mPrt_k_EAA2': np.array([-0.0003, -0.0002, -0.0004]),
+        'An_DigNDF': np.array([17.0, 20.0, 15.0]),
+        'An_DEInp': np.array([11.0, 8.0, 12.0]),
+        'An_DEStIn': np.array([20.0, 12.0, 22.0]),
+        'An_DEFAIn': np.array([5.0, 3.0, 6.0]),
+        'An_DErOMIn': np.array([2.0, 1.5, 2.5]),
+        'An_DENDFIn': np.array([10.0, 8.0, 11.0])
+    }
+    result = nd.calculate_Mlk_NP_g(Abs_AA_g=Abs_AA_g, mPrt_k_AA=mPrt_k_AA, coeff_dict=nd.coeff_dict, **inputs)
+    expected = [float(nd.calculate_Mlk_NP_g(Abs_AA_g=Abs_AA_g.loc[i], mPrt_k_AA=mPrt_k_AA.loc[i],
+                                            coeff_dict=nd.coeff_dict,
+                                            **{key: value[i] for key, value in inputs.items()}))
+                for i in range(3)]
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+    assert expected[1] == 0
@@ -0,0 +1,106 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+@pytest.fixture
+def model_outputs(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    diets = [user_diet, user_diet.iloc[:3], user_diet]
+    return [nd.execute_model(diet, {**animal_input, 'An_BW': An_BW}, equation_selection,
+                             feed_library, nd.coeff_dict.copy())
+            for diet, An_BW in zip(diets, [600, 650, 700])]
+
+
+def test_batch_model_output_layout(model_outputs):
+    batch = nd.BatchModelOutput.from_model_outputs(iter(model_outputs))
+    assert len(batch) == 3
+    assert batch.Production.keys() == model_outputs[0].Production.keys()
+    np.testing.assert_allclose(batch.Production['milk']['Mlk_Prod_comp'],
+                               [output.get_value('Mlk_Prod_comp') for output in model_outputs])
+    np.testing.assert_allclose(batch.get_value('An_Ca_bal'),
+                               [output.get_value('An_Ca_bal') for output in model_outputs])
+    assert list(batch.get_value('An_StatePhys')) == ['Lactating Cow'] * 3
+
+
+def test_batch_model_output_tables(model_outputs):
+    batch = nd.BatchModelOutput.from_model_outputs(model_outputs)
+    AA_values = batch.get_value('AA_values')
+    assert not AA_values.is_ragged
+    assert AA_values.columns['Abs_AA_g'].shape == (3, 10)
+    pd.testing.assert_frame_equal(AA_values.get(2), model_outputs[2].get_value('AA_values'), check_dtype=False)
+
+    diet_info = batch.get_value('diet_info')
+    assert diet_info.is_ragged
+    assert list(diet_info.offsets) == [0, 4, 7, 11]
+    pd.testing.assert_frame_equal(diet_info.get(1).reset_index(drop=True),
+                                  model_outputs[1].get_value('diet_info').reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_batch_model_output_to_pandas(model_outputs):
+    batch = nd.BatchModelOutput.from_model_outputs(model_outputs)
+    df = batch.to_pandas()
+    assert len(df) == 3
+    assert list(df['An_BW']) == [600, 650, 700]
+    diet_info = batch.to_pandas('diet_info')
+    assert len(diet_info) == 11
+    assert list(diet_info['animal'].unique()) == [0, 1, 2]
+    with pytest.raises(KeyError):
+        batch.to_pandas('Mlk_Prod_comp')
+
+
+def test_batch_model_output_to_arrow(model_outputs):
+    pytest.importorskip("pyarrow")
+    batch = nd.BatchModelOutput.from_model_outputs(model_outputs)
+    table = batch.to_arrow()
+    assert table.num_rows == 3
+    metadata = table.schema.field('Mlk_Prod_comp').metadata
+    assert metadata[b'category'] == b'Production' and metadata[b'group'] == b'milk'
+    assert batch.to_arrow('AA_values').num_rows == 30
+
+
+def test_batch_model_output_search(model_outputs):
+    batch = nd.BatchModelOutput.from_model_outputs(model_outputs)
+    result = batch.search('Mlk_Prod_comp').set_index('Name')
+    np.testing.assert_array_equal(result.loc['Mlk_Prod_comp', 'Value'], batch.get_value('Mlk_Prod_comp'))
+    assert list(batch.search('Mlk').columns) == ['Name', 'Value']
+    assert len(batch.search('Mlk')) == len(model_outputs[0].search('Mlk'))
+
+
+def test_batch_model_output_save_load(model_outputs, tmp_path):
+    batch = nd.BatchModelOutput.from_model_outputs(model_outputs)
+    path = tmp_path / "batch.nasem"
+    batch.save(path)
+    loaded = nd.BatchModelOutput.load(path)
+    assert len(loaded) == 3
+    # Every array is a view into one mapping of the file, so loading holds a single file descriptor
+    milk, Mlk_NP = loaded.get_value('Mlk_Prod_comp'), loaded.get_value('Mlk_NP_g')
+    assert isinstance(milk.base, np.memmap) and milk.base is Mlk_NP.base
+    np.testing.assert_array_equal(loaded.Production['milk']['Mlk_Prod_comp'], batch.get_value('Mlk_Prod_comp'))
+    assert list(loaded.get_value('An_StatePhys')) == list(batch.get_value('An_StatePhys'))
+    pd.testing.assert_frame_equal(loaded.get_value('diet_info').get(1), batch.get_value('diet_info').get(1))
+    pd.testing.assert_frame_equal(loaded.get_value('AA_values').get(0), batch.get_value('AA_values').get(0))
+    pd.testing.assert_frame_equal(nd.BatchModelOutput.load(path, mmap_mode=None).to_pandas(), batch.to_pandas())
+
+
+def test_batch_model_output_from_batch_results(compiled_model_input, model_outputs):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    herd = pd.DataFrame([animal_input] * 3).assign(diet_id='TMR', An_BW=[600, 650, 700])
+    results = nd.execute_model_batch(herd, {'TMR': user_diet}, equation_selection, feed_library)
+    batch = nd.BatchModelOutput.from_batch_results(results)
+    assert len(batch) == 3
+    # Outputs are stored in the same places as from ModelOutputs
+    np.testing.assert_array_equal(batch.Production['milk']['Mlk_Prod_comp'], results['Mlk_Prod_comp'])
+    np.testing.assert_array_equal(batch.Inputs['animal_input']['An_BW'], [600, 650, 700])
+    np.testing.assert_allclose(batch.get_value('Mlk_Prod_comp')[[0, 2]],
+                               [model_outputs[0].get_value('Mlk_Prod_comp'),
+                                model_outputs[2].get_value('Mlk_Prod_comp')], rtol=1e-12)
+    AA_values = batch.get_value('AA_values')
+    assert AA_values.columns['Abs_AA_g'].shape == (3, 10)
+    pd.testing.assert_series_equal(AA_values.get(2)['Abs_AA_g'], model_outputs[2].get_value('AA_values')['Abs_AA_g'],
+                                   check_names=False, rtol=1e-12)
+    np.testing.assert_array_equal(batch.Uncategorized['DMI_input'], results['DMI_input'])
+    assert list(batch.get_value('An_StatePhys')) == ['Lactating Cow'] * 3
+    assert batch.to_pandas()['Mlk_Prod_comp'].tolist() == results['Mlk_Prod_comp'].tolist()
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import nasem_dairy as nd
+
+
+def test_coeff_overlay_layers():
+    coeffs = nd.CoeffOverlay({'LCT': 5}, nd.coeff_dict)
+    assert coeffs['LCT'] == 5 and coeffs['En_CP'] == nd.coeff_dict['En_CP']
+    coeffs['En_CP'] = 1
+    assert nd.coeff_dict['En_CP'] != 1
+    assert coeffs.to_dict() == {**nd.coeff_dict, 'LCT': 5, 'En_CP': 1}
+    with pytest.raises(AssertionError):
+        nd.check_coeffs_in_coeff_dict(coeffs, ['Not_a_coefficient'])
+
+
+def test_execute_model_does_not_change_coeff_dict(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    coeff_dict = dict(nd.coeff_dict)
+    calf = nd.execute_model(user_diet, {**animal_input, 'An_AgeDay': 10}, equation_selection,
+                            feed_library, coeff_dict)
+    assert coeff_dict == nd.coeff_dict
+    assert calf.get_value('coeff_dict')['LCT'] == nd.adjust_LCT(10)
+    assert type(calf.get_value('coeff_dict')) is dict
+
+
+def test_execute_model_threads_share_coeff_dict(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    ages = [10, 200, 15, 800] * 3
+
+    def run(An_AgeDay):
+        output = nd.execute_model(user_diet, {**animal_input, 'An_AgeDay': An_AgeDay}, equation_selection,
+                                  feed_library, nd.coeff_dict, outputs=['An_NEm_Act_Topo', 'Trg_MEuse'])
+        return output['An_NEm_Act_Topo'], output['Trg_MEuse']
+
+    expected = [run(An_AgeDay) for An_AgeDay in ages]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(run, ages)) == expected
+    assert nd.coeff_dict['LCT'] == 15
@@ -0,0 +1,53 @@
+import pickle
+
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+@pytest.fixture
+def model_output(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    return nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+
+
+def test_model_output_values_are_python_scalars(model_output):
+    # np.where() results are stored as Python numbers
+    for name in ['An_MEIn', 'Mlk_Prod_comp', 'An_DCADmeq', 'An_Ca_req']:
+        assert type(model_output.get_value(name)) in (float, int)
+
+
+def test_model_output_attributes_and_pickle(model_output):
+    # Attributes can be added, and a ModelOutput can be pickled with them
+    model_output.scenario = 3
+    loaded = pickle.loads(pickle.dumps(model_output))
+    assert loaded.scenario == 3
+    assert loaded.get_value('Mlk_Prod_comp') == model_output.get_value('Mlk_Prod_comp')
+
+
+def test_compact_model_output(model_output):
+    compact = nd.CompactModelOutput.from_model_output(model_output)
+    for name in ['An_MEIn', 'An_StatePhys', 'An_Parity_rl', 'diet_info', 'Not_an_output']:
+        value = model_output.get_value(name)
+        compact_value = compact.get_value(name)
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(compact_value, value)
+        else:
+            assert compact_value == value
+            assert type(compact_value) is type(value)
+    assert compact.Production['milk'] == model_output.Production['milk']
+    assert compact.get_value('mineral_requirements') == model_output.get_value('mineral_requirements')
+    np.testing.assert_array_equal(compact.get_values(['An_MEIn', 'Trg_MEuse']),
+                                  model_output.get_values(['An_MEIn', 'Trg_MEuse']))
+    with pytest.raises(KeyError):
+        compact.get_values(['An_MEIn', 'Not_an_output'])
+    assert nd.compare_outputs(model_output, compact.to_model_output()).equal
+
+    # Outputs with the same variables share a layout, also after pickling
+    again = nd.CompactModelOutput.from_model_output(model_output, dtype='float32')
+    assert again._layout is compact._layout
+    assert pickle.loads(pickle.dumps(again))._layout is compact._layout
+    assert again.nbytes == compact.nbytes // 2
+    assert again.get_value('An_MEIn') == pytest.approx(model_output.get_value('An_MEIn'), rel=1e-6)
+    assert nd.compare_outputs(model_output, again.to_model_output(), rtol=1e-6).equal
@@ -0,0 +1,98 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+def test_compare_model_outputs(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    reference = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    same = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    report = nd.compare_outputs(reference, same)
+    assert report.equal
+    assert report.n_rows == 1
+    assert report.n_variables > 500
+
+    candidate = nd.execute_model(user_diet, {**animal_input, 'An_BW': animal_input['An_BW'] + 10},
+                                 equation_selection, feed_library, nd.coeff_dict.copy())
+    report = nd.compare_outputs(reference, candidate, rtol=1e-6)
+    assert not report
+    assert 'An_BW' in report.summary.index
+    assert 'An_StatePhys' not in report.summary.index
+    row = report.summary.loc['An_BW']
+    assert row['n_diverged'] == 1
+    assert row['max_abs_diff'] == pytest.approx(10)
+    assert row['candidate'] - row['reference'] == pytest.approx(10)
+    # A large enough tolerance accepts the change in body weight
+    assert 'An_BW' not in nd.compare_outputs(reference, candidate, atol=11).summary.index
+
+
+def test_compare_tables():
+    reference = pd.DataFrame({'scenario': [0, 1, 2, 3],
+                              'DMI': [20.0, 21.0, np.nan, 0.0],
+                              'Milk': [30.0, 31.0, 32.0, 33.0],
+                              'An_StatePhys': ['Lactating Cow', 'Dry Cow', 'Heifer', 'Heifer'],
+                              'Old': [1.0, 2.0, 3.0, 4.0]})
+    candidate = pd.DataFrame({'scenario': [3, 2, 1, 0, 4],
+                              'DMI': [1e-12, np.nan, 21.0, 20.0, 22.0],
+                              'Milk': [33.0, 32.5, np.nan, 30.0, 35.0],
+                              'An_StatePhys': ['Heifer', 'Heifer', 'Dry Cow', 'Lactating Cow', 'Heifer'],
+                              'New': [1.0, 2.0, 3.0, 4.0, 5.0]})
+    report = nd.compare_outputs(reference, candidate, atol=1e-9, on='scenario')
+    assert report.n_rows == 4
+    assert report.n_variables == 3
+    assert report.only_in_reference == ['Old']
+    assert report.only_in_candidate == ['New']
+    assert list(report.rows_only_in_candidate) == [4]
+    assert list(report.summary.index) == ['Milk']
+    milk = report.summary.loc['Milk']
+    assert milk['n_diverged'] == 2
+    assert milk['max_abs_diff'] == np.inf
+    assert milk['row'] == 1
+    assert sorted(report.diverged_rows) == [1, 2]
+
+    candidate.loc[candidate['scenario'] == 2, 'An_StatePhys'] = 'Dry Cow'
+    report = nd.compare_outputs(reference, candidate, atol=1, on='scenario')
+    assert list(report.summary.index) == ['Milk', 'An_StatePhys']
+    assert report.summary.loc['An_StatePhys', 'row'] == 2
+
+    with pytest.raises(ValueError):
+        nd.compare_outputs(reference, pd.concat([candidate, candidate]))
+
+
+def test_compare_table_outputs(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    reference = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    candidate = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    feed = candidate.get_value('diet_info')['Feedstuff'].iloc[0]
+    candidate.get_value('diet_info').loc[0, 'Fd_CP'] += 1
+    candidate.get_value('AA_values').loc['Arg', 'Abs_AA_g'] += 1
+    report = nd.compare_outputs(reference, candidate)
+    assert sorted(report.summary.index) == ['AA_values[Arg].Abs_AA_g', f'diet_info[{feed}].Fd_CP']
+
+    batch = nd.BatchModelOutput.from_model_outputs([reference, candidate])
+    report = nd.compare_outputs(batch, [reference, reference])
+    assert list(report.diverged_rows) == [1]
+    assert f'diet_info[{feed}].Fd_CP' in report.summary.index
+
+    # A feed removed from the diet
+    smaller = nd.execute_model(user_diet.iloc[1:], animal_input, equation_selection, feed_library,
+                               nd.coeff_dict.copy())
+    report = nd.compare_outputs(reference, smaller)
+    assert f'diet_info[{feed}].Fd_CP' in report.only_in_reference
+
+
+def test_compare_batch_table_outputs(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    full = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    smaller = nd.execute_model(user_diet.iloc[1:], animal_input, equation_selection, feed_library,
+                               nd.coeff_dict.copy())
+    # The cells of a BatchModelOutput match those of its ModelOutputs, for same and ragged rows
+    for results in ([full, full], [full, smaller]):
+        batch = nd.BatchModelOutput.from_model_outputs(results)
+        report = nd.compare_outputs(batch, results)
+        assert report.equal
+        assert report.n_variables == nd.compare_outputs(results, results).n_variables
+    feed = full.get_value('diet_info')['Feedstuff'].iloc[0]
+    report = nd.compare_outputs(batch, [full, full])
+    assert report.summary.loc[f'diet_info[{feed}].Fd_CP', 'row'] == 1
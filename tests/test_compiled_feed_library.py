@@ -0,0 +1,64 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+def test_get_feed_rows(model_input):
+    user_diet, _, _, feed_library = model_input
+    compiled = nd.CompiledFeedLibrary(feed_library)
+    feeds = user_diet['Feedstuff'].tolist() + ['Not a feed']
+    pd.testing.assert_frame_equal(compiled.get_feed_rows(feeds),
+                                  nd.get_feed_rows_feedlibrary(feeds_to_get=feeds, feed_lib_df=feed_library))
+
+
+def test_get_feed_properties(model_input):
+    user_diet, _, _, feed_library = model_input
+    compiled = nd.CompiledFeedLibrary(feed_library)
+    feeds = user_diet['Feedstuff'].tolist()
+    feed_properties = compiled.get_feed_properties(feeds + ['Not a feed'], 'Lactating Cow', 1, nd.coeff_dict)
+    feed_data = compiled.get_feed_rows(feeds).set_index('Feedstuff').loc[feeds].reset_index()
+    expected = nd.calculate_feed_properties('Lactating Cow', 1, feed_data, nd.coeff_dict)
+    pd.testing.assert_frame_equal(feed_properties.iloc[:-1], expected.astype(float))
+    assert feed_properties.iloc[-1].isna().all()
+    # Properties are compiled once for each An_StatePhys, Use_DNDF_IV and set of coefficients
+    assert compiled.compile('Lactating Cow', 1, nd.coeff_dict) is compiled.compile('Lactating Cow', 1, nd.coeff_dict.copy())
+    assert compiled.compile('Lactating Cow', 1, {**nd.coeff_dict, 'LCT': 5}) is compiled.compile('Lactating Cow', 1, nd.coeff_dict)
+    assert compiled.compile('Lactating Cow', 1, {**nd.coeff_dict, 'En_CP': 5.5}) is not compiled.compile('Lactating Cow', 1, nd.coeff_dict)
+
+
+@pytest.mark.parametrize("equation_changes", [{}, {'Use_DNDF_IV': 1}])
+def test_execute_model(model_input, equation_changes):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    equation_selection = {**equation_selection, **equation_changes}
+    compiled = nd.CompiledFeedLibrary(feed_library)
+    expected = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    for _ in range(2):
+        output = nd.execute_model(user_diet, animal_input, equation_selection, compiled, nd.coeff_dict.copy())
+        pd.testing.assert_frame_equal(output.get_value('diet_info'), expected.get_value('diet_info'),
+                                      check_dtype=False)
+        for name in ['Mlk_Prod_comp', 'An_MPuse_g_Trg', 'An_RDPIn_g', 'An_DEIn', 'An_Ca_req']:
+            assert output.get_value(name) == pytest.approx(expected.get_value(name), rel=1e-12)
+        # The feed properties used in the run are not an output
+        assert output.get_value('feed_properties') is None
+        assert sorted(output.Uncategorized) == sorted(expected.Uncategorized)
+
+
+def test_sum_diet_intakes(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    compiled = nd.CompiledFeedLibrary(feed_library)
+    output = nd.execute_model(user_diet, animal_input, equation_selection, compiled, nd.coeff_dict.copy())
+    diet_info = output.get_value('diet_info')
+    expected = nd.calculate_diet_data_sums(diet_info, nd.coeff_dict)
+    diet_info_initial = diet_info[['Feedstuff', 'kg_user', 'Fd_DMInp']].assign(
+        Fd_DMIn=diet_info['Fd_DMInp'] * animal_input['DMI'])
+    diet_sums = compiled.sum_diet_intakes(diet_info_initial, output.get_value('DMI'), 'Lactating Cow',
+                                          equation_selection['Use_DNDF_IV'], nd.coeff_dict)
+    assert diet_sums.keys() == expected.keys()
+    for name, value in expected.items():
+        assert diet_sums[name] == pytest.approx(value, rel=1e-12, abs=1e-15)
+    # The composition of the feeds is kept
+    feeds = user_diet['Feedstuff'].tolist()
+    assert (compiled.get_feed_composition(feeds, 'Lactating Cow', equation_selection['Use_DNDF_IV'], nd.coeff_dict)
+            is compiled.get_feed_composition(feeds, 'Lactating Cow', equation_selection['Use_DNDF_IV'],
+                                             {**nd.coeff_dict, 'LCT': 5}))
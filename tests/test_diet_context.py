@@ -0,0 +1,32 @@
+import nasem_dairy as nd
+
+
+def test_diet_context_matches_execute_model(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    pen = nd.DietContext(user_diet, feed_library)
+    cows = [({**animal_input, 'An_BW': An_BW, 'DMI': DMI}, equation_selection)
+            for An_BW, DMI in [(600, 22.5), (650, 24.0), (700, 25.5)]]
+    # DMI predicted by the model is different from the DMI in animal_input
+    cows.append((animal_input, {**equation_selection, 'DMIn_eqn': 8}))
+    for cow, selection in cows:
+        expected = nd.execute_model(user_diet, cow, selection, feed_library)
+        # The same diet fed in different amounts has the same composition
+        for diet in [user_diet, user_diet.assign(kg_user=user_diet['kg_user'] * 1.1)]:
+            output = nd.execute_model(diet, cow, selection, pen)
+            report = nd.compare_outputs(expected, output, rtol=1e-12)
+            # Only the amounts of the diet input, which diet_info keeps, are different
+            assert all(name.startswith(('user_diet[', 'diet_info[')) and name.endswith('].kg_user')
+                       for name in report.summary.index)
+            assert report.summary.empty or diet is not user_diet
+    assert len(pen._compositions) == 1
+
+
+def test_diet_context_other_diets(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    pen = nd.DietContext(user_diet, feed_library)
+    other_diet = user_diet.assign(kg_user=user_diet['kg_user'] * ([2] + [1] * (len(user_diet) - 1)))
+    assert not pen.is_same_diet(other_diet.assign(Fd_DMInp=other_diet['kg_user'] / other_diet['kg_user'].sum()))
+    expected = nd.execute_model(other_diet, animal_input, equation_selection, feed_library)
+    output = nd.execute_model(other_diet, animal_input, equation_selection, pen)
+    assert nd.compare_outputs(expected, output, rtol=0).equal
+    assert len(pen._compositions) == 0
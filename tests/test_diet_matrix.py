@@ -0,0 +1,56 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+def test_from_user_diets(model_input):
+    user_diet, _, _, feed_library = model_input
+    user_diet_2 = user_diet.iloc[:3].assign(kg_user=[1.0, 0.0, 2.0])
+    diets = nd.DietMatrix.from_user_diets({'diet_1': user_diet, 'diet_2': user_diet_2}, feed_library)
+    assert diets.shape == (2, len(feed_library))
+    assert list(diets.index) == ['diet_1', 'diet_2']
+    # Feeds with 0 kg are not stored
+    assert diets.nnz == len(user_diet) + 2
+    dense = diets.to_dataframe()
+    expected = user_diet.groupby('Feedstuff')['kg_user'].sum()
+    pd.testing.assert_series_equal(dense.loc['diet_1', expected.index], expected, check_names=False)
+    with pytest.raises(ValueError):
+        nd.DietMatrix.from_user_diets([pd.DataFrame({'Feedstuff': ['Not a feed'], 'kg_user': [1.0]})],
+                                      feed_library)
+
+
+def test_matches_dense():
+    rng = np.random.default_rng(1)
+    kg = rng.uniform(0, 10, (50, 20))
+    kg[kg < 6] = 0
+    kg_user = pd.DataFrame(kg, columns=[f'feed_{i}' for i in range(20)])
+    diets = nd.DietMatrix.from_dataframe(kg_user)
+    np.testing.assert_array_equal(diets.toarray(), kg)
+    nutrients = rng.uniform(0, 1, (20, 5))
+    np.testing.assert_allclose(diets.dot(nutrients), kg @ nutrients)
+    np.testing.assert_allclose(diets.dot(nutrients[:, 0]), kg @ nutrients[:, 0])
+    rows = [3, 3, 0, 49]
+    np.testing.assert_array_equal(diets.take(rows).toarray(), kg[rows])
+    assert list(diets.take(rows).index) == rows
+    np.testing.assert_allclose(diets.proportions().row_sums()[kg.sum(axis=1) > 0], 1)
+    columns = np.zeros(20, dtype=bool)
+    columns[[2, 7]] = True
+    np.testing.assert_array_equal(diets.any_nonzero(columns), (kg[:, columns] > 0).any(axis=1))
+    np.testing.assert_array_equal(diets.used_feeds(), (kg > 0).any(axis=0))
+
+
+def test_execute_model_batch(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    user_diet_2 = user_diet.assign(kg_user=user_diet['kg_user'] * np.linspace(0.5, 1.5, len(user_diet)))
+    diets = nd.DietMatrix.from_user_diets({'diet_1': user_diet, 'diet_2': user_diet_2}, feed_library)
+    animal_inputs = pd.DataFrame([{**animal_input, 'diet_id': diet_id}
+                                  for diet_id in ['diet_2', 'diet_1', 'diet_2']])
+    from_matrix = nd.execute_model_batch(animal_inputs, diets, equation_selection, feed_library)
+    from_dict = nd.execute_model_batch(animal_inputs, {'diet_1': user_diet, 'diet_2': user_diet_2},
+                                       equation_selection, feed_library)
+    pd.testing.assert_frame_equal(from_matrix, from_dict)
+    # One row per animal without diet_id
+    per_animal = nd.execute_model_batch(animal_inputs.drop(columns='diet_id'),
+                                        diets.take([1, 0, 1]), equation_selection, feed_library)
+    pd.testing.assert_frame_equal(per_animal, from_dict)
@@ -0,0 +1,86 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+@pytest.fixture
+def animal_variants():
+    return [
+        {},
+        {'An_BW': 700, 'An_LactDay': 20, 'An_GestDay': 200},
+        {'An_Parity_rl': 0, 'An_GestDay': 50, 'An_Breed': 'Jersey'},
+        {'Trg_MilkProd': 45, 'An_GestDay': 0, 'An_LactDay': 300},
+        {'An_StatePhys': 'Heifer', 'An_Parity_rl': 0, 'An_LactDay': 0, 'Trg_MilkProd': 0,
+         'An_BW': 400, 'An_AgeDay': 500, 'An_GestDay': 100},
+        {'An_StatePhys': 'Dry Cow', 'An_LactDay': 0, 'Trg_MilkProd': 0, 'An_GestDay': 250}
+    ]
+
+
+def compare_to_execute_model(results, diets, animal_inputs, equation_selection, feed_library):
+    for index, animal_input in animal_inputs.iterrows():
+        animal_input = animal_input.drop('diet_id').to_dict()
+        model_output = nd.execute_model(diets[index], animal_input, equation_selection,
+                                        feed_library, nd.coeff_dict.copy())
+        for name in results.columns:
+            # get_value() returns coeff_dict entries for these names
+            if name in nd.coeff_dict or name == 'An_StatePhys':
+                continue
+            value = model_output.get_value(name)
+            if isinstance(value, (int, float, np.number)):
+                assert results.loc[index, name] == pytest.approx(value, rel=1e-9, nan_ok=True), \
+                    f"{name} failed for animal {index}: {results.loc[index, name]} does not equal {value}"
+
+
+@pytest.mark.parametrize("equation_changes", [{}, {'DMIn_eqn': 8, 'mProd_eqn': 4, 'MiN_eqn': 2}])
+def test_matches_execute_model(model_input, animal_variants, equation_changes):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    equation_selection = {**equation_selection, **equation_changes}
+    user_diet_2 = user_diet.assign(kg_user=user_diet['kg_user'] * np.linspace(0.5, 1.5, len(user_diet)))
+    animal_inputs = pd.DataFrame([{**animal_input, **changes, 'diet_id': 'diet_2' if i % 2 else 'diet_1'}
+                                  for i, changes in enumerate(animal_variants)])
+    results = nd.execute_model_batch(animal_inputs, {'diet_1': user_diet, 'diet_2': user_diet_2},
+                                     equation_selection, feed_library)
+    assert len(results) == len(animal_inputs)
+    diets = [user_diet_2 if i % 2 else user_diet for i in range(len(animal_inputs))]
+    compare_to_execute_model(results, diets, animal_inputs, equation_selection, feed_library)
+
+
+def test_diet_matrix(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    # Whole milk has no Fd_dcFA, which changes TT_dcFdFA for every feed in the diet
+    user_diet_milk = pd.concat([user_diet, pd.DataFrame({'Feedstuff': ['Whole milk'], 'kg_user': [1.0]})],
+                               ignore_index=True)
+    kg_user = pd.DataFrame([user_diet.set_index('Feedstuff')['kg_user'],
+                            user_diet_milk.set_index('Feedstuff')['kg_user']],
+                           index=['cow_1', 'cow_2']).fillna(0)
+    animal_inputs = pd.DataFrame([animal_input, animal_input], index=['cow_1', 'cow_2'])
+    results = nd.execute_model_batch(animal_inputs, kg_user, equation_selection, feed_library)
+    assert list(results.index) == ['cow_1', 'cow_2']
+    compare_to_execute_model(results, {'cow_1': user_diet, 'cow_2': user_diet_milk},
+                             animal_inputs.assign(diet_id=None), equation_selection, feed_library)
+
+
+def test_invalid_input(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    calves = pd.DataFrame([{**animal_input, 'An_StatePhys': 'Calf', 'diet_id': 'diet_1'}])
+    with pytest.raises(ValueError):
+        nd.execute_model_batch(calves, {'diet_1': user_diet}, equation_selection, feed_library)
+    missing_feed = pd.DataFrame({'Feedstuff': ['Not a feed'], 'kg_user': [1.0]})
+    cows = pd.DataFrame([{**animal_input, 'diet_id': 'diet_1'}])
+    with pytest.raises(ValueError):
+        nd.execute_model_batch(cows, {'diet_1': missing_feed}, equation_selection, feed_library)
+    with pytest.raises(ValueError):
+        nd.execute_model_batch(cows, {'diet_1': user_diet}, {**equation_selection, 'DMIn_eqn': 9}, feed_library)
+
+
+def test_duplicate_index(model_input, animal_variants):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    # Animals are matched to their results by position, not by label
+    animal_inputs = pd.DataFrame([{**animal_input, **changes, 'diet_id': 'diet_1'} for changes in animal_variants],
+                                 index=['cow'] * len(animal_variants))
+    results = nd.execute_model_batch(animal_inputs, {'diet_1': user_diet}, equation_selection, feed_library)
+    assert list(results.index) == list(animal_inputs.index)
+    assert list(results['An_StatePhys']) == list(animal_inputs['An_StatePhys'])
+    compare_to_execute_model(results.reset_index(drop=True), [user_diet] * len(animal_inputs),
+                             animal_inputs.reset_index(drop=True), equation_selection, feed_library)
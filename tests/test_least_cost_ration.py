@@ -0,0 +1,57 @@
+import pytest
+import nasem_dairy as nd
+import pandas as pd
+
+
+@pytest.fixture
+def feeds():
+    return pd.DataFrame({
+        'Feedstuff': ['Corn silage, typical', 'Alfalfa meal', 'Canola meal', 'Corn grain HM, coarse grind',
+                      'Soybean meal, extruded', 'VitTM Premix, generic', 'Sodium chloride (salt)', 'Limestone',
+                      'Cobalt carbonate'],
+        'price': [0.08, 0.25, 0.40, 0.22, 0.5, 2.0, 0.3, 0.1, 5.0],
+        'min': [0.2, 0, 0, 0, 0, 0, 0, 0, 0],
+        'max': [0.6, 0.4, 0.3, 0.4, 0.3, 0.02, 0.01, 0.02, 0.001]
+    })
+
+
+def test_least_cost_ration(compiled_model_input, feeds):
+    _, animal_input, equation_selection, feed_library = compiled_model_input
+    constraints = {**nd.ration_constraints, 'Dt_NDF': (28, 36)}
+    ration = nd.formulate_least_cost_ration(animal_input, feeds, equation_selection, feed_library,
+                                            constraints=constraints, n_candidates=100, max_iterations=20, seed=1)
+    assert ration['feasible']
+    proportions = ration['user_diet']['kg_user'] / ration['user_diet']['kg_user'].sum()
+    assert (proportions >= feeds['min'] - 1e-9).all() and (proportions <= feeds['max'] + 1e-9).all()
+    assert ration['cost'] == pytest.approx((ration['user_diet']['kg_user'] * feeds['price']).sum())
+
+    # The diet found meets the constraints when run with execute_model
+    output = nd.execute_model(ration['user_diet'], animal_input, equation_selection, feed_library,
+                              nd.coeff_dict.copy())
+    assert output.get_value('An_MPIn_g') >= output.get_value('An_MPuse_g_Trg') * (1 - 1e-9)
+    assert output.get_value('An_MEIn') >= output.get_value('Trg_MEuse')
+    assert 28 <= output.get_value('Dt_NDF') <= 36
+    assert 100 <= output.get_value('An_DCADmeq') <= 500
+    assert output.get_value('An_Ca_bal') >= 0
+
+
+def test_default_constraints(compiled_model_input, feeds):
+    _, animal_input, equation_selection, feed_library = compiled_model_input
+    assert nd.ration_constraints['Dt_NDF'] == (25, 40)
+    assert nd.ration_constraints['An_DCADmeq'] == (100, 500)
+    ration = nd.formulate_least_cost_ration(animal_input, feeds, equation_selection, feed_library,
+                                            n_candidates=100, max_iterations=20, seed=1)
+    constraints = ration['constraints'].set_index('Output')
+    assert {'Dt_NDF', 'An_DCADmeq'} <= set(constraints.index)
+    assert ration['feasible']
+    assert 25 <= constraints.loc['Dt_NDF', 'Value'] <= 40
+    assert 100 <= constraints.loc['An_DCADmeq', 'Value'] <= 500
+
+
+def test_invalid_feeds(compiled_model_input, feeds):
+    _, animal_input, equation_selection, feed_library = compiled_model_input
+    with pytest.raises(ValueError):
+        nd.formulate_least_cost_ration(animal_input, feeds.assign(max=0.05), equation_selection, feed_library)
+    with pytest.raises(ValueError):
+        nd.formulate_least_cost_ration(animal_input, feeds.assign(Feedstuff='Not a feed'), equation_selection,
+                                       feed_library)
@@ -0,0 +1,79 @@
+import nasem_dairy as nd
+
+
+def test_memory_cache_key(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    cache = nd.MemoryCache()
+    key = cache.key(user_diet, animal_input, equation_selection, feed_library)
+    reversed_diet = user_diet.iloc[::-1].reset_index(drop=True)
+    reordered = dict(reversed(list(animal_input.items())))
+    assert cache.key(reversed_diet, reordered, equation_selection, nd.CompiledFeedLibrary(feed_library)) == key
+
+    changed_diet = user_diet.assign(kg_user=user_diet['kg_user'] * (1 + 0.1 * (user_diet.index == 0)))
+    assert cache.key(changed_diet, animal_input, equation_selection, feed_library) != key
+    assert cache.key(user_diet, animal_input, {**equation_selection, 'DMIn_eqn': 8}, feed_library) != key
+    assert cache.key(user_diet, animal_input, equation_selection, feed_library,
+                     {**nd.coeff_dict, 'Kl_ME_NE': 0.7}) != key
+    assert cache.key(user_diet, animal_input, equation_selection, feed_library,
+                     infusion_input={**nd.infusion_dict, 'Inf_Glc_g': 100}) != key
+
+
+def test_memory_cache_hits(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    cache = nd.MemoryCache()
+    expected = nd.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    first = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    second = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    assert nd.compare_outputs(expected, second, rtol=0).equal
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    assert cache.size > 0
+
+    snapshot = cache.execute_model(user_diet, animal_input, equation_selection, feed_library, capture='snapshot')
+    assert cache.execute_model(user_diet, animal_input, equation_selection, feed_library,
+                               capture='snapshot') == snapshot
+    values = cache.execute_model(user_diet, animal_input, equation_selection, feed_library,
+                                 outputs=['Mlk_Prod_comp', 'An_MEIn'])
+    assert values['An_MEIn'] == expected.get_value('An_MEIn')
+    assert cache.stats()['hits'] == 2 and cache.stats()['n_results'] == 3
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_memory_cache_results_are_copies(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    cache = nd.MemoryCache()
+    first = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    milk_production = first.get_value('Mlk_Prod_comp')
+    # Changing the results given doesn't change the cache
+    first.get_value('Production')['milk']['Mlk_Prod_comp'] = -1.0
+    first.get_value('diet_info')['Fd_CP'] = 0.0
+    second = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    assert second.get_value('Production')['milk']['Mlk_Prod_comp'] == milk_production
+    assert (second.get_value('diet_info')['Fd_CP'] > 0).any()
+    second.get_value('diet_info').drop(columns='Fd_CP', inplace=True)
+    third = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    assert 'Fd_CP' in third.get_value('diet_info').columns
+
+    values = cache.execute_model(user_diet, animal_input, equation_selection, feed_library, outputs=['diet_info'])
+    values['diet_info'] = None
+    assert cache.execute_model(user_diet, animal_input, equation_selection, feed_library,
+                               outputs=['diet_info'])['diet_info'] is not None
+
+
+def test_memory_cache_evicts_least_recently_used(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    cache = nd.MemoryCache(max_entries=2)
+    outputs = ['Mlk_Prod_comp']
+    keys = {}
+    for An_BW in [600, 650, 600, 700]:
+        cow = {**animal_input, 'An_BW': An_BW}
+        keys[An_BW] = cache.key(user_diet, cow, equation_selection, feed_library, outputs=outputs)
+        cache.execute_model(user_diet, cow, equation_selection, feed_library, outputs=outputs)
+    assert keys[600] in cache and keys[700] in cache and keys[650] not in cache
+    assert cache.n_evicted == 1
+
+    # Limited by size, a full ModelOutput doesn't fit
+    cache = nd.MemoryCache(max_bytes=10_000)
+    cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    cache.execute_model(user_diet, animal_input, equation_selection, feed_library, outputs=outputs)
+    assert len(cache) == 1 and cache.size <= 10_000
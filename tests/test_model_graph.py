@@ -0,0 +1,117 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+from nasem_dairy.ration_balancer.execute_model import model_graph
+from nasem_dairy.ration_balancer.model_graph import ModelGraph
+
+
+def sectioned_model(a, outputs=None):
+    if outputs is not None:
+        return {}
+
+    ########################################
+    # Step 1: Calculate
+    ########################################
+    capture = a * 2
+    outputs_sum = capture + a
+
+    ########################################
+    # Capture Outputs
+    ########################################
+    locals_dict = locals()
+    return locals_dict
+
+
+@pytest.mark.parametrize("equation_changes", [{}, {'DMIn_eqn': 8, 'MiN_eqn': 2}])
+def test_outputs_match_execute_model(model_input, equation_changes):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    equation_selection = {**equation_selection, **equation_changes}
+    animal_input_copy = animal_input.copy()
+    expected = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    # Local variables, animal_input entries, AA_values columns and entries in diet_data
+    outputs = ['Mlk_Prod', 'An_MEIn', 'An_MPIn_g', 'Trg_MEuse', 'An_DCADmeq', 'DMI', 'Abs_AA_g', 'Dt_NDFIn']
+    results = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy(),
+                               outputs=outputs)
+    assert list(results) == outputs
+    for name in outputs:
+        if isinstance(results[name], pd.Series):
+            pd.testing.assert_series_equal(results[name], expected.get_value('AA_values')[name])
+        else:
+            assert results[name] == pytest.approx(expected.get_value(name), rel=1e-12)
+    assert animal_input == animal_input_copy
+
+
+def test_graph_sections():
+    # Statements are nodes from the first heading to 'Capture Outputs', whatever names they use
+    nodes = ModelGraph(sectioned_model).build()
+    assert [node.binds for node in nodes] == [{'capture'}, {'outputs_sum'}]
+    assert 'capture' in nodes[1].uses
+
+
+def test_plan():
+    plan = model_graph.plan(['An_Ca_req'])
+    assert plan.n_skipped > 0
+    assert plan.n_skipped + len(plan.nodes) == plan.n_nodes
+    defined = set().union(*(node.defines for node in plan.nodes))
+    assert 'An_Ca_req' in defined
+    # The other minerals are not needed
+    assert not defined & {'An_Zn_req', 'An_P_req', 'An_Mg_req', 'An_DCADmeq'}
+
+
+def test_plan_cache():
+    # The graph of execute_model is public, and plans don't depend on the order of the outputs
+    assert nd.model_graph is model_graph
+    plan = nd.model_graph.plan(['An_MEIn', 'Mlk_Prod', 'An_MEIn'])
+    assert isinstance(plan, nd.EvaluationPlan)
+    assert nd.model_graph.plan(['Mlk_Prod', 'An_MEIn']) is plan
+    assert list(plan.outputs) == ['An_MEIn', 'Mlk_Prod']
+    # Only the most recently used plans are kept
+    graph = ModelGraph(sectioned_model, max_plans=2)
+    first = graph.plan(['capture'])
+    graph.plan(['outputs_sum'])
+    graph.plan(['capture', 'outputs_sum'])
+    assert len(graph._plans) == 2
+    assert graph.plan(['capture']) is not first
+
+
+def test_shortcut(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    expected = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    # The diet sums of diet_data_initial don't need diet_info with a CompiledFeedLibrary
+    outputs = ['Mlk_Prod', 'An_MPIn_g', 'An_Ca_req', 'Dt_NDFIn']
+    plan = nd.model_graph.plan(outputs)
+    assert [node.binds for node in plan.shortcuts] == [{'diet_data_initial'}]
+    defined = set().union(*(node.defines for node in plan.nodes))
+    assert not defined & {'diet_info', 'feed_properties'}
+    results = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy(),
+                               outputs=outputs)
+    for name in outputs:
+        assert type(results[name]) is float
+        assert results[name] == pytest.approx(expected.get_value(name), rel=1e-12)
+    # Outputs that need diet_info calculate it
+    assert not nd.model_graph.plan(['diet_info', 'Mlk_Prod']).shortcuts
+    # The full calculation is used without a CompiledFeedLibrary
+    results = nd.execute_model(user_diet, animal_input, equation_selection, feed_library.feed_data.rename(
+        columns={'Feedstuff': 'Fd_Name'}), nd.coeff_dict.copy(), outputs=outputs)
+    assert results['An_Ca_req'] == pytest.approx(expected.get_value('An_Ca_req'), rel=1e-12)
+
+
+def test_add_shortcut():
+    graph = ModelGraph(sectioned_model)
+    graph.add_shortcut("outputs_sum = a * 3", replaces=['capture', 'outputs_sum'])
+    plan = graph.plan(['outputs_sum'])
+    assert [node.binds for node in plan.nodes] == [{'outputs_sum'}]
+    assert plan.shortcuts == plan.nodes and plan.n_skipped == 1
+    assert graph.evaluate(['outputs_sum'], a=2) == {'outputs_sum': 6}
+    # capture is needed, so the statements are run as they are
+    assert not graph.plan(['capture', 'outputs_sum']).shortcuts
+    with pytest.raises(ValueError):
+        graph.add_shortcut("other = a * 3", replaces=['outputs_sum'])
+
+
+def test_unknown_output(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    with pytest.raises(KeyError):
+        nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy(),
+                         outputs=['Not_a_variable'])
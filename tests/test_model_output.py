@@ -0,0 +1,111 @@
+import pickle
+
+import pytest
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+@pytest.fixture
+def model_output(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    return nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+
+
+def test_get_value(model_output):
+    assert model_output.get_value('Production') is model_output.Production
+    assert model_output.get_value('milk') is model_output.Production['milk']
+    assert model_output.get_value('Mlk_Prod_comp') is model_output.Production['milk']['Mlk_Prod_comp']
+    assert model_output.get_value('An_Ca_bal') is model_output.Requirements['mineral_requirements']['Ca']['An_Ca_bal']
+    assert model_output.get_value('An_BW') == model_output.Inputs['animal_input']['An_BW']
+    # Efficiencies is searched before Requirements
+    assert model_output.get_value('energy') is model_output.Efficiencies['energy']
+    assert model_output.get_value('Not_a_variable') is None
+
+
+def test_get_values(model_output):
+    names = ['Mlk_Prod_comp', 'An_MPIn_g', 'An_Ca_bal']
+    values = model_output.get_values(names)
+    np.testing.assert_array_equal(values, [model_output.get_value(name) for name in names])
+    with pytest.raises(KeyError):
+        model_output.get_values(['Mlk_Prod_comp', 'Not_a_variable'])
+
+
+def test_search(model_output):
+    result = model_output.search('Mlk_Prod')
+    assert list(result.columns) == ['Name', 'Value']
+    assert 'Mlk_Prod_comp' in result['Name'].values
+    assert result.set_index('Name').loc['Mlk_Prod_comp', 'Value'] == model_output.get_value('Mlk_Prod_comp')
+    # Columns of dataframe outputs are also searched
+    fd_cp = model_output.search('^Fd_CP$')
+    assert {'Name': 'Fd_CP', 'Value': 'diet_info[column]'} in fd_cp.to_dict('records')
+    # Names are matched with their category and groups, and repeated searches give the same result
+    production = model_output.search('^production', ['Production'])
+    assert len(production) > 0
+    pd.testing.assert_frame_equal(model_output.search('^production', ['Production']), production)
+    assert model_output.search('Mlk_Prod', ['Inputs']).empty
+
+
+def test_capture_levels(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    full = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+
+    requirements = nd.execute_model(user_diet, animal_input, equation_selection, feed_library,
+                                    nd.coeff_dict.copy(), capture='requirements')
+    assert requirements.Inputs == {}
+    assert requirements.get_value('diet_info') is None
+    assert list(requirements.Production) == ['milk']
+    assert requirements.Production['milk'].keys() == full.Production['milk'].keys()
+    assert requirements.Requirements['mineral_requirements'] == full.Requirements['mineral_requirements']
+    for name in ['Trg_MEuse', 'An_MPuse_g_Trg', 'An_Ca_bal', 'An_MEIn', 'Mlk_Prod_MPalow', 'An_RDPIn_g']:
+        assert requirements.get_value(name) == pytest.approx(full.get_value(name))
+
+    snapshot = nd.execute_model(user_diet, animal_input, equation_selection, feed_library,
+                                nd.coeff_dict.copy(), capture='snapshot')
+    assert isinstance(snapshot, nd.ModelSnapshot)
+    for name, value in snapshot._asdict().items():
+        assert value == pytest.approx(float(full.get_value(name)))
+
+    with pytest.raises(ValueError):
+        nd.execute_model(user_diet, animal_input, equation_selection, feed_library, capture='summary')
+
+
+def test_save_load(model_output, tmp_path):
+    path = tmp_path / "output.nasem"
+    model_output.save(path)
+    loaded = nd.ModelOutput.load(path)
+    assert loaded.Production.keys() == model_output.Production.keys()
+    for name in ['Mlk_Prod_comp', 'An_Ca_bal', 'An_BW', 'An_StatePhys']:
+        assert loaded.get_value(name) == model_output.get_value(name)
+    assert loaded.get_value('coeff_dict') == model_output.get_value('coeff_dict')
+    for name in ['user_diet', 'diet_info', 'AA_values']:
+        pd.testing.assert_frame_equal(loaded.get_value(name), model_output.get_value(name))
+    with pytest.raises(ValueError):
+        nd.BatchModelOutput.load(path)
+
+
+def test_get_value_after_change(model_output):
+    model_output.Production['milk']['Mlk_Prod_comp'] = -1
+    assert model_output.get_value('Mlk_Prod_comp') == -1.0
+    np.testing.assert_array_equal(model_output.get_values(['Mlk_Prod_comp']), [-1.0])
+    del model_output.Production['milk']['Mlk_Prod_comp']
+    assert model_output.get_value('Mlk_Prod_comp') is None
+
+
+def test_unpickle_without_index(model_output):
+    # Outputs pickled by earlier versions don't have the name index
+    del model_output._ModelOutput__index
+    del model_output._ModelOutput__search_index
+    loaded = pickle.loads(pickle.dumps(model_output))
+    assert loaded.get_value('Mlk_Prod_comp') == model_output.Production['milk']['Mlk_Prod_comp']
+    assert loaded.get_values(['An_BW'])[0] == model_output.Inputs['animal_input']['An_BW']
+    assert 'Mlk_Prod_comp' in loaded.search('Mlk_Prod')['Name'].values
+
+
+def test_categories(model_output):
+    # Every category of ModelOutput is stored, by BatchModelOutput as well
+    batch = nd.BatchModelOutput.from_model_outputs([model_output])
+    for category_name in nd.ModelOutput.categories:
+        assert isinstance(getattr(model_output, category_name), dict)
+        assert isinstance(getattr(batch, category_name), dict)
+    assert model_output.get_value('Uncategorized') is model_output.Uncategorized
@@ -0,0 +1,67 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import nasem_dairy as nd
+import nasem_dairy.ration_balancer.execute_model as execute_model_module
+
+
+def test_model_profiler(compiled_model_input, tmp_path):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    calculate_An_MEIn = execute_model_module.calculate_An_MEIn
+    with nd.ModelProfiler() as profiler:
+        for _ in range(2):
+            nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+        nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy(),
+                         capture='snapshot')
+        with pytest.raises(RuntimeError):
+            nd.ModelProfiler().__enter__()
+    # The original functions are restored
+    assert execute_model_module.calculate_An_MEIn is calculate_An_MEIn
+
+    calls = profiler.to_pandas()
+    assert list(calls['run'].unique()) == [0, 1, 2]
+    assert (calls['duration'] >= 0).all()
+    # Each run calls the same equations in the same steps
+    first, second = (calls[calls['run'] == run] for run in (0, 1))
+    assert list(first['function']) == list(second['function'])
+    MEIn = first[first['function'] == 'calculate_An_MEIn'].iloc[0]
+    assert MEIn['step'] == 'Step 15: Energy Intake'
+    # The snapshot only runs the equations it needs
+    assert 0 < (calls['run'] == 2).sum() < len(first)
+
+    steps = profiler.to_pandas('step')
+    assert steps[steps['run'] == 0]['step'].iloc[0] == 'Step 1: Read User Input'
+    assert steps.groupby('run')['n_calls'].sum().tolist() == calls.groupby('run').size().tolist()
+    summary = profiler.summary('step')
+    assert summary['percent'].sum() == pytest.approx(100)
+    assert 'calculate_diet_info' in profiler.summary('function').index
+
+    trace = profiler.to_chrome_trace(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as file:
+        assert json.load(file) == trace
+    assert len(trace['traceEvents']) == len(calls) + len(steps)
+    assert {event['cat'] for event in trace['traceEvents']} == {'step', 'calculate'}
+
+
+def test_model_profiler_memory(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    with nd.ModelProfiler(track_memory=True) as profiler:
+        nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    calls = profiler.to_pandas()
+    assert calls['allocated_bytes'].notna().all()
+    diet_info = calls[calls['function'] == 'calculate_diet_info'].iloc[0]
+    assert diet_info['allocated_bytes'] > 0
+
+
+def test_model_profiler_threads(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    with nd.ModelProfiler() as profiler:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: nd.execute_model(user_diet, animal_input, equation_selection,
+                                                         feed_library, nd.coeff_dict), range(8)))
+    calls = profiler.to_pandas()
+    # Interleaved calls from different threads are not split into more runs
+    assert calls['run'].nunique() == 8
+    assert (calls.groupby('run')['thread'].nunique() == 1).all()
+    assert calls.groupby('run').size().nunique() == 1
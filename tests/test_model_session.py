@@ -0,0 +1,71 @@
+import pytest
+import nasem_dairy as nd
+
+
+@pytest.fixture
+def model_input(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    animal_input = {**animal_input, 'Env_TripsParlor': 2, 'Env_DistParlor': 500}
+    return user_diet, animal_input, equation_selection, feed_library
+
+
+outputs = ['Mlk_Prod', 'An_MEIn', 'An_MPIn_g', 'Trg_MEuse', 'An_DCADmeq', 'DMI', 'An_NEmUse', 'Dt_NDFIn']
+
+
+@pytest.mark.parametrize("changes", [
+    {'animal_input': {'Env_DistParlor': 1500}},
+    {'animal_input': {'DMI': 22.5, 'Env_TempCurr': 30}},
+    {'equation_selection': {'DMIn_eqn': 8}},
+    {'coeff_dict': {'Kl_ME_NE': 0.7}}
+])
+def test_update_matches_execute_model(model_input, changes):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    session = nd.ModelSession(user_diet, animal_input, equation_selection, feed_library)
+    session.update(**changes)
+
+    inputs = {'animal_input': animal_input, 'equation_selection': equation_selection,
+              'coeff_dict': nd.coeff_dict}
+    for name, values in changes.items():
+        inputs[name] = {**inputs[name], **values}
+    expected = nd.execute_model(user_diet, inputs['animal_input'], inputs['equation_selection'], feed_library,
+                                inputs['coeff_dict'].copy())
+    for name in outputs:
+        assert session.get_value(name) == pytest.approx(expected.get_value(name), rel=1e-12)
+    assert session.to_model_output().get_value('Mlk_Prod') == pytest.approx(expected.get_value('Mlk_Prod'))
+
+
+def test_update_user_diet(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    session = nd.ModelSession(user_diet, animal_input, equation_selection, feed_library)
+    diets = [user_diet.assign(kg_user=user_diet['kg_user'].where(user_diet.index != changed,
+                                                                 user_diet['kg_user'] * 1.5))
+             for changed in range(2)]
+    # Other feeds are calculated as usual, then scaled when their amounts change
+    diets += [user_diet.iloc[:-1], user_diet.iloc[:-1].assign(kg_user=lambda df: df['kg_user'] * 0.9)]
+    for diet in diets:
+        session.update(user_diet=diet)
+        expected = nd.execute_model(diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+        assert nd.compare_outputs(expected, session.to_model_output(), rtol=1e-12).equal
+        assert session.get_value('Dt_CPIn') == pytest.approx(expected.get_value('Dt_CPIn'), rel=1e-12)
+    # diet_info was scaled from the composition of each feed
+    assert session._diet_composition
+
+
+def test_update_only_runs_downstream(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    coeff_dict_copy = nd.coeff_dict.copy()
+    session = nd.ModelSession(user_diet, animal_input, equation_selection, feed_library)
+    evaluated = session.update(animal_input={'Env_DistParlor': 1500})
+    assigned = set().union(*(node.defines for node in evaluated))
+    assert {'An_NEm_Act_Parlor', 'An_NEmUse', 'Trg_MEuse'} <= assigned
+    assert not assigned & {'diet_info', 'diet_data', 'An_DCADmeq', 'An_MPIn_g'}
+    assert len(evaluated) < len(session.nodes) / 4
+    # Inputs given to the session are not changed
+    assert animal_input['Env_DistParlor'] == 500
+    assert nd.coeff_dict == coeff_dict_copy
+
+
+def test_unknown_input(model_input):
+    session = nd.ModelSession(*model_input)
+    with pytest.raises(TypeError):
+        session.update(not_an_input={})
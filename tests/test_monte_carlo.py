@@ -0,0 +1,39 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+
+
+def test_replicates_match_execute_model(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    outputs = ['Mlk_Prod_comp', 'An_MPIn_g', 'Du_MiCP_g']
+    # Each replicate uses a different coefficient value and 10% more CP in every feed
+    values = {'VmMiNInt': [90.0, 100.8, 110.0], 'KmMiNRDNDF': [0.08, 0.0939, 0.11],
+              'mPrt_k_Met_src': [0.05, 0.1, 0.15]}
+    coeff_distributions = {name: lambda rng, mean, size, value=value: np.array(value)
+                           for name, value in values.items()}
+    feed_distributions = {'Fd_CP': lambda rng, mean, size: mean * 1.1}
+    summary, samples = nd.run_monte_carlo(user_diet, animal_input, equation_selection, feed_library,
+                                          coeff_distributions, feed_distributions, n_replicates=3,
+                                          outputs=outputs, return_samples=True)
+    assert list(summary.index) == outputs
+
+    feed_data = feed_library.feed_data.rename(columns={'Feedstuff': 'Fd_Name'})
+    feed_data['Fd_CP'] = feed_data['Fd_CP'] * 1.1
+    for replicate in range(3):
+        coeffs = {**nd.coeff_dict, **{name: value[replicate] for name, value in values.items()}}
+        expected = nd.execute_model(user_diet, animal_input, equation_selection, feed_data, coeffs)
+        for name in outputs:
+            assert samples[name].iloc[replicate] == pytest.approx(expected.get_value(name), rel=1e-9)
+
+
+def test_quantiles(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    summary = nd.run_monte_carlo(user_diet, animal_input, equation_selection, feed_library,
+                                 coeff_distributions={'VmMiNInt': 0.1},
+                                 feed_distributions={'Fd_NDF': 0.05, 'Fd_St': 0.05},
+                                 n_replicates=500, seed=1)
+    assert list(summary.columns) == [0.025, 0.5, 0.975]
+    assert (summary[0.025] < summary[0.975]).all()
+    with pytest.raises(ValueError):
+        nd.run_monte_carlo(user_diet, animal_input, equation_selection, feed_library,
+                           coeff_distributions={'En_CP': 0.1}, n_replicates=10)
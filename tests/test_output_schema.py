@@ -0,0 +1,40 @@
+import nasem_dairy as nd
+
+
+def test_output_schema():
+    schema = nd.get_output_schema()
+    assert list(schema.columns) == ['description', 'unit', 'dtype', 'category', 'group', 'kind']
+    assert schema.set_index(['category', 'group'], append=True).index.is_unique
+    # Names stored in more than one place have a row for each
+    feedstuff = schema.loc['Feedstuff']
+    assert sorted(feedstuff['group']) == ['diet_info', 'user_diet']
+
+    milk = schema.loc['Trg_NEmilk_Milk']
+    assert (milk['category'], milk['group'], milk['kind'], milk['dtype']) == ('Production', 'milk', 'scalar', 'float64')
+    assert milk['unit'] == 'Mcal/kg'
+    assert schema.loc['An_Ca_bal', 'group'] == 'mineral_requirements.Ca'
+    assert schema.loc['Fd_CP', 'kind'] == 'per_feed'
+    assert schema.loc['Abs_AA_g', 'kind'] == 'per_AA'
+    assert schema.loc['An_StatePhys', 'dtype'] == 'str'
+
+
+def test_output_schema_entry():
+    from nasem_dairy.ration_balancer.output_schema import _schema_entry
+    entry = _schema_entry(('Requirements', 'mineral_requirements', 'Ca', 'An_Ca_bal'))
+    assert (entry['name'], entry['kind'], entry['dtype']) == ('An_Ca_bal', 'scalar', 'float64')
+    assert _schema_entry(('Intakes', 'infusion_data', 'Inf_Acet_g'))['category'] == 'Intakes'
+    assert _schema_entry(('Inputs', 'infusion_input', 'Inf_Acet_g'))['category'] == 'Inputs'
+    assert _schema_entry(('Production', 'milk', 'Not_a_variable')) is None
+
+
+def test_output_schema_matches_model_output(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    output = nd.execute_model(user_diet, animal_input, equation_selection, feed_library, nd.coeff_dict.copy())
+    schema = nd.get_output_schema()
+    for name in ['Mlk_Prod_comp', 'An_MPIn_g', 'Trg_MEuse', 'Du_MiCP_g']:
+        category = schema.loc[name, 'category']
+        group = schema.loc[name, 'group']
+        assert getattr(output, category)[group][name] is output.get_value(name)
+    # The returned schema is a copy
+    schema.loc['Mlk_Prod_comp', 'unit'] = 'changed'
+    assert nd.get_output_schema().loc['Mlk_Prod_comp', 'unit'] == 'kg/d'
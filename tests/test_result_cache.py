@@ -0,0 +1,90 @@
+import pytest
+import nasem_dairy as nd
+
+
+def test_result_cache_key(model_input, tmp_path):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    cache = nd.ResultCache(tmp_path)
+    key = cache.key(user_diet, animal_input, equation_selection, feed_library)
+    reordered = dict(reversed(list(animal_input.items())))
+    assert cache.key(user_diet, reordered, equation_selection, nd.CompiledFeedLibrary(feed_library)) == key
+    # Only the rows of the feeds in the diet are part of the key
+    other_feed = feed_library['Fd_Name'].str.strip() == 'Wheat straw'
+    assert not user_diet['Feedstuff'].eq('Wheat straw').any()
+    changed_library = feed_library.assign(Fd_CP=feed_library['Fd_CP'].where(~other_feed, 1.0))
+    assert cache.key(user_diet, animal_input, equation_selection, changed_library) == key
+
+    assert cache.key(user_diet, {**animal_input, 'An_BW': animal_input['An_BW'] + 1e-9},
+                     equation_selection, feed_library) != key
+    assert cache.key(user_diet, animal_input, equation_selection, feed_library,
+                     nd.CoeffOverlay({'VmMiNInt': 90}, nd.coeff_dict)) != key
+    assert cache.key(user_diet, animal_input, equation_selection, feed_library, outputs=['Mlk_Prod_comp']) != key
+
+
+def test_result_cache_hits(model_input, tmp_path):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    cache = nd.ResultCache(tmp_path)
+    expected = nd.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    first = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    second = cache.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    assert nd.compare_outputs(expected, second, rtol=0).equal
+    assert (cache.hits, cache.misses, cache.n_stored) == (1, 1, 1)
+
+    outputs = ['Mlk_Prod_comp', 'An_MEIn']
+    cache.execute_model(user_diet, animal_input, equation_selection, feed_library, outputs=outputs)
+    values = cache.execute_model(user_diet, animal_input, equation_selection, feed_library, outputs=outputs)
+    assert values['Mlk_Prod_comp'] == pytest.approx(expected.get_value('Mlk_Prod_comp'), rel=0)
+    snapshot = cache.execute_model(user_diet, animal_input, equation_selection, feed_library, capture='snapshot')
+    assert cache.execute_model(user_diet, animal_input, equation_selection, feed_library,
+                               capture='snapshot') == snapshot
+
+    # A new cache object finds the results in the directory
+    reopened = nd.ResultCache(tmp_path)
+    assert len(reopened) == 3 and reopened.size == cache.size
+    reopened.execute_model(user_diet, animal_input, equation_selection, feed_library)
+    assert reopened.stats()['hit_rate'] == 1.0
+    reopened.clear()
+    assert len(reopened) == 0 and not list(tmp_path.iterdir())
+
+
+def test_result_cache_evicts_least_recently_used(model_input, tmp_path):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    cache = nd.ResultCache(tmp_path, max_bytes=3 * 1024)
+    outputs = ['Mlk_Prod_comp']
+    for An_BW in [600, 650, 700]:
+        cache.execute_model(user_diet, {**animal_input, 'An_BW': An_BW}, equation_selection, feed_library,
+                            outputs=outputs)
+    # Room for three and a half results
+    cache.max_bytes = cache.size + cache.size // 6
+    # Using 600 again makes 650 the least recently used
+    cache.execute_model(user_diet, {**animal_input, 'An_BW': 600}, equation_selection, feed_library, outputs=outputs)
+    cache.execute_model(user_diet, {**animal_input, 'An_BW': 750}, equation_selection, feed_library, outputs=outputs)
+    assert cache.n_evicted == 1 and cache.size <= cache.max_bytes
+    key = cache.key(user_diet, {**animal_input, 'An_BW': 650}, equation_selection, feed_library, outputs=outputs)
+    assert cache.get(key) is None
+    key = cache.key(user_diet, {**animal_input, 'An_BW': 600}, equation_selection, feed_library, outputs=outputs)
+    assert cache.get(key) is not None
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_run_scenarios_with_cache(model_input, tmp_path, workers):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    scenarios = [{'user_diet': user_diet,
+                  'animal_input': {**animal_input, 'An_BW': An_BW},
+                  'equation_selection': equation_selection}
+                 for An_BW in [600, 650, 700]]
+    scenarios.append({'user_diet': user_diet, 'animal_input': {}, 'equation_selection': equation_selection})
+    cache = nd.ResultCache(tmp_path)
+    with nd.run_scenarios(scenarios[:2], feed_library, outputs=['Mlk_Prod_comp'], workers=workers,
+                          cache=cache) as results:
+        first = dict(results)
+    assert results.n_cached == 0 and cache.n_stored == 2
+
+    with nd.run_scenarios(scenarios, feed_library, outputs=['Mlk_Prod_comp'], workers=workers,
+                          chunksize=2, cache=cache) as results:
+        second = dict(results)
+    assert results.n_completed == 4 and results.n_cached == 2 and results.n_failed == 1
+    assert isinstance(second[3], Exception)
+    for index in first:
+        assert second[index]['Mlk_Prod_comp'] == pytest.approx(first[index]['Mlk_Prod_comp'], rel=0)
+    assert cache.n_stored == 3
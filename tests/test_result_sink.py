@@ -0,0 +1,48 @@
+import nasem_dairy as nd
+import numpy as np
+import pandas as pd
+
+
+def test_result_sink_row_groups(compiled_model_input, tmp_path):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    path = tmp_path / "sweep"
+    expected = []
+    with nd.ResultSink(path, flush_size=2) as sink:
+        for scenario, An_BW in enumerate([600, 625, 650, 675, 700]):
+            capture = 'full' if scenario == 0 else 'snapshot'
+            result = nd.execute_model(user_diet, {**animal_input, 'An_BW': An_BW}, equation_selection,
+                                      feed_library, nd.coeff_dict.copy(), capture=capture)
+            sink.append(result, scenario=scenario, An_BW=An_BW)
+            expected.append(float(result.Mlk_Prod_comp if capture == 'snapshot'
+                                  else result.get_value('Mlk_Prod_comp')))
+            if scenario == 2:
+                # Rows in complete row groups can be read during the sweep
+                assert sink.n_row_groups == 1
+                assert len(nd.read_results(path)) == 2
+    assert sink.n_row_groups == 3
+
+    results = nd.read_results(path, columns=['scenario', 'An_BW', 'Mlk_Prod_comp', 'Not_a_column'])
+    assert list(results['scenario']) == [0, 1, 2, 3, 4]
+    assert list(results['An_BW']) == [600, 625, 650, 675, 700]
+    np.testing.assert_allclose(results['Mlk_Prod_comp'], expected)
+    assert results['Not_a_column'].isna().all()
+    # Outputs only in the full ModelOutput are missing for the snapshot rows
+    assert nd.read_results(path)['An_Ca_bal'].isna().sum() == 4
+
+
+def test_result_sink_chunks(tmp_path):
+    path = tmp_path / "sweep"
+    sink = nd.ResultSink(path, flush_size=5)
+    sink.append_chunk(pd.DataFrame({'DMI': [20.0, 21.0, 22.0]}), diet='A')
+    sink.append({'DMI': 23.0, 'An_StatePhys': 'Lactating Cow'}, diet='B')
+    assert sink.n_row_groups == 0
+    sink.append_chunk(pd.DataFrame({'DMI': [24.0, 25.0]}), diet=['C', 'D'])
+    assert sink.n_row_groups == 1
+    sink.close()
+
+    # A new sink adds row groups after the existing ones
+    with nd.ResultSink(path) as sink:
+        sink.append({'DMI': 26.0})
+    results = nd.read_results(path)
+    assert list(results['DMI']) == [20.0, 21.0, 22.0, 23.0, 24.0, 25.0, 26.0]
+    assert list(results['diet'][:6]) == ['A', 'A', 'A', 'B', 'C', 'D']
@@ -0,0 +1,46 @@
+import pytest
+import nasem_dairy as nd
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_run_scenarios_matches_execute_model(model_input, workers):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    scenarios = [{'user_diet': user_diet,
+                  'animal_input': {**animal_input, 'An_BW': An_BW},
+                  'equation_selection': equation_selection}
+                 for An_BW in [600, 650, 700]]
+    scenarios.append({'user_diet': user_diet,
+                      'animal_input': animal_input,
+                      'equation_selection': equation_selection,
+                      'coeff_dict': {'VmMiNInt': 90}})
+    with nd.run_scenarios(scenarios, feed_library, outputs=['Mlk_Prod_comp'],
+                          workers=workers, chunksize=2) as results:
+        milk = dict(results)
+    assert sorted(milk) == [0, 1, 2, 3]
+    assert results.n_completed == 4
+    assert results.n_failed == 0
+    assert results.worker_throughput()['n_scenarios'].sum() == 4
+
+    for index, scenario in enumerate(scenarios):
+        coeffs = {**nd.coeff_dict, **scenario.get('coeff_dict', {})}
+        expected = nd.execute_model(scenario['user_diet'], scenario['animal_input'], equation_selection,
+                                    feed_library, coeffs, outputs=['Mlk_Prod_comp'])
+        assert milk[index]['Mlk_Prod_comp'] == pytest.approx(expected['Mlk_Prod_comp'])
+
+
+def test_run_scenarios_returns_errors(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    scenarios = [{'user_diet': user_diet, 'animal_input': animal_input, 'equation_selection': equation_selection},
+                 {'user_diet': user_diet, 'animal_input': {}, 'equation_selection': equation_selection}]
+    results = dict(nd.run_scenarios(scenarios, feed_library, outputs=['Mlk_Prod_comp'], workers=0))
+    assert isinstance(results[1], Exception)
+    assert 'Mlk_Prod_comp' in results[0]
+
+
+def test_run_scenarios_in_process_keeps_its_inputs(model_input):
+    user_diet, animal_input, equation_selection, feed_library = model_input
+    scenarios = [{'user_diet': user_diet, 'animal_input': animal_input, 'equation_selection': equation_selection}]
+    milk = nd.run_scenarios(scenarios, feed_library, outputs=['Mlk_Prod_comp'], workers=0)
+    weight = nd.run_scenarios(scenarios, feed_library, outputs=['An_BW'], workers=0)
+    assert list(next(milk)[1]) == ['Mlk_Prod_comp']
+    assert list(next(weight)[1]) == ['An_BW']
@@ -0,0 +1,29 @@
+import pytest
+import nasem_dairy as nd
+import numpy as np
+
+
+def test_jacobian_matches_execute_model(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    outputs = ['Mlk_Prod_MPalow', 'Mlk_Prod_NEalow', 'An_Ca_bal', 'An_P_bal']
+    result = nd.jacobian(user_diet, animal_input, equation_selection, feed_library, outputs=outputs)
+    assert list(result.index) == outputs
+    assert list(result.columns) == user_diet['Feedstuff'].tolist()
+
+    def run(feed, change):
+        diet = user_diet.copy()
+        diet.loc[feed, 'kg_user'] += change
+        DMI = animal_input['DMI'] * diet['kg_user'].sum() / user_diet['kg_user'].sum()
+        output = nd.execute_model(diet, {**animal_input, 'DMI': DMI}, equation_selection, feed_library,
+                                  nd.coeff_dict.copy())
+        return np.array([output.get_value(name) for name in outputs])
+
+    for feed in [0, 2]:
+        expected = (run(feed, 0.01) - run(feed, -0.01)) / 0.02
+        np.testing.assert_allclose(result.iloc[:, feed], expected, rtol=1e-6, atol=1e-9)
+
+
+def test_jacobian_unknown_output(compiled_model_input):
+    user_diet, animal_input, equation_selection, feed_library = compiled_model_input
+    with pytest.raises(KeyError):
+        nd.jacobian(user_diet, animal_input, equation_selection, feed_library, outputs=['Not_a_variable'])